@@ -1,11 +1,10 @@
 """
 Deuce Client - File API
 """
-from stoplight import validate
-
 from deuceclient.api.blocks import Blocks
 from deuceclient.api.splitter import FileSplitterBase
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class File(object):
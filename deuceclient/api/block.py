@@ -3,9 +3,8 @@ Deuce Client - Block API
 """
 import hashlib
 
-from stoplight import validate
-
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class Block(object):
@@ -1,10 +1,9 @@
 """
 Deuce Client - Blocks API
 """
-from stoplight import validate
-
 from deuceclient.api.block import Block
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class Blocks(dict):
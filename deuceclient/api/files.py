@@ -1,10 +1,9 @@
 """
 Deuce Client - Files API
 """
-from stoplight import validate
-
 from deuceclient.api.afile import File
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class Files(dict):
@@ -1,10 +1,9 @@
 """
 Deuce Client - Project API
 """
-from stoplight import validate
-
 from deuceclient.api.vault import Vault
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class Project(dict):
@@ -3,11 +3,29 @@ Deuce Client - (File) Splitter API
 """
 import abc
 
-from stoplight import validate
-
 from deuceclient.api.block import Block
 from deuceclient.common import errors
+import deuceclient.common.pagecache as pagecache
+import deuceclient.common.readahead as readahead
+import deuceclient.common.sparse as sparse
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
+
+
+def make_block(project_id, vault_id, data):
+    """Make a block of data split from a file
+
+    All-zero blocks share their data and id instead of being hashed.
+
+    :param data: bytes of the block
+    :returns: the Block
+    """
+    zeros = sparse.zeros(len(data))
+    if data == zeros:
+        return Block(project_id, vault_id, sparse.zero_block_id(len(data)),
+                     data=zeros)
+
+    return Block(project_id, vault_id, Block.make_id(data), data=data)
 
 
 class FileSplitterBase(object):
@@ -19,14 +37,75 @@ class FileSplitterBase(object):
     @validate(project_id=ProjectIdRule,
               vault_id=VaultIdRule,
               input_io=FileSplitterInputStreamRule)
-    def __init__(self, project_id, vault_id, input_io):
+    def __init__(self, project_id, vault_id, input_io,
+                 readahead=pagecache.DEFAULT_READAHEAD, drop_cache=True,
+                 prefetch_bytes=0):
         """
-        :param input_io: file-like object providing a read and tell functions
+        :param input_io: file-like object providing a read function; if it
+                         is not seekable, e.g. a pipe, the offsets of the
+                         blocks are counted from 0
+        :param readahead: for local files, number of bytes the kernel is
+                          asked to read ahead of the splitter, 0 to leave it
+                          to the kernel
+        :param drop_cache: for local files, whether or not to drop the
+                           content split from the page cache
+        :param prefetch_bytes: number of bytes of buffers to read the input
+                               stream into ahead of the splitter, in a
+                               background thread, so reading overlaps with
+                               hashing and uploading; 0 to read as blocks
+                               are split. See close.
         """
+        if prefetch_bytes < 0:
+            raise ValueError('prefetch_bytes must not be negative')
+
         self.__project_id = project_id
         self.__vault_id = vault_id
         self.__state = None
+        self.__readahead = readahead
+        self.__drop_cache = drop_cache
         self.__input_stream = input_io
+        self.__offset = self.__tracked_offset(input_io)
+        self.__holes = self.__hole_map(input_io, self.__offset)
+        self.__advisor = self.__page_cache_advisor(input_io)
+        self.__prefetch_bytes = prefetch_bytes
+        self.__prefetcher = None
+
+    @staticmethod
+    def __tracked_offset(input_io):
+        """Return the offset to count from if the stream cannot tell it
+
+        :returns: None if the stream is seekable and provides the offsets
+                  itself, otherwise 0
+        """
+        try:
+            seekable = input_io.seekable()
+
+        except AttributeError:
+            # not an io object, but it may still provide tell
+            seekable = hasattr(input_io, 'tell')
+
+        except (OSError, ValueError):
+            seekable = False
+
+        return None if seekable else 0
+
+    @staticmethod
+    def __hole_map(input_io, tracked_offset):
+        """Return the HoleMap of a local file, None for other streams
+        """
+        if tracked_offset is not None:
+            return None
+
+        holes = sparse.HoleMap(input_io)
+        return holes if holes.enabled else None
+
+    def __page_cache_advisor(self, input_io):
+        """Return the PageCacheAdvisor of a local file, None for others
+        """
+        advisor = pagecache.PageCacheAdvisor(input_io,
+                                             readahead=self.__readahead,
+                                             drop=self.__drop_cache)
+        return advisor if advisor.enabled else None
 
     @property
     def state(self):
@@ -53,6 +132,12 @@ class FileSplitterBase(object):
     def input_stream(self, input_io):
         if self.state is None:
             self.__input_stream = input_io
+            self.__offset = self.__tracked_offset(input_io)
+            self.__holes = self.__hole_map(input_io, self.__offset)
+            self.close()
+            if self.__advisor is not None:
+                self.__advisor.flush()
+            self.__advisor = self.__page_cache_advisor(input_io)
         else:
             raise RuntimeError('Invalid state to set new input_stream')
 
@@ -70,9 +155,114 @@ class FileSplitterBase(object):
 
         return blocks
 
+    def close(self):
+        """Stop reading the input stream ahead of the splitter
+
+        Only needed if the splitter is abandoned before the end of the input
+        stream; the input stream is then positioned after what was read
+        ahead.
+        """
+        if self.__prefetcher is not None:
+            self.__prefetcher.close()
+            self.__prefetcher = None
+
+    def __next_offset(self, size):
+        """Return the offset of the next read of the input stream
+
+        :returns: tuple of the offset and, if the range to read is a hole of
+                  a sparse file, the zeros it holds, otherwise None
+        """
+        if self.__offset is not None:
+            return (self.__offset, None)
+
+        # Seekable streams may have been repositioned by the caller
+        offset = self.__input_stream.tell()
+
+        # Holes of sparse files are not read at all
+        if self.__holes is not None and \
+                self.__holes.hole_size(offset, size) == size:
+            self.__input_stream.seek(offset + size)
+            return (offset, sparse.zeros(size))
+        return (offset, None)
+
+    def __consumed(self, offset, length, size):
+        """Record that length bytes were read at offset of the input stream
+        """
+        if self.__offset is not None:
+            self.__offset += length
+
+        if self.__advisor is not None:
+            self.__advisor.read(offset, length)
+            if length < size:
+                # The end of the file
+                self.__advisor.flush()
+
+    def __read_into(self, view):
+        """Read the next chunk of the input stream into a buffer
+
+        Called by the background thread reading ahead, see ReadAheadReader.
+        """
+        offset, zeros = self.__next_offset(len(view))
+        if zeros is not None:
+            return (offset, len(zeros), zeros)
+
+        readinto = getattr(self.__input_stream, 'readinto', None)
+        length = 0
+        while length < len(view):
+            if readinto is not None:
+                count = readinto(view[length:])
+            else:
+                data = self.__input_stream.read(len(view) - length)
+                count = len(data)
+                view[length:length + count] = data
+            if not count:
+                break
+            length += count
+
+        self.__consumed(offset, length, len(view))
+        return (offset, length, None)
+
+    def _read(self, size):
+        """Read data from the input stream
+
+        Streams such as pipes may return less data than requested before
+        their end; they are read until size bytes or the end are reached.
+
+        When reading ahead the data is a buffer that the next read reuses,
+        so it has to be used before then; see _make_block.
+
+        :returns: tuple of the offset of the data in the input stream and
+                  the data, which is empty at the end of the input stream
+        """
+        if self.__prefetch_bytes:
+            if self.__prefetcher is None:
+                self.__prefetcher = readahead.ReadAheadReader(
+                    self.__read_into, size, self.__prefetch_bytes)
+            elif self.__prefetcher.chunk_size != size:
+                raise ValueError('Reading ahead requires reads of {0} '
+                                 'bytes'.format(self.__prefetcher.chunk_size))
+            return self.__prefetcher.get()
+
+        offset, zeros = self.__next_offset(size)
+        if zeros is not None:
+            return (offset, zeros)
+
+        data = self.__input_stream.read(size)
+        while 0 < len(data) < size:
+            more = self.__input_stream.read(size - len(data))
+            if not more:
+                break
+            data += more
+
+        self.__consumed(offset, len(data), size)
+        return (offset, data)
+
     def _make_block(self, data):
-        block_id = Block.make_id(data)
-        return Block(self.project_id, self.vault_id, block_id, data=data)
+        """Make a block of data returned by _read
+
+        The block gets a copy of data that is a buffer reused by _read.
+        """
+        return make_block(self.project_id, self.vault_id, bytes(data))
 
     @abc.abstractmethod
     def configure(self, config):
@@ -1,9 +1,8 @@
 """
 Deuce Client - Deuce V1.0 Support
 """
-from stoplight import validate
-
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 def get_base_path():
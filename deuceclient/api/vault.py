@@ -1,13 +1,12 @@
 """
 Deuce Client - Vault API
 """
-from stoplight import validate
-
 from deuceclient.api.afile import File
 from deuceclient.api.files import Files
 from deuceclient.api.blocks import Blocks
 from deuceclient.api.storageblocks import StorageBlocks
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class Vault(object):
@@ -3,7 +3,6 @@ Deuce Authentication API
 """
 import abc
 import json
-import requests
 import logging
 import datetime
 import time
@@ -158,3 +157,8 @@ class AuthenticationBase(object):
     @abc.abstractmethod
     def _AuthExpirationTime(self):
         raise NotImplementedError()
+
+    def StopTokenRefresh(self):
+        """Stop refreshing the token in the background, if it is refreshed
+        """
+        pass
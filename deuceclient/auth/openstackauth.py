@@ -3,14 +3,9 @@ Deuce OpenStack Authentication API
 """
 import datetime
 import logging
-import time
-
-# What we want to do:
-# import keystoneclient.client
-# What we have to do:
-import keystoneclient.v2_0.client as client_v2
 
 import deuceclient.auth
+import deuceclient.auth.tokenmanager as tokenmanager
 
 
 class OpenStackAuthentication(deuceclient.auth.AuthenticationBase):
@@ -21,7 +16,15 @@ class OpenStackAuthentication(deuceclient.auth.AuthenticationBase):
 
     def __init__(self, userid=None, usertype=None,
                  credentials=None, auth_method=None,
-                 datacenter=None, auth_url=None):
+                 datacenter=None, auth_url=None,
+                 refresh_margin=tokenmanager.DEFAULT_REFRESH_MARGIN,
+                 token_cache=None):
+        """
+        :param refresh_margin: seconds before the token expires at which it
+                               is refreshed in the background
+        :param token_cache: optional deuceclient.auth.tokencache.TokenCache
+                            to share tokens with other processes
+        """
         if auth_url is None:
             raise deuceclient.auth.AuthenticationError(
                 'Required Parameter, auth_url, not specified.')
@@ -30,8 +33,15 @@ class OpenStackAuthentication(deuceclient.auth.AuthenticationBase):
                          credentials=credentials, auth_method=auth_method,
                          datacenter=datacenter, auth_url=auth_url)
 
+        self.log = logging.getLogger(__name__)
         self.__client = None
         self.__access = None
+        self.__token_cache = token_cache
+        self.__tokens = tokenmanager.TokenManager(
+            current=lambda: self.__access,
+            fetch=self.__fetch_access,
+            lifetime=self.__lifetime,
+            refresh_margin=refresh_margin)
 
     def get_client(self):
         """Retrieve the OpenStack Keystone Client
@@ -69,9 +79,14 @@ class OpenStackAuthentication(deuceclient.auth.AuthenticationBase):
                 'Invalid auth_method ({0:}) for OpenStackAuthentication'
                 .format(self.authmethod))
 
+        # Keystone is only imported once it is needed as importing it takes
+        # longer than many short commands take to run.
+        #
         # What we want to do:
+        # import keystoneclient.client
         # return keystoneclient.client.Client(**auth_args)
         # What we have to do:
+        import keystoneclient.v2_0.client as client_v2
         return client_v2.Client(**auth_args)
 
     def GetToken(self, retry=5):
@@ -113,16 +128,87 @@ class OpenStackAuthentication(deuceclient.auth.AuthenticationBase):
         else:
             return self.__access.will_expire_soon(stale_duration=fuzz)
 
-    def _AuthToken(self):
-        if self.IsExpired():
-            return self.GetToken()
+    @staticmethod
+    def __lifetime(access):
+        """Return the number of seconds until the access expires
+        """
+        try:
+            expires = access.expires
+            if expires.tzinfo is not None:
+                expires = expires.astimezone(
+                    datetime.timezone.utc).replace(tzinfo=None)
 
-        elif self.IsExpired(fuzz=2):
-            time.sleep(3)
-            return self.GetToken()
+            return (expires - datetime.datetime.utcnow()).total_seconds()
 
-        else:
-            return self.__access.auth_token
+        except Exception:
+            return 0
+
+    def _dump_access(self, access):
+        """Convert the access into data for the token cache
+        """
+        return dict(access)
+
+    def _load_access(self, data):
+        """Convert data from the token cache back into an access
+        """
+        import keystoneclient.access as keystone_access
+        return keystone_access.AccessInfo.factory(body={'access': data},
+                                                  region_name=self.datacenter)
+
+    def __cached_access(self, key):
+        """Return the access in the token cache if it is not about to expire
+        """
+        data = self.__token_cache.load(key)
+        if data is None:
+            return None
+
+        try:
+            access = self._load_access(data)
+
+        except Exception as ex:
+            self.log.debug('Token Cache: unusable entry: {0}'.format(ex))
+            return None
+
+        if self.__lifetime(access) <= self.__tokens.refresh_margin:
+            return None
+
+        return access
+
+    def __fetch_access(self):
+        """Retrieve a token, reusing one from the token cache if possible
+
+        The token cache entry stays locked while a token is retrieved so
+        that other processes wait for it instead of all retrieving one.
+        """
+        if self.__token_cache is None:
+            self.GetToken()
+            return
+
+        key = self.__token_cache.make_key(self.authurl, self.datacenter,
+                                          self.usertype, self.userid,
+                                          self.authmethod, self.credentials)
+        with self.__token_cache.lock(key):
+            access = self.__cached_access(key)
+            if access is not None:
+                self.__access = access
+                return
+
+            self.GetToken()
+            try:
+                self.__token_cache.store(key,
+                                         self._dump_access(self.__access))
+
+            except Exception as ex:
+                self.log.warning('Token Cache: unable to store the token: '
+                                 '{0}'.format(ex))
+
+    def StopTokenRefresh(self):
+        """Stop refreshing the token in the background
+        """
+        self.__tokens.stop()
+
+    def _AuthToken(self):
+        return self.__tokens.get().auth_token
 
     def _AuthExpirationTime(self):
         try:
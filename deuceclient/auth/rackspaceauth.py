@@ -5,6 +5,7 @@ import logging
 
 import deuceclient.auth
 import deuceclient.auth.openstackauth
+import deuceclient.auth.tokenmanager as tokenmanager
 
 
 def get_identity_apihost(datacenter):
@@ -28,7 +29,9 @@ class RackspaceAuthentication(
 
     def __init__(self, userid=None, usertype=None,
                  credentials=None, auth_method=None,
-                 datacenter=None, auth_url=None):
+                 datacenter=None, auth_url=None,
+                 refresh_margin=tokenmanager.DEFAULT_REFRESH_MARGIN,
+                 token_cache=None):
 
         # If an authentication url is not provided then create one using
         # Rackspace's Identity Service for the specified datacenter
@@ -46,7 +49,10 @@ class RackspaceAuthentication(
                                                       credentials=credentials,
                                                       auth_method=auth_method,
                                                       datacenter=datacenter,
-                                                      auth_url=auth_url)
+                                                      auth_url=auth_url,
+                                                      refresh_margin=(
+                                                          refresh_margin),
+                                                      token_cache=token_cache)
 
     @staticmethod
     def _management_url(*args, **kwargs):
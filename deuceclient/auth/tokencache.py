@@ -0,0 +1,119 @@
+"""
+Deuce Authentication Token Cache
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'deuce', 'tokens')
+
+
+class TokenCache(object):
+    """Authentication data shared between processes through files
+
+    Each entry is stored in its own file, readable only by the owner, and
+    replaced atomically. A lock per entry lets one process refresh an
+    expiring token while the others wait for and then reuse the result.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: directory to store the cache in, created with owner
+                     only permissions if it does not exist; defaults to
+                     ~/.cache/deuce/tokens
+        """
+        self.log = logging.getLogger(__name__)
+        if path is None:
+            path = DEFAULT_CACHE_DIR
+        self.__path = os.path.expanduser(path)
+
+    @property
+    def path(self):
+        return self.__path
+
+    @staticmethod
+    def make_key(*args):
+        """Build the key for an entry
+
+        The key is a digest so it does not disclose any of its parts
+        (e.g. credentials) through the file system.
+
+        :param args: strings identifying the entry
+        :returns: string key
+        """
+        return hashlib.sha256(
+            json.dumps([str(arg) for arg in args]).encode()).hexdigest()
+
+    def __entry_path(self, key, suffix=''):
+        return os.path.join(self.__path, '{0}{1}'.format(key, suffix))
+
+    def __ensure_dir(self):
+        os.makedirs(self.__path, mode=0o700, exist_ok=True)
+
+    def load(self, key):
+        """Load an entry
+
+        :param key: key of the entry
+        :returns: the stored data, None if there is no readable entry
+        """
+        try:
+            with open(self.__entry_path(key), 'r') as entry_file:
+                return json.load(entry_file)
+
+        except (OSError, ValueError) as ex:
+            self.log.debug('Token Cache: no entry {0}: {1}'.format(key, ex))
+            return None
+
+    def store(self, key, data):
+        """Store an entry
+
+        :param key: key of the entry
+        :param data: JSON serializable data to store
+        """
+        self.__ensure_dir()
+        temp_path = self.__entry_path(key, '.{0}.tmp'.format(os.getpid()))
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as entry_file:
+            json.dump(data, entry_file)
+        os.replace(temp_path, self.__entry_path(key))
+
+    def remove(self, key):
+        """Remove an entry
+
+        :param key: key of the entry
+        """
+        try:
+            os.remove(self.__entry_path(key))
+
+        except FileNotFoundError:
+            pass
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Hold the exclusive lock of an entry
+
+        Locking is not available on platforms without fcntl, in which case
+        concurrent refreshes are not prevented.
+
+        :param key: key of the entry
+        """
+        if fcntl is None:  # pragma: no cover
+            yield
+            return
+
+        self.__ensure_dir()
+        fd = os.open(self.__entry_path(key, '.lock'),
+                     os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
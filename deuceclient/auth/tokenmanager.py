@@ -0,0 +1,181 @@
+"""
+Deuce Authentication Token Management
+"""
+import logging
+import threading
+import time
+
+# Seconds before a token expires at which it is refreshed in the background
+DEFAULT_REFRESH_MARGIN = 300
+
+# Seconds to wait before retrying a failed background refresh
+DEFAULT_RETRY_DELAY = 5
+
+# Seconds without a token being used after which the background refresh
+# stops until the token is used again
+DEFAULT_IDLE_TIMEOUT = 3600
+
+
+class TokenManager(object):
+    """Keeps an authentication token fresh without stalling its users
+
+    The current authentication data is read without taking a lock. It is
+    refreshed by a background thread once it is within the refresh margin
+    of expiring, so callers only wait on the authentication service when
+    there is no usable token at all. Concurrent refreshes are coalesced
+    into a single request to the authentication service.
+
+    The background refresh stops once the token has not been used for the
+    idle timeout, so an idle process does not keep authenticating. It starts
+    again when the token is next used, which waits on a refresh only if the
+    token expired in the meantime.
+    """
+
+    def __init__(self, current, fetch, lifetime,
+                 refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 retry_delay=DEFAULT_RETRY_DELAY,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """
+        :param current: callable returning the current authentication data,
+                        None if there is none
+        :param fetch: callable retrieving new authentication data from the
+                      authentication service, after which it is returned by
+                      current
+        :param lifetime: callable taking authentication data and returning
+                         the number of seconds until it expires
+        :param refresh_margin: seconds before expiry at which the background
+                               refresh occurs; reduced to half the lifetime
+                               of short lived tokens
+        :param retry_delay: seconds to wait before retrying a failed
+                            background refresh
+        :param idle_timeout: seconds without a call to get after which the
+                             background refresh stops, None to keep
+                             refreshing until stopped
+        """
+        self.log = logging.getLogger(__name__)
+        self.__current = current
+        self.__fetch = fetch
+        self.__lifetime = lifetime
+        self.__refresh_margin = refresh_margin
+        self.__margin = refresh_margin
+        self.__retry_delay = retry_delay
+        self.__idle_timeout = idle_timeout
+        self.__last_used = time.monotonic()
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__stopped = False
+        self.__idled = False
+        self.__thread = None
+
+    @property
+    def refresh_margin(self):
+        return self.__refresh_margin
+
+    def __remaining(self, access):
+        if access is None:
+            return 0
+        return self.__lifetime(access)
+
+    def get(self):
+        """Return valid authentication data
+
+        :returns: the current authentication data, only waiting on a refresh
+                  if it has already expired
+        """
+        self.__last_used = time.monotonic()
+        access = self.__current()
+        remaining = self.__remaining(access)
+
+        if remaining <= 0:
+            return self.refresh(stale=access)
+
+        if self.__idled:
+            # The background refresh stopped while the token was unused
+            with self.__lock:
+                if self.__idled:
+                    self.__idled = False
+                    self.__start()
+
+        if remaining <= self.__margin:
+            # The refresher normally gets here first
+            self.__wakeup.set()
+
+        return access
+
+    def refresh(self, stale=None):
+        """Retrieve new authentication data
+
+        Callers that find their authentication data replaced while waiting
+        for another refresh to complete use the replacement instead of
+        retrieving their own.
+
+        :param stale: the authentication data to be replaced
+        :returns: the new authentication data
+        """
+        with self.__lock:
+            access = self.__current()
+            if access is not stale and self.__remaining(access) > 0:
+                return access
+
+            self.__fetch()
+            access = self.__current()
+
+            self.__margin = max(min(self.__refresh_margin,
+                                    self.__remaining(access) / 2), 0)
+            self.__start()
+            self.__wakeup.set()
+            return access
+
+    def __start(self):
+        if self.__thread is None and not self.__stopped:
+            self.__thread = threading.Thread(target=self.__run,
+                                             name='deuce-token-refresh')
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def __idle(self):
+        return (self.__idle_timeout is not None and
+                time.monotonic() - self.__last_used > self.__idle_timeout)
+
+    def __run(self):
+        while not self.__stopped:
+            self.__wakeup.clear()
+
+            access = self.__current()
+            delay = self.__remaining(access) - self.__margin
+            if delay > 0:
+                self.__wakeup.wait(delay)
+                continue
+
+            with self.__lock:
+                if self.__idle():
+                    # Started again by the next call to get
+                    self.log.debug('Token unused for {0} seconds, stopping '
+                                   'the background refresh'.format(
+                                       self.__idle_timeout))
+                    self.__thread = None
+                    self.__idled = True
+                    return
+
+            try:
+                if self.__remaining(self.refresh(stale=access)) > 0:
+                    continue
+
+                self.log.warning('Background token refresh returned an '
+                                 'expired token')
+
+            except Exception as ex:
+                self.log.warning('Background token refresh failed: '
+                                 '{0}'.format(ex))
+
+            self.__wakeup.wait(self.__retry_delay)
+
+    def stop(self):
+        """Stop the background refresh
+        """
+        self.__stopped = True
+        self.__wakeup.set()
+        with self.__lock:
+            thread, self.__thread = self.__thread, None
+        if thread is not None:
+            thread.join()
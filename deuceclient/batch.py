@@ -0,0 +1,210 @@
+"""
+Deuce Client Batch Mode
+
+Runs a script of shell commands in one process so they share the
+authenticated clients, and therefore one token and its connections:
+
+    deuce <options> batch [--jobs N] [--output {text,json}] [SCRIPT]
+
+Each line of the script is a command as it would follow the options of
+'deuce <options>', either as shell words or as a JSON list of strings:
+
+    vault --vault-name backups create
+    ["files", "--vault-name", "backups", "upload", "--content", "a.tar"]
+
+Blank lines and lines starting with '#' are ignored.
+
+The commands run concurrently, in no particular order, not one after the
+other as in a shell script. A command that depends on an earlier one, e.g.
+an upload into a vault created by the line before it, must be separated
+from it by a line reading 'wait', which waits for all of the earlier
+commands to complete before any later one starts:
+
+    vault --vault-name backups create
+    wait
+    ["files", "--vault-name", "backups", "upload", "--content", "a.tar"]
+
+With '--jobs 1' the commands run one at a time, in the order of the script.
+"""
+import contextlib
+import copy
+import io
+import itertools
+import json
+import shlex
+import sys
+
+import deuceclient.common.parallel as parallel
+import deuceclient.daemon as daemon
+
+WAIT = 'wait'
+
+
+class BatchCommand(object):
+    """A command of a batch script and its outcome
+    """
+
+    def __init__(self, line_number, text):
+        """
+        :param line_number: line of the script the command is on
+        :param text: the line itself
+        """
+        self.line_number = line_number
+        self.text = text
+        self.exit_code = None
+        self.stdout = ''
+        self.stderr = ''
+
+    def argv(self):
+        """Split the command into its arguments
+
+        :returns: list of the arguments
+        :raises: ValueError if the line cannot be split
+        """
+        if self.text.startswith('['):
+            argv = json.loads(self.text)
+            if not all(isinstance(arg, str) for arg in argv):
+                raise ValueError('JSON commands must be lists of strings')
+            return argv
+
+        return shlex.split(self.text)
+
+    def status(self):
+        """Return the outcome of the command
+
+        :returns: dict of the line, command, exit code and output
+        """
+        return {
+            'line': self.line_number,
+            'command': self.text,
+            'exit': self.exit_code,
+            'stdout': self.stdout,
+            'stderr': self.stderr
+        }
+
+
+def read_script(stream):
+    """Read the commands of a batch script
+
+    :param stream: iterable of the lines of the script
+    :returns: generator of BatchCommand, and of WAIT for the 'wait' lines
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if line == WAIT:
+            yield WAIT
+        else:
+            yield BatchCommand(line_number, line)
+
+
+@contextlib.contextmanager
+def _thread_outputs():
+    """Make sure sys.stdout and sys.stderr can be redirected per thread
+
+    In the client daemon they already are.
+
+    :returns: (stdout, stderr) ThreadOutput tuple
+    """
+    originals = (sys.stdout, sys.stderr)
+    outputs = tuple(stream if isinstance(stream, daemon.ThreadOutput)
+                    else daemon.ThreadOutput(stream)
+                    for stream in originals)
+    sys.stdout, sys.stderr = outputs
+    try:
+        yield outputs
+    finally:
+        sys.stdout, sys.stderr = originals
+
+
+def run(script, arguments, user_config, log,
+        max_workers=parallel.DEFAULT_MAX_WORKERS, cwd=None, report=None):
+    """Run the commands of a batch script
+
+    Commands between 'wait' lines run concurrently, see the module
+    documentation. Concurrent commands each use a client of their own; all
+    of the clients share one authenticator.
+
+    :param script: iterable of the lines of the script
+    :param arguments: argparse.Namespace with the global shell options
+    :param user_config: contents of the user configuration file
+    :param log: logger for the commands
+    :param max_workers: integer - number of commands to run concurrently
+    :param cwd: directory relative paths in the commands are relative to
+    :param report: optional callable taking each BatchCommand as it
+                   completes, with its output and exit code
+    :returns: dict with the number of commands that succeeded and failed
+    """
+    import deuceclient.shell as shell
+
+    # The options of the batch itself are not passed on to its commands
+    options = {key: value for key, value in vars(arguments).items()
+               if not key.startswith('batch_')
+               and key not in ('func', 'client_pool')}
+
+    options_namespace = type(arguments)(**options)
+
+    summary = {'succeeded': 0, 'failed': 0}
+
+    # Closing the pool stops refreshing the token once the batch is done
+    with contextlib.closing(daemon.ClientPool()) as client_pool, \
+            _thread_outputs() as (stdout, stderr):
+
+        def execute(command):
+            output = []
+            errors = []
+            lease = client_pool.lease()
+            try:
+                with stdout.redirect(output.append), \
+                        stderr.redirect(errors.append):
+                    try:
+                        command_arguments = shell.build_command_parser(
+                            cwd=cwd).parse_args(
+                                command.argv(),
+                                namespace=copy.copy(options_namespace))
+
+                    except SystemExit as ex:
+                        return ex.code or 0
+
+                    except ValueError as ex:
+                        print('Error: {0}'.format(ex), file=sys.stderr)
+                        return 2
+
+                    command_arguments.user_config = io.StringIO(user_config)
+                    command_arguments.client_pool = lease
+                    return daemon.call_command(command_arguments, log)
+
+            finally:
+                lease.release()
+                command.stdout = ''.join(output)
+                command.stderr = ''.join(errors)
+
+        commands = read_script(script)
+        for first in commands:
+            if first is WAIT:
+                continue
+
+            group = itertools.chain(
+                [first],
+                itertools.takewhile(lambda command: command is not WAIT,
+                                    commands))
+
+            for command, exit_code, error in parallel.map_unordered(
+                    execute, group, max_workers=max_workers):
+
+                if error is not None:
+                    command.stderr += 'Error: {0}\n'.format(error)
+                    exit_code = 1
+
+                command.exit_code = exit_code
+                if exit_code == 0:
+                    summary['succeeded'] += 1
+                else:
+                    summary['failed'] += 1
+
+                if report is not None:
+                    report(command)
+
+    return summary
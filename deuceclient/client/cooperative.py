@@ -0,0 +1,370 @@
+"""
+Deuce Client - Cooperative Upload
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import deuceclient.api.vault as api_vault
+import deuceclient.client.deuce as deuce
+from deuceclient.common.checkpoint import Checkpoint
+import deuceclient.common.errors as errors
+import deuceclient.common.pagecache as pagecache
+
+PLAN_FILE = 'plan.json'
+
+# Seconds a claim on a region lasts without its worker renewing it; the
+# region is then taken over by another worker
+DEFAULT_CLAIM_TIMEOUT = 300
+
+# Seconds between checks for the regions to be done
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class CooperativeUpload(object):
+    """Upload of a single file by several workers on several nodes
+
+    The nodes share the local file, e.g. an NFS-mounted snapshot, and a work
+    directory. The coordinator creates the file in the vault and publishes
+    a plan of the regions of the local file to upload in the work directory
+    (see create). Workers claim regions one at a time by creating a claim
+    directory, which is atomic even on NFS, upload them at their offsets
+    in the file (see DeuceClient.UploadFileRange) and mark them done. The
+    coordinator finalizes the file once every region is done (see
+    finalize).
+
+    A worker renews its claim while it uploads the region. A claim that has
+    not been renewed for claim_timeout seconds, e.g. because its node
+    crashed, is taken over by another worker; uploading a region again
+    assigns the same blocks at the same offsets.
+    """
+
+    def __init__(self, work_dir, plan):
+        """
+        :param work_dir: directory shared by the coordinator and workers
+        :param plan: the plan of the upload, see create and open
+        """
+        self.log = logging.getLogger(__name__)
+        self.__work_dir = work_dir
+        self.__plan = plan
+        self.__vault = api_vault.Vault(plan['project_id'], plan['vault_id'])
+        self.__vault.add_file(plan['file_id'], plan['url'])
+
+    @classmethod
+    def create(cls, client, vault, path, work_dir, regions,
+               file_id=None, chunk_size=deuce.DEFAULT_CHUNK_SIZE):
+        """Create the file and publish the plan of the upload
+
+        :param client: DeuceClient to create the file with
+        :param vault: vault to upload the file into
+        :param path: path of the local file to upload, as the workers see it
+        :param work_dir: directory shared with the workers, created if it
+                         does not exist; it must not hold another upload
+        :param regions: number of regions to divide the file into
+        :param file_id: optional id of an existing, empty file in the vault
+                        to upload into; one is created if not specified
+        :param chunk_size: size of the blocks the file is split into
+        :returns: the CooperativeUpload
+        :raises: FileExistsError if work_dir holds another upload
+        """
+        stat_result = os.stat(path)
+        length = stat_result.st_size
+        upload_regions = deuce.file_regions(length, regions, chunk_size)
+
+        os.makedirs(work_dir, exist_ok=True)
+        plan_file = Checkpoint(os.path.join(work_dir, PLAN_FILE))
+        if plan_file.load() is not None:
+            raise FileExistsError('{0} holds another upload'.format(
+                work_dir))
+
+        upload_vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        if file_id is None:
+            file_id = client.CreateFile(upload_vault)
+        else:
+            upload_vault.add_file(file_id)
+
+        plan = {
+            'project_id': vault.project_id,
+            'vault_id': vault.vault_id,
+            'file_id': file_id,
+            'url': upload_vault.files[file_id].url,
+            'path': path,
+            'length': length,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'chunk_size': chunk_size,
+            'regions': [list(region) for region in upload_regions]
+        }
+        plan_file.save(plan)
+        return cls(work_dir, plan)
+
+    @classmethod
+    def open(cls, work_dir):
+        """Open the upload published in a work directory
+
+        :param work_dir: directory shared with the coordinator
+        :returns: the CooperativeUpload
+        :raises: FileNotFoundError if no upload is published in work_dir
+        """
+        plan = Checkpoint(os.path.join(work_dir, PLAN_FILE)).load()
+        if plan is None:
+            raise FileNotFoundError('{0} holds no upload'.format(work_dir))
+        return cls(work_dir, plan)
+
+    @property
+    def file_id(self):
+        return self.__plan['file_id']
+
+    @property
+    def length(self):
+        return self.__plan['length']
+
+    @property
+    def regions(self):
+        """Return the regions of the local file as (start, end) tuples
+        """
+        return [tuple(region) for region in self.__plan['regions']]
+
+    def __region_path(self, index, suffix):
+        return os.path.join(self.__work_dir,
+                            'region-{0:06d}.{1}'.format(index, suffix))
+
+    def __done_marker(self, index):
+        return Checkpoint(self.__region_path(index, 'done'))
+
+    def done_regions(self):
+        """Return the summaries of the regions that are done
+
+        :returns: dict of the summary of each region done by its index
+        """
+        done = {}
+        for index in range(len(self.__plan['regions'])):
+            summary = self.__done_marker(index).load()
+            if summary is not None:
+                done[index] = summary
+        return done
+
+    def __make_claim(self, claim_path):
+        """Create a claim directory holding a token of its owner
+
+        :returns: the token, None if the claim exists
+        """
+        try:
+            os.mkdir(claim_path)
+
+        except FileExistsError:
+            return None
+
+        token = uuid.uuid4().hex
+        with open(os.path.join(claim_path, token), 'w'):
+            pass
+        return token
+
+    def __claim(self, index, claim_timeout):
+        """Claim a region
+
+        :returns: the token of the claim, None if the region is claimed by
+                  another worker
+        """
+        claim_path = self.__region_path(index, 'claim')
+        token = self.__make_claim(claim_path)
+        if token is not None:
+            return token
+
+        try:
+            stale_tokens = sorted(os.listdir(claim_path))
+            stale_mtime = os.stat(claim_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if time.time() - stale_mtime / 1e9 < claim_timeout:
+            return None
+
+        # Another worker may have taken over the expired claim, and made a
+        # fresh one, since it was looked at; only the expired claim is
+        # moved out of the way
+        stale_path = '{0}.stale.{1}'.format(claim_path, uuid.uuid4())
+        try:
+            os.rename(claim_path, stale_path)
+        except FileNotFoundError:
+            return None
+
+        try:
+            moved = (sorted(os.listdir(stale_path)) == stale_tokens and
+                     os.stat(stale_path).st_mtime_ns == stale_mtime)
+        except FileNotFoundError:
+            moved = False
+        if not moved:
+            try:
+                os.rename(stale_path, claim_path)
+            except OSError:
+                # A claim was made meanwhile, the region may be uploaded
+                # twice which assigns the same blocks at the same offsets
+                shutil.rmtree(stale_path, ignore_errors=True)
+            return None
+
+        shutil.rmtree(stale_path, ignore_errors=True)
+        self.log.info('Cooperative Upload: taking over the expired claim '
+                      'of region {0}'.format(index))
+        return self.__make_claim(claim_path)
+
+    def __release(self, index, token):
+        """Release a claim unless it was taken over
+        """
+        claim_path = self.__region_path(index, 'claim')
+        if os.path.exists(os.path.join(claim_path, token)):
+            shutil.rmtree(claim_path, ignore_errors=True)
+
+    def __check_source(self, path):
+        stat_result = os.stat(path)
+        if stat_result.st_size != self.__plan['length'] or \
+                stat_result.st_mtime_ns != self.__plan['mtime_ns']:
+            raise errors.InvalidContentError(
+                '{0} changed since the upload into file {1} was planned'
+                .format(path, self.file_id))
+
+    def work(self, client, path=None, count=deuce.DEFAULT_ASSIGNMENT_COUNT,
+             claim_timeout=DEFAULT_CLAIM_TIMEOUT,
+             readahead=pagecache.DEFAULT_READAHEAD, drop_cache=True):
+        """Upload regions of the file until none is left to claim
+
+        Regions are uploaded one at a time; run several workers on a node
+        to upload several regions of it at once. A region that fails is
+        released for another worker, or another call, to upload.
+
+        :param client: DeuceClient to upload the regions with
+        :param path: path of the local file on this node, defaults to the
+                     path in the plan
+        :param count: number of blocks to assign to the file at a time
+        :param claim_timeout: seconds after which a claim that is not
+                              renewed is taken over
+        :param readahead: number of bytes the kernel is asked to read ahead,
+                          see UploadFile
+        :param drop_cache: whether or not to drop the content uploaded from
+                           the page cache, see UploadFile
+        :returns: dict of the number of regions uploaded and that failed,
+                  and the bytes and blocks uploaded by this worker
+        :raises: errors.InvalidContentError if the local file changed since
+                 the upload was planned
+        """
+        if path is None:
+            path = self.__plan['path']
+        self.__check_source(path)
+
+        summary = {
+            'regions': 0,
+            'failed_regions': 0,
+            'bytes': 0,
+            'blocks': 0,
+            'uploaded_bytes': 0,
+            'uploaded_blocks': 0
+        }
+        for index, (start, end) in enumerate(self.regions):
+            marker = self.__done_marker(index)
+            if marker.load() is not None:
+                continue
+            token = self.__claim(index, claim_timeout)
+            if token is None:
+                continue
+
+            # The claim is renewed while the region is uploaded
+            claim_path = self.__region_path(index, 'claim')
+            uploaded = threading.Event()
+
+            def renew():
+                while not uploaded.wait(claim_timeout / 3.0):
+                    try:
+                        os.utime(claim_path)
+                    except OSError:
+                        return
+
+            renewer = threading.Thread(target=renew, daemon=True)
+            renewer.start()
+            try:
+                # The region may have been done by the worker whose claim
+                # expired
+                if marker.load() is not None:
+                    continue
+
+                region_summary = client.UploadFileRange(
+                    self.__vault, self.file_id, path, start, end,
+                    count=count, chunk_size=self.__plan['chunk_size'],
+                    readahead=readahead, drop_cache=drop_cache)
+                if region_summary['bytes'] != end - start:
+                    raise errors.InvalidContentError(
+                        '{0} ends before region {1}'.format(path, index))
+
+                marker.save(region_summary)
+                summary['regions'] += 1
+                for key in ('bytes', 'blocks', 'uploaded_bytes',
+                            'uploaded_blocks'):
+                    summary[key] += region_summary[key]
+
+            except Exception as ex:
+                self.log.warning('Cooperative Upload: region {0} failed: '
+                                 '{1}'.format(index, ex))
+                summary['failed_regions'] += 1
+
+            finally:
+                uploaded.set()
+                renewer.join()
+                self.__release(index, token)
+
+        return summary
+
+    def finalize(self, client, timeout=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        """Wait for every region to be done and finalize the file
+
+        The plan and the records of the regions are removed from the work
+        directory once the file is finalized.
+
+        :param client: DeuceClient to finalize the file with
+        :param timeout: optional number of seconds to wait for the regions
+        :param poll_interval: seconds between checks for the regions
+        :returns: dict of the file_id and url of the file, its length in
+                  bytes and blocks, the number of blocks and bytes that were
+                  uploaded and the number of regions, as UploadFileRegions
+        :raises: RuntimeError if the regions are not done within timeout
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        while True:
+            done = self.done_regions()
+            if len(done) == len(self.__plan['regions']):
+                break
+
+            if deadline is not None and time.monotonic() >= deadline:
+                missing = sorted(set(range(len(self.__plan['regions']))) -
+                                 set(done))
+                raise RuntimeError(
+                    'Failed to Finalize File. {0} of {1} regions are not '
+                    'done, e.g. region {2}'.format(
+                        len(missing), len(self.__plan['regions']),
+                        missing[0]))
+            time.sleep(poll_interval)
+
+        summary = {
+            'file_id': self.file_id,
+            'url': self.__plan['url'],
+            'bytes': 0,
+            'blocks': 0,
+            'uploaded_bytes': 0,
+            'uploaded_blocks': 0,
+            'regions': len(done)
+        }
+        for region_summary in done.values():
+            for key in ('bytes', 'blocks', 'uploaded_bytes',
+                        'uploaded_blocks'):
+                summary[key] += region_summary[key]
+
+        client.FinalizeFile(self.__vault, self.file_id,
+                            file_length=self.length)
+
+        for index in range(len(self.__plan['regions'])):
+            self.__done_marker(index).clear()
+        Checkpoint(os.path.join(self.__work_dir, PLAN_FILE)).clear()
+        return summary
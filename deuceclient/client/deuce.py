@@ -1,39 +1,107 @@
 """
 Deuce API
 """
+import collections
+import concurrent.futures
+import contextlib
 import datetime
+import hashlib
+import itertools
 import json
+import os
 import requests
+import stat
 import logging
+import threading
+import time
 from urllib.parse import urlparse, parse_qs
 
-import msgpack
-from stoplight import validate
-
 import deuceclient.api.afile as api_file
 import deuceclient.api.block as api_block
 import deuceclient.api.blocks as api_blocks
 import deuceclient.api.storageblocks as api_storageblocks
 import deuceclient.api.vault as api_vault
 import deuceclient.api.v1 as api_v1
+import deuceclient.client.fileidpool as fileidpool
+from deuceclient.client.fileidpool import FileIdPool
+from deuceclient.common.bitmap import Bitmap
+import deuceclient.common.pagecache as pagecache
+import deuceclient.common.parallel as parallel
+import deuceclient.common.sparse as sparse
+import deuceclient.common.shards as shards
+from deuceclient.utils import UniformSplitter
 from deuceclient.common.command import Command
+import deuceclient.common.errors as errors
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 from deuceclient.common.validation_instance import *
 
 
+# HTTP status codes for which a request may succeed if retried
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# Seconds an orphaned storage block is left alone after its references
+# last changed before it may be garbage collected
+DEFAULT_GC_GRACE_PERIOD = 24 * 60 * 60
+
+# Number of blocks assigned to a file at a time while uploading it
+DEFAULT_ASSIGNMENT_COUNT = 10
+
+# Size of the blocks files are split into while uploading them
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Number of blocks assigned to a file at a time from a known manifest
+MANIFEST_ASSIGNMENT_COUNT = 1000
+
+# Number of blocks restored between saves of the restore checkpoint
+RESTORE_CHECKPOINT_INTERVAL = 256
+
+
+def is_transient_error(error):
+    """Return whether or not a failed request may succeed if retried
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+
+    return (isinstance(error, errors.DeuceRequestError) and
+            error.status_code in TRANSIENT_STATUS_CODES)
+
+
+def file_regions(length, regions, chunk_size):
+    """Divide a file into regions that start on a chunk boundary
+
+    :param length: length of the file in bytes
+    :param regions: maximum number of regions
+    :param chunk_size: size of the blocks the file is split into
+    :returns: list of (start, end) tuples of at most regions regions
+    :raises: ValueError if regions is less than 1
+    """
+    if regions < 1:
+        raise ValueError('regions must be at least 1')
+
+    chunks = (length + chunk_size - 1) // chunk_size
+    region_chunks = max(1, (chunks + regions - 1) // regions)
+    region_size = region_chunks * chunk_size
+    return [(start, min(start + region_size, length))
+            for start in range(0, length, region_size)]
+
+
 class DeuceClient(Command):
 
     """
     Object defining HTTP REST API calls for interacting with Deuce.
     """
 
-    def __init__(self, authenticator, apihost, sslenabled=False):
+    def __init__(self, authenticator, apihost, sslenabled=False,
+                 max_workers=parallel.DEFAULT_MAX_WORKERS):
         """Initialize the Deuce Client access
 
         :param authenticator: instance of deuceclient.auth.Authentication
                               to use for retrieving auth tokens
         :param apihost: server to use for API calls
         :param sslenabled: True if using HTTPS; otherwise false
+        :param max_workers: default number of concurrent requests used by
+                            the bulk operations
         """
         super(DeuceClient, self).__init__(apihost,
                                           '/',
@@ -41,6 +109,36 @@ class DeuceClient(Command):
         self.log = logging.getLogger(__name__)
         self.sslenabled = sslenabled
         self.authenticator = authenticator
+        self.max_workers = max_workers
+        self.__local = threading.local()
+        self.__session = None
+
+    def _thread_client(self):
+        """Return the DeuceClient to use from the calling worker thread
+
+        Each request (re)initializes the uri and headers of the client it is
+        made on, so concurrent requests must each use their own client. The
+        clients share this client's authenticator.
+        """
+        client = getattr(self.__local, 'client', None)
+        if client is None:
+            client = DeuceClient(self.authenticator,
+                                 self.apihost,
+                                 sslenabled=self.sslenabled,
+                                 max_workers=self.max_workers)
+            self.__local.client = client
+        return client
+
+    @property
+    def session(self):
+        """Return the requests.Session the client makes its requests on
+
+        The session keeps the connections to the Deuce server open between
+        requests.
+        """
+        if self.__session is None:
+            self.__session = requests.Session()
+        return self.__session
 
     def __update_headers(self):
         """Update common headers
@@ -106,7 +204,7 @@ class DeuceClient(Command):
 
         self.__update_headers()
         self.__log_request_data(fn='List Vaults')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=True, fn='List Vaults')
 
         if res.status_code == 200:
@@ -145,7 +243,7 @@ class DeuceClient(Command):
 
         self.__update_headers()
         self.__log_request_data(fn='Create Vault')
-        res = requests.put(self.Uri, headers=self.Headers)
+        res = self.session.put(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Create Vault')
 
         if res.status_code == 201:
@@ -191,7 +289,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, path)
         self.__update_headers()
         self.__log_request_data(fn='Delete Vault')
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Delete Vault')
 
         if res.status_code == 204:
@@ -221,7 +319,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, path)
         self.__update_headers()
         self.__log_request_data(fn='Vault Exists')
-        res = requests.head(self.Uri, headers=self.Headers)
+        res = self.session.head(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Vault Exists')
 
         if res.status_code == 204:
@@ -253,7 +351,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, path)
         self.__update_headers()
         self.__log_request_data(fn='Get Vault Statistics')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=True, fn='Get Vault Statistics')
 
         if res.status_code == 200:
@@ -287,9 +385,9 @@ class DeuceClient(Command):
             # Apply the marker
             if marker is not None:
                 url = '{0:}marker={1:}'.format(url, marker)
-                # Apply a comma if the next item is not none
+                # Apply a separator if the next item is not none
                 if limit is not None:
-                    url = url + ','
+                    url = url + '&'
 
             # Apply the limit
             if limit is not None:
@@ -298,7 +396,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Get Block List')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=True, fn='Get Block List')
 
         if res.status_code == 200:
@@ -341,7 +439,7 @@ class DeuceClient(Command):
         headers.update(self.Headers)
         headers['content-type'] = 'application/octet-stream'
         self.__log_request_data(headers=headers, fn='Head Block')
-        res = requests.head(self.Uri, headers=headers)
+        res = self.session.head(self.Uri, headers=headers)
         self.__log_response_data(res, jsondata=False, fn='Head Block')
         if res.status_code == 204:
             block.ref_modified = int(res.headers['X-Ref-Modified'])\
@@ -365,6 +463,87 @@ class DeuceClient(Command):
                 'Error ({2:}): {3:}'.format(block.block_id, vault.vault_id,
                                             res.status_code, res.text))
 
+    @validate(vault=VaultInstanceRule,
+              block_id=MetadataBlockIdRule)
+    def BlockExists(self, vault, block_id):
+        """Determine whether or not a block exists in the vault
+
+        :param vault: vault to check for the block
+        :param block_id: block id of the block to check for
+
+        :returns: True if the block exists; otherwise False
+        :raises: RunTimeError on error
+        """
+        url = api_v1.get_block_path(vault.vault_id, block_id)
+        self.ReInit(self.sslenabled, url)
+        self.__update_headers()
+        self.__log_request_data(fn='Block Exists')
+        res = self.session.head(self.Uri, headers=self.Headers)
+        self.__log_response_data(res, jsondata=False, fn='Block Exists')
+
+        if res.status_code == 204:
+            return True
+        elif res.status_code == 404:
+            return False
+        else:
+            raise RuntimeError(
+                'Failed to determine if Block {0:} exists in Vault {1:}. '
+                'Error ({2:}): {3:}'.format(block_id, vault.vault_id,
+                                            res.status_code, res.text))
+
+    @validate(vault=VaultInstanceRule)
+    def BlocksExist(self, vault, block_ids, negative_cache=None,
+                    max_workers=None):
+        """Determine which of a series of blocks exist in the vault
+
+        The blocks are checked concurrently without creating any file
+        assignments.
+
+        :param vault: vault to check for the blocks
+        :param block_ids: block ids to check for, must be an iterable object
+        :param negative_cache: optional set of block ids known not to be in
+                               the vault; they are not checked again and any
+                               block found missing is added to it. Remove
+                               block ids from it once they are uploaded.
+        :param max_workers: maximum number of concurrent checks, defaults
+                            to the client's max_workers
+
+        :returns: dict mapping each block id to True if the block exists in
+                  the vault; otherwise False
+        :raises: RunTimeError on error
+        """
+        # A generator is only read once, so it is not consumed validating it
+        block_ids = list(block_ids)
+        validate_value(MetadataBlockIdIterableRule, block_ids)
+
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        results = {}
+        to_check = []
+        for block_id in block_ids:
+            if negative_cache is not None and block_id in negative_cache:
+                results[block_id] = False
+            elif block_id not in results:
+                results[block_id] = None
+                to_check.append(block_id)
+
+        def check_block(block_id):
+            return self._thread_client().BlockExists(vault, block_id)
+
+        for block_id, exists, error in parallel.map_unordered(
+                check_block, to_check, max_workers=max_workers):
+            if error is not None:
+                raise RuntimeError(
+                    'Failed to determine if Blocks exist in Vault {0:}. '
+                    'Error: {1:}'.format(vault.vault_id, error))
+
+            results[block_id] = exists
+            if not exists and negative_cache is not None:
+                negative_cache.add(block_id)
+
+        return results
+
     @validate(vault=VaultInstanceRule,
               block=BlockInstanceRule)
     def UploadBlock(self, vault, block):
@@ -382,9 +561,9 @@ class DeuceClient(Command):
         headers = {}
         headers.update(self.Headers)
         headers['content-type'] = 'application/octet-stream'
-        headers['content-length'] = len(block)
+        headers['content-length'] = str(len(block))
         self.__log_request_data(headers=headers, fn='Upload Block')
-        res = requests.put(self.Uri, headers=headers, data=block.data)
+        res = self.session.put(self.Uri, headers=headers, data=block.data)
         self.__log_response_data(res, jsondata=False, fn='Upload Block')
         if res.status_code == 201:
             return True
@@ -416,10 +595,13 @@ class DeuceClient(Command):
 
             block_data.append((block_id, block.data))
 
+        # msgpack is only needed here so it is not imported up front
+        import msgpack
+
         contents = dict(block_data)
         body = msgpack.packb(contents)
         self.__log_request_data(fn='Upload Multiple Blocks - msgpack')
-        res = requests.post(self.Uri, headers=headers, data=body)
+        res = self.session.post(self.Uri, headers=headers, data=body)
         self.__log_response_data(res,
                                  jsondata=False,
                                  fn='Upload Multiple Blocks - msgpack')
@@ -446,35 +628,106 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Delete Block')
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Delete Block')
         if res.status_code == 204:
             return True
         else:
-            raise RuntimeError(
-                'Failed to delete Vault. '
-                'Error ({0:}): {1:}'.format(res.status_code, res.text))
+            raise errors.DeuceRequestError(
+                'Failed to delete Block {0:} from Vault {1:}. '
+                'Error ({2:}): {3:}'.format(block.block_id, vault.vault_id,
+                                            res.status_code, res.text),
+                status_code=res.status_code)
+
+    def __bulk_operation(self, fn, operation, items, max_workers, rate_limit,
+                         retries):
+        """Run an operation concurrently over a series of items
+
+        :param fn: name of the operation for logging
+        :param operation: callable taking the DeuceClient for the worker
+                          thread and an item
+        :returns: generator of (item, ok, error) tuples in completion order
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        def do_operation(item):
+            return operation(self._thread_client(), item)
+
+        for item, result, error in parallel.map_unordered(
+                do_operation, items,
+                max_workers=max_workers,
+                rate_limit=rate_limit,
+                retries=retries,
+                retry_if=is_transient_error):
+            if error is not None:
+                self.log.debug('{0}: Failed on ({1}) - Exception {2}'
+                               .format(fn, item, str(error)))
+                yield (item, False, error)
+            else:
+                yield (item, bool(result), None)
 
-    @validate(vault=VaultInstanceRule, block_ids=MetadataBlockIdIterableRule)
-    def DeleteBlocks(self, vault, block_ids):
+    @validate(vault=VaultInstanceRule)
+    def StreamDeleteBlocks(self, vault, block_ids, max_workers=None,
+                           rate_limit=None, retries=parallel.DEFAULT_RETRIES):
+        """Delete a series of blocks from the vault concurrently
+
+        Results are produced as each deletion completes so block_ids may be
+        a generator over a very large number of blocks.
+
+        :param vault: vault to delete the blocks from
+        :param block_ids: iterable of the block ids to delete
+        :param max_workers: maximum number of concurrent deletions, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of deletions started
+                           per second
+        :param retries: number of times to retry a deletion that failed
+                        for a transient reason
+        :returns: generator of (block_id, ok, error) tuples where ok is a
+                  boolean denoting the result of the deletion and error is
+                  the exception for a failed deletion
+        """
+        def delete_block(client, block_id):
+            block = vault.blocks.get(block_id)
+            if block is None:
+                block = api_block.Block(vault.project_id,
+                                        vault.vault_id,
+                                        block_id)
+            return client.DeleteBlock(vault, block)
+
+        return self.__bulk_operation('Delete Blocks', delete_block, block_ids,
+                                     max_workers, rate_limit, retries)
+
+    @validate(vault=VaultInstanceRule)
+    def DeleteBlocks(self, vault, block_ids, max_workers=None,
+                     rate_limit=None, retries=parallel.DEFAULT_RETRIES):
         """Delete a list of blocks from the vault.
 
-        :param vault: vault to upload the blocks into
-        :param block_ids: block ids in the vault to upload,
+        The blocks are deleted concurrently; see StreamDeleteBlocks for the
+        results as each deletion completes.
+
+        :param vault: vault to delete the blocks from
+        :param block_ids: block ids in the vault to delete,
                           must be an iterable object
+        :param max_workers: maximum number of concurrent deletions, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of deletions started
+                           per second
+        :param retries: number of times to retry a deletion that failed
+                        for a transient reason
         :returns: list of tuples of the block id and a boolean to denote the
-                  result of its deletion
+                  result of its deletion, in the order of block_ids
         """
-        def do_delete_block(block_id):
-            try:
-                return (block_id, self.DeleteBlock(vault,
-                                                   vault.blocks[block_id]))
-            except Exception as ex:
-                self.log.debug('Delete Blocks: Failed to delete block '
-                               '({0}) - Exception {1}'.format(block_id,
-                                                              str(ex)))
-                return (block_id, False)
-        return [do_delete_block(blockid) for blockid in block_ids]
+        # A generator is only read once, so it is not consumed validating it
+        block_ids = list(block_ids)
+        validate_value(MetadataBlockIdIterableRule, block_ids)
+
+        results = {
+            block_id: ok for block_id, ok, error in self.StreamDeleteBlocks(
+                vault, collections.OrderedDict.fromkeys(block_ids),
+                max_workers=max_workers, rate_limit=rate_limit,
+                retries=retries)}
+        return [(block_id, results[block_id]) for block_id in block_ids]
 
     @validate(vault=VaultInstanceRule,
               block=BlockInstanceRule)
@@ -491,16 +744,17 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Download Block')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Download Block')
 
         if res.status_code == 200:
             block.data = res.content
             return True
         else:
-            raise RuntimeError(
+            raise errors.DeuceRequestError(
                 'Failed to get Block Content for Block Id . '
-                'Error ({0:}): {1:}'.format(res.status_code, res.text))
+                'Error ({0:}): {1:}'.format(res.status_code, res.text),
+                status_code=res.status_code)
 
     @validate(vault=VaultInstanceRule)
     def CreateFile(self, vault):
@@ -514,7 +768,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Create File')
-        res = requests.post(self.Uri, headers=self.Headers)
+        res = self.session.post(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Create File')
         if res.status_code == 201:
             new_file = api_file.File(project_id=self.project_id,
@@ -540,15 +794,111 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Delete File')
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=False, fn='Delete File')
         if res.status_code == 204:
             return True
         else:
-            raise RuntimeError(
+            raise errors.DeuceRequestError(
                 'Failed to Delete File. '
+                'Error ({0:}): {1:}'.format(res.status_code, res.text),
+                status_code=res.status_code)
+
+    @validate(vault=VaultInstanceRule)
+    def StreamDeleteFiles(self, vault, file_ids, max_workers=None,
+                          rate_limit=None, retries=parallel.DEFAULT_RETRIES):
+        """Delete a series of files from the vault concurrently
+
+        :param vault: vault to delete the files from
+        :param file_ids: iterable of the file ids to delete
+        :param max_workers: maximum number of concurrent deletions, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of deletions started
+                           per second
+        :param retries: number of times to retry a deletion that failed
+                        for a transient reason
+        :returns: generator of (file_id, ok, error) tuples
+        """
+        def delete_file(client, file_id):
+            return client.DeleteFile(vault, file_id)
+
+        return self.__bulk_operation('Delete Files', delete_file, file_ids,
+                                     max_workers, rate_limit, retries)
+
+    @validate(vault=VaultInstanceRule,
+              marker=FileIdRuleNoneOkay,
+              limit=LimitRuleNoneOkay)
+    def GetFileList(self, vault, marker=None, limit=None):
+        """Retrieve the list of files in the vault
+
+        :param vault: vault to get the file list for
+        :param marker: marker denoting the start of the list
+        :param limit: integer denoting the maximum entries to retrieve
+
+        :stores: The file information in the files property of the Vault
+        :returns: list of the file ids retrieved
+        :raises: TypeError if vault is not a Vault object
+        :raises: RunTimeError on failure
+        """
+        url = api_v1.get_files_path(vault.vault_id)
+        if marker is not None or limit is not None:
+            # add the separator between the URL and the parameters
+            url = url + '?'
+
+            # Apply the marker
+            if marker is not None:
+                url = '{0:}marker={1:}'.format(url, marker)
+                # Apply a separator if the next item is not none
+                if limit is not None:
+                    url = url + '&'
+
+            # Apply the limit
+            if limit is not None:
+                url = '{0:}limit={1:}'.format(url, limit)
+
+        self.ReInit(self.sslenabled, url)
+        self.__update_headers()
+        self.__log_request_data(fn='Get File List')
+        res = self.session.get(self.Uri, headers=self.Headers)
+        self.__log_response_data(res, jsondata=True, fn='Get File List')
+
+        if res.status_code == 200:
+            file_ids = []
+            for file_id in res.json():
+                if file_id not in vault.files:
+                    vault.add_file(file_id)
+                file_ids.append(file_id)
+
+            if 'x-next-batch' in res.headers:
+                parsed_url = urlparse(res.headers['x-next-batch'])
+
+                qs = parse_qs(parsed_url[4])
+                vault.files.marker = qs['marker'][0]
+            else:
+                vault.files.marker = None
+
+            return file_ids
+        else:
+            raise RuntimeError(
+                'Failed to get File list for Vault . '
                 'Error ({0:}): {1:}'.format(res.status_code, res.text))
 
+    @staticmethod
+    @contextlib.contextmanager
+    def __output_writer(output):
+        """Return a function writing to the output of a download
+
+        :param output: path of a local file, writable file-like object or
+                       callable taking bytes
+        """
+        if callable(getattr(output, 'write', None)):
+            yield output.write
+        elif callable(output):
+            yield output
+        else:
+            with open(output, 'wb') as output_file:
+                yield output_file.write
+
     @validate(vault=VaultInstanceRule,
               file_id=FileIdRule)
     def DownloadFile(self, vault, file_id, output_file, chunk_size=512 * 1024):
@@ -557,21 +907,23 @@ class DeuceClient(Command):
         :param vault: vault to download the file from
         :param file_id: file id within the vault to download
         :param output_file: local fully qualified (absolute) file name to
-                            store the file in
+                            store the file in, or a writable file-like
+                            object or callable taking each chunk of the
+                            content, e.g. to stream it to stdout
         :returns: True on success
         """
         url = api_v1.get_file_path(vault.vault_id, file_id)
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Download File')
-        res = requests.get(self.Uri, headers=self.Headers, stream=True)
+        res = self.session.get(self.Uri, headers=self.Headers, stream=True)
         if res.status_code == 200:
             try:
                 downloaded_bytes = 0
                 download_start_time = datetime.datetime.utcnow()
-                with open(output_file, 'wb') as output:
+                with self.__output_writer(output_file) as write:
                     for chunk in res.iter_content(chunk_size=chunk_size):
-                        output.write(chunk)
+                        write(chunk)
                         downloaded_bytes = downloaded_bytes + len(chunk)
                         res.raise_for_status()
                 download_end_time = datetime.datetime.utcnow()
@@ -602,11 +954,326 @@ class DeuceClient(Command):
 
     @validate(vault=VaultInstanceRule,
               file_id=FileIdRule)
-    def FinalizeFile(self, vault, file_id):
+    def StreamFile(self, vault, file_id, output, max_workers=None,
+                   retries=parallel.DEFAULT_RETRIES):
+        """Download a file block by block, concurrently, into a stream
+
+        The blocks are downloaded concurrently and in any order, but written
+        to the output in order, so the output need not be seekable: it may
+        be stdout, a socket or a decompressor. Blocks that arrive ahead of
+        the next one to write wait in a reorder buffer of at most twice
+        max_workers blocks. Blocks known to be all zeros are not downloaded.
+
+        :param vault: vault to download the file from
+        :param file_id: file id within the vault to download
+        :param output: path of a local file, writable file-like object or
+                       callable taking the content, a block at a time
+        :param max_workers: maximum number of concurrent block downloads,
+                            defaults to the client's max_workers
+        :param retries: number of times to retry a block download that
+                        failed for a transient reason
+        :returns: dict of the file_id and the length of the file in bytes
+                  and blocks
+        :raises: RuntimeError if a block of the file could not be
+                 downloaded; the output then has the content before it
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        manifest = self.GetFileManifest(vault, file_id)
+
+        def download_block(block_id):
+            block = api_block.Block(vault.project_id, vault.vault_id,
+                                    block_id)
+            self._thread_client().DownloadBlock(vault, block)
+            if api_block.Block.make_id(block.data) != block_id:
+                raise errors.InvalidContentError(
+                    'Block {0} downloaded with the wrong content'
+                    .format(block_id))
+            return block.data
+
+        def work(index):
+            block_id = manifest[index][0]
+            size = self.__zero_block_size(manifest, index)
+            if size is not None:
+                return sparse.zeros(size)
+
+            return parallel.call_with_retry(
+                lambda: download_block(block_id),
+                retries=retries,
+                retry_if=is_transient_error)
+
+        summary = {
+            'file_id': file_id,
+            'bytes': 0,
+            'blocks': len(manifest)
+        }
+
+        # The downloads in flight, in the order their blocks are written;
+        # completed ones wait at the front until the blocks before them
+        # are written
+        window = 2 * max_workers
+        entries = iter(range(len(manifest)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor, \
+                self.__output_writer(output) as write:
+            in_flight = collections.deque(
+                (index, executor.submit(work, index))
+                for index in itertools.islice(entries, window))
+
+            try:
+                while in_flight:
+                    index, future = in_flight.popleft()
+                    block_id, offset = manifest[index]
+                    try:
+                        data = future.result()
+
+                    except Exception as ex:
+                        raise RuntimeError(
+                            'Failed to Stream File. Block {0} at offset {1} '
+                            'could not be downloaded. Error: {2}'.format(
+                                block_id, offset, ex))
+
+                    for index in itertools.islice(entries, 1):
+                        in_flight.append((index,
+                                          executor.submit(work, index)))
+
+                    write(data)
+                    summary['bytes'] += len(data)
+
+            finally:
+                for index, future in in_flight:
+                    future.cancel()
+
+        return summary
+
+    @staticmethod
+    def __zero_block_size(manifest, index):
+        """Return the size of a block of a file manifest if it is all zeros
+
+        The size of a block is only known from the offset of the next one,
+        so the last block of a file is never known to be all zeros.
+
+        :returns: size of the block in bytes, or None if it is not known to
+                  be all zeros
+        """
+        if index + 1 >= len(manifest):
+            return None
+
+        block_id, offset = manifest[index]
+        size = manifest[index + 1][1] - offset
+        if sparse.is_zero_block(block_id, size):
+            return size
+        return None
+
+    @staticmethod
+    def __manifest_digest(manifest):
+        digest = hashlib.sha1()
+        for block_id, offset in manifest:
+            digest.update('{0}:{1}\n'.format(offset, block_id).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def __verify_restored(fd, manifest, done, length):
+        """Clear the bits of the restored blocks whose data is not intact
+
+        :returns: number of blocks whose data was not intact
+        """
+        damaged = 0
+        for index, (block_id, offset) in enumerate(manifest):
+            if index not in done:
+                continue
+
+            if index + 1 < len(manifest):
+                end = manifest[index + 1][1]
+            else:
+                end = length
+
+            data = os.pread(fd, end - offset, offset)
+            if api_block.Block.make_id(data) != block_id:
+                done.clear(index)
+                damaged += 1
+        return damaged
+
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRule)
+    def RestoreFile(self, vault, file_id, output_file, max_workers=None,
+                    retries=parallel.DEFAULT_RETRIES, checkpoint=None,
+                    verify=False):
+        """Download a file block by block, concurrently
+
+        Unlike DownloadFile an interrupted restore does not have to start
+        over. With a checkpoint, the blocks of the file that have been
+        written to the output file are recorded in a bitmap with a bit per
+        block of the file. The checkpoint is only saved once the blocks it
+        records are on disk, so a restore resumed from it only downloads
+        the blocks that are missing. Blocks assigned to the file more than
+        once are only downloaded once. The checkpoint is cleared once the
+        file is restored.
+
+        Blocks known to be all zeros are not downloaded; they are left as
+        holes of the output file where it is sparse.
+
+        :param vault: vault to download the file from
+        :param file_id: file id within the vault to download
+        :param output_file: local file name to store the file in
+        :param max_workers: maximum number of concurrent block downloads,
+                            defaults to the client's max_workers
+        :param retries: number of times to retry a block download that
+                        failed for a transient reason
+        :param checkpoint: optional Checkpoint to record the restored blocks
+                           in and to resume the restore from
+        :param verify: whether or not to check the data of the blocks
+                       restored before the restore was resumed, downloading
+                       the blocks whose data is not intact again
+        :returns: dict of the file_id, the length of the file in bytes and
+                  blocks, the number of blocks and bytes downloaded and the
+                  number of blocks already restored and restored as zeros
+        :raises: RuntimeError if blocks of the file could not be downloaded;
+                 the checkpoint then records the blocks that were restored
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        manifest = self.GetFileManifest(vault, file_id)
+        digest = self.__manifest_digest(manifest)
+
+        state = None
+        if checkpoint is not None:
+            state = checkpoint.load()
+
+        if state is not None and (state['file_id'] != file_id or
+                                  state['manifest'] != digest or
+                                  not os.path.exists(output_file)):
+            self.log.info('Restore File: checkpoint {0} is not of this '
+                          'restore, starting over'.format(checkpoint.path))
+            state = None
+
+        if state is not None:
+            done = Bitmap.decode(len(manifest), state['done'])
+            flags = os.O_RDWR
+        else:
+            state = {
+                'file_id': file_id,
+                'manifest': digest,
+                'length': None
+            }
+            done = Bitmap(len(manifest))
+            flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC
+
+        summary = {
+            'file_id': file_id,
+            'bytes': 0,
+            'blocks': len(manifest),
+            'downloaded_blocks': 0,
+            'downloaded_bytes': 0,
+            'resumed_blocks': 0,
+            'zero_blocks': 0
+        }
+
+        fd = os.open(output_file, flags, 0o666)
+        try:
+            if verify and done.count():
+                damaged = self.__verify_restored(fd, manifest, done,
+                                                 state['length'])
+                if damaged:
+                    self.log.info('Restore File: {0} restored blocks are not '
+                                  'intact'.format(damaged))
+
+            summary['resumed_blocks'] = done.count()
+
+            # Each block is downloaded once for all of its offsets. A new
+            # output file is all holes so zero blocks need not be written
+            fresh = bool(flags & os.O_TRUNC)
+            pending = {}
+            for index in list(done.missing()):
+                size = self.__zero_block_size(manifest, index)
+                if size is None:
+                    pending.setdefault(manifest[index][0], []).append(index)
+                    continue
+
+                if not fresh:
+                    sparse.punch_hole(fd, manifest[index][1], size)
+                done.set(index)
+                summary['zero_blocks'] += 1
+
+            def restore_block(item):
+                block_id, indexes = item
+                block = api_block.Block(vault.project_id, vault.vault_id,
+                                        block_id)
+                self._thread_client().DownloadBlock(vault, block)
+                if api_block.Block.make_id(block.data) != block_id:
+                    raise errors.InvalidContentError(
+                        'Block {0} downloaded with the wrong content'
+                        .format(block_id))
+
+                for index in indexes:
+                    os.pwrite(fd, block.data, manifest[index][1])
+                return len(block.data)
+
+            def save():
+                if checkpoint is not None:
+                    os.fdatasync(fd)
+                    state['done'] = done.encode()
+                    checkpoint.save(state)
+
+            failures = []
+            unsaved = 0
+            try:
+                for item, size, error in parallel.map_unordered(
+                        restore_block, pending.items(),
+                        max_workers=max_workers,
+                        retries=retries,
+                        retry_if=is_transient_error):
+                    block_id, indexes = item
+                    if error is not None:
+                        self.log.debug('Restore File: Failed on ({0}) - '
+                                       'Exception {1}'.format(block_id,
+                                                              str(error)))
+                        failures.append(error)
+                        continue
+
+                    for index in indexes:
+                        done.set(index)
+                    if indexes[-1] == len(manifest) - 1:
+                        state['length'] = manifest[-1][1] + size
+
+                    summary['downloaded_blocks'] += 1
+                    summary['downloaded_bytes'] += size
+                    unsaved += 1
+                    if unsaved >= RESTORE_CHECKPOINT_INTERVAL:
+                        save()
+                        unsaved = 0
+
+            finally:
+                if unsaved:
+                    save()
+
+            if failures:
+                raise RuntimeError(
+                    'Failed to Restore File. {0} blocks could not be '
+                    'downloaded. Error: {1}'.format(len(failures),
+                                                    failures[0]))
+
+            summary['bytes'] = state['length'] if len(manifest) else 0
+            os.ftruncate(fd, summary['bytes'])
+            os.fsync(fd)
+
+        finally:
+            os.close(fd)
+
+        if checkpoint is not None:
+            checkpoint.clear()
+        return summary
+
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRule)
+    def FinalizeFile(self, vault, file_id, file_length=None):
         """Finalize the file in the vault
 
         :param vault: vault containing the file
         :param file_id: file_id of the file to finalize
+        :param file_length: optional length of the file in bytes, defaults
+                            to the length of the file object in the vault
 
         :returns: True on success
         """
@@ -618,9 +1285,11 @@ class DeuceClient(Command):
         self.__update_headers()
         headers = {}
         headers.update(self.Headers)
-        headers['X-File-Length'] = len(vault.files[file_id])
+        if file_length is None:
+            file_length = len(vault.files[file_id])
+        headers['X-File-Length'] = str(file_length)
         self.__log_request_data(fn='Finalize File')
-        res = requests.post(self.Uri, headers=headers)
+        res = self.session.post(self.Uri, headers=headers)
         self.__log_response_data(res, jsondata=True, fn='Finalize File')
         if res.status_code in (200, 204):
             return True
@@ -691,9 +1360,9 @@ class DeuceClient(Command):
             self.log.debug('Offset, Block -> {0:}, {1:}'.format(offset,
                                                                 block_id))
 
-        res = requests.post(self.Uri,
-                            data=json.dumps(block_assignment_data),
-                            headers=self.Headers)
+        res = self.session.post(self.Uri,
+                                data=json.dumps(block_assignment_data),
+                                headers=self.Headers)
         self.__log_response_data(res, jsondata=True,
                                  fn='Assign Blocks To File')
         if res.status_code == 200:
@@ -705,6 +1374,603 @@ class DeuceClient(Command):
                 'Failed to Assign Blocks to the File. '
                 'Error ({0:}): {1:}'.format(res.status_code, res.text))
 
+    def __upload_target(self, vault, file_id, file_id_pool):
+        """Return a private vault and the file in it to upload into
+
+        :returns: (vault, file) tuple
+        """
+        upload_vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        if file_id is not None:
+            upload_vault.add_file(file_id)
+        elif file_id_pool is not None:
+            file_id, file_url = file_id_pool.get()
+            upload_vault.add_file(file_id, file_url)
+        else:
+            file_id = self.CreateFile(upload_vault)
+        return (upload_vault, upload_vault.files[file_id])
+
+    @staticmethod
+    def __content_offset(content):
+        """Return the position of the content
+
+        :returns: the position, 0 if the content is not seekable, e.g. a pipe
+        """
+        try:
+            seekable = content.seekable()
+
+        except AttributeError:
+            seekable = hasattr(content, 'tell')
+
+        except (OSError, ValueError):
+            seekable = False
+
+        return content.tell() if seekable else 0
+
+    @staticmethod
+    def __content_fingerprint(content):
+        """Identify the content of a local file by its size and mtime
+
+        :returns: [size, mtime_ns], None if content is not a regular local
+                  file, e.g. a pipe
+        """
+        try:
+            stat_result = os.fstat(content.fileno())
+
+        except (AttributeError, OSError, ValueError):
+            return None
+
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+
+        return [stat_result.st_size, stat_result.st_mtime_ns]
+
+    @staticmethod
+    def __upload_summary(afile):
+        return {
+            'file_id': afile.file_id,
+            'url': afile.url,
+            'bytes': 0,
+            'blocks': 0,
+            'uploaded_bytes': 0,
+            'uploaded_blocks': 0
+        }
+
+    def _assign_block_list(self, upload_vault, afile, block_list, summary):
+        """Assign blocks to a file, uploading those the vault does not have
+
+        Shared by the ways of uploading a file, see DeuceFileWriter.
+
+        :param upload_vault: private vault of the file, see __upload_target
+        :param afile: the file in upload_vault
+        :param block_list: list of (block, offset) tuples
+        :param summary: dict whose blocks, uploaded_blocks and uploaded_bytes
+                        are updated
+        """
+        # The length of the file only depends on its last block
+        afile.blocks.clear()
+        for block, offset in block_list:
+            afile.add_block(block)
+            afile.assign_block(block.block_id, offset)
+
+        blocks_to_upload = set(self.AssignBlocksToFile(
+            upload_vault,
+            afile.file_id,
+            [(block.block_id, offset) for block, offset in block_list]))
+
+        summary['blocks'] += len(block_list)
+        if len(blocks_to_upload):
+            for block, offset in block_list:
+                if block.block_id in blocks_to_upload:
+                    upload_vault.blocks[block.block_id] = block
+
+            self.UploadBlocks(upload_vault, blocks_to_upload)
+
+            summary['uploaded_blocks'] += len(blocks_to_upload)
+            summary['uploaded_bytes'] += sum(
+                len(upload_vault.blocks[block_id])
+                for block_id in blocks_to_upload)
+            upload_vault.blocks.clear()
+
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRuleNoneOkay)
+    def UploadFile(self, vault, content, file_id=None,
+                   count=DEFAULT_ASSIGNMENT_COUNT, file_id_pool=None,
+                   keep_manifest=False, journal=None,
+                   readahead=pagecache.DEFAULT_READAHEAD, drop_cache=True,
+                   prefetch_bytes=0):
+        """Upload the content of a file into the vault
+
+        The content is split into blocks that are assigned to the file a few
+        at a time; only the blocks the vault does not already have are
+        uploaded. The file is finalized once all of the content is assigned.
+
+        Only the blocks of a single assignment are held in memory so the
+        file is not added to vault.files.
+
+        With a journal the progress of the upload is recorded after each
+        assignment. If the journal holds the progress of an interrupted
+        upload, that upload is resumed: the content is read from the end of
+        the last completed assignment and the blocks are assigned to the
+        same file. The journal is cleared once the file is finalized.
+
+        :param vault: vault to upload the file into
+        :param content: file-like object providing a read function, it may
+                        be a pipe; to resume an upload it must be seekable
+        :param file_id: optional id of an existing, empty file in the vault
+                        to upload into; one is created if not specified
+        :param count: number of blocks to assign to the file at a time
+        :param file_id_pool: optional FileIdPool for the vault to take the
+                             new file from instead of creating it
+        :param keep_manifest: whether or not to return the manifest of the
+                              file, e.g. for UploadFileFromManifest; for a
+                              resumed upload it only has the blocks assigned
+                              since it was resumed
+        :param journal: optional Checkpoint to record the progress in,
+                        content must then be a regular local file so it can
+                        be told whether it changed since the interruption
+        :param readahead: for a local file, number of bytes the kernel is
+                          asked to read ahead, 0 to leave it to the kernel
+        :param drop_cache: for a local file, whether or not to drop the
+                           content uploaded from the page cache, so uploading
+                           large files does not evict what other processes
+                           have cached
+        :param prefetch_bytes: number of bytes of buffers to read the
+                               content into ahead of the upload, in a
+                               background thread, so reading overlaps with
+                               hashing and uploading; 0 not to
+        :returns: dict of the file_id and url of the file, its length in
+                  bytes and blocks, and the number of blocks and bytes that
+                  were uploaded; with keep_manifest also the manifest, the
+                  list of (block_id, offset) tuples of the file
+        :raises: errors.InvalidContentError if the journal is of an upload
+                 of different content
+        :raises: ValueError if there is a journal but content is not a
+                 regular local file
+        """
+        # Offsets in the file are relative to where the content starts
+        base_offset = self.__content_offset(content)
+        source = self.__content_fingerprint(content)
+        if journal is not None and source is None:
+            raise ValueError('Resuming an upload requires the content to be '
+                             'a regular local file')
+
+        state = None
+        if journal is not None:
+            state = journal.load()
+
+        if state is not None:
+            if state['source'] != source:
+                raise errors.InvalidContentError(
+                    'The content changed since the upload into file {0} '
+                    'was interrupted'.format(state['file_id']))
+
+            upload_vault = api_vault.Vault(vault.project_id, vault.vault_id)
+            upload_vault.add_file(state['file_id'], state['url'])
+            afile = upload_vault.files[state['file_id']]
+            content.seek(base_offset + state['offset'])
+            self.log.info('Resuming the upload into file {0} at offset '
+                          '{1}'.format(afile.file_id, state['offset']))
+
+        else:
+            upload_vault, afile = self.__upload_target(vault, file_id,
+                                                       file_id_pool)
+            state = {
+                'file_id': afile.file_id,
+                'url': afile.url,
+                'source': source,
+                'chunk_size': DEFAULT_CHUNK_SIZE,
+                'offset': 0,
+                'blocks': 0,
+                'uploaded_blocks': 0,
+                'uploaded_bytes': 0
+            }
+            if journal is not None:
+                journal.save(state)
+
+        file_id = afile.file_id
+        splitter = UniformSplitter(vault.project_id, vault.vault_id, content,
+                                   chunk_size=state['chunk_size'],
+                                   readahead=readahead,
+                                   drop_cache=drop_cache,
+                                   prefetch_bytes=prefetch_bytes)
+
+        summary = self.__upload_summary(afile)
+        summary['bytes'] = state['offset']
+        for key in ('blocks', 'uploaded_blocks', 'uploaded_bytes'):
+            summary[key] = state[key]
+        if keep_manifest:
+            summary['manifest'] = []
+
+        try:
+            while True:
+                block_list = [(block, block_offset - base_offset)
+                              for block_offset, block
+                              in splitter.get_blocks(count)]
+                if not len(block_list):
+                    break
+
+                self._assign_block_list(upload_vault, afile, block_list,
+                                        summary)
+                summary['bytes'] = block_list[-1][1] + len(block_list[-1][0])
+                if keep_manifest:
+                    summary['manifest'].extend(
+                        (block.block_id, offset)
+                        for block, offset in block_list)
+
+                if journal is not None:
+                    state['offset'] = summary['bytes']
+                    for key in ('blocks', 'uploaded_blocks', 'uploaded_bytes'):
+                        state[key] = summary[key]
+                    journal.save(state)
+
+        finally:
+            splitter.close()
+
+        self.FinalizeFile(upload_vault, file_id, file_length=summary['bytes'])
+        if journal is not None:
+            journal.clear()
+
+        summary['url'] = afile.url
+        return summary
+
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRule)
+    def UploadFileRange(self, vault, file_id, path, start, end,
+                        count=DEFAULT_ASSIGNMENT_COUNT,
+                        chunk_size=DEFAULT_CHUNK_SIZE,
+                        readahead=pagecache.DEFAULT_READAHEAD,
+                        drop_cache=True):
+        """Upload a range of a local file into the same range of a file
+
+        The range is split into blocks that are assigned to the file at
+        their offsets in the local file, uploading the blocks the vault does
+        not have. The file is not finalized, so the other ranges of the local
+        file may be uploaded separately, e.g. by other workers; see
+        UploadFileRegions.
+
+        :param vault: vault containing the file
+        :param file_id: id of the file in the vault to upload into
+        :param path: path of the local file
+        :param start: offset of the range, a multiple of chunk_size so the
+                      blocks are the same as when the whole file is split
+        :param end: offset of the end of the range, a multiple of chunk_size
+                    or the length of the local file
+        :param count: number of blocks to assign to the file at a time
+        :param chunk_size: size of the blocks the file is split into
+        :param readahead: number of bytes the kernel is asked to read ahead,
+                          see UploadFile
+        :param drop_cache: whether or not to drop the content uploaded from
+                           the page cache, see UploadFile
+        :returns: dict of the file_id and url of the file, the length of the
+                  range uploaded in bytes and blocks, and the number of
+                  blocks and bytes that were uploaded; the length is short
+                  of the range if the local file ends before it
+        """
+        if start % chunk_size:
+            raise ValueError('start must be a multiple of chunk_size')
+
+        url = None
+        if file_id in vault.files:
+            url = vault.files[file_id].url
+        range_vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        range_vault.add_file(file_id, url)
+        range_file = range_vault.files[file_id]
+
+        summary = self.__upload_summary(range_file)
+        offset = start
+        with open(path, 'rb') as content:
+            content.seek(start)
+            splitter = UniformSplitter(vault.project_id, vault.vault_id,
+                                       content,
+                                       chunk_size=chunk_size,
+                                       readahead=readahead,
+                                       drop_cache=drop_cache)
+
+            # The range starts on a chunk boundary, so no block crosses its
+            # end
+            while offset < end:
+                block_list = []
+                while offset < end and len(block_list) < count:
+                    block_offset, block = splitter.get_block()
+                    if block is None:
+                        break
+                    block_list.append((block, block_offset))
+                    offset = block_offset + len(block)
+                if not len(block_list):
+                    break
+
+                self._assign_block_list(range_vault, range_file,
+                                        block_list, summary)
+
+        summary['bytes'] = offset - start
+        return summary
+
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRuleNoneOkay)
+    def UploadFileRegions(self, vault, path, regions=None, max_workers=None,
+                          file_id=None, count=DEFAULT_ASSIGNMENT_COUNT,
+                          file_id_pool=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                          readahead=pagecache.DEFAULT_READAHEAD,
+                          drop_cache=True):
+        """Upload a large local file, splitting regions of it concurrently
+
+        The file is divided into regions that start on a block boundary.
+        Each region is read, split, assigned to the file at its offset and
+        uploaded by a worker of its own, so the upload of a single file is
+        not limited to a single thread. The file is finalized once every
+        region is uploaded; if any region fails it is not finalized.
+
+        The file must not change during the upload.
+
+        :param vault: vault to upload the file into
+        :param path: path of the local file to upload
+        :param regions: number of regions to divide the file into, defaults
+                        to max_workers
+        :param max_workers: maximum number of regions uploaded concurrently,
+                            defaults to the client's max_workers
+        :param file_id: optional id of an existing, empty file in the vault
+                        to upload into; one is created if not specified
+        :param count: number of blocks to assign to the file at a time
+        :param file_id_pool: optional FileIdPool for the vault to take the
+                             new file from instead of creating it
+        :param chunk_size: size of the blocks the file is split into
+        :param readahead: number of bytes the kernel is asked to read ahead
+                          of each region, see UploadFile
+        :param drop_cache: whether or not to drop the content uploaded from
+                           the page cache, see UploadFile
+        :returns: dict of the file_id and url of the file, its length in
+                  bytes and blocks, the number of blocks and bytes that were
+                  uploaded and the number of regions
+        :raises: RuntimeError if regions of the file could not be uploaded
+                 or the file changed during the upload
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+        if regions is None:
+            regions = max_workers
+
+        length = os.path.getsize(path)
+        upload_regions = file_regions(length, regions, chunk_size)
+        upload_vault, afile = self.__upload_target(vault, file_id,
+                                                   file_id_pool)
+
+        summary = self.__upload_summary(afile)
+        summary['regions'] = len(upload_regions)
+
+        def upload_region(region):
+            start, end = region
+            return self._thread_client().UploadFileRange(
+                upload_vault, afile.file_id, path, start, end, count=count,
+                chunk_size=chunk_size, readahead=readahead,
+                drop_cache=drop_cache)
+
+        failures = []
+        for region, region_summary, error in parallel.map_unordered(
+                upload_region, upload_regions, max_workers=max_workers):
+            if error is not None:
+                self.log.debug('Upload File Regions: Failed on ({0}) - '
+                               'Exception {1}'.format(region, str(error)))
+                failures.append(error)
+                continue
+
+            for key in ('bytes', 'blocks', 'uploaded_blocks',
+                        'uploaded_bytes'):
+                summary[key] += region_summary[key]
+
+        if failures:
+            raise RuntimeError(
+                'Failed to Upload File. {0} of {1} regions could not be '
+                'uploaded. Error: {2}'.format(len(failures),
+                                              len(upload_regions),
+                                              failures[0]))
+
+        if summary['bytes'] != length:
+            raise RuntimeError(
+                'Failed to Upload File. {0} changed during the upload'
+                .format(path))
+
+        self.FinalizeFile(upload_vault, afile.file_id, file_length=length)
+        return summary
+
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRuleNoneOkay)
+    def UploadFileFromManifest(self, vault, manifest, length, content=None,
+                               file_id=None, file_id_pool=None):
+        """Upload a file whose blocks are known from an earlier upload
+
+        The blocks are assigned to the file without reading its content.
+        Only blocks the vault no longer has are read back from the content
+        and uploaded.
+
+        :param vault: vault to upload the file into
+        :param manifest: list of (block_id, offset) tuples of the content of
+                         the file, in order of offset
+        :param length: length of the content in bytes
+        :param content: optional seekable file-like object of the content to
+                        read missing blocks from
+        :param file_id: optional id of an existing, empty file in the vault
+                        to upload into; one is created if not specified
+        :param file_id_pool: optional FileIdPool for the vault to take the
+                             new file from instead of creating it
+        :returns: dict of the file_id and url of the file, its length in
+                  bytes and blocks, and the number of blocks and bytes that
+                  were uploaded
+        :raises: errors.InvalidContentError if the vault is missing blocks
+                 that the content does not provide, in which case the new
+                 file is deleted
+        """
+        upload_vault, afile = self.__upload_target(vault, file_id,
+                                                   file_id_pool)
+        file_id = afile.file_id
+
+        summary = self.__upload_summary(afile)
+        summary['bytes'] = length
+        summary['blocks'] = len(manifest)
+
+        block_ends = [offset for _, offset in manifest[1:]] + [length]
+
+        try:
+            for start in range(0, len(manifest), MANIFEST_ASSIGNMENT_COUNT):
+                assignments = manifest[start:start +
+                                       MANIFEST_ASSIGNMENT_COUNT]
+                afile.offsets.clear()
+                for block_id, offset in assignments:
+                    afile.assign_block(block_id, offset)
+
+                blocks_to_upload = set(self.AssignBlocksToFile(
+                    upload_vault, file_id, assignments))
+                if not len(blocks_to_upload):
+                    continue
+
+                if content is None:
+                    raise errors.InvalidContentError(
+                        'The vault is missing blocks of the file')
+
+                for index, (block_id, offset) in enumerate(assignments):
+                    if block_id not in blocks_to_upload or \
+                            block_id in upload_vault.blocks:
+                        continue
+
+                    content.seek(offset)
+                    data = content.read(block_ends[start + index] - offset)
+                    if api_block.Block.make_id(data) != block_id:
+                        raise errors.InvalidContentError(
+                            'The content of the file no longer matches '
+                            'its manifest at offset {0}'.format(offset))
+
+                    upload_vault.blocks[block_id] = api_block.Block(
+                        vault.project_id, vault.vault_id, block_id,
+                        data=data)
+
+                self.UploadBlocks(upload_vault, blocks_to_upload)
+
+                summary['uploaded_blocks'] += len(blocks_to_upload)
+                summary['uploaded_bytes'] += sum(
+                    len(upload_vault.blocks[block_id])
+                    for block_id in blocks_to_upload)
+                upload_vault.blocks.clear()
+
+        except errors.InvalidContentError:
+            try:
+                self.DeleteFile(upload_vault, file_id)
+
+            except Exception as ex:
+                self.log.warning('Failed to delete the incomplete file '
+                                 '{0}: {1}'.format(file_id, ex))
+            raise
+
+        self.FinalizeFile(upload_vault, file_id, file_length=length)
+        summary['url'] = afile.url
+        return summary
+
+    @validate(vault=VaultInstanceRule)
+    def StreamUploadFiles(self, vault, paths, max_workers=None,
+                          count=DEFAULT_ASSIGNMENT_COUNT, file_id_pool=None,
+                          manifest_cache=None,
+                          readahead=pagecache.DEFAULT_READAHEAD,
+                          drop_cache=True):
+        """Upload a series of local files into the vault concurrently
+
+        Each file is uploaded into a new file in the vault, see UploadFile.
+        When there are more files than a FileIdPool keeps ready at least,
+        the new files are created ahead of time in the background. The
+        files created but not taken are deleted once the uploads end; if the
+        process is killed they are left in the vault, empty and not
+        finalized.
+
+        With a manifest cache, files that have not changed since they were
+        last uploaded into the vault are not read at all; their recorded
+        blocks are assigned to the new file instead, see
+        UploadFileFromManifest.
+
+        :param vault: vault to upload the files into
+        :param paths: iterable of the paths of the local files
+        :param max_workers: maximum number of concurrent uploads, defaults
+                            to the client's max_workers
+        :param count: number of blocks to assign to a file at a time
+        :param file_id_pool: optional FileIdPool for the vault to take the
+                             new files from; by default one is used for the
+                             duration of the uploads if there are enough
+                             files
+        :param manifest_cache: optional ManifestCache of the manifests of
+                               earlier uploads, updated as files are uploaded
+        :param readahead: number of bytes the kernel is asked to read ahead
+                          of each upload, see UploadFile
+        :param drop_cache: whether or not to drop the content uploaded from
+                           the page cache, see UploadFile
+        :returns: generator of (path, summary, error) tuples in completion
+                  order; summary is the result of UploadFile for the file,
+                  with 'cached' set if the file was unchanged, and None if
+                  it failed; error is the exception if it failed
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        # A few files are quicker to create as they are uploaded than to
+        # have a pool create files ahead of time that may not be taken
+        paths = iter(paths)
+        head = list(itertools.islice(paths, fileidpool.DEFAULT_MIN_SIZE + 1))
+        paths = itertools.chain(head, paths)
+
+        own_pool = (file_id_pool is None and
+                    len(head) > fileidpool.DEFAULT_MIN_SIZE)
+        if own_pool:
+            file_id_pool = FileIdPool(self, vault,
+                                      max_size=max(fileidpool.DEFAULT_MAX_SIZE,
+                                                   2 * max_workers))
+
+        def upload_file(path):
+            client = self._thread_client()
+            with open(path, 'rb') as content:
+                if manifest_cache is None:
+                    return client.UploadFile(vault, content, count=count,
+                                             file_id_pool=file_id_pool,
+                                             readahead=readahead,
+                                             drop_cache=drop_cache)
+
+                # Taken before reading so changes made while the file is
+                # read make the next fingerprint differ
+                stat_result = os.fstat(content.fileno())
+
+                cached = manifest_cache.lookup(vault, path, stat_result)
+                if cached is not None:
+                    manifest, length = cached
+                    try:
+                        summary = client.UploadFileFromManifest(
+                            vault, manifest, length, content=content,
+                            file_id_pool=file_id_pool)
+                        summary['cached'] = True
+                        return summary
+
+                    except errors.InvalidContentError as ex:
+                        self.log.info('Upload Files: manifest of ({0}) is '
+                                      'out of date: {1}'.format(path, ex))
+                        manifest_cache.remove(vault, path)
+                        content.seek(0)
+
+                summary = client.UploadFile(vault, content, count=count,
+                                            file_id_pool=file_id_pool,
+                                            keep_manifest=True,
+                                            readahead=readahead,
+                                            drop_cache=drop_cache)
+                manifest_cache.store(vault, path, stat_result,
+                                     summary.pop('manifest'),
+                                     summary['bytes'])
+                summary['cached'] = False
+                return summary
+
+        try:
+            for path, summary, error in parallel.map_unordered(
+                    upload_file, paths, max_workers=max_workers):
+                if error is not None:
+                    self.log.debug('Upload Files: Failed on ({0}) - '
+                                   'Exception {1}'.format(path, str(error)))
+                yield (path, summary, error)
+
+        finally:
+            if own_pool:
+                file_id_pool.close()
+
     @validate(vault=VaultInstanceRule,
               file_id=FileIdRule,
               marker=MetadataBlockIdRuleNoneOkay,
@@ -733,9 +1999,9 @@ class DeuceClient(Command):
             # Apply the marker
             if marker is not None:
                 url = '{0:}marker={1:}'.format(url, marker)
-                # Apply a comma if the next item is not none
+                # Apply a separator if the next item is not none
                 if limit is not None:
-                    url = url + ','
+                    url = url + '&'
 
             # Apply the limit
             if limit is not None:
@@ -744,7 +2010,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Get File Block List')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res, jsondata=True, fn='Get File Block List')
 
         if res.status_code == 200:
@@ -766,6 +2032,32 @@ class DeuceClient(Command):
                 'Failed to get Block list for File . '
                 'Error ({0:}): {1:}'.format(res.status_code, res.text))
 
+    @validate(vault=VaultInstanceRule,
+              file_id=FileIdRule)
+    def GetFileManifest(self, vault, file_id):
+        """Retrieve all of the blocks assigned to the file
+
+        Unlike GetFileBlockList the whole list is retrieved, batch by batch,
+        and the file is not added to the vault.
+
+        :param vault: vault the file belongs to
+        :param file_id: file id of the file in the vault
+        :returns: list of (block_id, offset) tuples in order of offset
+        """
+        listing_vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        listing_vault.add_file(file_id)
+
+        marker = None
+        while True:
+            block_ids, marker = self.GetFileBlockList(listing_vault, file_id,
+                                                      marker=marker)
+            if marker is None:
+                break
+
+        return [(block_id, offset) for offset, block_id in sorted(
+            (int(offset), block_id) for offset, block_id
+            in listing_vault.files[file_id].offsets.items())]
+
     @validate(vault=VaultInstanceRule, block=BlockInstanceRule)
     def DownloadBlockStorageData(self, vault, block):
         """Download a block directly from block storage
@@ -781,7 +2073,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Download Block Storage Data')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res,
                                  jsondata=False,
                                  fn='Download Block Storage Data')
@@ -817,18 +2109,87 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Delete Block Storage')
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
         self.__log_response_data(res,
                                  jsondata=False,
                                  fn='Delete Block Storage')
         if res.status_code == 204:
             return True
         else:
-            raise RuntimeError(
+            raise errors.DeuceRequestError(
                 'Failed to delete Block {0:} from BlockStorage, Vault {1:}'
                 'Error ({2:}): {3:}'.format(block.storage_id, vault.vault_id,
                                             res.status_code,
-                                            res.text))
+                                            res.text),
+                status_code=res.status_code)
+
+    @validate(vault=VaultInstanceRule)
+    def StreamDeleteStorageBlocks(self, vault, storage_block_ids,
+                                  max_workers=None, rate_limit=None,
+                                  retries=parallel.DEFAULT_RETRIES):
+        """Delete a series of blocks directly from block storage concurrently
+
+        Results are produced as each deletion completes so storage_block_ids
+        may be a generator over a very large number of blocks.
+
+        :param vault: instance of deuce.api.vault.Vault
+        :param storage_block_ids: iterable of the storage block ids to delete
+        :param max_workers: maximum number of concurrent deletions, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of deletions started
+                           per second
+        :param retries: number of times to retry a deletion that failed
+                        for a transient reason
+        :returns: generator of (storage_block_id, ok, error) tuples
+        """
+        def delete_storage_block(client, storage_block_id):
+            block = vault.storageblocks.get(storage_block_id)
+            if block is None:
+                block = api_block.Block(vault.project_id,
+                                        vault.vault_id,
+                                        storage_id=storage_block_id,
+                                        block_type='storage')
+            return client.DeleteBlockStorage(vault, block)
+
+        return self.__bulk_operation('Delete Storage Blocks',
+                                     delete_storage_block,
+                                     storage_block_ids,
+                                     max_workers, rate_limit, retries)
+
+    @validate(vault=VaultInstanceRule)
+    def DeleteStorageBlocks(self, vault, storage_block_ids, max_workers=None,
+                            rate_limit=None,
+                            retries=parallel.DEFAULT_RETRIES):
+        """Delete a list of blocks directly from block storage
+
+        The blocks are deleted concurrently; see StreamDeleteStorageBlocks
+        for the results as each deletion completes.
+
+        :param vault: instance of deuce.api.vault.Vault
+        :param storage_block_ids: storage block ids to delete,
+                                  must be an iterable object
+        :param max_workers: maximum number of concurrent deletions, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of deletions started
+                           per second
+        :param retries: number of times to retry a deletion that failed
+                        for a transient reason
+        :returns: list of tuples of the storage block id and a boolean to
+                  denote the result of its deletion, in the order of
+                  storage_block_ids
+        """
+        # A generator is only read once, so it is not consumed validating it
+        storage_block_ids = list(storage_block_ids)
+        validate_value(StorageBlockIdIterableRule, storage_block_ids)
+
+        results = {
+            storage_block_id: ok
+            for storage_block_id, ok, error in self.StreamDeleteStorageBlocks(
+                vault, collections.OrderedDict.fromkeys(storage_block_ids),
+                max_workers=max_workers, rate_limit=rate_limit,
+                retries=retries)}
+        return [(storage_block_id, results[storage_block_id])
+                for storage_block_id in storage_block_ids]
 
     @validate(vault=VaultInstanceRule, marker=StorageBlockIdRuleNoneOkay,
               limit=LimitRuleNoneOkay)
@@ -860,7 +2221,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Get Block Storage List')
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.__log_response_data(res,
                                  jsondata=True,
                                  fn='Get Block Storage List')
@@ -908,7 +2269,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data(fn='Head Block in Storage')
-        res = requests.head(self.Uri, headers=self.Headers)
+        res = self.session.head(self.Uri, headers=self.Headers)
         self.__log_response_data(res,
                                  jsondata=True,
                                  fn='Head Block in Storage')
@@ -929,8 +2290,412 @@ class DeuceClient(Command):
                 json.loads(res.headers['X-Block-Orphaned'].lower())
             return block
         else:
-            raise RuntimeError(
+            raise errors.DeuceRequestError(
                 'Failed to head Block {0:} from BlockStorage, Vault {1:}'
                 'Error ({2:}): {3:}'.format(block.storage_id, vault.vault_id,
                                             res.status_code,
-                                            res.text))
+                                            res.text),
+                status_code=res.status_code)
+
+    @validate(vault=VaultInstanceRule)
+    def ScanVault(self, vault, work, storage_blocks=False, shard_count=1,
+                  worker=0, workers=1, counters=(), max_workers=None,
+                  rate_limit=None, retries=parallel.DEFAULT_RETRIES,
+                  limit=None, checkpoint=None, progress=None):
+        """Run work on each block in a part of the block id key space
+
+        The key space is divided between the workers, e.g. one per machine,
+        and each worker scans only its part of it (see
+        deuceclient.common.shards.key_space_shards), so jobs over the whole
+        of a large vault such as scrubs, inventories or garbage collection
+        run on several machines at once without checking any block twice.
+
+        The part of the worker is split into shards which are listed
+        concurrently, and the blocks of each listing page are worked on
+        concurrently.
+
+        :param vault: vault to scan the blocks of
+        :param work: callable receiving a client of its own, the block id
+                     (the storage block id if storage_blocks) and a callable
+                     that runs a request with the retries and rate limit of
+                     the scan; it returns None or a dict of counts to add to
+                     the totals
+        :param storage_blocks: whether to list the storage blocks instead of
+                               the metadata blocks
+        :param shard_count: number of key space shards of the part of the
+                            worker to list concurrently
+        :param worker: index of the worker, from 0 to workers - 1
+        :param workers: number of workers dividing the key space
+        :param counters: names of the counts work returns, reported even
+                         when they are 0
+        :param max_workers: maximum number of concurrent requests, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of requests started per
+                           second
+        :param retries: number of times to retry a request that failed for
+                        a transient reason
+        :param limit: optional number of entries per listing page
+        :param checkpoint: optional deuceclient.common.checkpoint.Checkpoint
+                           recording the progress of each shard after every
+                           page so an interrupted scan resumes where it
+                           stopped; each worker needs a checkpoint of its own
+        :param progress: optional callable receiving the running totals, the
+                         number of completed shards, elapsed (seconds) and
+                         rate (blocks scanned per second) after each page
+        :returns: dict of the totals - scanned, failed (blocks work raised
+                  an exception for) and the counts returned by work
+        :raises: ValueError if the checkpoint is for a different shard_count
+                 or worker
+        :raises: RunTimeError on failure to list the blocks
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        key_shards = shards.key_space_shards(shard_count, worker=worker,
+                                             workers=workers)
+        shard_workers = min(shard_count, max_workers)
+        block_workers = max(1, max_workers // shard_workers)
+
+        def bound(block_id):
+            # The listing marker starting at a block id
+            if storage_blocks:
+                return shards.storage_block_marker(block_id)
+            return block_id
+
+        rate_limiter = None
+        if rate_limit is not None:
+            rate_limiter = parallel.RateLimiter(rate_limit)
+
+        counters = ('scanned', 'failed') + tuple(counters)
+
+        state = None
+        if checkpoint is not None:
+            state = checkpoint.load()
+        if state is None:
+            state = {
+                'shard_count': shard_count,
+                'worker': worker,
+                'workers': workers,
+                'shards': [{'marker': bound(start),
+                            'done': False,
+                            'results': {counter: 0 for counter in counters}}
+                           for start, end in key_shards]
+            }
+        elif state['shard_count'] != shard_count or \
+                state.get('worker', 0) != worker or \
+                state.get('workers', 1) != workers:
+            raise ValueError(
+                'Checkpoint {0} is for {1} shards of worker {2} of {3}, not '
+                '{4} shards of worker {5} of {6}'.format(
+                    checkpoint.path, state['shard_count'],
+                    state.get('worker', 0), state.get('workers', 1),
+                    shard_count, worker, workers))
+
+        state_lock = threading.Lock()
+        started = time.monotonic()
+
+        def request(func):
+            return parallel.call_with_retry(func,
+                                            retries=retries,
+                                            retry_if=is_transient_error,
+                                            rate_limiter=rate_limiter)
+
+        def totals():
+            results = {counter: 0 for counter in counters}
+            for shard in state['shards']:
+                for counter, count in shard['results'].items():
+                    results[counter] = results.get(counter, 0) + count
+            return results
+
+        def scan_block(block_id):
+            return work(self._thread_client(), block_id, request)
+
+        def scan_shard(index):
+            client = self._thread_client()
+            shard = state['shards'][index]
+            end = bound(key_shards[index][1])
+
+            # A private vault keeps the listing marker of each shard apart
+            shard_vault = api_vault.Vault(vault.project_id, vault.vault_id)
+            if storage_blocks:
+                list_blocks = client.GetBlockStorageList
+                listing = shard_vault.storageblocks
+            else:
+                list_blocks = client.GetBlockList
+                listing = shard_vault.blocks
+
+            while not shard['done']:
+                block_ids = [
+                    block_id
+                    for block_id in request(
+                        lambda: list_blocks(shard_vault,
+                                            marker=shard['marker'],
+                                            limit=limit))
+                    if end is None or block_id < end]
+                marker = listing.marker
+                listing.clear()
+
+                results = {}
+                scanned = parallel.map_unordered(scan_block, block_ids,
+                                                 max_workers=block_workers)
+                for block_id, counts, error in scanned:
+                    results['scanned'] = results.get('scanned', 0) + 1
+                    if error is not None:
+                        self.log.debug('Scan Vault: Failed on ({0}) - '
+                                       'Exception {1}'.format(block_id,
+                                                              str(error)))
+                        results['failed'] = results.get('failed', 0) + 1
+                        continue
+
+                    for counter, count in (counts or {}).items():
+                        results[counter] = results.get(counter, 0) + count
+
+                with state_lock:
+                    for counter, count in results.items():
+                        shard['results'][counter] = \
+                            shard['results'].get(counter, 0) + count
+                    shard['marker'] = marker
+                    shard['done'] = marker is None or \
+                        (end is not None and marker >= end)
+
+                    if checkpoint is not None:
+                        checkpoint.save(state)
+
+                    if progress is not None:
+                        status = totals()
+                        status['shards_done'] = sum(
+                            1 for entry in state['shards'] if entry['done'])
+                        status['elapsed'] = time.monotonic() - started
+                        status['rate'] = status['scanned'] / \
+                            status['elapsed'] if status['elapsed'] else 0.0
+                        progress(status)
+
+        pending = [index for index, shard in enumerate(state['shards'])
+                   if not shard['done']]
+        listing_errors = [
+            error for index, result, error in parallel.map_unordered(
+                scan_shard, pending, max_workers=shard_workers)
+            if error is not None]
+        if listing_errors:
+            raise listing_errors[0]
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+        return totals()
+
+    @validate(vault=VaultInstanceRule)
+    def CollectOrphanedStorageBlocks(self, vault,
+                                     grace_period=DEFAULT_GC_GRACE_PERIOD,
+                                     dry_run=False, shard_count=1,
+                                     worker=0, workers=1,
+                                     max_workers=None, rate_limit=None,
+                                     retries=parallel.DEFAULT_RETRIES,
+                                     limit=None, checkpoint=None,
+                                     progress=None):
+        """Delete the orphaned blocks from block storage
+
+        The storage block id space is split into shards which are listed
+        concurrently, and the blocks of each listing page are checked and
+        deleted concurrently; several workers, e.g. on several machines, may
+        each collect a part of the key space (see ScanVault). An orphaned
+        block is only deleted once its references have not changed for the
+        grace period, which protects blocks of uploads that have not yet
+        been assigned to a file. Blocks whose references were never
+        recorded are only deleted when the grace period is 0.
+
+        :param vault: vault to collect the orphaned storage blocks of
+        :param grace_period: seconds since the references of an orphaned
+                             block last changed before it is deleted
+        :param dry_run: if True only report what would be deleted
+        :param shard_count: number of key space shards to list concurrently
+        :param worker: index of the worker, from 0 to workers - 1
+        :param workers: number of workers dividing the key space
+        :param max_workers: maximum number of concurrent requests, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of requests started per
+                           second
+        :param retries: number of times to retry a request that failed for
+                        a transient reason
+        :param limit: optional number of entries per listing page
+        :param checkpoint: optional deuceclient.common.checkpoint.Checkpoint
+                           recording the progress of each shard after every
+                           page so an interrupted collection resumes where
+                           it stopped
+        :param progress: optional callable receiving the running totals, the
+                         number of completed shards, elapsed (seconds) and
+                         rate (blocks checked per second) after each page
+        :returns: dict of the totals - scanned, orphaned, deferred (orphaned
+                  but within the grace period), deleted, failed and
+                  reclaimed_bytes (the bytes that would be reclaimed for a
+                  dry run)
+        :raises: ValueError if the checkpoint is for a different shard_count
+                 or worker
+        :raises: RunTimeError on failure to list the storage blocks
+        """
+        cutoff = time.time() - grace_period
+
+        def collect_block(client, storage_block_id, request):
+            block = api_block.Block(vault.project_id,
+                                    vault.vault_id,
+                                    storage_id=storage_block_id,
+                                    block_type='storage')
+            request(lambda: client.HeadBlockStorage(vault, block))
+
+            if not block.block_orphaned:
+                return None
+
+            if grace_period > 0 and (not block.ref_modified or
+                                     block.ref_modified > cutoff):
+                return {'orphaned': 1, 'deferred': 1}
+
+            if not dry_run:
+                request(lambda: client.DeleteBlockStorage(vault, block))
+            return {'orphaned': 1, 'deleted': 1,
+                    'reclaimed_bytes': block.block_size or 0}
+
+        return self.ScanVault(vault, collect_block, storage_blocks=True,
+                              shard_count=shard_count, worker=worker,
+                              workers=workers,
+                              counters=('orphaned', 'deferred', 'deleted',
+                                        'reclaimed_bytes'),
+                              max_workers=max_workers, rate_limit=rate_limit,
+                              retries=retries, limit=limit,
+                              checkpoint=checkpoint, progress=progress)
+
+    @staticmethod
+    def _vault_statistic(statistics, *keys):
+        """Retrieve a count from the vault statistics
+
+        :returns: the count or None if it is not available
+        """
+        try:
+            for key in keys:
+                statistics = statistics[key]
+            return int(statistics)
+
+        except (LookupError, TypeError, ValueError):
+            return None
+
+    @validate(vault=VaultInstanceRule)
+    def PurgeVault(self, vault, max_workers=None, rate_limit=None,
+                   retries=parallel.DEFAULT_RETRIES, limit=None,
+                   checkpoint=None, progress=None):
+        """Delete all the files and blocks in a vault and then the vault
+
+        The file, block and storage block listings are processed a page at
+        a time with the entries of each page deleted concurrently, so the
+        vault may hold any number of entries. Files are deleted first to
+        release their block references, then the blocks, then any storage
+        blocks left behind. The vault is only deleted if every entry was.
+
+        :param vault: vault to purge
+        :param max_workers: maximum number of concurrent deletions, defaults
+                            to the client's max_workers
+        :param rate_limit: optional maximum number of deletions started
+                           per second
+        :param retries: number of times to retry a deletion that failed
+                        for a transient reason
+        :param limit: optional number of entries per listing page
+        :param checkpoint: optional deuceclient.common.checkpoint.Checkpoint
+                           recording the progress after each page so an
+                           interrupted purge resumes where it stopped
+        :param progress: optional callable receiving a dict with the stage,
+                         deleted, failed, remaining (None when unknown),
+                         elapsed (seconds) and rate (deletions per second)
+                         after each page
+        :returns: dict of the deleted and failed counts for each stage and
+                  whether or not the vault was deleted
+        :raises: RunTimeError on failure to list the vault contents
+        """
+        stages = [
+            ('files', self.GetFileList, vault.files,
+             self.StreamDeleteFiles, ('metadata', 'files', 'count')),
+            ('blocks', self.GetBlockList, vault.blocks,
+             self.StreamDeleteBlocks, ('metadata', 'blocks', 'count')),
+            ('storage', self.GetBlockStorageList, vault.storageblocks,
+             self.StreamDeleteStorageBlocks, ('storage', 'block-count')),
+        ]
+        stage_names = [stage[0] for stage in stages]
+
+        state = None
+        if checkpoint is not None:
+            state = checkpoint.load()
+        if state is None:
+            state = {
+                'stage': stage_names[0],
+                'marker': None,
+                'results': {name: {'deleted': 0, 'failed': 0}
+                            for name in stage_names}
+            }
+
+        try:
+            self.GetVaultStatistics(vault)
+        except RuntimeError as ex:
+            self.log.debug('Purge Vault: no statistics - {0}'.format(ex))
+
+        for name, list_page, collection, delete, statistic in stages:
+            if stage_names.index(name) < stage_names.index(state['stage']):
+                continue
+
+            marker = state['marker'] if name == state['stage'] else None
+            state['stage'] = name
+            results = state['results'][name]
+            total = self._vault_statistic(vault.statistics, *statistic)
+            deleted_at_start = results['deleted']
+            stage_start = time.monotonic()
+
+            while True:
+                entries = list_page(vault, marker=marker, limit=limit)
+                marker = collection.marker
+
+                for entry, ok, error in delete(vault, entries,
+                                               max_workers=max_workers,
+                                               rate_limit=rate_limit,
+                                               retries=retries):
+                    if ok:
+                        results['deleted'] = results['deleted'] + 1
+                    else:
+                        results['failed'] = results['failed'] + 1
+
+                # Keep memory bounded for very large vaults
+                for entry in entries:
+                    dict.pop(collection, entry, None)
+
+                state['marker'] = marker
+                if checkpoint is not None:
+                    checkpoint.save(state)
+
+                if progress is not None:
+                    elapsed = time.monotonic() - stage_start
+                    deleted = results['deleted'] - deleted_at_start
+                    remaining = None
+                    if total is not None:
+                        remaining = max(total - results['deleted'], 0)
+                    progress({
+                        'stage': name,
+                        'deleted': results['deleted'],
+                        'failed': results['failed'],
+                        'remaining': remaining,
+                        'elapsed': elapsed,
+                        'rate': deleted / elapsed if elapsed else 0.0
+                    })
+
+                if marker is None:
+                    break
+
+        summary = dict(state['results'])
+        failures = sum(counts['failed']
+                       for counts in state['results'].values())
+        summary['vault_deleted'] = False
+        if failures == 0:
+            summary['vault_deleted'] = self.DeleteVault(vault)
+        else:
+            self.log.info('Purge Vault: {0} entries could not be deleted; '
+                          'not deleting Vault {1}'.format(failures,
+                                                          vault.vault_id))
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+        return summary
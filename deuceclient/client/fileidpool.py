@@ -0,0 +1,204 @@
+"""
+Deuce Client - File ID Pool
+"""
+import collections
+import logging
+import math
+import threading
+import time
+
+import deuceclient.api.vault as api_vault
+
+# Bounds on the number of file ids kept ready
+DEFAULT_MIN_SIZE = 2
+DEFAULT_MAX_SIZE = 64
+
+# Number of threads creating files in the background
+DEFAULT_WORKERS = 2
+
+# Seconds to wait before creating files again after a failure
+DEFAULT_RETRY_DELAY = 5
+
+# Weight of the latest measurement in the moving averages of the rates
+SMOOTHING = 0.2
+
+
+class FileIdPool(object):
+    """Files created ahead of time for uploads to take
+
+    Creating a file is a round trip to the server before any data of the
+    file can be sent; for small files it is most of the cost of the upload.
+    The pool creates files in the background so uploads take one that is
+    ready instead.
+
+    The number of files kept ready adapts to how fast they are taken and
+    how long creating one takes, within min_size and max_size. Files that
+    were created but not taken are deleted when the pool is closed.
+    """
+
+    def __init__(self, client, vault, min_size=DEFAULT_MIN_SIZE,
+                 max_size=DEFAULT_MAX_SIZE, workers=DEFAULT_WORKERS,
+                 retry_delay=DEFAULT_RETRY_DELAY):
+        """
+        :param client: DeuceClient to create the files with; each thread
+                       uses a client of its own sharing its authenticator
+        :param vault: vault to create the files in
+        :param min_size: number of files kept ready at least
+        :param max_size: number of files kept ready at most
+        :param workers: number of threads creating files
+        :param retry_delay: seconds to wait before creating files again
+                            after a failure
+        """
+        if not 0 <= min_size <= max_size:
+            raise ValueError('min_size must be between 0 and max_size')
+
+        self.log = logging.getLogger(__name__)
+        self.__client = client
+        self.__vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        self.__min_size = min_size
+        self.__max_size = max_size
+        self.__retry_delay = retry_delay
+
+        self.__condition = threading.Condition()
+        self.__ready = collections.deque()
+        self.__pending = 0
+        self.__target = min_size
+        self.__last_taken = None
+        self.__interval = None
+        self.__latency = None
+        self.__closed = False
+        self.__stop = threading.Event()
+
+        self.__threads = [threading.Thread(target=self.__run,
+                                           name='deuce-file-id-pool')
+                          for _ in range(workers)]
+        for thread in self.__threads:
+            thread.daemon = True
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        with self.__condition:
+            return len(self.__ready)
+
+    @property
+    def target(self):
+        """Return the number of files currently kept ready
+        """
+        return self.__target
+
+    @staticmethod
+    def __average(average, value):
+        if average is None:
+            return value
+        return (1 - SMOOTHING) * average + SMOOTHING * value
+
+    def __resize(self):
+        """Keep enough files ready to cover the time it takes to create one
+
+        Called with the condition held.
+        """
+        if self.__interval is None or self.__latency is None:
+            return
+
+        # Files taken while one is created, with the same again as headroom
+        needed = 2 * math.ceil(self.__latency / max(self.__interval, 1e-6))
+        self.__target = max(self.__min_size, min(self.__max_size, needed))
+
+    def __create(self, client):
+        """Create a file
+
+        :returns: (file_id, url) tuple
+        """
+        start_time = time.monotonic()
+        file_id = client.CreateFile(self.__vault)
+        url = self.__vault.files.pop(file_id).url
+
+        with self.__condition:
+            self.__latency = self.__average(self.__latency,
+                                            time.monotonic() - start_time)
+            self.__resize()
+        return (file_id, url)
+
+    def __run(self):
+        client = self.__client._thread_client()
+
+        while True:
+            with self.__condition:
+                while not self.__closed and \
+                        len(self.__ready) + self.__pending >= self.__target:
+                    self.__condition.wait()
+
+                if self.__closed:
+                    return
+                self.__pending += 1
+
+            try:
+                entry = self.__create(client)
+
+            except Exception as ex:
+                self.log.warning('File ID Pool: failed to create a file: '
+                                 '{0}'.format(ex))
+                with self.__condition:
+                    self.__pending -= 1
+                self.__stop.wait(self.__retry_delay)
+                continue
+
+            with self.__condition:
+                self.__pending -= 1
+                self.__ready.append(entry)
+                self.__condition.notify_all()
+
+    def get(self):
+        """Take a file
+
+        A file is created by the calling thread if none is ready.
+
+        :returns: (file_id, url) tuple of a new, empty file
+        :raises: RuntimeError if the pool is closed
+        """
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError('File ID Pool is closed')
+
+            now = time.monotonic()
+            if self.__last_taken is not None:
+                self.__interval = self.__average(self.__interval,
+                                                 now - self.__last_taken)
+            self.__last_taken = now
+            self.__resize()
+
+            # Wake the workers to replace the file
+            self.__condition.notify_all()
+            if len(self.__ready):
+                return self.__ready.popleft()
+
+        return self.__create(self.__client._thread_client())
+
+    def close(self):
+        """Stop creating files and delete the files that were not taken
+        """
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__stop.set()
+
+        for thread in self.__threads:
+            thread.join()
+
+        client = self.__client._thread_client()
+        while len(self.__ready):
+            file_id, url = self.__ready.popleft()
+            try:
+                client.DeleteFile(self.__vault, file_id)
+
+            except Exception as ex:
+                self.log.warning('File ID Pool: failed to delete unused file '
+                                 '{0}: {1}'.format(file_id, ex))
@@ -0,0 +1,255 @@
+"""
+Deuce Client - File Reader
+"""
+import bisect
+import collections
+import concurrent.futures
+import io
+import logging
+import os
+
+import deuceclient.api.block as api_block
+import deuceclient.api.vault as api_vault
+import deuceclient.client.deuce as deuce
+import deuceclient.common.errors as errors
+import deuceclient.common.parallel as parallel
+import deuceclient.common.sparse as sparse
+
+# Number of recently read blocks kept in memory
+DEFAULT_CACHE_BLOCKS = 16
+
+# Number of blocks downloaded ahead of sequential reads
+DEFAULT_READ_AHEAD = 4
+
+
+class DeuceFileReader(io.RawIOBase):
+    """Read-only, seekable file object over a file in a vault
+
+    The manifest of the file is retrieved once when the reader is opened;
+    reads then only download the blocks they touch. Recently read blocks are
+    kept in memory and, while the file is read sequentially, the blocks
+    following the one being read are downloaded in the background.
+
+    Wrap it in io.BufferedReader for small reads, or io.TextIOWrapper for
+    text.
+    """
+
+    def __init__(self, client, vault, file_id, length=None,
+                 cache_blocks=DEFAULT_CACHE_BLOCKS,
+                 read_ahead=DEFAULT_READ_AHEAD,
+                 retries=parallel.DEFAULT_RETRIES):
+        """
+        :param client: DeuceClient to retrieve the manifest and the blocks
+                       with; read-ahead threads use clients of their own
+                       sharing its authenticator
+        :param vault: vault containing the file
+        :param file_id: file id of the file in the vault
+        :param length: optional length of the file in bytes; if not given
+                       the last block is downloaded to determine it, if
+                       beyond the end of the last block reads stop there
+        :param cache_blocks: number of recently read blocks kept in memory
+        :param read_ahead: number of blocks downloaded ahead of sequential
+                           reads, 0 to only download blocks as they are read
+        :param retries: number of times to retry a block download that
+                        failed for a transient reason
+        :raises: errors.InvalidContentError if length is given for a file
+                 without any blocks
+        """
+        super(DeuceFileReader, self).__init__()
+        self.log = logging.getLogger(__name__)
+        self.__client = client
+        self.__vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        self.__file_id = file_id
+        self.__cache_blocks = cache_blocks
+        self.__read_ahead = read_ahead
+        self.__retries = retries
+        self.__cache = collections.OrderedDict()
+        self.__prefetch = {}
+        self.__executor = None
+        self.__last_index = None
+        self.__position = 0
+
+        if cache_blocks < 1:
+            raise ValueError('cache_blocks must be at least 1')
+        if read_ahead < 0:
+            raise ValueError('read_ahead must not be negative')
+
+        manifest = client.GetFileManifest(self.__vault, file_id)
+        self.__block_ids = [block_id for block_id, _ in manifest]
+        self.__offsets = [offset for _, offset in manifest]
+        if length and not len(manifest):
+            raise errors.InvalidContentError(
+                'File {0} has no blocks for its length of {1} '
+                'bytes'.format(file_id, length))
+
+        if read_ahead:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(
+                read_ahead)
+
+        if length is None:
+            length = 0
+            if len(manifest):
+                length = self.__offsets[-1] + len(
+                    self.__block(len(manifest) - 1))
+        self.__length = length
+
+    @property
+    def file_id(self):
+        return self.__file_id
+
+    def __len__(self):
+        return self.__length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self.__position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._checkClosed()
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self.__position + offset
+        elif whence == os.SEEK_END:
+            position = self.__length + offset
+        else:
+            raise ValueError('Invalid whence ({0})'.format(whence))
+
+        if position < 0:
+            raise ValueError('Negative seek position {0}'.format(position))
+
+        self.__position = position
+        return position
+
+    def __block_size(self, index):
+        if index + 1 < len(self.__offsets):
+            return self.__offsets[index + 1] - self.__offsets[index]
+        return None
+
+    def __download(self, client, index):
+        """Download the data of a block of the file
+
+        :returns: the data of the block, without downloading it if it is
+                  known to be all zeros
+        :raises: errors.InvalidContentError if the data is not that of the
+                 block
+        """
+        block_id = self.__block_ids[index]
+        size = self.__block_size(index)
+        if sparse.is_zero_block(block_id, size):
+            return sparse.zeros(size)
+
+        block = api_block.Block(self.__vault.project_id,
+                                self.__vault.vault_id,
+                                block_id)
+        parallel.call_with_retry(
+            lambda: client.DownloadBlock(self.__vault, block),
+            retries=self.__retries,
+            retry_if=deuce.is_transient_error)
+
+        if api_block.Block.make_id(block.data) != block_id or \
+                (size is not None and len(block.data) != size):
+            raise errors.InvalidContentError(
+                'Block {0} at offset {1} of file {2} downloaded with the '
+                'wrong content'.format(block_id, self.__offsets[index],
+                                       self.__file_id))
+        return block.data
+
+    def __prefetch_block(self, index):
+        return self.__download(self.__client._thread_client(), index)
+
+    def __schedule_read_ahead(self, index):
+        """Download the blocks following a block in the background
+
+        Blocks downloaded ahead of an earlier position are dropped.
+        """
+        wanted = range(index + 1,
+                       min(index + 1 + self.__read_ahead,
+                           len(self.__block_ids)))
+
+        for prefetched in list(self.__prefetch):
+            if prefetched not in wanted:
+                self.__prefetch.pop(prefetched).cancel()
+
+        for next_index in wanted:
+            if next_index in self.__prefetch or \
+                    self.__block_ids[next_index] in self.__cache:
+                continue
+            self.__prefetch[next_index] = self.__executor.submit(
+                self.__prefetch_block, next_index)
+
+    def __block(self, index):
+        """Return the data of a block of the file
+
+        :param index: index of the block in the manifest
+        """
+        block_id = self.__block_ids[index]
+        data = self.__cache.get(block_id)
+        if data is not None:
+            self.__cache.move_to_end(block_id)
+
+        else:
+            future = self.__prefetch.pop(index, None)
+            if future is not None:
+                data = future.result()
+            else:
+                data = self.__download(self.__client, index)
+
+            self.__cache[block_id] = data
+            while len(self.__cache) > self.__cache_blocks:
+                self.__cache.popitem(last=False)
+
+        return data
+
+    def readinto(self, buffer):
+        self._checkClosed()
+        view = memoryview(buffer).cast('B')
+        filled = 0
+
+        while filled < len(view) and self.__position < self.__length:
+            index = bisect.bisect_right(self.__offsets, self.__position) - 1
+            data = self.__block(index)
+
+            if self.__last_index is None:
+                sequential = index == 0
+            else:
+                sequential = index - self.__last_index in (0, 1)
+            if sequential and self.__executor is not None:
+                self.__schedule_read_ahead(index)
+            self.__last_index = index
+
+            start = self.__position - self.__offsets[index]
+            count = min(len(view) - filled, len(data) - start,
+                        self.__length - self.__position)
+            if count <= 0:
+                break
+
+            view[filled:filled + count] = data[start:start + count]
+            filled += count
+            self.__position += count
+
+        return filled
+
+    def readall(self):
+        self._checkClosed()
+        remaining = max(0, self.__length - self.__position)
+        buffer = bytearray(remaining)
+        filled = self.readinto(buffer)
+        del buffer[filled:]
+        return bytes(buffer)
+
+    def close(self):
+        if not self.closed:
+            if self.__executor is not None:
+                for future in self.__prefetch.values():
+                    future.cancel()
+                self.__prefetch.clear()
+                self.__executor.shutdown(wait=True)
+            self.__cache.clear()
+        super(DeuceFileReader, self).close()
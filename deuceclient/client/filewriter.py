@@ -0,0 +1,299 @@
+"""
+Deuce Client - File Writer
+"""
+import concurrent.futures
+import io
+import logging
+import threading
+
+import deuceclient.api.splitter as api_splitter
+import deuceclient.api.vault as api_vault
+import deuceclient.client.deuce as deuce
+import deuceclient.common.parallel as parallel
+
+# Number of threads hashing and uploading the blocks written
+DEFAULT_WORKERS = 2
+
+
+class DeuceFileWriter(io.RawIOBase):
+    """Write-only file object that uploads what is written into a new file
+
+    The content written is split into blocks as it arrives. Every count
+    blocks are hashed, assigned to the file and, if the vault does not have
+    them yet, uploaded by background threads while more content is written,
+    the same way as by UploadFile. A batch that fails for a transient reason
+    is retried.
+    Only max_pending batches of blocks are held at a time: writes wait for
+    the uploads to catch up, so the memory used is bounded by about
+    (max_pending + 1) * count * chunk_size bytes.
+
+    Closing the writer, or leaving it as a context manager, uploads the
+    rest of the content and finalizes the file. Leaving it because of an
+    exception aborts the upload instead; see abort.
+
+    Unlike UploadFile the content does not need to be seekable or provide
+    tell, so e.g. the output of another process can be written as it is
+    produced.
+    """
+
+    def __init__(self, client, vault, file_id=None, file_id_pool=None,
+                 chunk_size=deuce.DEFAULT_CHUNK_SIZE,
+                 count=deuce.DEFAULT_ASSIGNMENT_COUNT,
+                 workers=DEFAULT_WORKERS, max_pending=None,
+                 retries=parallel.DEFAULT_RETRIES):
+        """
+        :param client: DeuceClient to create and finalize the file with;
+                       each background thread uses a client of its own
+                       sharing its authenticator
+        :param vault: vault to upload the file into
+        :param file_id: optional id of an existing, empty file in the vault
+                        to upload into; one is created if not specified
+        :param file_id_pool: optional FileIdPool for the vault to take the
+                             new file from instead of creating it
+        :param chunk_size: size of the blocks the content is split into
+        :param count: number of blocks assigned to the file at a time
+        :param workers: number of threads uploading blocks
+        :param max_pending: number of batches of blocks waiting for or being
+                            uploaded at most, defaults to twice the workers
+        :param retries: number of times to retry a batch of blocks that
+                        failed for a transient reason
+        """
+        super(DeuceFileWriter, self).__init__()
+        self.log = logging.getLogger(__name__)
+        self.__executor = None
+        self.__finished = False
+
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        if count < 1:
+            raise ValueError('count must be at least 1')
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        if max_pending is None:
+            max_pending = 2 * workers
+
+        self.__client = client
+        self.__vault = api_vault.Vault(vault.project_id, vault.vault_id)
+        self.__chunk_size = chunk_size
+        self.__count = count
+        self.__retries = retries
+
+        self.__created = file_id is None
+        if file_id is not None:
+            self.__vault.add_file(file_id)
+        elif file_id_pool is not None:
+            file_id, file_url = file_id_pool.get()
+            self.__vault.add_file(file_id, file_url)
+        else:
+            file_id = client.CreateFile(self.__vault)
+        self.__file_id = file_id
+
+        # Content written that is not split into blocks yet, and its offset
+        self.__buffer = bytearray()
+        self.__offset = 0
+        self.__batch = []
+
+        self.__lock = threading.Lock()
+        self.__pending = threading.BoundedSemaphore(max_pending)
+        self.__futures = set()
+        self.__error = None
+        self.__summary = {
+            'file_id': file_id,
+            'url': self.__vault.files[file_id].url,
+            'bytes': 0,
+            'blocks': 0,
+            'uploaded_bytes': 0,
+            'uploaded_blocks': 0
+        }
+        self.__executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    def __del__(self):
+        # Unlike other file objects the writer is not closed when it is
+        # garbage collected: the file would be finalized with only part of
+        # its content
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def file_id(self):
+        return self.__file_id
+
+    @property
+    def chunk_size(self):
+        return self.__chunk_size
+
+    @property
+    def summary(self):
+        """Return the outcome of the upload
+
+        :returns: dict of the file_id and url of the file, its length in
+                  bytes and blocks, and the number of blocks and bytes that
+                  were uploaded, as returned by UploadFile
+        """
+        with self.__lock:
+            return dict(self.__summary)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self.__offset + len(self.__buffer)
+
+    def __check_error(self):
+        with self.__lock:
+            error = self.__error
+        if error is not None:
+            raise error
+
+    def __upload_batch(self, batch):
+        """Hash a batch of blocks, assign them and upload the missing ones
+
+        :param batch: list of (offset, data) tuples
+        """
+        client = self.__client._thread_client()
+        batch_vault = api_vault.Vault(self.__vault.project_id,
+                                      self.__vault.vault_id)
+        batch_vault.add_file(self.__file_id)
+        afile = batch_vault.files[self.__file_id]
+
+        block_list = [(api_splitter.make_block(self.__vault.project_id,
+                                               self.__vault.vault_id, data),
+                       offset)
+                      for offset, data in batch]
+
+        def assign():
+            # Counted afresh by each attempt
+            batch_summary = {'blocks': 0,
+                             'uploaded_blocks': 0,
+                             'uploaded_bytes': 0}
+            client._assign_block_list(batch_vault, afile, block_list,
+                                      batch_summary)
+            return batch_summary
+
+        batch_summary = parallel.call_with_retry(
+            assign, retries=self.__retries,
+            retry_if=deuce.is_transient_error)
+
+        with self.__lock:
+            for key, value in batch_summary.items():
+                self.__summary[key] += value
+
+    def __batch_done(self, future):
+        with self.__lock:
+            self.__futures.discard(future)
+            if not future.cancelled() and future.exception() is not None \
+                    and self.__error is None:
+                self.__error = future.exception()
+        self.__pending.release()
+
+    def __submit(self):
+        """Hand the blocks split off so far to the background threads
+        """
+        if not len(self.__batch):
+            return
+
+        batch, self.__batch = self.__batch, []
+        self.__pending.acquire()
+        future = self.__executor.submit(self.__upload_batch, batch)
+        with self.__lock:
+            self.__futures.add(future)
+        future.add_done_callback(self.__batch_done)
+
+    def __split(self, final=False):
+        """Split the content written so far into blocks
+        """
+        while len(self.__buffer) >= self.__chunk_size or \
+                (final and len(self.__buffer)):
+            data = bytes(self.__buffer[:self.__chunk_size])
+            del self.__buffer[:self.__chunk_size]
+
+            self.__batch.append((self.__offset, data))
+            self.__offset += len(data)
+            if len(self.__batch) >= self.__count:
+                self.__submit()
+
+    def write(self, data):
+        """Write content to the file
+
+        :param data: bytes-like object
+        :returns: number of bytes written, all of data
+        :raises: the exception of a failed upload of earlier content
+        """
+        self._checkClosed()
+        self.__check_error()
+
+        with memoryview(data) as view, view.cast('B') as content:
+            for start in range(0, len(content), self.__chunk_size):
+                self.__buffer += content[start:start + self.__chunk_size]
+                self.__split()
+            return len(content)
+
+    def __wait(self):
+        """Wait for the background threads to complete
+        """
+        self.__executor.shutdown(wait=True)
+
+    def close(self):
+        """Upload the rest of the content and finalize the file
+
+        :raises: the exception of a failed upload, in which case the file is
+                 not finalized but deleted if the writer created it
+        """
+        if self.closed:
+            return
+
+        try:
+            if not self.__finished:
+                self.__finished = True
+                self.__split(final=True)
+                self.__submit()
+                self.__wait()
+                self.__check_error()
+
+                self.__client.FinalizeFile(self.__vault, self.__file_id,
+                                           file_length=self.__offset)
+                with self.__lock:
+                    self.__summary['bytes'] = self.__offset
+
+        except BaseException:
+            self.__wait()
+            self.__delete_created()
+            raise
+
+        finally:
+            super(DeuceFileWriter, self).close()
+
+    def __delete_created(self):
+        """Delete the incomplete file if the writer created it
+        """
+        if self.__created:
+            try:
+                self.__client.DeleteFile(self.__vault, self.__file_id)
+
+            except Exception as ex:
+                self.log.warning('Failed to delete the incomplete file '
+                                 '{0}: {1}'.format(self.__file_id, ex))
+
+    def abort(self):
+        """Stop uploading and close the writer without finalizing the file
+
+        The file is deleted if the writer created it.
+        """
+        if self.closed:
+            return
+
+        self.__finished = True
+        with self.__lock:
+            futures = list(self.__futures)
+        for future in futures:
+            future.cancel()
+        self.__wait()
+        self.__delete_created()
+
+        super(DeuceFileWriter, self).close()
@@ -0,0 +1,104 @@
+"""
+Deuce Client: Bitmap Functionality
+"""
+import base64
+import zlib
+
+
+class Bitmap(object):
+    """Fixed size set of bits, e.g. which entries of a manifest are done
+
+    One bit per entry keeps the bitmap of a million entries at 125 KB, and
+    the encoded form compresses the long runs of set or clear bits of a
+    partially completed operation down to little more than its boundaries.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: number of bits, all initially clear
+        """
+        if size < 0:
+            raise ValueError('size must not be negative')
+
+        self.__size = size
+        self.__bits = bytearray((size + 7) // 8)
+
+    def __len__(self):
+        return self.__size
+
+    def __check(self, index):
+        if not 0 <= index < self.__size:
+            raise IndexError('bit {0} is out of range'.format(index))
+
+    def __contains__(self, index):
+        self.__check(index)
+        return bool(self.__bits[index >> 3] & (1 << (index & 7)))
+
+    def set(self, index):
+        """Set a bit
+
+        :param index: integer - index of the bit
+        """
+        self.__check(index)
+        self.__bits[index >> 3] |= 1 << (index & 7)
+
+    def clear(self, index):
+        """Clear a bit
+
+        :param index: integer - index of the bit
+        """
+        self.__check(index)
+        self.__bits[index >> 3] &= ~(1 << (index & 7)) & 0xff
+
+    def count(self):
+        """Return the number of bits that are set
+        """
+        return sum(bin(byte).count('1') for byte in self.__bits)
+
+    def all(self):
+        """Return whether or not every bit is set
+        """
+        return self.count() == self.__size
+
+    def missing(self):
+        """Return the indexes of the bits that are clear
+
+        :returns: generator of the indexes in increasing order
+        """
+        for byte_index, byte in enumerate(self.__bits):
+            if byte == 0xff:
+                continue
+
+            for bit in range(8):
+                index = (byte_index << 3) + bit
+                if index < self.__size and not byte & (1 << bit):
+                    yield index
+
+    def encode(self):
+        """Encode the bitmap as text, e.g. for a Checkpoint
+
+        :returns: string
+        """
+        return base64.b64encode(zlib.compress(bytes(self.__bits))).decode()
+
+    @classmethod
+    def decode(cls, size, text):
+        """Decode a bitmap from the result of encode
+
+        :param size: number of bits of the encoded bitmap
+        :param text: string from encode
+        :returns: Bitmap
+        :raises: ValueError if text is not an encoded bitmap of that size
+        """
+        try:
+            bits = zlib.decompress(base64.b64decode(text.encode()))
+
+        except (zlib.error, ValueError) as ex:
+            raise ValueError('Invalid encoded bitmap: {0}'.format(ex))
+
+        bitmap = cls(size)
+        if len(bits) != len(bitmap.__bits):
+            raise ValueError('Encoded bitmap is not of {0} bits'.format(size))
+
+        bitmap.__bits[:] = bits
+        return bitmap
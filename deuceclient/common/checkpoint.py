@@ -0,0 +1,59 @@
+"""
+Deuce Client: Checkpoint Functionality
+"""
+import json
+import os
+import uuid
+
+
+class Checkpoint(object):
+    """JSON progress record for long running, resumable operations
+
+    The state is replaced atomically on each save so an interrupted
+    operation always finds either the previous or the new state.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: file to store the checkpoint in
+        """
+        self.__path = path
+
+    @property
+    def path(self):
+        return self.__path
+
+    def load(self):
+        """Load the saved state
+
+        :returns: the saved state or None if there is no checkpoint
+        """
+        try:
+            with open(self.__path, 'r') as checkpoint_file:
+                return json.load(checkpoint_file)
+
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        """Save the state
+
+        :param state: JSON serializable state to save
+        """
+        # Writers sharing a checkpoint, e.g. in a shared directory, each
+        # write a file of their own
+        temp_path = '{0}.{1}.tmp'.format(self.__path, uuid.uuid4().hex)
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump(state, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.__path)
+
+    def clear(self):
+        """Remove the checkpoint once the operation has completed
+        """
+        try:
+            os.remove(self.__path)
+
+        except FileNotFoundError:
+            pass
@@ -103,3 +103,14 @@ class InvalidFileSplitterType(InvalidApiObjectInstance):
     """Invalid File Splitter Type
     """
     pass
+
+
+class DeuceRequestError(RuntimeError):
+    """Request to the Deuce API failed
+
+    status_code is the HTTP status code of the response
+    """
+
+    def __init__(self, message, status_code=None):
+        super(DeuceRequestError, self).__init__(message)
+        self.status_code = status_code
@@ -0,0 +1,131 @@
+"""
+Deuce Client: Manifest Cache Functionality
+"""
+import json
+import os
+import sqlite3
+import threading
+
+# Number of stores between commits; an interrupted run loses at most this
+# many entries, which are then uploaded again
+COMMIT_INTERVAL = 100
+
+
+class ManifestCache(object):
+    """Block manifests of uploaded local files
+
+    Records, for each local file uploaded into a vault, the blocks of its
+    content along with the size, modification time and inode the file had.
+    A file whose stat fingerprint still matches can then be uploaded again
+    by assigning the recorded blocks to a new file without reading it.
+
+    The cache is a SQLite database that may be shared by concurrent
+    threads.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: file to store the cache in, created if it does not exist
+        """
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__uncommitted = 0
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock:
+            self.__db.execute(
+                'CREATE TABLE IF NOT EXISTS manifests ('
+                'project_id TEXT NOT NULL, '
+                'vault_id TEXT NOT NULL, '
+                'path TEXT NOT NULL, '
+                'size INTEGER NOT NULL, '
+                'mtime_ns INTEGER NOT NULL, '
+                'inode INTEGER NOT NULL, '
+                'length INTEGER NOT NULL, '
+                'manifest TEXT NOT NULL, '
+                'PRIMARY KEY (project_id, vault_id, path))')
+            self.__db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def path(self):
+        return self.__path
+
+    @staticmethod
+    def __key(vault, path):
+        return (vault.project_id, vault.vault_id, os.path.abspath(path))
+
+    @staticmethod
+    def __fingerprint(stat_result):
+        return (stat_result.st_size, stat_result.st_mtime_ns,
+                stat_result.st_ino)
+
+    def lookup(self, vault, path, stat_result):
+        """Find the manifest of an unchanged file
+
+        :param vault: vault the file was uploaded into
+        :param path: path of the local file
+        :param stat_result: os.stat_result of the local file
+        :returns: (manifest, length) tuple where manifest is the list of
+                  (block_id, offset) tuples of the content of the file; None
+                  if the file was not uploaded or has changed since
+        """
+        with self.__lock:
+            row = self.__db.execute(
+                'SELECT size, mtime_ns, inode, length, manifest '
+                'FROM manifests '
+                'WHERE project_id = ? AND vault_id = ? AND path = ?',
+                self.__key(vault, path)).fetchone()
+
+        if row is None or tuple(row[:3]) != self.__fingerprint(stat_result):
+            return None
+
+        manifest = [(block_id, offset)
+                    for block_id, offset in json.loads(row[4])]
+        return (manifest, row[3])
+
+    def store(self, vault, path, stat_result, manifest, length):
+        """Record the manifest of an uploaded file
+
+        :param vault: vault the file was uploaded into
+        :param path: path of the local file
+        :param stat_result: os.stat_result of the local file from before
+                            it was read
+        :param manifest: list of (block_id, offset) tuples of its content
+        :param length: length of its content in bytes
+        """
+        with self.__lock:
+            self.__db.execute(
+                'INSERT OR REPLACE INTO manifests '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                self.__key(vault, path) + self.__fingerprint(stat_result) +
+                (length, json.dumps(manifest)))
+
+            self.__uncommitted += 1
+            if self.__uncommitted >= COMMIT_INTERVAL:
+                self.__db.commit()
+                self.__uncommitted = 0
+
+    def remove(self, vault, path):
+        """Forget the manifest of a file
+
+        :param vault: vault the file was uploaded into
+        :param path: path of the local file
+        """
+        with self.__lock:
+            self.__db.execute(
+                'DELETE FROM manifests '
+                'WHERE project_id = ? AND vault_id = ? AND path = ?',
+                self.__key(vault, path))
+            self.__uncommitted += 1
+
+    def close(self):
+        """Commit the outstanding changes and close the cache
+        """
+        with self.__lock:
+            self.__db.commit()
+            self.__db.close()
@@ -0,0 +1,121 @@
+"""
+Deuce Client: Page Cache Advice
+"""
+import os
+import stat
+
+# Bytes requested ahead of sequential reads of a local file
+DEFAULT_READAHEAD = 8 * 1024 * 1024
+
+# Bytes read before they are dropped from the page cache at once
+DROP_INTERVAL = 4 * 1024 * 1024
+
+
+class PageCacheAdvisor(object):
+    """Advises the kernel how a local file is read, using posix_fadvise
+
+    The file is declared as read sequentially and a window of readahead
+    bytes ahead of the reads is requested in advance. With drop, the ranges
+    that were read are dropped from the page cache, so reading a large file
+    once does not evict the page cache of the rest of the system.
+
+    Where posix_fadvise is unavailable, or for streams other than local
+    files, the advisor does nothing.
+    """
+
+    def __init__(self, stream, readahead=DEFAULT_READAHEAD, drop=True):
+        """
+        :param stream: file object being read
+        :param readahead: number of bytes to request ahead of the reads,
+                          0 to leave it to the kernel
+        :param drop: whether or not to drop the ranges read from the page
+                     cache
+        """
+        if readahead < 0:
+            raise ValueError('readahead must not be negative')
+
+        self.__fd = None
+        self.__readahead = readahead
+        self.__drop = drop
+
+        # End of the last read, of the range requested ahead of it and start
+        # of the range read but not dropped yet
+        self.__position = None
+        self.__advised = 0
+        self.__drop_start = 0
+
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                fileno = stream.fileno()
+                if isinstance(fileno, int):
+                    if stat.S_ISREG(os.fstat(fileno).st_mode):
+                        self.__fd = fileno
+
+            except (AttributeError, OSError, TypeError, ValueError):
+                pass
+
+        if self.__fd is not None:
+            self.__advise(0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    @property
+    def enabled(self):
+        """Return whether or not the kernel is advised
+        """
+        return self.__fd is not None
+
+    @property
+    def readahead(self):
+        return self.__readahead
+
+    @property
+    def drop(self):
+        return self.__drop
+
+    def __advise(self, offset, length, advice):
+        try:
+            os.posix_fadvise(self.__fd, offset, length, advice)
+
+        except OSError:
+            # e.g. the file was closed; give up advising
+            self.__fd = None
+
+    def read(self, offset, length):
+        """Record that a range of the file was read
+
+        :param offset: start of the range read
+        :param length: length of the range read
+        """
+        if self.__fd is None or length <= 0:
+            return
+
+        if offset != self.__position:
+            # The stream was repositioned
+            self.flush()
+            self.__drop_start = offset
+            self.__advised = offset
+
+        end = offset + length
+        self.__position = end
+
+        # The window is extended once half of it has been read
+        if self.__readahead and \
+                self.__advised - end < self.__readahead // 2:
+            start = max(self.__advised, end)
+            self.__advised = end + self.__readahead
+            self.__advise(start, self.__advised - start,
+                          os.POSIX_FADV_WILLNEED)
+
+        if end - self.__drop_start >= DROP_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Drop the ranges read so far from the page cache
+        """
+        if self.__fd is None or not self.__drop or \
+                self.__position is None or \
+                self.__position <= self.__drop_start:
+            return
+
+        self.__advise(self.__drop_start, self.__position - self.__drop_start,
+                      os.POSIX_FADV_DONTNEED)
+        self.__drop_start = self.__position
@@ -0,0 +1,133 @@
+"""
+Deuce Client: Parallel Execution Functionality
+"""
+import concurrent.futures
+import itertools
+import threading
+import time
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_DELAY = 0.5
+
+
+class RateLimiter(object):
+    """Thread-safe limit on the rate at which operations are started
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: maximum number of operations per second
+        """
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+
+        self.__interval = 1.0 / rate
+        self.__next_start = time.monotonic()
+        self.__lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return 1.0 / self.__interval
+
+    def acquire(self):
+        """Wait until the next operation may start
+        """
+        with self.__lock:
+            now = time.monotonic()
+            start_at = max(now, self.__next_start)
+            self.__next_start = start_at + self.__interval
+
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+def call_with_retry(func, retries=DEFAULT_RETRIES, retry_if=None,
+                    retry_delay=DEFAULT_RETRY_DELAY, rate_limiter=None):
+    """Call a function, retrying it on failure
+
+    :param func: callable taking no parameters
+    :param retries: integer - number of times to retry after a failure
+    :param retry_if: optional callable taking the exception raised and
+                     returning whether or not it should be retried;
+                     by default every exception is retried
+    :param retry_delay: seconds to wait before the first retry, doubled
+                        for each subsequent retry
+    :param rate_limiter: optional RateLimiter applied to every attempt
+    :returns: the result of func
+    :raises: the exception from the last attempt
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        try:
+            return func()
+
+        except Exception as ex:
+            if attempt >= retries:
+                raise
+            if retry_if is not None and not retry_if(ex):
+                raise
+
+        time.sleep(retry_delay * (2 ** attempt))
+        attempt = attempt + 1
+
+
+def map_unordered(func, items, max_workers=DEFAULT_MAX_WORKERS,
+                  rate_limit=None, retries=0, retry_if=None,
+                  retry_delay=DEFAULT_RETRY_DELAY):
+    """Run a function over a series of items on a bounded worker pool
+
+    Only a small window of items (twice the number of workers) is in flight
+    at any time so the items may be supplied by a (very large) generator
+    and results are available as soon as each item completes.
+
+    :param func: callable taking a single item
+    :param items: iterable of the items to process
+    :param max_workers: integer - maximum number of concurrent workers
+    :param rate_limit: optional maximum number of calls started per second
+                       across all of the workers
+    :param retries: integer - number of times to retry a failed item
+    :param retry_if: optional callable deciding whether or not an exception
+                     is retried (see call_with_retry)
+    :param retry_delay: seconds to wait before the first retry of an item
+    :returns: generator of (item, result, exception) tuples in completion
+              order; exception is None on success, otherwise result is None
+    """
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+
+    rate_limiter = None
+    if rate_limit is not None:
+        rate_limiter = RateLimiter(rate_limit)
+
+    def work(item):
+        return call_with_retry(lambda: func(item),
+                               retries=retries,
+                               retry_if=retry_if,
+                               retry_delay=retry_delay,
+                               rate_limiter=rate_limiter)
+
+    items = iter(items)
+    window = max_workers * 2
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        pending = {executor.submit(work, item): item
+                   for item in itertools.islice(items, window)}
+
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    yield (item, future.result(), None)
+                else:
+                    yield (item, None, error)
+
+            for item in itertools.islice(items, len(done)):
+                pending[executor.submit(work, item)] = item
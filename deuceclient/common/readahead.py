@@ -0,0 +1,119 @@
+"""
+Deuce Client: Read-Ahead Functionality
+"""
+import queue
+import threading
+
+
+class ReadAheadReader(object):
+    """Reads a stream ahead of its consumer in a background thread
+
+    The stream is read in chunks into a ring of buffers that are allocated
+    once and reused, so reading does not allocate memory per chunk. A chunk
+    returned by get is only valid until the next call to get, which hands
+    its buffer back to the background thread to be filled again.
+
+    The buffers use at most budget bytes, but there are at least two of
+    them so the next chunk is read while the consumer processes the current
+    one.
+    """
+
+    def __init__(self, read_into, chunk_size, budget):
+        """
+        :param read_into: callable reading the next chunk of the stream
+                          into the memoryview passed to it, which it fills
+                          unless the end of the stream is reached; it
+                          returns a tuple of the offset of the chunk, its
+                          length and either None or, instead of filling the
+                          memoryview, the data of the chunk
+        :param chunk_size: size of the chunks in bytes
+        :param budget: number of bytes to use for the buffers
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        if budget < 0:
+            raise ValueError('budget must not be negative')
+
+        self.__read_into = read_into
+        self.__chunk_size = chunk_size
+        self.__free = queue.Queue()
+        self.__filled = queue.Queue()
+        self.__stop = threading.Event()
+        self.__current = None
+        self.__end = None
+        self.__error = None
+
+        for _ in range(max(2, budget // chunk_size)):
+            self.__free.put(bytearray(chunk_size))
+
+        self.__thread = threading.Thread(target=self.__run,
+                                         name='deuceclient-readahead',
+                                         daemon=True)
+        self.__thread.start()
+
+    @property
+    def chunk_size(self):
+        return self.__chunk_size
+
+    def __run(self):
+        try:
+            while True:
+                buffer = self.__free.get()
+                if self.__stop.is_set():
+                    return
+
+                with memoryview(buffer) as view:
+                    offset, length, data = self.__read_into(view)
+                self.__filled.put((offset, buffer, length, data, None))
+                if length < self.__chunk_size:
+                    # The end of the stream
+                    return
+
+        except Exception as ex:
+            self.__filled.put((None, None, 0, None, ex))
+
+    def __release(self):
+        if self.__current is not None:
+            self.__free.put(self.__current)
+            self.__current = None
+
+    def get(self):
+        """Return the next chunk of the stream
+
+        :returns: tuple of the offset of the chunk and its data, which is
+                  empty at the end of the stream; the data is only valid
+                  until the next call
+        :raises: the exception raised reading the chunk
+        """
+        self.__release()
+        if self.__error is not None:
+            raise self.__error
+        if self.__end is not None:
+            return (self.__end, b'')
+
+        offset, buffer, length, data, error = self.__filled.get()
+        if error is not None:
+            self.__error = error
+            raise error
+
+        if length < self.__chunk_size:
+            self.__end = offset + length
+
+        if data is not None:
+            self.__free.put(buffer)
+            return (offset, data)
+
+        self.__current = buffer
+        if length == len(buffer):
+            return (offset, buffer)
+        return (offset, memoryview(buffer)[:length])
+
+    def close(self):
+        """Stop reading ahead
+
+        Waits for the chunk being read, if any, to be read.
+        """
+        self.__stop.set()
+        self.__release()
+        self.__free.put(None)
+        self.__thread.join()
@@ -0,0 +1,59 @@
+"""
+Deuce Client: Key Space Sharding Functionality
+"""
+from deuceclient.common.validation import METADATA_BLOCK_ID_LEN
+
+# Block IDs are SHA1 hex digests so the key space is evenly populated
+KEY_SPACE_SIZE = 16 ** METADATA_BLOCK_ID_LEN
+
+# Smallest UUID, used to start a storage block listing at a block id
+MIN_UUID = '00000000-0000-0000-0000-000000000000'
+
+
+def key_space_shards(count, worker=0, workers=1):
+    """Split the block id key space into contiguous shards of equal size
+
+    With several workers, e.g. one per machine, the key space is first
+    divided between the workers and only the part of the given worker is
+    split into shards, so the workers share out the key space without
+    overlapping. When count * workers is a power of 16 the shards are the
+    block ids sharing a hex prefix.
+
+    :param count: integer - number of shards
+    :param worker: integer - index of the worker, from 0 to workers - 1
+    :param workers: integer - number of workers sharing the key space
+    :returns: list of (start, end) tuples of the block ids bounding each
+              shard; start is inclusive, end is exclusive and None for the
+              last shard of the key space
+    :raises: ValueError if count or workers is less than 1 or worker is not
+             the index of one of the workers
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    if not 0 <= worker < workers:
+        raise ValueError('worker must be from 0 to {0}'.format(workers - 1))
+
+    total = count * workers
+    first = worker * count
+    bounds = ['{0:0{1}x}'.format(KEY_SPACE_SIZE * index // total,
+                                 METADATA_BLOCK_ID_LEN)
+              for index in range(first, first + count)]
+    end = None
+    if worker < workers - 1:
+        end = '{0:0{1}x}'.format(KEY_SPACE_SIZE * (first + count) // total,
+                                 METADATA_BLOCK_ID_LEN)
+    return list(zip(bounds, bounds[1:] + [end]))
+
+
+def storage_block_marker(block_id):
+    """Return the listing marker for the first storage block of a block id
+
+    :param block_id: metadata block id or None
+    :returns: storage block id usable as a storage block listing marker,
+              None if block_id is None
+    """
+    if block_id is None:
+        return None
+    return '{0}_{1}'.format(block_id, MIN_UUID)
@@ -0,0 +1,171 @@
+"""
+Deuce Client: Sparse File Functionality
+"""
+import functools
+import os
+import stat
+
+import deuceclient.api.block as api_block
+
+# Linux fallocate(2) mode deallocating a range without changing the size
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+# Size of the writes filling a range with zeros where holes are unsupported
+ZERO_FILL_SIZE = 1024 * 1024
+
+
+@functools.lru_cache(maxsize=8)
+def zeros(size):
+    """Return size zero bytes
+
+    The same object is returned for the same size so all-zero blocks share
+    their data.
+    """
+    return bytes(size)
+
+
+@functools.lru_cache(maxsize=64)
+def zero_block_id(size):
+    """Return the id of the block of size zero bytes
+    """
+    return api_block.Block.make_id(zeros(size))
+
+
+def is_zero_block(block_id, size):
+    """Return whether or not a block is all zeros
+
+    :param block_id: id of the block
+    :param size: size of the block in bytes, None if unknown
+    """
+    return size is not None and size > 0 and block_id == zero_block_id(size)
+
+
+class HoleMap(object):
+    """Finds the holes of a sparse local file
+
+    Uses lseek with SEEK_DATA and SEEK_HOLE, which are only available on
+    some platforms and file systems; elsewhere a file has no holes.
+    """
+
+    def __init__(self, stream):
+        """
+        :param stream: seekable file object of a local file
+        """
+        self.__stream = stream
+        self.__region = None
+
+        self.__size = None
+        if hasattr(os, 'SEEK_DATA'):
+            try:
+                fileno = stream.fileno()
+                if isinstance(fileno, int):
+                    stat_result = os.fstat(fileno)
+                    if stat.S_ISREG(stat_result.st_mode):
+                        self.__size = stat_result.st_size
+
+            except (AttributeError, OSError, TypeError, ValueError):
+                pass
+
+    @property
+    def enabled(self):
+        """Return whether or not the holes of the file can be found
+        """
+        return self.__size is not None
+
+    def __find_region(self, offset):
+        """Find the data or hole region containing an offset
+
+        The position of the stream is restored afterwards.
+
+        :returns: (start, end, is_hole) tuple
+        """
+        position = self.__stream.tell()
+        try:
+            try:
+                data_start = self.__stream.seek(offset, os.SEEK_DATA)
+
+            except OSError:
+                # ENXIO, only holes from offset to the end of the file
+                data_start = self.__size
+
+            if data_start > offset:
+                return (offset, data_start, True)
+
+            try:
+                hole_start = self.__stream.seek(offset, os.SEEK_HOLE)
+
+            except OSError:
+                hole_start = self.__size
+            return (offset, hole_start, False)
+
+        finally:
+            self.__stream.seek(position)
+
+    def hole_size(self, offset, size):
+        """Return how much of a range of the file is a hole
+
+        :param offset: start of the range
+        :param size: length of the range
+        :returns: size if the range is entirely a hole or beyond the end of
+                  the file, otherwise 0
+        """
+        if self.__size is None or size <= 0 or offset >= self.__size:
+            return 0
+
+        if self.__region is None or \
+                not self.__region[0] <= offset < self.__region[1]:
+            try:
+                self.__region = self.__find_region(offset)
+
+            except (OSError, ValueError):
+                # The file system does not support finding holes
+                self.__size = None
+                return 0
+
+        start, end, is_hole = self.__region
+        if is_hole and offset + size <= end:
+            return size
+        return 0
+
+
+def punch_hole(fd, offset, length):
+    """Zero a range of a file, deallocating it where possible
+
+    :param fd: file descriptor of the file opened for writing
+    :param offset: start of the range
+    :param length: length of the range
+    """
+    if length <= 0:
+        return
+
+    if _fallocate_punch_hole(fd, offset, length):
+        return
+
+    written = 0
+    while written < length:
+        size = min(ZERO_FILL_SIZE, length - written)
+        os.pwrite(fd, zeros(size), offset + written)
+        written += size
+
+
+def _fallocate_punch_hole(fd, offset, length):
+    """Deallocate a range of a file with Linux fallocate(2)
+
+    :returns: True on success, False if it is unsupported
+    """
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fallocate = libc.fallocate
+
+    except (ImportError, OSError, AttributeError):
+        return False
+
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int,
+                          ctypes.c_longlong, ctypes.c_longlong]
+    fallocate.restype = ctypes.c_int
+    return fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE,
+                     offset, length) == 0
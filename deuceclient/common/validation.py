@@ -1,33 +1,213 @@
 """
 Deuce Client: Validation Functionality
 """
+import functools
+import inspect
 import re
+import string
+import threading
 
+import stoplight
 from stoplight import Rule, ValidationFailed, validation_function
 
 import deuceclient.common.errors as errors
 
 PROJECT_ID_MAX_LEN = 128
 VAULT_ID_MAX_LEN = 128
-OPENSTRING_REGEX = re.compile('^[a-zA-Z0-9_\-]+$')
+METADATA_BLOCK_ID_LEN = 40
+UUID_LEN = 36
+UUID_HYPHEN_POSITIONS = (8, 13, 18, 23)
+STORAGE_BLOCK_ID_LEN = METADATA_BLOCK_ID_LEN + 1 + UUID_LEN
+# The id regular expressions match the whole value; \Z unlike $ does not
+# match before a trailing newline
+OPENSTRING_REGEX = re.compile('^[a-zA-Z0-9_\\-]+\\Z')
 PROJECT_ID_REGEX = OPENSTRING_REGEX
 VAULT_ID_REGEX = OPENSTRING_REGEX
-METADATA_BLOCK_ID_REGEX = re.compile('\\b[0-9a-f]{40}\\b')
-UUID_REGEX = re.compile(
-    '[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+METADATA_BLOCK_ID_PATTERN = '[0-9a-f]{40}'
+METADATA_BLOCK_ID_REGEX = re.compile(
+    '^' + METADATA_BLOCK_ID_PATTERN + '\\Z')
+UUID_PATTERN = '[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+UUID_REGEX = re.compile('^' + UUID_PATTERN + '\\Z')
 FILE_ID_REGEX = UUID_REGEX
 STORAGE_BLOCK_ID_REGEX = re.compile(
-    METADATA_BLOCK_ID_REGEX.pattern[2:-2] + '_' + UUID_REGEX.pattern
+    '^' + METADATA_BLOCK_ID_PATTERN + '_' + UUID_PATTERN + '\\Z'
 )
 OFFSET_REGEX = re.compile(
     '(?<![-.])\\b[0-9]+\\b(?!\\.[0-9])')
 LIMIT_REGEX = re.compile(
     '(?<![-.])\\b[0-9]+\\b(?!\\.[0-9])')
 
+# Types of the values that are not re-validated, see validate; the values of
+# other types may have changed since they were validated
+TRUSTED_TYPES = (str, bytes, int, type(None))
+
+# Character sets used by the non-strict (fast) checks; they accept exactly
+# what the regular expressions above match
+HEX_CHARS = frozenset(string.hexdigits.lower())
+OPENSTRING_CHARS = frozenset(string.ascii_letters + string.digits + '_-')
+
+# Validation state
+#   strict - validate every call using the regular expressions (default)
+#   trusted - per-thread record of the values the outer-most validated call
+#             has validated when strict mode is off, so that validated calls
+#             made while servicing it skip re-validating the same values
+_validation_state = {
+    'strict': True
+}
+_trusted = threading.local()
+
+
+def set_strict(strict):
+    """Enable or disable strict validation
+
+    When strict (the default) every validated call runs its full set of
+    rules. When not strict, the same rules accept and reject the same
+    values but ids are checked with cheap length/character-set checks, and
+    validated calls made while servicing a validated call do not re-check
+    the very same (immutable) values with the same rules.
+
+    :param strict: bool - True for strict validation, False for the fast path
+    """
+    _validation_state['strict'] = bool(strict)
+
+
+def is_strict():
+    """Return whether strict validation is enabled
+    """
+    return _validation_state['strict']
+
+
+def validate(**rules):
+    """Validates a function's input using the specified set of rules
+
+    Drop-in replacement for stoplight.validate that honors the strict
+    validation switch (see set_strict)
+    """
+    def decorator(func):
+        checked = stoplight.validate(**rules)(func)
+        params = inspect.getfullargspec(func).args
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _validation_state['strict']:
+                return checked(*args, **kwargs)
+
+            # (rule, value) pairs keyed by their ids; the values are kept so
+            # that their ids are not reused during the call
+            validated = getattr(_trusted, 'validated', None)
+            outer_most = validated is None
+            if outer_most:
+                validated = _trusted.validated = {}
+
+            try:
+                values = dict(zip(params, args))
+                values.update(kwargs)
+                for param, rule in rules.items():
+                    getval = rule.getter or values.get
+                    value = getval(param)
+                    key = (id(rule), id(value))
+                    if key in validated:
+                        continue
+
+                    if not _apply_rule(rule, value):
+                        # stoplight.validate does not call the function
+                        # either
+                        return None
+
+                    if isinstance(value, TRUSTED_TYPES):
+                        validated[key] = (rule, value)
+
+                return func(*args, **kwargs)
+
+            finally:
+                if outer_most:
+                    _trusted.validated = None
+        return wrapper
+    return decorator
+
+
+def _apply_rule(rule, value):
+    """Validate a value with a rule and its nested rules
+
+    Makes the same checks as stoplight.validate does for a parameter.
+
+    :returns: True if the value is valid, False after calling the error
+              function of the rule that failed otherwise
+    """
+    try:
+        rule.vfunc(value)
+    except ValidationFailed:
+        rule.errfunc()
+        return False
+
+    for nested_rule in rule.nested_rules:
+        try:
+            nested_rule.vfunc(nested_rule.getter(value))
+        except ValidationFailed:
+            nested_rule.errfunc()
+            return False
+
+    return True
+
+
+def validate_value(rule, value):
+    """Validate a value using a rule outside of a validated call
+
+    For iterable parameters that are turned into a list before they are
+    validated, so that validating a generator does not consume it.
+
+    :param rule: the stoplight Rule to validate the value with
+    :param value: the value to validate
+    :raises: the error of the rule if the value is not valid
+    """
+    if not _apply_rule(rule, value):
+        raise ValidationFailed('Invalid value ({0})'.format(value))
+
+
+def _is_hex(value, length):
+    return len(value) == length and HEX_CHARS.issuperset(value)
+
+
+def _is_uuid(value):
+    if len(value) != UUID_LEN:
+        return False
+    for position in UUID_HYPHEN_POSITIONS:
+        if value[position] != '-':
+            return False
+    return (value.count('-') == len(UUID_HYPHEN_POSITIONS) and
+            HEX_CHARS.issuperset(value.replace('-', '')))
+
+
+def _match_openstring(regex, value):
+    if _validation_state['strict'] or not isinstance(value, str):
+        return regex.match(value)
+    return len(value) and OPENSTRING_CHARS.issuperset(value)
+
+
+def _match_metadata_block_id(value):
+    if _validation_state['strict'] or not isinstance(value, str):
+        return METADATA_BLOCK_ID_REGEX.match(value)
+    return _is_hex(value, METADATA_BLOCK_ID_LEN)
+
+
+def _match_file_id(value):
+    if _validation_state['strict'] or not isinstance(value, str):
+        return FILE_ID_REGEX.match(value)
+    return _is_uuid(value)
+
+
+def _match_storage_block_id(value):
+    if _validation_state['strict'] or not isinstance(value, str):
+        return STORAGE_BLOCK_ID_REGEX.match(value)
+    return (len(value) == STORAGE_BLOCK_ID_LEN and
+            value[METADATA_BLOCK_ID_LEN] == '_' and
+            _is_hex(value[:METADATA_BLOCK_ID_LEN], METADATA_BLOCK_ID_LEN) and
+            _is_uuid(value[METADATA_BLOCK_ID_LEN + 1:]))
+
 
 @validation_function
 def val_project_id(value):
-    if not PROJECT_ID_REGEX.match(value):
+    if not _match_openstring(PROJECT_ID_REGEX, value):
         raise ValidationFailed('Invalid project id ({0})'.format(value))
 
     if len(value) > PROJECT_ID_MAX_LEN:
@@ -37,7 +217,7 @@ def val_project_id(value):
 
 @validation_function
 def val_vault_id(value):
-    if not VAULT_ID_REGEX.match(value):
+    if not _match_openstring(VAULT_ID_REGEX, value):
         raise ValidationFailed('Invalid vault id ({0})'.format(value))
 
     if len(value) > VAULT_ID_MAX_LEN:
@@ -47,7 +227,7 @@ def val_vault_id(value):
 
 @validation_function
 def val_file_id(value):
-    if not FILE_ID_REGEX.match(value):
+    if not _match_file_id(value):
         raise ValidationFailed('Invalid File ID ({0})'.format(value))
 
 
@@ -66,7 +246,7 @@ def val_metadata_block_id(value):
     if not (isinstance(value, str) or isinstance(value, bytes)):
         raise ValidationFailed('Invalid Block ID ({0}) Type {1})'
                                .format(value, type(value)))
-    if not METADATA_BLOCK_ID_REGEX.match(value):
+    if not _match_metadata_block_id(value):
         raise ValidationFailed('Invalid Block ID ({0})'.format(value))
 
 
@@ -88,7 +268,7 @@ def val_storage_block_id(value):
     if not (isinstance(value, str) or isinstance(value, bytes)):
         raise ValidationFailed('Invalid Storage Block ID ({0}) Type {1})'
                                .format(value, type(value)))
-    if not STORAGE_BLOCK_ID_REGEX.match(value):
+    if not _match_storage_block_id(value):
         raise ValidationFailed('Invalid Storage Block ID ({0})'.format(value))
 
 
@@ -177,13 +357,6 @@ def file_splitter_input_stream_validation(value):
     except AttributeError:
         raise ValidationFailed('input stream must have read method')
 
-    try:
-        # tell is used to determine the starting offset into the
-        # data stream that the block data was read from
-        getattr(value, 'tell')
-    except AttributeError:
-        raise ValidationFailed('input stream must have tell method')
-
 
 def _abort(error_code):
     abort_errors = {
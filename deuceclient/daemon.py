@@ -0,0 +1,462 @@
+"""
+Deuce Client Daemon
+
+An optional long-lived process that runs shell commands for short-lived
+shell invocations. It keeps the authenticated clients of earlier commands,
+with their tokens and open connections, so a command forwarded to it skips
+authentication and connection setup.
+
+    deuce daemon start [--socket PATH]
+    deuce daemon status [--socket PATH]
+    deuce daemon stop [--socket PATH]
+
+The daemon listens on a Unix socket only its owner may connect to. Shell
+commands are forwarded to it whenever it is running unless --no-daemon is
+given.
+"""
+from __future__ import print_function
+import argparse
+import codecs
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+
+DEFAULT_SOCKET_NAME = 'deuce-client.sock'
+
+
+def daemon_socket_path(path=None):
+    """Return the path of the daemon socket
+
+    :param path: explicit path, used as is if given
+    :returns: path from DEUCE_DAEMON_SOCKET, otherwise in XDG_RUNTIME_DIR
+              or ~/.cache/deuce
+    """
+    if path is None:
+        path = os.environ.get('DEUCE_DAEMON_SOCKET')
+
+    if path is None:
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR',
+                                     os.path.join('~', '.cache', 'deuce'))
+        path = os.path.join(runtime_dir, DEFAULT_SOCKET_NAME)
+
+    return os.path.expanduser(path)
+
+
+def _send(stream, message):
+    stream.write('{0}\n'.format(json.dumps(message)))
+    stream.flush()
+
+
+def _request(socket_path, message):
+    """Send a request to the daemon
+
+    :returns: generator of the response messages, None if the daemon is not
+              running
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+
+    except OSError:
+        connection.close()
+        return None
+
+    def responses():
+        with connection, connection.makefile('rw') as stream:
+            _send(stream, message)
+            for line in stream:
+                yield json.loads(line)
+
+    return responses()
+
+
+def forward(argv, socket_path=None, stdout=None, stderr=None):
+    """Run a shell command in the daemon
+
+    Commands reading from stdin or writing to stdout, given - as a file,
+    are never forwarded.
+
+    :param argv: shell arguments of the command
+    :param socket_path: daemon socket, see daemon_socket_path
+    :param stdout: stream for the output of the command, default sys.stdout
+    :param stderr: stream for the errors of the command, default sys.stderr
+    :returns: exit code of the command, None if it was not forwarded
+    """
+    if any(arg == '-' or arg.endswith('=-') for arg in argv):
+        return None
+
+    responses = _request(daemon_socket_path(socket_path),
+                         {'argv': argv, 'cwd': os.getcwd()})
+    if responses is None:
+        return None
+
+    streams = {
+        'stdout': sys.stdout if stdout is None else stdout,
+        'stderr': sys.stderr if stderr is None else stderr
+    }
+    for message in responses:
+        for name, stream in streams.items():
+            if name in message:
+                stream.write(message[name])
+                stream.flush()
+
+        if 'exit' in message:
+            return message['exit']
+
+    streams['stderr'].write('Error: the client daemon stopped before the '
+                            'command completed\n')
+    return 1
+
+
+class ClientPool(object):
+    """Authenticated clients kept between commands
+
+    Clients are not thread-safe so each concurrent command gets a client of
+    its own. Clients for the same key share one authenticator, and
+    therefore one token.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__idle = {}
+        self.__authenticators = {}
+
+    def lease(self):
+        """Start lending clients to a command
+
+        :returns: ClientLease
+        """
+        return ClientLease(self)
+
+    def checkout(self, key, factory):
+        """Take a client out of the pool
+
+        :param key: string identifying the server and credentials
+        :param factory: callable returning a new (authenticator, client)
+        :returns: (authenticator, client) tuple
+        """
+        with self.__lock:
+            idle = self.__idle.get(key)
+            if idle:
+                return idle.pop()
+
+        new_authenticator, client = factory()
+        with self.__lock:
+            authenticator = self.__authenticators.setdefault(
+                key, new_authenticator)
+
+        if authenticator is not new_authenticator:
+            # Share the token of the other clients for the key
+            new_authenticator.StopTokenRefresh()
+            client = type(client)(authenticator,
+                                  client.apihost,
+                                  sslenabled=client.sslenabled,
+                                  max_workers=client.max_workers)
+        return (authenticator, client)
+
+    def checkin(self, key, entry):
+        """Return a client to the pool
+
+        :param key: string identifying the server and credentials
+        :param entry: (authenticator, client) tuple from checkout
+        """
+        with self.__lock:
+            self.__idle.setdefault(key, []).append(entry)
+
+    def __len__(self):
+        with self.__lock:
+            return sum(len(idle) for idle in self.__idle.values())
+
+    def close(self):
+        """Stop refreshing the tokens of the clients and drop the clients
+        """
+        with self.__lock:
+            authenticators = list(self.__authenticators.values())
+            self.__authenticators = {}
+            self.__idle = {}
+
+        for authenticator in authenticators:
+            authenticator.StopTokenRefresh()
+
+
+class ClientLease(object):
+    """Clients lent to a single command
+    """
+
+    def __init__(self, pool):
+        self.__pool = pool
+        self.__leased = []
+
+    def get(self, key, factory):
+        """Borrow a client, see ClientPool.checkout
+        """
+        entry = self.__pool.checkout(key, factory)
+        self.__leased.append((key, entry))
+        return entry
+
+    def release(self):
+        """Return the borrowed clients to the pool
+        """
+        for key, entry in self.__leased:
+            self.__pool.checkin(key, entry)
+        self.__leased = []
+
+
+class ThreadOutput(io.TextIOBase):
+    """Output stream that can be redirected for a single thread
+
+    Commands print their output; installed as sys.stdout (or sys.stderr) it
+    lets each command send its output to its own caller.
+    """
+
+    def __init__(self, default):
+        self.__default = default
+        self.__local = threading.local()
+        self.__buffer = ThreadBinaryOutput(self)
+
+    @contextlib.contextmanager
+    def redirect(self, write):
+        """Redirect the output of the calling thread
+
+        :param write: callable taking the text written
+        """
+        self.__local.write = write
+        self.__local.decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            yield
+        finally:
+            self.__local.write = None
+
+    @property
+    def buffer(self):
+        """Binary stream of the output, like the buffer of sys.stdout
+        """
+        return self.__buffer
+
+    def writable(self):
+        return True
+
+    def write_bytes(self, data):
+        """Write binary output, see ThreadBinaryOutput
+        """
+        write = getattr(self.__local, 'write', None)
+        if write is None:
+            return self.__default.buffer.write(data)
+
+        # Redirected output is sent on as text
+        write(self.__local.decoder.decode(bytes(data)))
+        return len(data)
+
+    def write(self, text):
+        write = getattr(self.__local, 'write', None)
+        if write is None:
+            return self.__default.write(text)
+
+        write(text)
+        return len(text)
+
+    def flush(self):
+        if getattr(self.__local, 'write', None) is None:
+            self.__default.flush()
+
+
+class ThreadBinaryOutput(io.BufferedIOBase):
+    """Binary side of a ThreadOutput
+
+    Output redirected for a thread must be UTF-8 text since it is sent on
+    as text; a UnicodeDecodeError is raised for anything else.
+    """
+
+    def __init__(self, output):
+        self.__output = output
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.__output.write_bytes(data)
+
+    def flush(self):
+        self.__output.flush()
+
+
+def call_command(arguments, log):
+    """Call the function of a parsed shell command
+
+    Files opened while parsing the arguments are closed afterwards.
+
+    :param arguments: argparse.Namespace of the command
+    :param log: logger for the command
+    :returns: exit code of the command
+    """
+    try:
+        return arguments.func(log, arguments) or 0
+
+    except SystemExit as ex:
+        if ex.code is None or isinstance(ex.code, int):
+            return ex.code or 0
+        print(ex.code, file=sys.stderr)
+        return 1
+
+    except Exception as ex:
+        log.exception('Command failed: {0}'.format(ex))
+        print('Error: {0}'.format(ex), file=sys.stderr)
+        return 1
+
+    finally:
+        for value in vars(arguments).values():
+            if isinstance(value, io.IOBase):
+                value.close()
+
+
+def run_command(argv, cwd, client_pool, log):
+    """Run a shell command with clients from the pool
+
+    :param argv: shell arguments of the command
+    :param cwd: directory relative paths in the arguments are relative to
+    :param client_pool: ClientPool
+    :param log: logger for the command
+    :returns: exit code of the command
+    """
+    import deuceclient.shell as shell
+
+    try:
+        arguments = shell.build_parser(cwd=cwd).parse_args(argv)
+
+    except SystemExit as ex:
+        return ex.code or 0
+
+    lease = client_pool.lease()
+    try:
+        arguments.client_pool = lease
+        return call_command(arguments, log)
+
+    finally:
+        lease.release()
+
+
+def serve(socket_path, log=None):
+    """Run the daemon until it is stopped
+
+    :param socket_path: socket to listen on
+    :param log: logger for the daemon
+    :returns: exit code
+    """
+    import socketserver
+
+    if log is None:
+        log = logging.getLogger(__name__)
+
+    if _request(socket_path, {'command': 'status'}) is not None:
+        print('The client daemon is already running on {0}'.format(
+            socket_path), file=sys.stderr)
+        return 1
+
+    socket_dir = os.path.dirname(socket_path)
+    if socket_dir:
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    if os.path.exists(socket_path):
+        # left behind by a daemon that did not exit cleanly
+        os.remove(socket_path)
+
+    client_pool = ClientPool()
+    original_stdout, original_stderr = sys.stdout, sys.stderr
+    stdout = ThreadOutput(original_stdout)
+    stderr = ThreadOutput(original_stderr)
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def send(self, message):
+            try:
+                self.wfile.write('{0}\n'.format(
+                    json.dumps(message)).encode())
+                self.wfile.flush()
+
+            except OSError:
+                # The caller went away, the command runs to completion
+                pass
+
+        def handle(self):
+            request = json.loads(self.rfile.readline().decode())
+            command = request.get('command', 'run')
+
+            if command == 'status':
+                self.send({'stdout': 'Running (pid {0}, {1} idle clients)'
+                           '\n'.format(os.getpid(), len(client_pool)),
+                           'exit': 0})
+
+            elif command == 'stop':
+                self.send({'exit': 0})
+                threading.Thread(target=self.server.shutdown).start()
+
+            else:
+                def send_stdout(text):
+                    self.send({'stdout': text})
+
+                def send_stderr(text):
+                    self.send({'stderr': text})
+
+                with stdout.redirect(send_stdout), \
+                        stderr.redirect(send_stderr):
+                    exit_code = run_command(request['argv'], request['cwd'],
+                                            client_pool, log)
+                self.send({'exit': exit_code})
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # Only the owner may connect, the daemon holds their credentials
+    umask = os.umask(0o177)
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(umask)
+
+    sys.stdout, sys.stderr = stdout, stderr
+    log.info('Client daemon listening on {0}'.format(socket_path))
+    try:
+        server.serve_forever()
+    finally:
+        sys.stdout, sys.stderr = original_stdout, original_stderr
+        server.server_close()
+        os.remove(socket_path)
+        client_pool.close()
+    return 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        prog='deuce daemon',
+        description='Deuce Client Daemon')
+    arg_parser.add_argument('--socket',
+                            default=None,
+                            type=str,
+                            required=False,
+                            help='Socket to listen on. Default: {0}'.format(
+                                daemon_socket_path()))
+    arg_parser.add_argument('command',
+                            choices=['start', 'status', 'stop'],
+                            help='Start the daemon (in the foreground), '
+                            'report whether it is running or stop it')
+    arguments = arg_parser.parse_args(argv)
+    socket_path = daemon_socket_path(arguments.socket)
+
+    if arguments.command == 'start':
+        return serve(socket_path)
+
+    responses = _request(socket_path, {'command': arguments.command})
+    if responses is None:
+        print('The client daemon is not running')
+        return 1
+
+    for message in responses:
+        if 'stdout' in message:
+            sys.stdout.write(message['stdout'])
+        if 'exit' in message:
+            return message['exit']
+    return 1
@@ -6,15 +6,19 @@ from __future__ import print_function
 import argparse
 import json
 import logging
+import os
 import pprint
 import sys
+import time
 
-import deuceclient.api as api
-import deuceclient.auth.nonauth as noauth
-import deuceclient.auth.openstackauth as openstackauth
-import deuceclient.auth.rackspaceauth as rackspaceauth
-import deuceclient.client.deuce as client
-import deuceclient.utils as utils
+import deuceclient.auth.tokencache as tokencache
+from deuceclient.common.checkpoint import Checkpoint
+import deuceclient.common.pagecache as pagecache
+
+# NOTE: The API, client and authentication modules pull in large
+# dependencies (requests, stoplight, keystoneclient) so they are imported
+# where they are used; only what the selected backend and operation need
+# is loaded and short commands start quickly.
 
 
 class ProgramArgumentError(ValueError):
@@ -108,12 +112,15 @@ def __api_operation_prep(log, arguments):
 
     asp = None
     if auth_provider == 'openstack':
+        import deuceclient.auth.openstackauth as openstackauth
         asp = openstackauth.OpenStackAuthentication
 
     elif auth_provider == 'rackspace':
+        import deuceclient.auth.rackspaceauth as rackspaceauth
         asp = rackspaceauth.RackspaceAuthentication
 
     elif auth_provider == 'none':
+        import deuceclient.auth.nonauth as noauth
         asp = noauth.NonAuthAuthentication
 
     else:
@@ -121,18 +128,38 @@ def __api_operation_prep(log, arguments):
                          ': {0:}'.format(auth_provider))
         sys.exit(-4)
 
-    auth_engine = asp(userid=auth_data['user']['value'],
-                      usertype=auth_data['user']['type'],
-                      credentials=auth_data['credentials']['value'],
-                      auth_method=auth_data['credentials']['type'],
-                      datacenter=datacenter,
-                      auth_url=auth_url)
+    auth_args = {}
+    if arguments.token_cache is not None and auth_provider != 'none':
+        auth_args['token_cache'] = tokencache.TokenCache(
+            arguments.token_cache or None)
 
     # Deuce URL
     uri = arguments.url
 
-    # Setup Agent Access
-    deuce = client.DeuceClient(auth_engine, uri)
+    def setup_access():
+        auth_engine = asp(userid=auth_data['user']['value'],
+                          usertype=auth_data['user']['type'],
+                          credentials=auth_data['credentials']['value'],
+                          auth_method=auth_data['credentials']['type'],
+                          datacenter=datacenter,
+                          auth_url=auth_url,
+                          **auth_args)
+
+        # Setup Agent Access
+        import deuceclient.client.deuce as client
+        deuce = client.DeuceClient(auth_engine, uri)
+
+        return (auth_engine, deuce)
+
+    # The client daemon provides authenticated clients it keeps between
+    # commands
+    client_pool = getattr(arguments, 'client_pool', None)
+    if client_pool is not None:
+        key = json.dumps([auth_provider, auth_url, datacenter, uri,
+                          user_data], sort_keys=True)
+        auth_engine, deuce = client_pool.get(key, setup_access)
+    else:
+        auth_engine, deuce = setup_access()
 
     return (auth_engine, deuce, uri)
 
@@ -143,6 +170,8 @@ def vault_list(log, arguments):
     """
     auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
 
+    import deuceclient.api as api
+
     # We need to authenticate to get the project id
     auth_engine.AuthToken
 
@@ -217,6 +246,45 @@ def vault_delete(log, arguments):
         print('Error: {0}'.format(str(ex)))
 
 
+def vault_purge(log, arguments):
+    """
+    Delete everything in the vault with the given name and then the vault
+    """
+    auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
+
+    def report_progress(status):
+        remaining = status['remaining']
+        if remaining is None:
+            remaining = 'unknown'
+        print('{0:}: deleted {1:}, failed {2:}, remaining {3:} '
+              '({4:.1f}/s)'.format(status['stage'], status['deleted'],
+                                   status['failed'], remaining,
+                                   status['rate']))
+
+    try:
+        vault = deuceclient.GetVault(arguments.vault_name)
+
+        checkpoint = None
+        if arguments.checkpoint is not None:
+            checkpoint = Checkpoint(arguments.checkpoint)
+
+        summary = deuceclient.PurgeVault(vault,
+                                         max_workers=arguments.jobs,
+                                         rate_limit=arguments.rate_limit,
+                                         limit=arguments.limit,
+                                         checkpoint=checkpoint,
+                                         progress=report_progress)
+
+        if summary['vault_deleted']:
+            print('Purged and Deleted Vault {0}'.format(arguments.vault_name))
+        else:
+            print('Purged Vault {0}; some entries could not be deleted so '
+                  'the Vault was not deleted'.format(arguments.vault_name))
+
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)))
+
+
 def block_list(log, arguments):
     """
     List the blocks in a vault
@@ -243,12 +311,63 @@ def block_list(log, arguments):
         print('Error: {0}'.format(str(ex)))
 
 
+def block_gc(log, arguments):
+    """
+    Delete the orphaned blocks in block storage
+    """
+    auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
+
+    action = 'deletable' if arguments.dry_run else 'deleted'
+
+    def report_progress(status):
+        print('shards {0:}/{1:}: scanned {2:}, orphaned {3:}, {4:} {5:}, '
+              'deferred {6:}, failed {7:} ({8:.1f}/s)'.format(
+                  status['shards_done'], arguments.shards,
+                  status['scanned'], status['orphaned'], action,
+                  status['deleted'], status['deferred'], status['failed'],
+                  status['rate']))
+
+    try:
+        vault = deuceclient.GetVault(arguments.vault_name)
+
+        checkpoint = None
+        if arguments.checkpoint is not None:
+            checkpoint = Checkpoint(arguments.checkpoint)
+
+        grace_period = arguments.grace_period
+        if grace_period is None:
+            import deuceclient.client.deuce as client
+            grace_period = client.DEFAULT_GC_GRACE_PERIOD
+
+        summary = deuceclient.CollectOrphanedStorageBlocks(
+            vault,
+            grace_period=grace_period,
+            dry_run=arguments.dry_run,
+            shard_count=arguments.shards,
+            worker=arguments.worker[0],
+            workers=arguments.worker[1],
+            max_workers=arguments.jobs,
+            rate_limit=arguments.rate_limit,
+            limit=arguments.limit,
+            checkpoint=checkpoint,
+            progress=report_progress)
+
+        print('Orphaned Blocks {0:}: {1:} ({2:} bytes reclaimed{3:})'.format(
+            action, summary['deleted'], summary['reclaimed_bytes'],
+            ' if deleted' if arguments.dry_run else ''))
+
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)))
+
+
 def block_upload(log, arguments):
     """
     Upload blocks to a vault
     """
     auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
 
+    import deuceclient.api as api
+
     try:
         vault = deuceclient.GetVault(arguments.vault_name)
 
@@ -314,52 +433,223 @@ def file_upload(log, arguments):
     try:
         vault = deuceclient.GetVault(arguments.vault_name)
 
-        file_id = arguments.file_id
-        if file_id is None:
-            file_id = deuceclient.CreateFile(vault)
+        if arguments.regions is not None:
+            # Regions of a large local file are uploaded concurrently
+            if arguments.journal is not None or \
+                    not arguments.content.seekable():
+                raise ValueError('--regions requires --content to be a '
+                                 'regular file and no --journal')
+
+            summary = deuceclient.UploadFileRegions(
+                vault, arguments.content.name,
+                regions=arguments.regions,
+                max_workers=arguments.jobs,
+                file_id=arguments.file_id,
+                readahead=arguments.readahead,
+                drop_cache=not arguments.keep_cache)
+
+        elif arguments.content.seekable():
+            journal = None
+            if arguments.journal is not None:
+                journal = Checkpoint(arguments.journal)
+
+            summary = deuceclient.UploadFile(
+                vault, arguments.content,
+                file_id=arguments.file_id,
+                journal=journal,
+                readahead=arguments.readahead,
+                drop_cache=not arguments.keep_cache,
+                prefetch_bytes=arguments.prefetch)
+
         else:
-            vault.add_file(file_id)
+            # A pipe, e.g. stdin; it is streamed as it is read and cannot
+            # be read again to resume
+            if arguments.journal is not None:
+                raise ValueError('--journal requires --content to be a '
+                                 'regular file')
+
+            import deuceclient.client.filewriter as filewriter
+
+            with filewriter.DeuceFileWriter(
+                    deuceclient, vault, file_id=arguments.file_id,
+                    workers=arguments.jobs) as writer:
+                while True:
+                    data = arguments.content.read(writer.chunk_size)
+                    if not data:
+                        break
+                    writer.write(data)
+            summary = writer.summary
 
-        file_splitter = utils.UniformSplitter(vault.project_id,
-                                              vault.vault_id,
-                                              arguments.content)
+        print('Uploaded File')
+        print('\tFile ID: {0}'.format(summary['file_id']))
+        print('\tURL: {0}'.format(summary['url']))
 
-        while True:
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)))
 
-            block_list = vault.files[file_id].assign_from_data_source(
-                file_splitter, append=True, count=10)
 
-            if len(block_list):
-                assignment_list = []
+def _tree_files(top):
+    """Generate the paths of the regular files below a directory
 
-                for block, block_offset in block_list:
-                    assignment_list.append((block.block_id, block_offset))
+    Symbolic links are not followed.
+    """
+    for dir_path, dir_names, file_names in os.walk(top):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield path
 
-                blocks_to_upload = \
-                    deuceclient.AssignBlocksToFile(vault,
-                                                   file_id,
-                                                   assignment_list)
 
-                if len(blocks_to_upload):
-                    for block, offset in block_list:
-                        if block.block_id in blocks_to_upload:
-                            vault.blocks[block.block_id] = block
+def file_upload_tree(log, arguments):
+    """
+    Upload every file in a directory tree
+    """
+    auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
 
-                    deuceclient.UploadBlocks(vault, blocks_to_upload)
+    index = {}
+    totals = {
+        'bytes': 0,
+        'uploaded_bytes': 0,
+        'unchanged': 0,
+        'failed': 0
+    }
 
-            else:
-                break
+    manifest_cache = None
+    try:
+        vault = deuceclient.GetVault(arguments.vault_name)
 
-        deuceclient.FinalizeFile(vault, file_id)
+        if arguments.manifest_cache is not None:
+            import deuceclient.common.manifestcache as manifestcache
+            manifest_cache = manifestcache.ManifestCache(
+                arguments.manifest_cache)
+
+        start_time = time.time()
+        for path, summary, error in deuceclient.StreamUploadFiles(
+                vault, _tree_files(arguments.directory),
+                max_workers=arguments.jobs,
+                manifest_cache=manifest_cache,
+                readahead=arguments.readahead,
+                drop_cache=not arguments.keep_cache):
+
+            name = os.path.relpath(path, arguments.directory)
+            if error is not None:
+                totals['failed'] += 1
+                print('Error: {0}: {1}'.format(name, str(error)))
+                continue
+
+            index[name] = summary['file_id']
+            totals['bytes'] += summary['bytes']
+            totals['uploaded_bytes'] += summary['uploaded_bytes']
+            if summary.get('cached'):
+                totals['unchanged'] += 1
+            print('Uploaded {0}: {1}'.format(name, summary['file_id']))
+
+        elapsed = max(time.time() - start_time, 1e-6)
 
-        file_url = vault.files[file_id].url
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)))
+        return 1
+
+    finally:
+        if manifest_cache is not None:
+            manifest_cache.close()
+
+    if arguments.index is not None:
+        with open(arguments.index, 'w') as index_file:
+            json.dump(index, index_file, indent=4, sort_keys=True)
+    else:
+        print(json.dumps(index, indent=4, sort_keys=True))
+
+    saved = totals['bytes'] - totals['uploaded_bytes']
+    print('Uploaded {0} files ({1} unchanged), {2} failed'.format(
+        len(index), totals['unchanged'], totals['failed']))
+    print('\tBytes: {0} in {1:.1f}s ({2:.1f} MB/s)'.format(
+        totals['bytes'], elapsed, totals['bytes'] / elapsed / 2 ** 20))
+    print('\tDeduplicated: {0} bytes not uploaded ({1:.1f}%)'.format(
+        saved, 100.0 * saved / totals['bytes'] if totals['bytes'] else 0))
+
+    return 1 if totals['failed'] else 0
+
+
+def file_upload_plan(log, arguments):
+    """
+    Plan the upload of a file by several nodes
+    """
+    auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
+
+    try:
+        from deuceclient.client.cooperative import CooperativeUpload
+
+        vault = deuceclient.GetVault(arguments.vault_name)
+        upload = CooperativeUpload.create(deuceclient, vault,
+                                          arguments.content,
+                                          arguments.work_dir,
+                                          arguments.regions,
+                                          file_id=arguments.file_id)
+
+        print('Planned Upload')
+        print('\tFile ID: {0}'.format(upload.file_id))
+        print('\tRegions: {0}'.format(len(upload.regions)))
+
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)))
+        return 1
+
+    return 0
+
+
+def file_upload_work(log, arguments):
+    """
+    Upload regions of a file planned with upload-plan
+    """
+    auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
+
+    try:
+        from deuceclient.client.cooperative import CooperativeUpload
+
+        kwargs = {}
+        if arguments.claim_timeout is not None:
+            kwargs['claim_timeout'] = arguments.claim_timeout
+
+        upload = CooperativeUpload.open(arguments.work_dir)
+        summary = upload.work(deuceclient, path=arguments.content,
+                              readahead=arguments.readahead,
+                              drop_cache=not arguments.keep_cache, **kwargs)
+
+        print('Uploaded {0} regions of File {1}, {2} failed'.format(
+            summary['regions'], upload.file_id, summary['failed_regions']))
+        print('\tBytes: {0} ({1} uploaded)'.format(
+            summary['bytes'], summary['uploaded_bytes']))
+
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)))
+        return 1
+
+    return 1 if summary['failed_regions'] else 0
+
+
+def file_upload_finish(log, arguments):
+    """
+    Finalize a file once the regions planned with upload-plan are uploaded
+    """
+    auth_engine, deuceclient, api_url = __api_operation_prep(log, arguments)
+
+    try:
+        from deuceclient.client.cooperative import CooperativeUpload
+
+        upload = CooperativeUpload.open(arguments.work_dir)
+        summary = upload.finalize(deuceclient, timeout=arguments.timeout)
 
         print('Uploaded File')
-        print('\tFile ID: {0}'.format(file_id))
-        print('\tURL: {0}'.format(file_url))
+        print('\tFile ID: {0}'.format(summary['file_id']))
+        print('\tURL: {0}'.format(summary['url']))
 
     except Exception as ex:
         print('Error: {0}'.format(str(ex)))
+        return 1
+
+    return 0
 
 
 def file_download(log, arguments):
@@ -374,18 +664,140 @@ def file_download(log, arguments):
         file_id = arguments.file_id
         filename = arguments.file_name
 
-        deuceclient.DownloadFile(vault, file_id, filename)
+        if filename == '-':
+            # Only the content of the file may go to stdout
+            if arguments.checkpoint is not None:
+                raise ValueError('--checkpoint requires --file-name to be a '
+                                 'local file')
+
+            deuceclient.StreamFile(vault, file_id, sys.stdout.buffer,
+                                   max_workers=arguments.jobs)
+            sys.stdout.flush()
+            return
+
+        if arguments.jobs is None and arguments.checkpoint is None:
+            deuceclient.DownloadFile(vault, file_id, filename)
+            return
+
+        checkpoint = None
+        if arguments.checkpoint is not None:
+            checkpoint = Checkpoint(arguments.checkpoint)
+
+        summary = deuceclient.RestoreFile(vault, file_id, filename,
+                                          max_workers=arguments.jobs,
+                                          checkpoint=checkpoint,
+                                          verify=arguments.verify)
+
+        print('Restored File')
+        print('\tBytes: {0} in {1} blocks'.format(
+            summary['bytes'], summary['blocks']))
+        print('\tDownloaded: {0} bytes in {1} blocks'.format(
+            summary['downloaded_bytes'], summary['downloaded_blocks']))
+        print('\tAlready restored: {0} blocks'.format(
+            summary['resumed_blocks']))
+
+    except Exception as ex:
+        print('Error: {0}'.format(str(ex)), file=sys.stderr)
+        return 1
+
+
+def batch_run(log, arguments):
+    """
+    Run the commands of a batch script over shared clients
+    """
+    import deuceclient.batch as batch
+
+    # Every command reads the user configuration
+    user_config = arguments.user_config.read()
+
+    if arguments.batch_output == 'json':
+        def report(command):
+            print(json.dumps(command.status()))
+            sys.stdout.flush()
+    else:
+        def report(command):
+            print('[line {0}] {1}: {2}'.format(
+                command.line_number,
+                'ok' if command.exit_code == 0 else
+                'failed (exit {0})'.format(command.exit_code),
+                command.text))
+            sys.stdout.write(command.stdout)
+            sys.stderr.write(command.stderr)
+            sys.stdout.flush()
+
+    try:
+        summary = batch.run(arguments.batch_script,
+                            arguments,
+                            user_config,
+                            log,
+                            max_workers=arguments.batch_jobs,
+                            cwd=arguments.cwd,
+                            report=report)
 
     except Exception as ex:
         print('Error: {0}'.format(str(ex)))
+        return 1
 
+    if arguments.batch_output == 'text':
+        print('Ran {0} commands: {1} succeeded, {2} failed'.format(
+            summary['succeeded'] + summary['failed'],
+            summary['succeeded'], summary['failed']))
+
+    return 1 if summary['failed'] else 0
+
+
+def _path_type(cwd):
+    """Argument type for paths, relative paths are taken relative to cwd
+    """
+    def path(value):
+        if cwd is None or value in ('', '-'):
+            return value
+        return os.path.join(cwd, os.path.expanduser(value))
+    return path
+
+
+def _file_type(mode, cwd):
+    """Argument type for files, relative paths are taken relative to cwd
+    """
+    path = _path_type(cwd)
+    file_type = argparse.FileType(mode)
+
+    def open_file(value):
+        return file_type(path(value))
+    return open_file
+
+
+def _worker_type(value):
+    """Argument type for a worker K/M, the K-th (from 0) of M workers
+    """
+    try:
+        worker, workers = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected K/M, e.g. 0/4, not {0}'.format(value))
+    if workers < 1 or not 0 <= worker < workers:
+        raise argparse.ArgumentTypeError(
+            'K must be from 0 to M - 1 in {0}'.format(value))
+    return (worker, workers)
+
+
+def build_parser(cwd=None):
+    """Build the command-line argument parser
+
+    :param cwd: directory relative paths are relative to, defaults to the
+                current directory
+    :returns: argparse.ArgumentParser
+    """
+    path = _path_type(cwd)
+
+    def file_type(mode):
+        return _file_type(mode, cwd)
 
-def main():
     arg_parser = argparse.ArgumentParser(
         description="Cloud Backup Agent Status")
     arg_parser.add_argument('--user-config',
                             default=None,
-                            type=argparse.FileType('r'),
+                            type=file_type('r'),
                             required=True,
                             help='JSON file containing username and API Key')
     arg_parser.add_argument('--url',
@@ -396,7 +808,7 @@ def main():
                                  " Default: 127.0.0.1:8080")
     arg_parser.add_argument('-lg', '--log-config',
                             default=None,
-                            type=str,
+                            type=path,
                             dest='logconfig',
                             help='log configuration file')
     arg_parser.add_argument('-dc', '--datacenter',
@@ -417,7 +829,93 @@ def main():
                             type=str,
                             required=False,
                             help='Authentication Service Provider URL')
+    arg_parser.add_argument('--token-cache',
+                            default=None,
+                            required=False,
+                            nargs='?',
+                            const='',
+                            type=path,
+                            help='Share authentication tokens with other '
+                            'invocations through a cache directory. '
+                            'Default directory: {0}'.format(
+                                tokencache.DEFAULT_CACHE_DIR))
+    arg_parser.add_argument('--daemon-socket',
+                            default=None,
+                            required=False,
+                            type=path,
+                            help='Socket of the client daemon to run the '
+                            'command in. Default: $DEUCE_DAEMON_SOCKET or '
+                            'deuce-client.sock in $XDG_RUNTIME_DIR')
+    arg_parser.add_argument('--no-daemon',
+                            default=False,
+                            action='store_true',
+                            help='Run the command in this process even if '
+                            'the client daemon is running')
+    arg_parser.set_defaults(cwd=cwd)
     sub_argument_parser = arg_parser.add_subparsers(title='subcommands')
+    _add_commands(sub_argument_parser, cwd)
+
+    batch_parser = sub_argument_parser.add_parser(
+        'batch',
+        description='Run a script of commands over shared clients. The '
+        'commands run CONCURRENTLY, in no particular order, unless '
+        'separated by a line reading "wait"; use --jobs 1 to run them one '
+        'after the other.')
+    batch_parser.add_argument('batch_script',
+                              metavar='script',
+                              default='-',
+                              nargs='?',
+                              type=file_type('r'),
+                              help='File of commands to run, one per line '
+                              'as shell words or a JSON list, given '
+                              'without the options above. Commands run '
+                              'concurrently; a line reading "wait" waits '
+                              'for the earlier commands to complete before '
+                              'any later one starts. Default: stdin')
+    batch_parser.add_argument('--jobs',
+                              default=8,
+                              required=False,
+                              type=int,
+                              dest='batch_jobs',
+                              help='Number of commands to run concurrently, '
+                              '1 to run them in order. Default: 8')
+    batch_parser.add_argument('--output',
+                              default='text',
+                              required=False,
+                              dest='batch_output',
+                              choices=['text', 'json'],
+                              help='Format of the status of each command. '
+                              'Default: text')
+    batch_parser.set_defaults(func=batch_run)
+
+    return arg_parser
+
+
+def build_command_parser(cwd=None):
+    """Build the argument parser for the commands of a batch
+
+    The commands take the global options given to the batch itself.
+
+    :param cwd: directory relative paths are relative to, defaults to the
+                current directory
+    :returns: argparse.ArgumentParser
+    """
+    arg_parser = argparse.ArgumentParser(prog='deuce batch')
+    sub_argument_parser = arg_parser.add_subparsers(title='subcommands',
+                                                    dest='command')
+    # add_subparsers only takes required from Python 3.7
+    sub_argument_parser.required = True
+    _add_commands(sub_argument_parser, cwd)
+    return arg_parser
+
+
+def _add_commands(sub_argument_parser, cwd):
+    """Add the vault, blocks and files commands to the parser
+    """
+    path = _path_type(cwd)
+
+    def file_type(mode):
+        return _file_type(mode, cwd)
 
     vault_parser = sub_argument_parser.add_parser('vault')
     vault_parser.add_argument('--vault-name',
@@ -439,6 +937,33 @@ def main():
     vault_delete_parser = vault_subparsers.add_parser('delete')
     vault_delete_parser.set_defaults(func=vault_delete)
 
+    vault_purge_parser = vault_subparsers.add_parser('purge')
+    vault_purge_parser.add_argument('--jobs',
+                                    default=8,
+                                    required=False,
+                                    type=int,
+                                    help='Number of concurrent deletions. '
+                                    'Default: 8')
+    vault_purge_parser.add_argument('--rate-limit',
+                                    default=None,
+                                    required=False,
+                                    type=float,
+                                    help='Maximum deletions per second. '
+                                    'Unspecified means no limit.')
+    vault_purge_parser.add_argument('--limit',
+                                    default=None,
+                                    required=False,
+                                    type=int,
+                                    help='Number of entries to list at a '
+                                    'time')
+    vault_purge_parser.add_argument('--checkpoint',
+                                    default=None,
+                                    required=False,
+                                    type=path,
+                                    help='File to record progress in so an '
+                                    'interrupted purge can be resumed')
+    vault_purge_parser.set_defaults(func=vault_purge)
+
     vault_list_parser = vault_subparsers.add_parser('list')
     vault_list_parser.set_defaults(func=vault_list)
 
@@ -469,10 +994,63 @@ def main():
     block_upload_parser.add_argument('--block-content',
                                      default=None,
                                      required=True,
-                                     type=argparse.FileType('r'),
+                                     type=file_type('r'),
                                      help="The block to be uploaded")
     block_upload_parser.set_defaults(func=block_upload)
 
+    block_gc_parser = block_subparsers.add_parser('gc')
+    block_gc_parser.add_argument('--grace-period',
+                                 default=None,
+                                 required=False,
+                                 type=int,
+                                 help='Seconds since the references of an '
+                                 'orphaned block last changed before it is '
+                                 'deleted. Default: 1 day')
+    block_gc_parser.add_argument('--dry-run',
+                                 default=False,
+                                 action='store_true',
+                                 help='Only report the orphaned blocks that '
+                                 'would be deleted')
+    block_gc_parser.add_argument('--shards',
+                                 default=8,
+                                 required=False,
+                                 type=int,
+                                 help='Number of key space shards to list '
+                                 'concurrently. Default: 8')
+    block_gc_parser.add_argument('--worker',
+                                 default=(0, 1),
+                                 required=False,
+                                 type=_worker_type,
+                                 metavar='K/M',
+                                 help='Only collect the K-th (from 0) of M '
+                                 'parts of the key space, to run the '
+                                 'collection on M machines at once. '
+                                 'Default: 0/1')
+    block_gc_parser.add_argument('--jobs',
+                                 default=8,
+                                 required=False,
+                                 type=int,
+                                 help='Number of concurrent requests. '
+                                 'Default: 8')
+    block_gc_parser.add_argument('--rate-limit',
+                                 default=None,
+                                 required=False,
+                                 type=float,
+                                 help='Maximum requests per second. '
+                                 'Unspecified means no limit.')
+    block_gc_parser.add_argument('--limit',
+                                 default=None,
+                                 required=False,
+                                 type=int,
+                                 help='Number of entries to list at a time')
+    block_gc_parser.add_argument('--checkpoint',
+                                 default=None,
+                                 required=False,
+                                 type=path,
+                                 help='File to record progress in so an '
+                                 'interrupted collection can be resumed')
+    block_gc_parser.set_defaults(func=block_gc)
+
     file_parser = sub_argument_parser.add_parser('files')
     file_parser.add_argument('--vault-name',
                              default=None,
@@ -495,10 +1073,171 @@ def main():
     file_upload_parser.add_argument('--content',
                                     default=None,
                                     required=True,
-                                    type=argparse.FileType('rb'),
-                                    help='File to upload')
+                                    type=file_type('rb'),
+                                    help='File to upload, - for stdin')
+    file_upload_parser.add_argument('--jobs',
+                                    default=2,
+                                    required=False,
+                                    type=int,
+                                    help='Number of concurrent uploads when '
+                                    'streaming from a pipe or uploading '
+                                    'regions. Default: 2')
+    file_upload_parser.add_argument('--regions',
+                                    default=None,
+                                    required=False,
+                                    type=int,
+                                    help='Number of regions of the file to '
+                                    'split and upload concurrently, for '
+                                    'large files')
+    file_upload_parser.add_argument('--journal',
+                                    default=None,
+                                    required=False,
+                                    type=path,
+                                    help='File to record progress in so an '
+                                    'interrupted upload can be resumed')
+    file_upload_parser.add_argument('--readahead',
+                                    default=pagecache.DEFAULT_READAHEAD,
+                                    required=False,
+                                    type=int,
+                                    help='Bytes to read ahead of the upload '
+                                    'of a local file, 0 to leave it to '
+                                    'the kernel. Default: {0}'.format(
+                                        pagecache.DEFAULT_READAHEAD))
+    file_upload_parser.add_argument('--keep-cache',
+                                    default=False,
+                                    action='store_true',
+                                    help='Leave the content uploaded in the '
+                                    'page cache instead of dropping it')
+    file_upload_parser.add_argument('--prefetch',
+                                    default=0,
+                                    required=False,
+                                    type=int,
+                                    help='Bytes of the content to read ahead '
+                                    'of the upload in a background '
+                                    'thread. Default: 0')
     file_upload_parser.set_defaults(func=file_upload)
 
+    file_upload_tree_parser = file_subparsers.add_parser('upload-tree')
+    file_upload_tree_parser.add_argument('directory',
+                                         type=path,
+                                         help='Directory to upload the files '
+                                         'below, each into a new file')
+    file_upload_tree_parser.add_argument('--jobs',
+                                         default=8,
+                                         required=False,
+                                         type=int,
+                                         help='Number of files to upload '
+                                         'concurrently. Default: 8')
+    file_upload_tree_parser.add_argument('--index',
+                                         default=None,
+                                         required=False,
+                                         type=path,
+                                         help='File to write the JSON index '
+                                         'of the File ID of each local path '
+                                         'to. Default: stdout')
+    file_upload_tree_parser.add_argument('--manifest-cache',
+                                         default=None,
+                                         required=False,
+                                         type=path,
+                                         help='Database of the blocks of '
+                                         'earlier uploads; files unchanged '
+                                         'since are not read again')
+    file_upload_tree_parser.add_argument('--readahead',
+                                         default=pagecache.DEFAULT_READAHEAD,
+                                         required=False,
+                                         type=int,
+                                         help='Bytes to read ahead of the '
+                                         'upload of each file, 0 to leave it '
+                                         'to the kernel. Default: {0}'.format(
+                                             pagecache.DEFAULT_READAHEAD))
+    file_upload_tree_parser.add_argument('--keep-cache',
+                                         default=False,
+                                         action='store_true',
+                                         help='Leave the content uploaded in '
+                                         'the page cache instead of dropping '
+                                         'it')
+    file_upload_tree_parser.set_defaults(func=file_upload_tree)
+
+    file_upload_plan_parser = file_subparsers.add_parser('upload-plan')
+    file_upload_plan_parser.add_argument('--content',
+                                         default=None,
+                                         required=True,
+                                         type=path,
+                                         help='File to upload, at a path the '
+                                         'workers share')
+    file_upload_plan_parser.add_argument('--work-dir',
+                                         default=None,
+                                         required=True,
+                                         type=path,
+                                         help='Directory shared with the '
+                                         'workers to publish the plan in')
+    file_upload_plan_parser.add_argument('--regions',
+                                         default=None,
+                                         required=True,
+                                         type=int,
+                                         help='Number of regions to divide '
+                                         'the file into for the workers')
+    file_upload_plan_parser.add_argument('--file-id',
+                                         default=None,
+                                         required=False,
+                                         type=str,
+                                         help='File ID in the Vault for the '
+                                         'new file. One will be created if '
+                                         'not specified.')
+    file_upload_plan_parser.set_defaults(func=file_upload_plan)
+
+    file_upload_work_parser = file_subparsers.add_parser('upload-work')
+    file_upload_work_parser.add_argument('--work-dir',
+                                         default=None,
+                                         required=True,
+                                         type=path,
+                                         help='Directory the plan was '
+                                         'published in')
+    file_upload_work_parser.add_argument('--content',
+                                         default=None,
+                                         required=False,
+                                         type=path,
+                                         help='Path of the file on this node '
+                                         'if it differs from the plan')
+    file_upload_work_parser.add_argument('--claim-timeout',
+                                         default=None,
+                                         required=False,
+                                         type=int,
+                                         help='Seconds after which a region '
+                                         'claimed by a worker that stopped '
+                                         'is taken over. Default: 5 minutes')
+    file_upload_work_parser.add_argument('--readahead',
+                                         default=pagecache.DEFAULT_READAHEAD,
+                                         required=False,
+                                         type=int,
+                                         help='Bytes to read ahead of the '
+                                         'upload of each region, 0 to leave '
+                                         'it to the kernel. Default: {0}'
+                                         .format(pagecache.DEFAULT_READAHEAD))
+    file_upload_work_parser.add_argument('--keep-cache',
+                                         default=False,
+                                         action='store_true',
+                                         help='Leave the content uploaded in '
+                                         'the page cache instead of dropping '
+                                         'it')
+    file_upload_work_parser.set_defaults(func=file_upload_work)
+
+    file_upload_finish_parser = file_subparsers.add_parser('upload-finish')
+    file_upload_finish_parser.add_argument('--work-dir',
+                                           default=None,
+                                           required=True,
+                                           type=path,
+                                           help='Directory the plan was '
+                                           'published in')
+    file_upload_finish_parser.add_argument('--timeout',
+                                           default=None,
+                                           required=False,
+                                           type=int,
+                                           help='Seconds to wait for the '
+                                           'workers to upload the regions. '
+                                           'Default: no limit')
+    file_upload_finish_parser.set_defaults(func=file_upload_finish)
+
     file_download_parser = file_subparsers.add_parser('download')
     file_download_parser.add_argument('--file-id',
                                       default=None,
@@ -509,8 +1248,28 @@ def main():
     file_download_parser.add_argument('--file-name',
                                       default=None,
                                       required=True,
-                                      type=str,
-                                      help='File name to store the file in')
+                                      type=path,
+                                      help='File name to store the file in, '
+                                      '- for stdout')
+    file_download_parser.add_argument('--jobs',
+                                      default=None,
+                                      required=False,
+                                      type=int,
+                                      help='Download the blocks of the file, '
+                                      'this many concurrently')
+    file_download_parser.add_argument('--checkpoint',
+                                      default=None,
+                                      required=False,
+                                      type=path,
+                                      help='File to record the downloaded '
+                                      'blocks in so an interrupted download '
+                                      'can be resumed')
+    file_download_parser.add_argument('--verify',
+                                      default=False,
+                                      action='store_true',
+                                      help='When resuming, check the blocks '
+                                      'downloaded before and download the '
+                                      'ones that are not intact again')
     file_download_parser.set_defaults(func=file_download)
 
     file_delete_parser = file_subparsers.add_parser('delete')
@@ -521,7 +1280,26 @@ def main():
                                     help='File ID in the Vault to be deleted')
     file_delete_parser.set_defaults(func=file_delete)
 
-    arguments = arg_parser.parse_args()
+
+def main():
+    argv = sys.argv[1:]
+
+    # The client daemon has its own commands, see deuceclient.daemon
+    if argv[:1] == ['daemon']:
+        import deuceclient.daemon as daemon
+        return daemon.main(argv[1:])
+
+    arguments = build_parser().parse_args(argv)
+
+    # Hand the command to the client daemon if it is running; the daemon
+    # cannot read the stdin of this process
+    reads_stdin = any(value is sys.stdin or value is sys.stdin.buffer
+                      for value in vars(arguments).values())
+    if not arguments.no_daemon and not reads_stdin:
+        import deuceclient.daemon as daemon
+        exit_code = daemon.forward(argv, socket_path=arguments.daemon_socket)
+        if exit_code is not None:
+            return exit_code
 
     # If the caller provides a log configuration then use it
     # Otherwise we'll add our own little configuration as a default
@@ -539,7 +1317,17 @@ def main():
     # Build the logger
     log = logging.getLogger()
 
-    arguments.func(log, arguments)
+    # The pool stops refreshing the token once the command is done
+    import deuceclient.daemon as daemon
+    client_pool = daemon.ClientPool()
+    lease = client_pool.lease()
+    arguments.client_pool = lease
+    try:
+        return arguments.func(log, arguments)
+
+    finally:
+        lease.release()
+        client_pool.close()
 
 
 if __name__ == "__main__":
@@ -2,18 +2,22 @@
 Tests - Deuce Client - Auth - OpenStack Authentication
 """
 import datetime
+import tempfile
+import threading
 import time
 import uuid
 from unittest import TestCase
 
 import contextlib
+import keystoneclient.access
 import keystoneclient.exceptions
 import mock
 
 import deuceclient.auth
 import deuceclient.auth.openstackauth as openstackauth
+import deuceclient.auth.tokencache as tokencache
 import deuceclient.tests.test_auth
-from deuceclient.tests import fastsleep
+from deuceclient.tests import fastsleep, slowsleep
 
 
 class FakeAccess(object):
@@ -117,6 +121,15 @@ class FakeAccess(object):
             return (check_time <= now_time)
 
 
+class TimedAccess(object):
+    """Fake Keystone Access Object expiring at a given time
+    """
+    def __init__(self, auth_token, lifetime):
+        self.auth_token = auth_token
+        self.expires = datetime.datetime.utcnow() + \
+            datetime.timedelta(seconds=lifetime)
+
+
 class FakeClient(object):
     """Fake Keystone Client Object for testing
     """
@@ -176,13 +189,14 @@ class OpenStackAuthTest(TestCase,
 
     def create_authengine(self, userid=None, usertype=None,
                           credentials=None, auth_method=None,
-                          datacenter=None, auth_url=None):
+                          datacenter=None, auth_url=None, token_cache=None):
         return openstackauth.OpenStackAuthentication(userid=userid,
                                                      usertype=usertype,
                                                      credentials=credentials,
                                                      auth_method=auth_method,
                                                      datacenter=datacenter,
-                                                     auth_url=auth_url)
+                                                     auth_url=auth_url,
+                                                     token_cache=token_cache)
 
     def test_parameter_no_authurl(self):
         userid = self.create_userid()
@@ -701,67 +715,89 @@ class OpenStackAuthTest(TestCase,
             # We must reset expire_time when we're done
             FakeAccess.expire_time = None
 
-    def test_auth_token_expired(self):
-        usertype = 'user_name'
-        username = self.create_username()
-
-        apikey = self.create_apikey()
-        auth_method = 'apikey'
-
-        datacenter = 'test'
-        auth_url = 'http://identity.api.rackspacecloud.com'
-
-        authengine = self.create_authengine(userid=username,
-                                            usertype=usertype,
-                                            credentials=apikey,
-                                            auth_method=auth_method,
-                                            datacenter=datacenter,
-                                            auth_url=auth_url)
-
-        mok_isexpired = 'deuceclient.auth.openstackauth' \
-            '.OpenStackAuthentication.IsExpired'
+    def create_default_authengine(self):
+        return self.create_authengine(
+            userid=self.create_username(),
+            usertype='user_name',
+            credentials=self.create_apikey(),
+            auth_method='apikey',
+            datacenter='test',
+            auth_url='http://identity.api.rackspacecloud.com')
+
+    def install_access(self, authengine, access):
+        authengine._OpenStackAuthentication__access = access
+
+    def mock_gettoken(self, authengine, lifetime=3600, delay=None):
+        """Mock GetToken to install a new access each time it is called
+        """
         mok_gettoken = 'deuceclient.auth.openstackauth' \
             '.OpenStackAuthentication.GetToken'
 
-        with mock.patch(mok_isexpired) as mock_isexpired,\
-                mock.patch(mok_gettoken) as mock_gettoken:
-
-            mock_isexpired.return_value = True
-            token = self.create_token()
-            mock_gettoken.return_value = token
+        def get_token(*args, **kwargs):
+            if delay is not None:
+                delay.wait(5)
+            access = TimedAccess(self.create_token(), lifetime)
+            self.install_access(authengine, access)
+            return access.auth_token
 
-            self.assertEqual(token, authengine.AuthToken)
-
-    def test_auth_token_will_expire(self):
-        usertype = 'user_name'
-        username = self.create_username()
-
-        apikey = self.create_apikey()
-        auth_method = 'apikey'
+        return mock.patch(mok_gettoken, side_effect=get_token)
 
-        datacenter = 'test'
-        auth_url = 'http://identity.api.rackspacecloud.com'
+    def test_auth_token_expired(self):
+        authengine = self.create_default_authengine()
+        self.addCleanup(authengine.StopTokenRefresh)
 
-        authengine = self.create_authengine(userid=username,
-                                            usertype=usertype,
-                                            credentials=apikey,
-                                            auth_method=auth_method,
-                                            datacenter=datacenter,
-                                            auth_url=auth_url)
+        with self.mock_gettoken(authengine) as mock_gettoken:
+            token = authengine.AuthToken
+            self.assertIsNotNone(token)
+            self.assertEqual(1, mock_gettoken.call_count)
 
-        mok_isexpired = 'deuceclient.auth.openstackauth' \
-            '.OpenStackAuthentication.IsExpired'
-        mok_gettoken = 'deuceclient.auth.openstackauth' \
-            '.OpenStackAuthentication.GetToken'
+            # An expired token is replaced before it is returned
+            self.install_access(authengine,
+                                TimedAccess(self.create_token(), -1))
+            self.assertNotEqual(token, authengine.AuthToken)
+            self.assertEqual(2, mock_gettoken.call_count)
 
-        with mock.patch(mok_isexpired) as mock_isexpired,\
-                mock.patch(mok_gettoken) as mock_gettoken:
+    def test_auth_token_will_expire(self):
+        authengine = self.create_default_authengine()
+        self.addCleanup(authengine.StopTokenRefresh)
 
-            mock_isexpired.side_effect = [False, True]
-            token = self.create_token()
-            mock_gettoken.return_value = token
+        with self.mock_gettoken(authengine) as mock_gettoken:
+            authengine.AuthToken
 
-            self.assertEqual(token, authengine.AuthToken)
+            # The token is about to expire, it is still returned without
+            # waiting while the new token is retrieved in the background
+            old_access = TimedAccess(self.create_token(), 10)
+            self.install_access(authengine, old_access)
+            self.assertEqual(old_access.auth_token, authengine.AuthToken)
+
+            for _ in range(500):
+                if authengine.AuthToken != old_access.auth_token:
+                    break
+                slowsleep(0.01)
+
+            self.assertNotEqual(old_access.auth_token, authengine.AuthToken)
+            self.assertEqual(2, mock_gettoken.call_count)
+
+    def test_auth_token_refresh_coalesced(self):
+        authengine = self.create_default_authengine()
+        self.addCleanup(authengine.StopTokenRefresh)
+        delay = threading.Event()
+        tokens = []
+
+        with self.mock_gettoken(authengine, delay=delay) as mock_gettoken:
+            threads = [threading.Thread(
+                target=lambda: tokens.append(authengine.AuthToken))
+                for _ in range(8)]
+            for thread in threads:
+                thread.start()
+
+            delay.set()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(1, mock_gettoken.call_count)
+            self.assertEqual(8, len(tokens))
+            self.assertEqual(1, len(set(tokens)))
 
     def test_auth_token_cached(self):
         usertype = 'user_name'
@@ -773,11 +809,6 @@ class OpenStackAuthTest(TestCase,
         datacenter = 'test'
         auth_url = 'http://identity.api.rackspacecloud.com'
 
-        mok_isexpired = 'deuceclient.auth.openstackauth' \
-            '.OpenStackAuthentication.IsExpired'
-        mok_authtoken = 'deuceclient.auth.openstackauth' \
-            '.OpenStackAuthentication.__access.auth_token'
-
         # Because the mock strings are so long, we're going to store them
         # in variables here to keep the mocking statements short
         mok_ky_base = 'keystoneclient'
@@ -802,8 +833,7 @@ class OpenStackAuthTest(TestCase,
                 mock.patch(mok_ky_v2_client) as keystone_v2_client,\
                 mock.patch(mok_ky_v2_rawtoken) as keystone_raw_token_mock,\
                 mock.patch(mok_ky_discover_version) as keystone_discover_ver,\
-                mock.patch(mok_ky_discover_client) as keystone_discover_cli, \
-                mock.patch(mok_isexpired) as mock_isexpired:
+                mock.patch(mok_ky_discover_client) as keystone_discover_cli:
 
             keystone_auth_mock.return_value = True
 
@@ -814,11 +844,10 @@ class OpenStackAuthTest(TestCase,
 
             FakeAccess.raise_until = 0
             FakeAccess.raise_counter = 0
+            FakeAccess.expire_time = datetime.datetime.utcnow() + \
+                datetime.timedelta(hours=1)
             keystone_raw_token_mock.return_value = FakeAccess()
 
-            mock_isexpired.return_value = False
-            token = self.create_token()
-
             authengine = self.create_authengine(userid=username,
                                                 usertype=usertype,
                                                 credentials=apikey,
@@ -830,7 +859,114 @@ class OpenStackAuthTest(TestCase,
             # non-expired functions
             authengine.GetToken()
 
-            authengine.AuthToken
+            with mock.patch.object(FakeClient,
+                                   'get_raw_token_from_identity_service') \
+                    as mock_raw_token:
+                self.assertIsNotNone(authengine.AuthToken)
+                self.assertFalse(mock_raw_token.called)
+
+            # We must reset expire_time when we're done
+            FakeAccess.expire_time = None
+
+    def test_lifetime(self):
+        authengine = self.create_default_authengine()
+        lifetime = authengine._OpenStackAuthentication__lifetime
+
+        self.assertEqual(0, lifetime(None))
+        self.assertAlmostEqual(60, lifetime(TimedAccess('token', 60)),
+                               delta=5)
+
+        access = TimedAccess('token', 60)
+        access.expires = datetime.datetime.now(datetime.timezone.utc) + \
+            datetime.timedelta(seconds=60)
+        self.assertAlmostEqual(60, lifetime(access), delta=5)
+
+    def create_cached_authengine(self, cache):
+        authengine = self.create_authengine(
+            userid='cheshirecat',
+            usertype='user_name',
+            credentials='alice',
+            auth_method='apikey',
+            datacenter='test',
+            auth_url='http://identity.api.rackspacecloud.com',
+            token_cache=cache)
+        self.addCleanup(authengine.StopTokenRefresh)
+        return authengine
+
+    def mock_keystone_gettoken(self, authengine, lifetime=3600):
+        """Mock GetToken to install a new Keystone access
+        """
+        mok_gettoken = 'deuceclient.auth.openstackauth' \
+            '.OpenStackAuthentication.GetToken'
+
+        def get_token(*args, **kwargs):
+            expires = datetime.datetime.utcnow() + \
+                datetime.timedelta(seconds=lifetime)
+            access = keystoneclient.access.AccessInfo.factory(body={
+                'access': {
+                    'token': {
+                        'id': self.create_token(),
+                        'expires': expires.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        'tenant': {'id': 'tenant', 'name': 'tenant'}
+                    },
+                    'user': {'id': 'user', 'name': 'user'}
+                }
+            })
+            self.install_access(authengine, access)
+            return access.auth_token
+
+        return mock.patch(mok_gettoken, side_effect=get_token)
+
+    def test_token_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = tokencache.TokenCache(cache_dir)
+
+            first = self.create_cached_authengine(cache)
+            with self.mock_keystone_gettoken(first) as mock_gettoken:
+                token = first.AuthToken
+                self.assertEqual(1, mock_gettoken.call_count)
+
+            # Another process reuses the cached token
+            second = self.create_cached_authengine(cache)
+            with self.mock_keystone_gettoken(second) as mock_gettoken:
+                self.assertEqual(token, second.AuthToken)
+                self.assertEqual('tenant', second.AuthTenantId)
+                self.assertFalse(mock_gettoken.called)
+
+    def test_token_cache_expiring(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = tokencache.TokenCache(cache_dir)
+
+            first = self.create_cached_authengine(cache)
+            with self.mock_keystone_gettoken(first, lifetime=60):
+                token = first.AuthToken
+
+            # A token about to expire is not reused, the new one is cached
+            second = self.create_cached_authengine(cache)
+            with self.mock_keystone_gettoken(second) as mock_gettoken:
+                new_token = second.AuthToken
+                self.assertNotEqual(token, new_token)
+                self.assertEqual(1, mock_gettoken.call_count)
+
+            third = self.create_cached_authengine(cache)
+            with self.mock_keystone_gettoken(third) as mock_gettoken:
+                self.assertEqual(new_token, third.AuthToken)
+                self.assertFalse(mock_gettoken.called)
+
+    def test_token_cache_corrupt(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = tokencache.TokenCache(cache_dir)
+
+            authengine = self.create_cached_authengine(cache)
+            key = cache.make_key(authengine.authurl, authengine.datacenter,
+                                 authengine.usertype, authengine.userid,
+                                 authengine.authmethod,
+                                 authengine.credentials)
+            cache.store(key, {'unexpected': 'data'})
+
+            with self.mock_keystone_gettoken(authengine) as mock_gettoken:
+                self.assertIsNotNone(authengine.AuthToken)
+                self.assertEqual(1, mock_gettoken.call_count)
 
     def test_expiration_time(self):
         usertype = 'user_name'
@@ -13,13 +13,14 @@ class RackspaceAuthTest(openstacktest.OpenStackAuthTest):
 
     def create_authengine(self, userid=None, usertype=None,
                           credentials=None, auth_method=None,
-                          datacenter=None, auth_url=None):
+                          datacenter=None, auth_url=None, token_cache=None):
         return rackspaceauth.RackspaceAuthentication(userid=userid,
                                                      usertype=usertype,
                                                      credentials=credentials,
                                                      auth_method=auth_method,
                                                      datacenter=datacenter,
-                                                     auth_url=auth_url)
+                                                     auth_url=auth_url,
+                                                     token_cache=token_cache)
 
     def test_get_identity(self):
         main_dc_list = ('us', 'uk', 'lon', 'iad', 'dfw', 'ord')
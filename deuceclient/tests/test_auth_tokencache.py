@@ -0,0 +1,78 @@
+"""
+Tests - Deuce Client - Auth - Token Cache
+"""
+import os
+import stat
+import tempfile
+import threading
+from unittest import TestCase
+
+import deuceclient.auth.tokencache as tokencache
+
+
+class TokenCacheTest(TestCase):
+
+    def setUp(self):
+        super(TokenCacheTest, self).setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'tokens')
+        self.cache = tokencache.TokenCache(self.cache_dir)
+        self.key = self.cache.make_key('url', 'user', 'secret')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(TokenCacheTest, self).tearDown()
+
+    def test_default_path(self):
+        self.assertEqual(os.path.expanduser(tokencache.DEFAULT_CACHE_DIR),
+                         tokencache.TokenCache().path)
+
+    def test_make_key(self):
+        self.assertEqual(self.key,
+                         self.cache.make_key('url', 'user', 'secret'))
+        self.assertNotEqual(self.key,
+                            self.cache.make_key('url', 'user', 'other'))
+        self.assertNotIn('secret', self.key)
+
+    def test_store_load(self):
+        self.assertIsNone(self.cache.load(self.key))
+
+        self.cache.store(self.key, {'token': 'mock'})
+        self.assertEqual({'token': 'mock'}, self.cache.load(self.key))
+
+        # only the owner may access the cache
+        self.assertEqual(0o700,
+                         stat.S_IMODE(os.stat(self.cache_dir).st_mode))
+        self.assertEqual(0o600, stat.S_IMODE(
+            os.stat(os.path.join(self.cache_dir, self.key)).st_mode))
+
+        self.cache.remove(self.key)
+        self.assertIsNone(self.cache.load(self.key))
+        self.cache.remove(self.key)
+
+    def test_load_corrupt(self):
+        self.cache.store(self.key, {})
+        with open(os.path.join(self.cache_dir, self.key), 'w') as entry:
+            entry.write('{not json')
+
+        self.assertIsNone(self.cache.load(self.key))
+
+    def test_lock(self):
+        events = []
+        locked = threading.Event()
+
+        def contender():
+            locked.wait(5)
+            with self.cache.lock(self.key):
+                events.append('contender')
+
+        thread = threading.Thread(target=contender)
+        thread.start()
+
+        with self.cache.lock(self.key):
+            locked.set()
+            thread.join(0.2)
+            events.append('holder')
+
+        thread.join()
+        self.assertEqual(['holder', 'contender'], events)
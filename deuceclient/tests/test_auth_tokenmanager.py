@@ -0,0 +1,150 @@
+"""
+Tests - Deuce Client - Auth - Token Manager
+"""
+import threading
+import time
+from unittest import TestCase
+
+import deuceclient.auth.tokenmanager as tokenmanager
+
+
+class FakeTokenService(object):
+    """Issues tokens as (token number, monotonic expiry) tuples
+    """
+
+    def __init__(self, lifetime, failures=0):
+        self.lifetime = lifetime
+        self.failures = failures
+        self.calls = 0
+        self.access = None
+        self.refreshed = threading.Event()
+
+    def fetch(self):
+        self.calls = self.calls + 1
+        if self.failures > 0:
+            self.failures = self.failures - 1
+            raise RuntimeError('mock failure')
+
+        self.access = (self.calls, time.monotonic() + self.lifetime)
+        self.refreshed.set()
+
+    @staticmethod
+    def lifetime_of(access):
+        return access[1] - time.monotonic()
+
+    def manager(self, **kwargs):
+        manager = tokenmanager.TokenManager(current=lambda: self.access,
+                                            fetch=self.fetch,
+                                            lifetime=self.lifetime_of,
+                                            **kwargs)
+        return manager
+
+
+class TokenManagerTest(TestCase):
+
+    def test_get(self):
+        service = FakeTokenService(lifetime=3600)
+        manager = service.manager()
+        self.addCleanup(manager.stop)
+
+        access = manager.get()
+        self.assertEqual(1, access[0])
+
+        # served from the cached access
+        for _ in range(10):
+            self.assertIs(access, manager.get())
+        self.assertEqual(1, service.calls)
+
+    def test_get_failure(self):
+        service = FakeTokenService(lifetime=3600, failures=1)
+        manager = service.manager()
+        self.addCleanup(manager.stop)
+
+        with self.assertRaises(RuntimeError):
+            manager.get()
+
+        self.assertEqual(2, manager.get()[0])
+
+    def test_refresh_coalesced(self):
+        service = FakeTokenService(lifetime=3600)
+        manager = service.manager()
+        self.addCleanup(manager.stop)
+
+        stale = manager.get()
+        refreshed = manager.refresh(stale=stale)
+        self.assertIsNot(stale, refreshed)
+
+        # Somebody else already replaced the stale access
+        self.assertIs(refreshed, manager.refresh(stale=stale))
+        self.assertEqual(2, service.calls)
+
+    def test_background_refresh(self):
+        service = FakeTokenService(lifetime=0.4)
+        manager = service.manager(refresh_margin=0.3)
+        self.addCleanup(manager.stop)
+
+        access = manager.get()
+        service.refreshed.clear()
+
+        # The margin is limited to half the lifetime of short lived tokens
+        self.assertTrue(service.refreshed.wait(5))
+        self.assertEqual(2, service.calls)
+        self.assertIsNot(access, manager.get())
+
+    def test_background_refresh_retried(self):
+        service = FakeTokenService(lifetime=0.2)
+        manager = service.manager(retry_delay=0.01)
+        self.addCleanup(manager.stop)
+
+        manager.get()
+        service.failures = 2
+        service.refreshed.clear()
+
+        self.assertTrue(service.refreshed.wait(5))
+        self.assertEqual(4, service.calls)
+
+    def test_background_refresh_idle(self):
+        service = FakeTokenService(lifetime=0.2)
+        manager = service.manager(idle_timeout=0.1)
+        self.addCleanup(manager.stop)
+
+        manager.get()
+        service.refreshed.clear()
+
+        # Unused since, so the token is left to expire
+        threading.Event().wait(0.5)
+        self.assertEqual(1, service.calls)
+
+        # Used again, it is refreshed when it expired, and in the
+        # background while it is being used
+        access = manager.get()
+        self.assertEqual(2, access[0])
+        self.assertEqual(2, service.calls)
+        service.refreshed.clear()
+        for _ in range(50):
+            manager.get()
+            if service.refreshed.wait(0.02):
+                break
+        self.assertEqual(3, service.calls)
+
+    def test_background_refresh_not_idle(self):
+        service = FakeTokenService(lifetime=0.2)
+        manager = service.manager(idle_timeout=None)
+        self.addCleanup(manager.stop)
+
+        manager.get()
+        threading.Event().wait(0.5)
+        self.assertLess(2, service.calls)
+
+    def test_stop(self):
+        service = FakeTokenService(lifetime=0.2)
+        manager = service.manager()
+
+        manager.get()
+        manager.stop()
+        calls = service.calls
+
+        threading.Event().wait(0.3)
+        self.assertEqual(calls, service.calls)
+        self.assertEqual(tokenmanager.DEFAULT_REFRESH_MARGIN,
+                         manager.refresh_margin)
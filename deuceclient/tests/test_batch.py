@@ -0,0 +1,212 @@
+"""
+Tests - Deuce Client - Batch Mode
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+import mock
+
+import deuceclient.batch as batch
+import deuceclient.daemon as daemon
+import deuceclient.shell as shell
+
+
+class ReadScriptTest(TestCase):
+
+    def test_read_script(self):
+        script = io.StringIO('# comment\n'
+                             '\n'
+                             'vault --vault-name mock create\n'
+                             '  wait  \n'
+                             '["vault", "--vault-name", "mock", "exists"]\n')
+
+        commands = list(batch.read_script(script))
+        self.assertEqual(3, len(commands))
+        self.assertEqual(3, commands[0].line_number)
+        self.assertEqual(['vault', '--vault-name', 'mock', 'create'],
+                         commands[0].argv())
+        self.assertIs(batch.WAIT, commands[1])
+        self.assertEqual(5, commands[2].line_number)
+        self.assertEqual(['vault', '--vault-name', 'mock', 'exists'],
+                         commands[2].argv())
+
+    def test_quoting(self):
+        command = batch.BatchCommand(1, 'files --vault-name "a b" list')
+        self.assertEqual(['files', '--vault-name', 'a b', 'list'],
+                         command.argv())
+
+    def test_invalid(self):
+        for text in ('vault --vault-name "mock', '["vault", 1]', '[vault'):
+            with self.assertRaises(ValueError):
+                batch.BatchCommand(1, text).argv()
+
+
+class CommandParserTest(TestCase):
+
+    def test_command_required(self):
+        arg_parser = shell.build_command_parser()
+
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as err:
+            with self.assertRaises(SystemExit) as context:
+                arg_parser.parse_args([])
+        self.assertEqual(2, context.exception.code)
+        self.assertIn('required', err.getvalue())
+
+        arguments = arg_parser.parse_args(['vault', '--vault-name', 'mock',
+                                           'exists'])
+        self.assertEqual('vault', arguments.command)
+
+
+class BatchRunTest(TestCase):
+
+    def setUp(self):
+        super(BatchRunTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.user_config = os.path.join(self.temp_dir, 'user.json')
+        with open(self.user_config, 'w') as config:
+            json.dump({'user': 'cheshirecat', 'password': 'alice'}, config)
+
+        self.log = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.clients = []
+        self.vault_names = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+        super(BatchRunTest, self).tearDown()
+
+    def global_arguments(self, *argv):
+        return shell.build_parser().parse_args(
+            ['--user-config', self.user_config,
+             '-dc', 'ord',
+             '--auth-service', 'none'] + list(argv))
+
+    def fake_vault_exists(self, log, arguments):
+        auth_engine, client, api_url = \
+            getattr(shell, '__api_operation_prep')(log, arguments)
+        with self.lock:
+            self.clients.append(client)
+            self.vault_names.append(arguments.vault_name)
+        print('Vault {0}'.format(arguments.vault_name))
+
+    def run_batch(self, script, max_workers=4):
+        arguments = self.global_arguments('batch')
+        with open(self.user_config) as config:
+            user_config = config.read()
+
+        completed = []
+        with mock.patch.object(shell, 'vault_exists',
+                               self.fake_vault_exists):
+            summary = batch.run(io.StringIO(script), arguments, user_config,
+                                self.log, max_workers=max_workers,
+                                report=completed.append)
+        return summary, completed
+
+    def test_shared_authentication(self):
+        script = ''.join('vault --vault-name mock{0} exists\n'.format(i)
+                         for i in range(20))
+
+        summary, completed = self.run_batch(script)
+
+        self.assertEqual({'succeeded': 20, 'failed': 0}, summary)
+        self.assertEqual(20, len(completed))
+        for command in completed:
+            self.assertEqual(0, command.exit_code)
+            self.assertEqual('Vault mock{0}\n'.format(
+                command.line_number - 1), command.stdout)
+            self.assertEqual('', command.stderr)
+
+        # Clients are reused and never outnumber the concurrent commands
+        self.assertEqual(20, len(self.clients))
+        self.assertLessEqual(len(set(id(c) for c in self.clients)), 4)
+        self.assertEqual(1, len(set(id(c.authenticator)
+                                    for c in self.clients)))
+
+    def test_client_pool_closed(self):
+        with mock.patch.object(daemon.ClientPool, 'close',
+                               autospec=True) as close:
+            summary, completed = self.run_batch(
+                'vault --vault-name mock exists\n')
+
+        self.assertEqual({'succeeded': 1, 'failed': 0}, summary)
+        close.assert_called_once_with(mock.ANY)
+
+    def test_wait(self):
+        script = ('vault --vault-name first exists\n'
+                  'vault --vault-name second exists\n'
+                  'wait\n'
+                  'vault --vault-name third exists\n')
+
+        summary, completed = self.run_batch(script)
+
+        self.assertEqual({'succeeded': 3, 'failed': 0}, summary)
+        self.assertEqual([4], [command.line_number
+                               for command in completed[2:]])
+
+    def test_one_job_in_order(self):
+        script = ''.join('vault --vault-name mock{0} exists\n'.format(i)
+                         for i in range(10))
+
+        summary, completed = self.run_batch(script, max_workers=1)
+
+        self.assertEqual({'succeeded': 10, 'failed': 0}, summary)
+        self.assertEqual(['mock{0}'.format(i) for i in range(10)],
+                         self.vault_names)
+
+    def test_failures(self):
+        def fail(log, arguments):
+            raise RuntimeError('mock failure')
+
+        script = ('vault --vault-name "mock\n'
+                  'vault --bogus\n'
+                  'batch\n'
+                  'vault --vault-name mock delete\n'
+                  'vault --vault-name mock exists\n')
+
+        with mock.patch.object(shell, 'vault_delete', fail):
+            summary, completed = self.run_batch(script, max_workers=1)
+
+        self.assertEqual({'succeeded': 1, 'failed': 4}, summary)
+        status = {command.line_number: command for command in completed}
+
+        self.assertEqual(2, status[1].exit_code)
+        self.assertIn('No closing quotation', status[1].stderr)
+        self.assertEqual(2, status[2].exit_code)
+        self.assertIn('usage', status[2].stderr)
+        # Batches do not nest
+        self.assertEqual(2, status[3].exit_code)
+        self.assertEqual(1, status[4].exit_code)
+        self.assertIn('mock failure', status[4].stderr)
+        self.assertEqual(0, status[5].exit_code)
+
+        self.assertEqual({'line': 5,
+                          'command': 'vault --vault-name mock exists',
+                          'exit': 0,
+                          'stdout': 'Vault mock\n',
+                          'stderr': ''}, status[5].status())
+
+    def test_shell(self):
+        script = os.path.join(self.temp_dir, 'script.txt')
+        with open(script, 'w') as script_file:
+            script_file.write('vault --vault-name mock exists\n'
+                              'vault --vault-name mock bogus\n')
+
+        arguments = self.global_arguments('batch', '--output', 'json',
+                                          '--jobs', '2', script)
+        with mock.patch.object(shell, 'vault_exists',
+                               self.fake_vault_exists), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            self.assertEqual(1, shell.batch_run(self.log, arguments))
+
+        status = sorted((json.loads(line) for line in
+                         out.getvalue().splitlines()),
+                        key=lambda entry: entry['line'])
+        self.assertEqual([1, 2], [entry['line'] for entry in status])
+        self.assertEqual([0, 2], [entry['exit'] for entry in status])
+        self.assertEqual('Vault mock\n', status[0]['stdout'])
@@ -0,0 +1,330 @@
+"""
+Tests - Deuce Client - Client - Cooperative Upload
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+import deuceclient.api as api
+from deuceclient.client.cooperative import CooperativeUpload
+import deuceclient.client.cooperative as cooperative
+import deuceclient.client.deuce
+import deuceclient.common.errors as errors
+from deuceclient.tests import *
+
+
+class SharedDirectoryClient(deuceclient.client.deuce.DeuceClient):
+    """Stands in for the Deuce server with a directory shared by processes
+
+    Blocks are kept in server_dir/blocks and the assignments of a file in
+    server_dir/<file_id>, one file per offset, so workers in other
+    processes see the same vault.
+    """
+
+    def __init__(self, authenticator, apihost, server_dir, fail_offsets=()):
+        super(SharedDirectoryClient, self).__init__(authenticator, apihost,
+                                                    sslenabled=True)
+        self.server_dir = server_dir
+        self.fail_offsets = set(fail_offsets)
+        os.makedirs(os.path.join(server_dir, 'blocks'), exist_ok=True)
+
+    def __write(self, path, data):
+        temp_path = '{0}.{1}'.format(path, os.getpid())
+        with open(temp_path, 'wb') as output_file:
+            output_file.write(data)
+        os.replace(temp_path, path)
+
+    def CreateFile(self, vault):
+        file_id = create_file()
+        os.mkdir(os.path.join(self.server_dir, file_id))
+        vault.add_file(file_id, get_file_url(self.apihost, vault.vault_id,
+                                             file_id))
+        return file_id
+
+    def AssignBlocksToFile(self, vault, file_id, block_ids=None):
+        missing = []
+        for block_id, offset in block_ids:
+            if offset in self.fail_offsets:
+                self.fail_offsets.discard(offset)
+                raise RuntimeError('mock failure')
+
+            self.__write(os.path.join(self.server_dir, file_id,
+                                      str(offset)),
+                         '{0} {1}'.format(block_id, os.getpid()).encode())
+            if not os.path.exists(os.path.join(self.server_dir, 'blocks',
+                                               block_id)):
+                missing.append(block_id)
+        return missing
+
+    def UploadBlocks(self, vault, block_ids):
+        for block_id in block_ids:
+            self.__write(os.path.join(self.server_dir, 'blocks', block_id),
+                         vault.blocks[block_id].data)
+        return True
+
+    def FinalizeFile(self, vault, file_id, file_length=None):
+        with open(os.path.join(self.server_dir, 'finalized'), 'a') as log:
+            log.write('{0} {1}\n'.format(file_id, file_length))
+        return True
+
+    def finalized(self):
+        path = os.path.join(self.server_dir, 'finalized')
+        if not os.path.exists(path):
+            return []
+        with open(path) as log:
+            return [line.split() for line in log]
+
+    def assignments(self, file_id):
+        """Return the block id and pid of the worker assigning each offset
+        """
+        assigned = {}
+        file_dir = os.path.join(self.server_dir, file_id)
+        for name in os.listdir(file_dir):
+            with open(os.path.join(file_dir, name)) as assignment:
+                block_id, pid = assignment.read().split()
+            assigned[int(name)] = (block_id, int(pid))
+        return assigned
+
+    def content(self, file_id):
+        data = b''
+        for offset, (block_id, pid) in sorted(
+                self.assignments(file_id).items()):
+            with open(os.path.join(self.server_dir, 'blocks',
+                                   block_id), 'rb') as block:
+                data += block.read()
+        return data
+
+
+def work(client, work_dir, results):
+    """Run a worker in a process of its own
+    """
+    # Slow the worker down so the regions are spread between the workers
+    assign_blocks = client.AssignBlocksToFile
+
+    def slow_assign_blocks(*args, **kwargs):
+        time.sleep(0.02)
+        return assign_blocks(*args, **kwargs)
+
+    client.AssignBlocksToFile = slow_assign_blocks
+    results.put(CooperativeUpload.open(work_dir).work(client))
+
+
+class CooperativeUploadTests(ClientTestBase):
+
+    def setUp(self):
+        super(CooperativeUploadTests, self).setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.work_dir = os.path.join(self.temp_dir.name, 'work')
+        self.path = os.path.join(self.temp_dir.name, 'image')
+        self.client = self.make_client()
+
+    def make_client(self, fail_offsets=()):
+        return SharedDirectoryClient(self.authenticator, self.apihost,
+                                     os.path.join(self.temp_dir.name,
+                                                  'server'),
+                                     fail_offsets=fail_offsets)
+
+    def make_file(self, data):
+        with open(self.path, 'wb') as local_file:
+            local_file.write(data)
+
+    def create(self, regions, length=8000):
+        data = os.urandom(length)
+        self.make_file(data)
+        upload = CooperativeUpload.create(self.client, self.vault, self.path,
+                                          self.work_dir, regions,
+                                          chunk_size=1000)
+        return upload, data
+
+    def test_create(self):
+        upload, data = self.create(3)
+
+        self.assertEqual(8000, upload.length)
+        self.assertEqual([(0, 3000), (3000, 6000), (6000, 8000)],
+                         upload.regions)
+        self.assertEqual({}, upload.done_regions())
+
+        opened = CooperativeUpload.open(self.work_dir)
+        self.assertEqual(upload.file_id, opened.file_id)
+        self.assertEqual(upload.regions, opened.regions)
+
+    def test_create_existing_plan(self):
+        self.create(2)
+        with self.assertRaises(FileExistsError):
+            CooperativeUpload.create(self.client, self.vault, self.path,
+                                     self.work_dir, 2)
+
+    def test_create_invalid_regions(self):
+        self.make_file(b'data')
+        with self.assertRaises(ValueError):
+            CooperativeUpload.create(self.client, self.vault, self.path,
+                                     self.work_dir, 0)
+
+    def test_open_no_plan(self):
+        with self.assertRaises(FileNotFoundError):
+            CooperativeUpload.open(self.temp_dir.name)
+
+    def test_processes(self):
+        upload, data = self.create(6, length=16500)
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [context.Process(target=work,
+                                   args=(self.client, self.work_dir,
+                                         results))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+
+        summary = upload.finalize(self.client, timeout=60,
+                                  poll_interval=0.05)
+
+        worker_summaries = [results.get(timeout=60) for _ in workers]
+        for worker in workers:
+            worker.join(timeout=60)
+            self.assertEqual(0, worker.exitcode)
+
+        # Every region was uploaded by exactly one of the workers
+        self.assertEqual(6, sum(worker_summary['regions']
+                                for worker_summary in worker_summaries))
+        self.assertEqual(0, sum(worker_summary['failed_regions']
+                                for worker_summary in worker_summaries))
+        self.assertEqual({
+            'file_id': upload.file_id,
+            'url': get_file_url(self.apihost, self.vault.vault_id,
+                                upload.file_id),
+            'bytes': 16500,
+            'blocks': 17,
+            'uploaded_bytes': 16500,
+            'uploaded_blocks': 17,
+            'regions': 6
+        }, summary)
+
+        assignments = self.client.assignments(upload.file_id)
+        self.assertEqual(list(range(0, 16500, 1000)), sorted(assignments))
+        self.assertEqual({api.Block.make_id(data[offset:offset + 1000])
+                          for offset in range(0, 16500, 1000)},
+                         {block_id for block_id, pid in assignments.values()})
+        self.assertTrue({pid for block_id, pid in assignments.values()} <=
+                        {worker.pid for worker in workers})
+        self.assertEqual(data, self.client.content(upload.file_id))
+
+        # The file was finalized once, by the coordinator
+        self.assertEqual([[upload.file_id, '16500']],
+                         self.client.finalized())
+        self.assertEqual([], os.listdir(self.work_dir))
+
+    def test_work_resumes(self):
+        upload, data = self.create(4)
+
+        summary = upload.work(self.make_client(fail_offsets=[2000]))
+        self.assertEqual(3, summary['regions'])
+        self.assertEqual(1, summary['failed_regions'])
+        self.assertEqual([0, 2, 3], sorted(upload.done_regions()))
+
+        # The claim of the failed region was released
+        summary = CooperativeUpload.open(self.work_dir).work(self.client)
+        self.assertEqual(1, summary['regions'])
+        self.assertEqual(0, summary['failed_regions'])
+
+        upload.finalize(self.client, timeout=0)
+        self.assertEqual(data, self.client.content(upload.file_id))
+
+    def test_live_claim_skipped(self):
+        upload, data = self.create(2)
+        os.mkdir(os.path.join(self.work_dir, 'region-000001.claim'))
+
+        summary = upload.work(self.client)
+        self.assertEqual(1, summary['regions'])
+        self.assertEqual([0], list(upload.done_regions()))
+
+        with self.assertRaises(RuntimeError):
+            upload.finalize(self.client, timeout=0.1, poll_interval=0.05)
+        self.assertEqual([], self.client.finalized())
+
+    def test_expired_claim_taken_over(self):
+        upload, data = self.create(2)
+        claim_path = os.path.join(self.work_dir, 'region-000001.claim')
+        os.mkdir(claim_path)
+        with open(os.path.join(claim_path, 'crashed-worker'), 'w'):
+            pass
+        expired = time.time() - 120
+        os.utime(claim_path, (expired, expired))
+
+        summary = upload.work(self.client, claim_timeout=60)
+        self.assertEqual(2, summary['regions'])
+        self.assertFalse(os.path.exists(claim_path))
+        self.assertEqual([], [name for name in os.listdir(self.work_dir)
+                              if 'stale' in name])
+
+        upload.finalize(self.client, timeout=0)
+        self.assertEqual(data, self.client.content(upload.file_id))
+
+    def test_claim_taken_over_meanwhile(self):
+        upload, data = self.create(2)
+        claim_path = os.path.join(self.work_dir, 'region-000001.claim')
+        os.mkdir(claim_path)
+        with open(os.path.join(claim_path, 'crashed-worker'), 'w'):
+            pass
+        expired = time.time() - 120
+        os.utime(claim_path, (expired, expired))
+
+        rename = os.rename
+
+        def take_over_first(source, destination):
+            # Another worker takes the expired claim over right before this
+            # one moves it out of the way
+            if source == claim_path and os.path.exists(
+                    os.path.join(claim_path, 'crashed-worker')):
+                shutil.rmtree(claim_path)
+                os.mkdir(claim_path)
+                with open(os.path.join(claim_path, 'other-worker'), 'w'):
+                    pass
+            rename(source, destination)
+
+        with mock.patch.object(cooperative.os, 'rename', take_over_first):
+            summary = upload.work(self.client, claim_timeout=60)
+
+        # The claim of the other worker is left in place
+        self.assertEqual(1, summary['regions'])
+        self.assertEqual(['other-worker'], os.listdir(claim_path))
+        self.assertEqual([], [name for name in os.listdir(self.work_dir)
+                              if 'stale' in name])
+
+    def test_done_region_not_uploaded_again(self):
+        upload, data = self.create(2)
+        upload.work(self.client)
+        shutil.rmtree(os.path.join(self.temp_dir.name, 'server', 'blocks'))
+
+        summary = upload.work(self.client)
+        self.assertEqual(0, summary['regions'])
+        self.assertEqual(0, summary['uploaded_blocks'])
+
+    def test_source_changed(self):
+        upload, data = self.create(2)
+        self.make_file(os.urandom(9000))
+
+        with self.assertRaises(errors.InvalidContentError):
+            upload.work(self.client)
+
+    def test_work_path_override(self):
+        upload, data = self.create(2)
+        other_path = os.path.join(self.temp_dir.name, 'mount', 'image')
+        os.mkdir(os.path.dirname(other_path))
+        shutil.copy2(self.path, other_path)
+        os.unlink(self.path)
+
+        summary = upload.work(self.client, path=other_path)
+        self.assertEqual(2, summary['regions'])
+
+    def test_finalize_timeout(self):
+        upload, data = self.create(2)
+        with self.assertRaises(RuntimeError):
+            upload.finalize(self.client, timeout=0)
+        self.assertTrue(os.path.exists(os.path.join(self.work_dir,
+                                                    cooperative.PLAN_FILE)))
@@ -4,9 +4,12 @@ Tests - Deuce Client - Client - Deuce
 import json
 
 import httpretty
+import requests
 
 import deuceclient.api as api
 import deuceclient.api.vault as api_vault
+import deuceclient.client.deuce as deuce
+from deuceclient.common import errors
 from deuceclient.tests import *
 
 
@@ -22,3 +25,19 @@ class DeuceClientTests(ClientTestBase):
     Keeping temporarily for merge purposes
     To be Removed
     """
+
+
+class DeuceClientTransientErrorTests(TestCase):
+
+    def test_transient_errors(self):
+        self.assertTrue(deuce.is_transient_error(requests.ConnectionError()))
+        self.assertTrue(deuce.is_transient_error(requests.Timeout()))
+        for status_code in deuce.TRANSIENT_STATUS_CODES:
+            self.assertTrue(deuce.is_transient_error(
+                errors.DeuceRequestError('mock', status_code=status_code)))
+
+        self.assertFalse(deuce.is_transient_error(
+            errors.DeuceRequestError('mock', status_code=404)))
+        self.assertFalse(deuce.is_transient_error(
+            errors.DeuceRequestError('mock')))
+        self.assertFalse(deuce.is_transient_error(RuntimeError('mock')))
@@ -7,9 +7,11 @@ import urllib.parse
 import uuid
 
 import httpretty
+import mock
 
 import deuceclient.client.deuce
 import deuceclient.api as api
+from deuceclient.common import errors
 from deuceclient.tests import *
 
 
@@ -101,6 +103,8 @@ class ClientDeuceBlockTests(ClientTestBase):
         self.assertTrue(self.client.GetBlockList(self.vault,
                                                  marker=block_id,
                                                  limit=5))
+        self.assertEqual({'marker': [block_id], 'limit': ['5']},
+                         httpretty.last_request().querystring)
         self.assertEqual(len(data), len(self.vault.blocks))
         self.assertIsNone(self.vault.blocks.marker)
         for block_id in data:
@@ -332,6 +336,105 @@ class ClientDeuceBlockTests(ClientTestBase):
         for block_id, r in results:
             self.assertEqual(r, expected_results[block_id])
 
+    @httpretty.activate
+    def test_block_list_deletion_not_in_vault(self):
+        block_ids = [block[0] for block in create_blocks(block_count=5)]
+
+        for block_id in block_ids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 block_id),
+                                   status=204)
+
+        results = self.client.DeleteBlocks(self.vault, block_ids,
+                                           max_workers=2)
+
+        # the results are in the order of the block ids, not of the
+        # deletions completing
+        self.assertEqual([(block_id, True) for block_id in block_ids],
+                         results)
+
+    @httpretty.activate
+    def test_block_list_deletion_generator(self):
+        block_ids = [block[0] for block in create_blocks(block_count=5)]
+
+        for block_id in block_ids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 block_id),
+                                   status=204)
+
+        results = self.client.DeleteBlocks(
+            self.vault, (block_id for block_id in block_ids), max_workers=2)
+        self.assertEqual([(block_id, True) for block_id in block_ids],
+                         results)
+        self.assertEqual(5, len([request
+                                 for request in httpretty.latest_requests()
+                                 if request.method == 'DELETE']))
+
+    def test_block_list_deletion_invalid_generator(self):
+        with self.assertRaises(errors.InvalidBlocks):
+            self.client.DeleteBlocks(
+                self.vault, (block_id for block_id in ['not a block id']))
+
+    @httpretty.activate
+    def test_block_list_deletion_transient_failure(self):
+        block_id = create_block()[0]
+        httpretty.register_uri(httpretty.DELETE,
+                               get_block_url(self.apihost,
+                                             self.vault.vault_id,
+                                             block_id),
+                               responses=[
+                                   httpretty.Response(body='mock failure',
+                                                      status=503),
+                                   httpretty.Response(body='',
+                                                      status=204)
+                               ])
+
+        with mock.patch('deuceclient.common.parallel.time.sleep'):
+            results = self.client.DeleteBlocks(self.vault, [block_id])
+        self.assertEqual([(block_id, True)], results)
+
+        httpretty.register_uri(httpretty.DELETE,
+                               get_block_url(self.apihost,
+                                             self.vault.vault_id,
+                                             block_id),
+                               body='mock failure',
+                               status=503)
+
+        with mock.patch('deuceclient.common.parallel.time.sleep'):
+            results = self.client.DeleteBlocks(self.vault, [block_id],
+                                               retries=0)
+        self.assertEqual([(block_id, False)], results)
+
+    @httpretty.activate
+    def test_block_stream_deletion(self):
+        blocks = [block[0] for block in create_blocks(block_count=20)]
+
+        for block_id in blocks:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 block_id),
+                                   status=204)
+        # invalid ids are reported rather than stopping the stream
+        blocks.append('not a block id')
+
+        results = {block_id: (r, error) for block_id, r, error in
+                   self.client.StreamDeleteBlocks(self.vault,
+                                                  iter(blocks),
+                                                  max_workers=4,
+                                                  rate_limit=10000)}
+        self.assertEqual(len(blocks), len(results))
+        r, error = results.pop('not a block id')
+        self.assertFalse(r)
+        self.assertIsInstance(error, errors.InvalidBlocks)
+        for r, error in results.values():
+            self.assertTrue(r)
+            self.assertIsNone(error)
+
     @httpretty.activate
     def test_block_deletion(self):
         block_id, blockdata, block_size = create_block()
@@ -494,3 +597,134 @@ class ClientDeuceBlockTests(ClientTestBase):
         self.assertEqual(block.block_id, block_id)
         self.assertEqual(block.block_size, block_size)
         self.assertFalse(block.block_orphaned)
+
+    @httpretty.activate
+    def test_block_exists(self):
+        block_id, block_data, block_size = create_block()
+
+        httpretty.register_uri(httpretty.HEAD,
+                               get_block_url(self.apihost,
+                                             self.vault.vault_id,
+                                             block_id),
+                               status=204)
+
+        self.assertTrue(self.client.BlockExists(self.vault, block_id))
+
+    @httpretty.activate
+    def test_block_exists_non_existent(self):
+        block_id, block_data, block_size = create_block()
+
+        httpretty.register_uri(httpretty.HEAD,
+                               get_block_url(self.apihost,
+                                             self.vault.vault_id,
+                                             block_id),
+                               status=404)
+
+        self.assertFalse(self.client.BlockExists(self.vault, block_id))
+
+    @httpretty.activate
+    def test_block_exists_failed(self):
+        block_id, block_data, block_size = create_block()
+
+        httpretty.register_uri(httpretty.HEAD,
+                               get_block_url(self.apihost,
+                                             self.vault.vault_id,
+                                             block_id),
+                               content_type='text/plain',
+                               body='mocking error',
+                               status=500)
+
+        with self.assertRaises(RuntimeError):
+            self.client.BlockExists(self.vault, block_id)
+
+    def register_block_heads(self, blocks_present, blocks_missing):
+        for block_id in blocks_present:
+            httpretty.register_uri(httpretty.HEAD,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 block_id),
+                                   status=204)
+        for block_id in blocks_missing:
+            httpretty.register_uri(httpretty.HEAD,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 block_id),
+                                   status=404)
+
+    @httpretty.activate
+    def test_blocks_exist(self):
+        blocks_present = [block[0] for block in create_blocks(block_count=10)]
+        blocks_missing = [block[0] for block in create_blocks(block_count=10)]
+        self.register_block_heads(blocks_present, blocks_missing)
+
+        block_ids = blocks_present + blocks_missing
+        random.shuffle(block_ids)
+
+        results = self.client.BlocksExist(self.vault, block_ids,
+                                          max_workers=4)
+        self.assertEqual(len(block_ids), len(results))
+        for block_id in blocks_present:
+            self.assertTrue(results[block_id])
+        for block_id in blocks_missing:
+            self.assertFalse(results[block_id])
+
+    @httpretty.activate
+    def test_blocks_exist_generator(self):
+        blocks_present = [block[0] for block in create_blocks(block_count=3)]
+        blocks_missing = [block[0] for block in create_blocks(block_count=3)]
+        self.register_block_heads(blocks_present, blocks_missing)
+
+        results = self.client.BlocksExist(
+            self.vault,
+            (block_id for block_id in blocks_present + blocks_missing),
+            max_workers=2)
+
+        self.assertEqual(dict([(block_id, True)
+                               for block_id in blocks_present] +
+                              [(block_id, False)
+                               for block_id in blocks_missing]), results)
+
+    def test_blocks_exist_invalid_generator(self):
+        with self.assertRaises(errors.InvalidBlocks):
+            self.client.BlocksExist(
+                self.vault, (block_id for block_id in ['not a block id']))
+
+    @httpretty.activate
+    def test_blocks_exist_negative_cache(self):
+        blocks_present = [block[0] for block in create_blocks(block_count=5)]
+        blocks_missing = [block[0] for block in create_blocks(block_count=5)]
+        blocks_cached = [block[0] for block in create_blocks(block_count=5)]
+        self.register_block_heads(blocks_present, blocks_missing)
+
+        negative_cache = set(blocks_cached)
+        results = self.client.BlocksExist(
+            self.vault,
+            blocks_present + blocks_missing + blocks_cached + blocks_present,
+            negative_cache=negative_cache)
+
+        self.assertEqual(15, len(results))
+        for block_id in blocks_present:
+            self.assertTrue(results[block_id])
+            self.assertNotIn(block_id, negative_cache)
+        for block_id in blocks_missing + blocks_cached:
+            self.assertFalse(results[block_id])
+            self.assertIn(block_id, negative_cache)
+
+        # each block not already in the negative cache was checked once
+        self.assertEqual(10, len(httpretty.httpretty.latest_requests))
+
+    @httpretty.activate
+    def test_blocks_exist_failed(self):
+        blocks_present = [block[0] for block in create_blocks(block_count=5)]
+        block_id = create_block()[0]
+        self.register_block_heads(blocks_present, [])
+        httpretty.register_uri(httpretty.HEAD,
+                               get_block_url(self.apihost,
+                                             self.vault.vault_id,
+                                             block_id),
+                               content_type='text/plain',
+                               body='mocking error',
+                               status=500)
+
+        with self.assertRaises(RuntimeError):
+            self.client.BlocksExist(self.vault, blocks_present + [block_id])
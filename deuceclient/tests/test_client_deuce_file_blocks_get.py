@@ -165,6 +165,8 @@ class ClientDeuceFileGetBlocksTests(ClientTestBase):
                                                               limit=5)
         self.assertEqual(return_data,
                          block_list)
+        self.assertEqual({'marker': [block_id], 'limit': ['5']},
+                         httpretty.last_request().querystring)
         self.assertIsNone(block_next)
 
     @httpretty.activate
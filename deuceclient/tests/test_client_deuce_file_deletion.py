@@ -45,3 +45,32 @@ class ClientDeuceFileDeletionTests(ClientTestBase):
 
         with self.assertRaises(RuntimeError):
             self.client.DeleteFile(self.vault, file_id)
+
+    @httpretty.activate
+    def test_file_stream_deletion(self):
+        file_ids = [create_file() for _ in range(10)]
+        failed_file_id = file_ids[0]
+
+        for file_id in file_ids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_file_url(self.apihost,
+                                                self.vault.vault_id,
+                                                file_id),
+                                   status=204)
+        httpretty.register_uri(httpretty.DELETE,
+                               get_file_url(self.apihost,
+                                            self.vault.vault_id,
+                                            failed_file_id),
+                               status=404)
+
+        results = list(self.client.StreamDeleteFiles(self.vault,
+                                                     iter(file_ids),
+                                                     max_workers=3))
+        self.assertEqual(len(file_ids), len(results))
+        for file_id, r, error in results:
+            if file_id == failed_file_id:
+                self.assertFalse(r)
+                self.assertEqual(404, error.status_code)
+            else:
+                self.assertTrue(r)
+                self.assertIsNone(error)
@@ -1,9 +1,11 @@
 """
 Tests - Deuce Client - Client - Deuce - File - Download
 """
+import io
 import json
 import os
 import tempfile
+import threading
 
 import httpretty
 import mock
@@ -11,6 +13,7 @@ import mock
 import deuceclient.api as api
 import deuceclient.client.deuce
 from deuceclient.tests import *
+import deuceclient.tests.test_client_deuce_file_restore as restore_tests
 
 
 class ClientDeuceFileDownloadTests(ClientTestBase):
@@ -93,3 +96,124 @@ class ClientDeuceFileDownloadTests(ClientTestBase):
                          self.client.DownloadFile(self.vault,
                                                   file_id,
                                                   output_file.name))
+
+    @httpretty.activate
+    def test_file_download_to_stream(self):
+        file_id = create_file()
+        data = os.urandom(2 * 1024 * 1024)
+
+        httpretty.register_uri(httpretty.GET,
+                               get_file_url(self.apihost,
+                                            self.vault.vault_id,
+                                            file_id),
+                               body=data,
+                               status=200)
+
+        output = io.BytesIO()
+        self.assertTrue(self.client.DownloadFile(self.vault, file_id, output))
+        self.assertEqual(data, output.getvalue())
+
+        chunks = []
+        self.assertTrue(self.client.DownloadFile(self.vault, file_id,
+                                                 chunks.append))
+        self.assertEqual(data, b''.join(chunks))
+
+
+class ClientDeuceFileStreamTests(restore_tests.FileBlocksServerTestBase):
+
+    def stream(self, output, **kwargs):
+        return self.client.StreamFile(self.vault, self.file_id, output,
+                                      max_workers=1, retries=0, **kwargs)
+
+    @httpretty.activate
+    def test_stream_file(self):
+        self.make_file(7, repeat=1)
+        self.register(page_size=3)
+
+        output = io.BytesIO()
+        summary = self.stream(output)
+
+        self.assertEqual(self.content, output.getvalue())
+        self.assertEqual({
+            'file_id': self.file_id,
+            'bytes': len(self.content),
+            'blocks': 8
+        }, summary)
+
+    @httpretty.activate
+    def test_stream_file_to_callable_and_path(self):
+        self.make_file(3)
+        self.register()
+
+        chunks = []
+        self.stream(chunks.append)
+        self.assertEqual(self.content, b''.join(chunks))
+        self.assertEqual(3, len(chunks))
+
+        self.stream(self.output_file)
+        with open(self.output_file, 'rb') as output:
+            self.assertEqual(self.content, output.read())
+
+    @httpretty.activate
+    def test_stream_file_failure(self):
+        self.make_file(5)
+        self.register()
+        self.failing.add(self.manifest[3][0])
+
+        output = io.BytesIO()
+        with self.assertRaises(RuntimeError):
+            self.stream(output)
+
+        # The content before the failed block was written, in order
+        self.assertEqual(self.content[:self.manifest[3][1]],
+                         output.getvalue())
+
+    @httpretty.activate
+    def test_stream_file_zero_blocks(self):
+        self.add_block(bytes(400))
+        self.make_file(2)
+        self.add_block(bytes(300))
+        self.register()
+
+        output = io.BytesIO()
+        self.stream(output)
+
+        self.assertEqual(self.content, output.getvalue())
+        self.assertEqual(self.manifest[1:], [
+            entry for entry in self.manifest
+            if entry[0] in self.downloads])
+
+    def test_stream_file_reorders(self):
+        blocks = create_blocks(block_count=12, block_size=10,
+                               uniform_sizes=True)
+        manifest = [(block_id, index * 10)
+                    for index, (block_id, data, size) in enumerate(blocks)]
+        contents = {block_id: data for block_id, data, size in blocks}
+        released = set()
+        condition = threading.Condition()
+
+        def download_block(vault, block):
+            # Each block waits for the one after it to be requested, so
+            # they complete out of order, except the last
+            index = [block_id for block_id, offset
+                     in manifest].index(block.block_id)
+            with condition:
+                released.add(index)
+                condition.notify_all()
+                condition.wait_for(lambda: index + 1 in released or
+                                   index + 1 == len(manifest), timeout=5)
+            block.data = contents[block.block_id]
+            return True
+
+        output = io.BytesIO()
+        with mock.patch.object(self.client, 'GetFileManifest',
+                               return_value=manifest), \
+                mock.patch.object(deuceclient.client.deuce.DeuceClient,
+                                  'DownloadBlock', autospec=True,
+                                  side_effect=lambda client, vault, block:
+                                  download_block(vault, block)):
+            self.client.StreamFile(self.vault, self.file_id, output,
+                                   max_workers=4)
+
+        self.assertEqual(b''.join(data for block_id, data, size in blocks),
+                         output.getvalue())
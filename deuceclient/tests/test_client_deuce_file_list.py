@@ -0,0 +1,96 @@
+"""
+Tests - Deuce Client - Client - Deuce - File - List
+"""
+import json
+import urllib.parse
+
+import httpretty
+
+import deuceclient.api as api
+import deuceclient.client.deuce
+from deuceclient.tests import *
+
+
+class ClientDeuceFileListTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceFileListTests, self).setUp()
+
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+
+    def tearDown(self):
+        super(ClientDeuceFileListTests, self).tearDown()
+
+    @httpretty.activate
+    def test_file_list(self):
+        data = [create_file() for _ in range(5)]
+
+        httpretty.register_uri(httpretty.GET,
+                               get_files_url(self.apihost,
+                                             self.vault.vault_id),
+                               content_type='application/json',
+                               body=json.dumps(data),
+                               status=200)
+
+        self.assertEqual(data, self.client.GetFileList(self.vault))
+        self.assertIsNone(self.vault.files.marker)
+        for file_id in data:
+            self.assertIn(file_id, self.vault.files)
+
+    @httpretty.activate
+    def test_file_list_with_next_batch(self):
+        data = [create_file() for _ in range(5)]
+        next_marker = create_file()
+
+        url = get_files_url(self.apihost, self.vault.vault_id)
+        url_params = urllib.parse.urlencode({'marker': next_marker})
+        httpretty.register_uri(httpretty.GET,
+                               url,
+                               content_type='application/json',
+                               adding_headers={
+                                   'x-next-batch': '{0}?{1}'.format(url,
+                                                                    url_params)
+                               },
+                               body=json.dumps(data),
+                               status=200)
+
+        # a file already known to the vault is kept as is
+        self.vault.add_file(data[0])
+        known_file = self.vault.files[data[0]]
+
+        self.assertEqual(data, self.client.GetFileList(self.vault,
+                                                       marker=create_file(),
+                                                       limit=5))
+        self.assertEqual(next_marker, self.vault.files.marker)
+        self.assertIs(known_file, self.vault.files[data[0]])
+
+        query = httpretty.last_request().querystring
+        self.assertIn('marker', query)
+        self.assertEqual(['5'], query['limit'])
+
+    @httpretty.activate
+    def test_file_list_with_limit(self):
+        httpretty.register_uri(httpretty.GET,
+                               get_files_url(self.apihost,
+                                             self.vault.vault_id),
+                               content_type='application/json',
+                               body=json.dumps([]),
+                               status=200)
+
+        self.assertEqual([], self.client.GetFileList(self.vault, limit=5))
+        self.assertEqual({'limit': ['5']},
+                         httpretty.last_request().querystring)
+
+    @httpretty.activate
+    def test_file_list_failed(self):
+        httpretty.register_uri(httpretty.GET,
+                               get_files_url(self.apihost,
+                                             self.vault.vault_id),
+                               content_type='text/plain',
+                               body='mock failure',
+                               status=404)
+
+        with self.assertRaises(RuntimeError):
+            self.client.GetFileList(self.vault)
@@ -0,0 +1,242 @@
+"""
+Tests - Deuce Client - Client - Deuce - File - Restore
+"""
+import json
+import os
+import re
+import tempfile
+
+import httpretty
+
+import deuceclient.api as api
+import deuceclient.client.deuce
+from deuceclient.common.checkpoint import Checkpoint
+from deuceclient.tests import *
+
+
+class FileBlocksServerTestBase(ClientTestBase):
+    """Serves the blocks of a file, block by block
+    """
+
+    def setUp(self):
+        super(FileBlocksServerTestBase, self).setUp()
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.temp_dir.name, 'restored')
+        self.checkpoint = Checkpoint(os.path.join(self.temp_dir.name,
+                                                  'restored.restore'))
+        self.file_id = create_file()
+        self.blocks = {}
+        self.manifest = []
+        self.content = b''
+        self.downloads = []
+        self.failing = set()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(FileBlocksServerTestBase, self).tearDown()
+
+    def make_file(self, block_count, repeat=None):
+        blocks = create_blocks(block_count=block_count, min_size=1,
+                               max_size=300)
+        if repeat is not None:
+            blocks.append(blocks[repeat])
+
+        for block_id, block_data, block_size in blocks:
+            self.blocks[block_id] = block_data
+            self.manifest.append((block_id, len(self.content)))
+            self.content += block_data
+
+    def add_block(self, block_data):
+        block_id = api.Block.make_id(block_data)
+        self.blocks[block_id] = block_data
+        self.manifest.append((block_id, len(self.content)))
+        self.content += block_data
+
+    def register(self, page_size=1000):
+        file_blocks_url = get_file_blocks_url(self.apihost,
+                                              self.vault.vault_id,
+                                              self.file_id)
+
+        def list_blocks(request, uri, headers):
+            block_ids = [block_id for block_id, offset in self.manifest]
+            start = 0
+            if 'marker' in request.querystring:
+                start = block_ids.index(request.querystring['marker'][0])
+            end = start + page_size
+            if end < len(self.manifest):
+                headers['x-next-batch'] = '{0}?marker={1}'.format(
+                    file_blocks_url, block_ids[end])
+            return (200, headers, json.dumps(self.manifest[start:end]))
+
+        def get_block(request, uri, headers):
+            block_id = uri.rsplit('/', 1)[-1]
+            self.downloads.append(block_id)
+            if block_id in self.failing:
+                return (404, headers, 'mock failure')
+            return (200, headers, self.blocks[block_id])
+
+        httpretty.register_uri(httpretty.GET,
+                               re.compile(re.escape(file_blocks_url)),
+                               body=list_blocks)
+        httpretty.register_uri(httpretty.GET,
+                               re.compile(re.escape(get_blocks_url(
+                                   self.apihost, self.vault.vault_id)) +
+                                   '/[0-9a-f]+$'),
+                               body=get_block)
+
+
+class ClientDeuceFileRestoreTests(FileBlocksServerTestBase):
+
+    def restore(self, **kwargs):
+        return self.client.RestoreFile(self.vault, self.file_id,
+                                       self.output_file, max_workers=1,
+                                       retries=0, **kwargs)
+
+    def restored(self):
+        with open(self.output_file, 'rb') as restored_file:
+            return restored_file.read()
+
+    @httpretty.activate
+    def test_restore(self):
+        self.make_file(5, repeat=2)
+        self.register(page_size=2)
+
+        summary = self.restore()
+
+        self.assertEqual(self.content, self.restored())
+        self.assertEqual(len(self.content), summary['bytes'])
+        self.assertEqual(6, summary['blocks'])
+        self.assertEqual(5, summary['downloaded_blocks'])
+        self.assertEqual(0, summary['resumed_blocks'])
+        self.assertEqual(5, len(self.downloads))
+
+    @httpretty.activate
+    def test_restore_empty_file(self):
+        self.register()
+        with open(self.output_file, 'wb') as output:
+            output.write(b'stale')
+
+        summary = self.restore(checkpoint=self.checkpoint)
+
+        self.assertEqual(b'', self.restored())
+        self.assertEqual(0, summary['bytes'])
+        self.assertIsNone(self.checkpoint.load())
+
+    @httpretty.activate
+    def test_restore_failure_and_resume(self):
+        self.make_file(6)
+        self.register()
+        failed_block = self.manifest[3][0]
+        self.failing.add(failed_block)
+
+        with self.assertRaises(RuntimeError):
+            self.restore(checkpoint=self.checkpoint)
+
+        state = self.checkpoint.load()
+        self.assertEqual(self.file_id, state['file_id'])
+
+        self.failing.clear()
+        self.downloads = []
+        summary = self.restore(checkpoint=self.checkpoint)
+
+        self.assertEqual([failed_block], self.downloads)
+        self.assertEqual(5, summary['resumed_blocks'])
+        self.assertEqual(1, summary['downloaded_blocks'])
+        self.assertEqual(self.content, self.restored())
+        self.assertIsNone(self.checkpoint.load())
+
+    @httpretty.activate
+    def test_restore_resume_verify(self):
+        self.make_file(4)
+        self.register()
+        self.failing.add(self.manifest[0][0])
+
+        with self.assertRaises(RuntimeError):
+            self.restore(checkpoint=self.checkpoint)
+
+        # Damage a block that was restored
+        damaged_block, damaged_offset = self.manifest[2]
+        with open(self.output_file, 'r+b') as output:
+            output.seek(damaged_offset)
+            output.write(b'\0')
+
+        self.failing.clear()
+        self.downloads = []
+        summary = self.restore(checkpoint=self.checkpoint, verify=True)
+
+        self.assertEqual(sorted([self.manifest[0][0], damaged_block]),
+                         sorted(self.downloads))
+        self.assertEqual(2, summary['resumed_blocks'])
+        self.assertEqual(self.content, self.restored())
+
+    @httpretty.activate
+    def test_restore_checkpoint_of_other_file(self):
+        self.make_file(3)
+        self.register()
+        self.checkpoint.save({'file_id': create_file(),
+                              'manifest': 'other',
+                              'length': None,
+                              'done': 'other'})
+        with open(self.output_file, 'wb') as output:
+            output.write(os.urandom(2000))
+
+        summary = self.restore(checkpoint=self.checkpoint)
+
+        self.assertEqual(0, summary['resumed_blocks'])
+        self.assertEqual(3, len(self.downloads))
+        self.assertEqual(self.content, self.restored())
+
+    @httpretty.activate
+    def test_restore_block_wrong_content(self):
+        self.make_file(2)
+        self.register()
+        self.blocks[self.manifest[1][0]] = b'corrupted'
+
+        with self.assertRaises(RuntimeError):
+            self.restore(checkpoint=self.checkpoint)
+
+        self.assertIsNotNone(self.checkpoint.load())
+
+    @httpretty.activate
+    def test_restore_zero_blocks(self):
+        self.make_file(2)
+        self.add_block(bytes(500))
+        self.make_file(1)
+        self.add_block(bytes(500))
+        self.add_block(bytes(300))
+        self.register()
+
+        summary = self.restore()
+
+        # Only the last block of zeros, whose size is not known, is
+        # downloaded
+        self.assertEqual(self.content, self.restored())
+        self.assertEqual(2, summary['zero_blocks'])
+        self.assertEqual(4, summary['downloaded_blocks'])
+        self.assertNotIn(self.manifest[2][0], self.downloads)
+
+    @httpretty.activate
+    def test_restore_resume_verify_zero_block(self):
+        self.make_file(2)
+        self.add_block(bytes(500))
+        self.make_file(1)
+        self.register()
+        self.failing.add(self.manifest[0][0])
+
+        with self.assertRaises(RuntimeError):
+            self.restore(checkpoint=self.checkpoint)
+
+        with open(self.output_file, 'r+b') as output:
+            output.seek(self.manifest[2][1] + 100)
+            output.write(b'damaged')
+
+        self.failing.clear()
+        self.downloads = []
+        summary = self.restore(checkpoint=self.checkpoint, verify=True)
+
+        self.assertEqual([self.manifest[0][0]], self.downloads)
+        self.assertEqual(1, summary['zero_blocks'])
+        self.assertEqual(self.content, self.restored())
@@ -0,0 +1,576 @@
+"""
+Tests - Deuce Client - Client - Deuce - File - Upload
+"""
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import httpretty
+import mock
+import msgpack
+
+import deuceclient.api as api
+import deuceclient.client.deuce
+from deuceclient.client.fileidpool import FileIdPool
+from deuceclient.common import errors
+from deuceclient.common.checkpoint import Checkpoint
+from deuceclient.common.manifestcache import ManifestCache
+from deuceclient.tests import *
+
+
+class FakeFileServer(object):
+    """Just enough of the files and blocks API to upload files into
+    """
+
+    def __init__(self, apihost, vault_id, stored_blocks=()):
+        self.apihost = apihost
+        self.vault_id = vault_id
+        self.lock = threading.Lock()
+        self.blocks = {block_id: None for block_id in stored_blocks}
+        self.files = {}
+        self.finalized = {}
+        self.assignments = 0
+
+    def register(self):
+        httpretty.register_uri(httpretty.POST,
+                               get_files_url(self.apihost, self.vault_id),
+                               body=self.create_file)
+        httpretty.register_uri(httpretty.POST,
+                               re.compile(re.escape(get_files_url(
+                                   self.apihost, self.vault_id)) + '/.+'),
+                               body=self.file_request)
+        httpretty.register_uri(httpretty.DELETE,
+                               re.compile(re.escape(get_files_url(
+                                   self.apihost, self.vault_id)) + '/.+'),
+                               body=self.delete_file)
+        httpretty.register_uri(httpretty.POST,
+                               get_blocks_url(self.apihost, self.vault_id),
+                               body=self.upload_blocks)
+
+    def create_file(self, request, uri, headers):
+        file_id = create_file()
+        with self.lock:
+            self.files[file_id] = {}
+        headers.update({
+            'x-file-id': file_id,
+            'location': get_file_url(self.apihost, self.vault_id, file_id)
+        })
+        return (201, headers, '')
+
+    def file_request(self, request, uri, headers):
+        file_id = uri.split('/files/')[1].split('/')[0]
+        with self.lock:
+            if uri.endswith('/blocks'):
+                self.assignments += 1
+                missing = []
+                for block_id, offset in json.loads(request.body.decode()):
+                    self.files[file_id][offset] = block_id
+                    if block_id not in self.blocks:
+                        missing.append(block_id)
+                return (200, headers, json.dumps(missing))
+
+            self.finalized[file_id] = int(request.headers['X-File-Length'])
+            return (204, headers, '')
+
+    def delete_file(self, request, uri, headers):
+        with self.lock:
+            del self.files[uri.split('/files/')[1]]
+        return (204, headers, '')
+
+    def upload_blocks(self, request, uri, headers):
+        with self.lock:
+            self.blocks.update(msgpack.unpackb(request.body, raw=False))
+        return (201, headers, '')
+
+    def content(self, file_id):
+        offsets = self.files[file_id]
+        return b''.join(self.blocks[offsets[offset]]
+                        for offset in sorted(offsets))
+
+
+class ClientDeuceFileUploadTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceFileUploadTests, self).setUp()
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+
+    def tearDown(self):
+        super(ClientDeuceFileUploadTests, self).tearDown()
+
+    def serial_file_id_pool(self):
+        # httpretty does not cope with requests from several threads at once
+        pool = FileIdPool(self.client, self.vault, min_size=0, workers=0)
+        self.addCleanup(pool.close)
+        return pool
+
+    @httpretty.activate
+    def test_upload_file(self):
+        chunk_size = 1024 * 1024
+        data = os.urandom(3 * chunk_size + 1000)
+        existing_block_id = api.Block.make_id(data[:chunk_size])
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id,
+                                stored_blocks=[existing_block_id])
+        server.blocks[existing_block_id] = data[:chunk_size]
+        server.register()
+
+        summary = self.client.UploadFile(self.vault, io.BytesIO(data),
+                                         count=2)
+
+        file_id = summary['file_id']
+        self.assertEqual({
+            'file_id': file_id,
+            'url': get_file_url(self.apihost, self.vault.vault_id, file_id),
+            'bytes': len(data),
+            'blocks': 4,
+            'uploaded_bytes': len(data) - chunk_size,
+            'uploaded_blocks': 3
+        }, summary)
+
+        self.assertEqual(2, server.assignments)
+        self.assertEqual({file_id: len(data)}, server.finalized)
+        self.assertEqual(data, server.content(file_id))
+
+        # The upload does not accumulate the file in the vault
+        self.assertNotIn(file_id, self.vault.files)
+
+    @httpretty.activate
+    def test_upload_file_duplicate_blocks(self):
+        data = bytes(3 * 1024 * 1024)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        summary = self.client.UploadFile(self.vault, io.BytesIO(data))
+
+        self.assertEqual(3, summary['blocks'])
+        self.assertEqual(1, summary['uploaded_blocks'])
+        self.assertEqual(1024 * 1024, summary['uploaded_bytes'])
+        self.assertEqual(data, server.content(summary['file_id']))
+        self.assertEqual(len(data), server.finalized[summary['file_id']])
+
+    @httpretty.activate
+    def test_upload_file_prefetch(self):
+        data = os.urandom(3 * 1024 * 1024 + 1000)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        summary = self.client.UploadFile(self.vault, io.BytesIO(data),
+                                         count=2,
+                                         prefetch_bytes=2 * 1024 * 1024)
+
+        self.assertEqual(4, summary['blocks'])
+        self.assertEqual(data, server.content(summary['file_id']))
+
+    @httpretty.activate
+    def test_upload_file_pipe(self):
+        data = os.urandom(2 * 1024 * 1024 + 100)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        read_fd, write_fd = os.pipe()
+
+        def produce():
+            with open(write_fd, 'wb') as pipe:
+                pipe.write(data)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        with open(read_fd, 'rb') as content:
+            self.assertFalse(content.seekable())
+            summary = self.client.UploadFile(self.vault, content)
+        producer.join()
+
+        self.assertEqual(3, summary['blocks'])
+        self.assertEqual(len(data), summary['bytes'])
+        self.assertEqual(data, server.content(summary['file_id']))
+        self.assertEqual(len(data), server.finalized[summary['file_id']])
+
+    @httpretty.activate
+    def test_upload_file_existing_file(self):
+        file_id = create_file()
+        data = os.urandom(1000)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.files[file_id] = {}
+        server.register()
+
+        summary = self.client.UploadFile(self.vault, io.BytesIO(data),
+                                         file_id=file_id)
+        self.assertEqual(file_id, summary['file_id'])
+        self.assertEqual({file_id: 1000}, server.finalized)
+        self.assertEqual(data, server.content(file_id))
+
+    @httpretty.activate
+    def test_upload_file_empty(self):
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        summary = self.client.UploadFile(self.vault, io.BytesIO())
+        self.assertEqual(0, summary['bytes'])
+        self.assertEqual(0, server.assignments)
+        self.assertEqual({summary['file_id']: 0}, server.finalized)
+
+    def test_upload_file_bad_vault(self):
+        with self.assertRaises(TypeError):
+            self.client.UploadFile(self.vault.vault_id, io.BytesIO())
+
+    @httpretty.activate
+    def test_upload_file_failed(self):
+        file_id = create_file()
+        self.vault.add_file(file_id)
+        httpretty.register_uri(httpretty.POST,
+                               get_file_blocks_url(self.apihost,
+                                                   self.vault.vault_id,
+                                                   file_id),
+                               status=500)
+
+        with self.assertRaises(RuntimeError):
+            self.client.UploadFile(self.vault, io.BytesIO(b'data'),
+                                   file_id=file_id)
+
+    @httpretty.activate
+    def test_upload_file_keep_manifest(self):
+        data = os.urandom(2 * 1024 * 1024 + 10)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        summary = self.client.UploadFile(self.vault, io.BytesIO(data),
+                                         keep_manifest=True)
+        offsets = server.files[summary['file_id']]
+        self.assertEqual([(offsets[offset], offset)
+                          for offset in sorted(offsets)],
+                         summary['manifest'])
+
+    def upload_manifest(self, data):
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+        summary = self.client.UploadFile(self.vault, io.BytesIO(data),
+                                         keep_manifest=True)
+        return (server, summary['manifest'])
+
+    @httpretty.activate
+    def test_upload_file_from_manifest(self):
+        data = os.urandom(3 * 1024 * 1024 + 10)
+        server, manifest = self.upload_manifest(data)
+
+        content = mock.Mock()
+        summary = self.client.UploadFileFromManifest(self.vault, manifest,
+                                                     len(data),
+                                                     content=content)
+
+        file_id = summary['file_id']
+        self.assertEqual(len(data), server.finalized[file_id])
+        self.assertEqual(data, server.content(file_id))
+        self.assertEqual(4, summary['blocks'])
+        self.assertEqual(len(data), summary['bytes'])
+        self.assertEqual(0, summary['uploaded_bytes'])
+        # Nothing was read
+        self.assertEqual([], content.mock_calls)
+
+    @httpretty.activate
+    def test_upload_file_from_manifest_missing_blocks(self):
+        data = os.urandom(3 * 1024 * 1024 + 10)
+        server, manifest = self.upload_manifest(data)
+
+        # The vault lost a block since
+        del server.blocks[manifest[1][0]]
+        summary = self.client.UploadFileFromManifest(self.vault, manifest,
+                                                     len(data),
+                                                     content=io.BytesIO(data))
+
+        self.assertEqual(data, server.content(summary['file_id']))
+        self.assertEqual(1, summary['uploaded_blocks'])
+        self.assertEqual(1024 * 1024, summary['uploaded_bytes'])
+
+    @httpretty.activate
+    def test_upload_file_from_manifest_changed_content(self):
+        data = os.urandom(3 * 1024 * 1024 + 10)
+        server, manifest = self.upload_manifest(data)
+        del server.blocks[manifest[1][0]]
+
+        for content in (None, io.BytesIO(os.urandom(len(data)))):
+            with self.assertRaises(errors.InvalidContentError):
+                self.client.UploadFileFromManifest(self.vault, manifest,
+                                                   len(data),
+                                                   content=content)
+
+        # The incomplete files were deleted
+        self.assertEqual(1, len(server.files))
+
+    @httpretty.activate
+    def test_stream_upload_files_manifest_cache(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        paths = []
+        for index in range(3):
+            paths.append(os.path.join(temp_dir, 'file{0}'.format(index)))
+            with open(paths[-1], 'wb') as local_file:
+                local_file.write(os.urandom(1024 * 1024 + index))
+
+        def upload():
+            with ManifestCache(os.path.join(temp_dir, 'cache.db')) as cache:
+                results = list(self.client.StreamUploadFiles(
+                    self.vault, paths, max_workers=1,
+                    file_id_pool=self.serial_file_id_pool(),
+                    manifest_cache=cache))
+            for path, summary, error in results:
+                self.assertIsNone(error)
+                with open(path, 'rb') as local_file:
+                    self.assertEqual(local_file.read(),
+                                     server.content(summary['file_id']))
+            return {path: summary for path, summary, _ in results}
+
+        first = upload()
+        self.assertEqual([False] * 3, [first[p]['cached'] for p in paths])
+
+        with open(paths[2], 'ab') as local_file:
+            local_file.write(b'changed')
+
+        with mock.patch.object(deuceclient.client.deuce.UniformSplitter,
+                               'get_block',
+                               autospec=True,
+                               side_effect=deuceclient.client.deuce.
+                               UniformSplitter.get_block) as get_block:
+            second = upload()
+
+        self.assertEqual([True, True, False],
+                         [second[p]['cached'] for p in paths])
+        self.assertEqual(0, second[paths[0]]['uploaded_bytes'])
+        self.assertEqual(first[paths[0]]['bytes'],
+                         second[paths[0]]['bytes'])
+        # Only the changed file was read
+        self.assertEqual({paths[2]}, set(
+            call[0][0].input_stream.name for call in get_block.call_args_list))
+
+    def make_source(self, data):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'source')
+        with open(path, 'wb') as source:
+            source.write(data)
+        return (path, Checkpoint(os.path.join(temp_dir, 'journal')))
+
+    @httpretty.activate
+    def test_upload_file_journal_resume(self):
+        chunk_size = deuceclient.client.deuce.DEFAULT_CHUNK_SIZE
+        data = os.urandom(5 * chunk_size + 10)
+        path, journal = self.make_source(data)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+
+        # The upload is interrupted during its second assignment
+        upload_blocks = server.upload_blocks
+        uploads = []
+
+        def interrupted_upload_blocks(request, uri, headers):
+            uploads.append(uri)
+            if len(uploads) == 2:
+                return (500, headers, 'mock failure')
+            return upload_blocks(request, uri, headers)
+
+        server.upload_blocks = interrupted_upload_blocks
+        server.register()
+
+        with open(path, 'rb') as content:
+            with self.assertRaises(RuntimeError):
+                self.client.UploadFile(self.vault, content, count=2,
+                                       journal=journal)
+
+        state = journal.load()
+        self.assertEqual(2 * chunk_size, state['offset'])
+        self.assertEqual(2, state['blocks'])
+        self.assertEqual(list(server.files), [state['file_id']])
+
+        with open(path, 'rb') as content:
+            summary = self.client.UploadFile(self.vault, content, count=2,
+                                             journal=journal)
+
+        # Resumed into the same file from the last completed assignment
+        self.assertEqual(state['file_id'], summary['file_id'])
+        self.assertEqual(list(server.files), [state['file_id']])
+        self.assertEqual(len(data), summary['bytes'])
+        self.assertEqual(6, summary['blocks'])
+        self.assertEqual(6, summary['uploaded_blocks'])
+        self.assertEqual(len(data), summary['uploaded_bytes'])
+        self.assertEqual(4, len(uploads))
+        self.assertEqual(data, server.content(summary['file_id']))
+        self.assertEqual(len(data), server.finalized[summary['file_id']])
+        self.assertIsNone(journal.load())
+
+    @httpretty.activate
+    def test_upload_file_journal_resume_finalize(self):
+        data = os.urandom(3000)
+        path, journal = self.make_source(data)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        # Interrupted after the last assignment, before the finalization
+        with open(path, 'rb') as content, \
+                mock.patch.object(journal, 'clear'), \
+                mock.patch.object(self.client, 'FinalizeFile',
+                                  side_effect=RuntimeError('mock failure')):
+            with self.assertRaises(RuntimeError):
+                self.client.UploadFile(self.vault, content, journal=journal)
+
+        with open(path, 'rb') as content:
+            summary = self.client.UploadFile(self.vault, content,
+                                             journal=journal)
+        self.assertEqual(1, server.assignments)
+        self.assertEqual({summary['file_id']: 3000}, server.finalized)
+        self.assertEqual(3000, summary['bytes'])
+
+    @httpretty.activate
+    def test_upload_file_journal_changed_source(self):
+        path, journal = self.make_source(os.urandom(3000))
+        journal.save({'file_id': create_file(), 'url': None,
+                      'source': [3000, 0], 'chunk_size': 1024 * 1024,
+                      'offset': 0, 'blocks': 0, 'uploaded_blocks': 0,
+                      'uploaded_bytes': 0})
+
+        with open(path, 'rb') as content:
+            with self.assertRaises(errors.InvalidContentError):
+                self.client.UploadFile(self.vault, content, journal=journal)
+
+    @httpretty.activate
+    def test_upload_file_journal_not_regular_file(self):
+        path, journal = self.make_source(os.urandom(3000))
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        # Neither a pipe nor in-memory content can be told to have changed
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(read_fd, 'rb') as content:
+            os.close(write_fd)
+            with self.assertRaises(ValueError):
+                self.client.UploadFile(self.vault, content, journal=journal)
+
+        with self.assertRaises(ValueError):
+            self.client.UploadFile(self.vault, io.BytesIO(b'content'),
+                                   journal=journal)
+
+        self.assertEqual({}, server.files)
+        self.assertIsNone(journal.load())
+
+    @httpretty.activate
+    def test_stream_upload_files(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        server = FakeFileServer(self.apihost, self.vault.vault_id)
+        server.register()
+
+        contents = {}
+        for index in range(10):
+            path = os.path.join(temp_dir, 'file{0}'.format(index))
+            contents[path] = os.urandom(100 * index)
+            with open(path, 'wb') as local_file:
+                local_file.write(contents[path])
+        missing = os.path.join(temp_dir, 'missing')
+
+        results = list(self.client.StreamUploadFiles(
+            self.vault, sorted(contents) + [missing], max_workers=1,
+            file_id_pool=self.serial_file_id_pool()))
+
+        self.assertEqual(11, len(results))
+        for path, summary, error in results:
+            if path == missing:
+                self.assertIsNone(summary)
+                self.assertIsInstance(error, FileNotFoundError)
+            else:
+                self.assertIsNone(error)
+                self.assertEqual(contents[path],
+                                 server.content(summary['file_id']))
+
+        self.assertEqual(10, len(server.finalized))
+        self.assertEqual(sorted(server.finalized), sorted(server.files))
+
+    def test_stream_upload_files_concurrent(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        paths = []
+        for index in range(20):
+            paths.append(os.path.join(temp_dir, 'file{0}'.format(index)))
+            with open(paths[-1], 'wb') as local_file:
+                local_file.write(b'x' * index)
+
+        lock = threading.Lock()
+        clients = set()
+        active = [0, 0]
+
+        def fake_upload_file(client, vault, content, count=10,
+                             file_id_pool=None, **kwargs):
+            with lock:
+                clients.add(client)
+                active[0] += 1
+                active[1] = max(active)
+            threading.Event().wait(0.02)
+            with lock:
+                active[0] -= 1
+            return {'file_id': create_file(), 'bytes': len(content.read())}
+
+        with mock.patch.object(deuceclient.client.deuce.DeuceClient,
+                               'UploadFile', fake_upload_file):
+            results = list(self.client.StreamUploadFiles(
+                self.vault, paths, max_workers=4,
+                file_id_pool=mock.Mock()))
+
+        self.assertEqual(sorted(paths), sorted(r[0] for r in results))
+        self.assertEqual(list(range(20)),
+                         sorted(r[1]['bytes'] for r in results))
+        # Each worker uploads with a client of its own
+        self.assertEqual(4, active[1])
+        self.assertEqual(4, len(clients))
+        self.assertNotIn(self.client, clients)
+
+    def test_stream_upload_files_own_pool(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        min_size = deuceclient.client.fileidpool.DEFAULT_MIN_SIZE
+        paths = []
+        for index in range(min_size + 1):
+            paths.append(os.path.join(temp_dir, 'file{0}'.format(index)))
+            with open(paths[-1], 'wb') as local_file:
+                local_file.write(b'x' * index)
+
+        def fake_upload_file(client, vault, content, file_id_pool=None,
+                             **kwargs):
+            return {'file_id': create_file(), 'pool': file_id_pool}
+
+        with mock.patch.object(deuceclient.client.deuce.DeuceClient,
+                               'UploadFile', fake_upload_file), \
+                mock.patch.object(deuceclient.client.deuce,
+                                  'FileIdPool') as pool_class:
+            # Too few files for a pool to be worth creating files ahead
+            results = list(self.client.StreamUploadFiles(
+                self.vault, iter(paths[:min_size])))
+            self.assertEqual(sorted(paths[:min_size]),
+                             sorted(r[0] for r in results))
+            self.assertEqual([None] * min_size,
+                             [r[1]['pool'] for r in results])
+            self.assertFalse(pool_class.called)
+
+            results = list(self.client.StreamUploadFiles(
+                self.vault, iter(paths)))
+            self.assertEqual(sorted(paths), sorted(r[0] for r in results))
+            self.assertEqual([pool_class.return_value] * len(paths),
+                             [r[1]['pool'] for r in results])
+            self.assertEqual(1, pool_class.call_count)
+            pool_class.return_value.close.assert_called_once_with()
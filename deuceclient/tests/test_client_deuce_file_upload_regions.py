@@ -0,0 +1,163 @@
+"""
+Tests - Deuce Client - Client - Deuce - File - Upload Regions
+"""
+import os
+import tempfile
+import threading
+
+import httpretty
+import mock
+
+import deuceclient.api as api
+import deuceclient.client.deuce
+from deuceclient.tests import *
+import deuceclient.tests.test_client_deuce_file_upload as upload_tests
+
+
+class ClientDeuceFileUploadRegionsTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceFileUploadRegionsTests, self).setUp()
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+        self.server = upload_tests.FakeFileServer(self.apihost,
+                                                  self.vault.vault_id)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'image')
+
+    def make_file(self, data):
+        with open(self.path, 'wb') as local_file:
+            local_file.write(data)
+
+    def upload(self, **kwargs):
+        # httpretty does not cope with requests from several threads at once
+        return self.client.UploadFileRegions(self.vault, self.path,
+                                             max_workers=1, chunk_size=1000,
+                                             count=3, **kwargs)
+
+    @httpretty.activate
+    def test_upload_regions(self):
+        self.server.register()
+        data = os.urandom(5500)
+        self.make_file(data)
+        existing_block_id = api.Block.make_id(data[2000:3000])
+        self.server.blocks[existing_block_id] = data[2000:3000]
+
+        summary = self.upload(regions=3)
+
+        file_id = summary['file_id']
+        self.assertEqual({
+            'file_id': file_id,
+            'url': get_file_url(self.apihost, self.vault.vault_id, file_id),
+            'bytes': 5500,
+            'blocks': 6,
+            'uploaded_bytes': 4500,
+            'uploaded_blocks': 5,
+            'regions': 3
+        }, summary)
+
+        # Each region of two blocks was assigned at its offsets in one go
+        self.assertEqual(3, self.server.assignments)
+        self.assertEqual(list(range(0, 5500, 1000)),
+                         sorted(self.server.files[file_id]))
+        self.assertEqual(data, self.server.content(file_id))
+        self.assertEqual({file_id: 5500}, self.server.finalized)
+
+    @httpretty.activate
+    def test_upload_regions_more_than_blocks(self):
+        self.server.register()
+        data = os.urandom(1500)
+        self.make_file(data)
+
+        summary = self.upload(regions=8)
+
+        self.assertEqual(2, summary['regions'])
+        self.assertEqual(data, self.server.content(summary['file_id']))
+
+    @httpretty.activate
+    def test_upload_regions_empty_file(self):
+        self.server.register()
+        self.make_file(b'')
+
+        summary = self.upload(regions=4)
+
+        self.assertEqual(0, summary['regions'])
+        self.assertEqual({summary['file_id']: 0}, self.server.finalized)
+
+    @httpretty.activate
+    def test_upload_regions_failure(self):
+        self.server.register()
+        httpretty.register_uri(httpretty.POST,
+                               get_blocks_url(self.apihost,
+                                              self.vault.vault_id),
+                               body='mock failure',
+                               status=500)
+        self.make_file(os.urandom(3000))
+
+        with self.assertRaises(RuntimeError):
+            self.upload(regions=3)
+
+        self.assertEqual({}, self.server.finalized)
+
+    @httpretty.activate
+    def test_upload_regions_file_changed(self):
+        self.server.register()
+        self.make_file(os.urandom(3000))
+
+        with mock.patch('os.path.getsize', return_value=4000):
+            with self.assertRaises(RuntimeError):
+                self.upload(regions=2)
+
+        self.assertEqual({}, self.server.finalized)
+
+    @httpretty.activate
+    def test_upload_regions_concurrent(self):
+        self.server.register()
+        data = os.urandom(4000)
+        self.make_file(data)
+        barrier = threading.Barrier(4, timeout=5)
+        lock = threading.Lock()
+        assigned = {}
+
+        def assign_blocks(client, vault, file_id, block_ids):
+            # Only returns once all four regions are being uploaded at once
+            barrier.wait()
+            with lock:
+                assigned.update((offset, block_id)
+                                for block_id, offset in block_ids)
+            return []
+
+        with mock.patch.object(deuceclient.client.deuce.DeuceClient,
+                               'AssignBlocksToFile', autospec=True,
+                               side_effect=assign_blocks):
+            summary = self.client.UploadFileRegions(self.vault, self.path,
+                                                    max_workers=4,
+                                                    chunk_size=1000)
+
+        self.assertEqual(4, summary['regions'])
+        self.assertEqual({offset: api.Block.make_id(data[offset:
+                                                         offset + 1000])
+                          for offset in range(0, 4000, 1000)}, assigned)
+        self.assertEqual({summary['file_id']: 4000}, self.server.finalized)
+
+    def test_upload_regions_invalid(self):
+        self.make_file(b'data')
+        with self.assertRaises(ValueError):
+            self.upload(regions=0)
+
+    def test_file_regions(self):
+        self.assertEqual([(0, 3000), (3000, 6000), (6000, 8000)],
+                         deuceclient.client.deuce.file_regions(8000, 3, 1000))
+        # Regions start on a chunk boundary, so there may be fewer of them
+        self.assertEqual([(0, 1500), (1500, 3000)],
+                         deuceclient.client.deuce.file_regions(3000, 4,
+                                                               1500))
+        self.assertEqual([(0, 1000), (1000, 1500)],
+                         deuceclient.client.deuce.file_regions(1500, 8, 1000))
+        self.assertEqual([],
+                         deuceclient.client.deuce.file_regions(0, 2, 1000))
+
+        with self.assertRaises(ValueError):
+            deuceclient.client.deuce.file_regions(8000, 0, 1000)
@@ -0,0 +1,185 @@
+"""
+Tests - Deuce Client - Client - Deuce - Scan Vault
+"""
+import json
+import os
+import tempfile
+import threading
+import urllib.parse
+
+import httpretty
+
+import deuceclient.client.deuce
+from deuceclient.common.checkpoint import Checkpoint
+import deuceclient.common.shards as shards
+from deuceclient.tests import *
+
+
+class ClientDeuceScanVaultTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceScanVaultTests, self).setUp()
+
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+        self.block_ids = sorted(hashlib.sha1(str(index).encode()).hexdigest()
+                                for index in range(64))
+        self.listings = []
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def list_blocks(self, request, uri, response_headers):
+        # marker and limit are honored like the service does
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(uri).query)
+        limit = int(params.get('limit', ['5'])[0])
+        marker = params.get('marker', [None])[0]
+        entries = self.block_ids
+        if marker is not None:
+            entries = [block_id for block_id in entries
+                       if block_id >= marker]
+        self.listings.append(marker)
+
+        if len(entries) > limit:
+            response_headers['x-next-batch'] = '{0}?{1}'.format(
+                uri.split('?')[0],
+                urllib.parse.urlencode({'marker': entries[limit]}))
+        response_headers['content-type'] = 'application/json'
+        return (200, response_headers, json.dumps(entries[:limit]))
+
+    def register_blocks(self):
+        httpretty.register_uri(httpretty.GET,
+                               get_blocks_url(self.apihost,
+                                              self.vault.vault_id),
+                               body=self.list_blocks)
+
+    def scan(self, **kwargs):
+        lock = threading.Lock()
+        scanned = []
+
+        def work(client, block_id, request):
+            self.assertIsInstance(client,
+                                  deuceclient.client.deuce.DeuceClient)
+            with lock:
+                scanned.append(block_id)
+            return {'even': 1 if int(block_id, 16) % 2 == 0 else 0}
+
+        summary = self.client.ScanVault(self.vault, work, counters=('even',),
+                                        limit=4, **kwargs)
+        return summary, scanned
+
+    def even_blocks(self, block_ids):
+        return sum(1 for block_id in block_ids if int(block_id, 16) % 2 == 0)
+
+    @httpretty.activate
+    def test_scan(self):
+        self.register_blocks()
+        progress = []
+
+        summary, scanned = self.scan(shard_count=4, max_workers=4,
+                                     progress=progress.append)
+
+        self.assertEqual({
+            'scanned': 64,
+            'failed': 0,
+            'even': self.even_blocks(self.block_ids)
+        }, summary)
+        self.assertEqual(self.block_ids, sorted(scanned))
+        self.assertEqual(4, progress[-1]['shards_done'])
+
+    @httpretty.activate
+    def test_scan_workers(self):
+        self.register_blocks()
+        worker_scans = []
+
+        for worker in range(4):
+            summary, scanned = self.scan(shard_count=2, worker=worker,
+                                         workers=4, max_workers=2)
+            self.assertEqual(len(scanned), summary['scanned'])
+            worker_scans.append(scanned)
+
+        # each worker scans only its part of the key space and together
+        # they scan every block exactly once
+        self.assertEqual(self.block_ids, sorted(sum(worker_scans, [])))
+        for worker, scanned in enumerate(worker_scans):
+            key_shards = shards.key_space_shards(2, worker=worker, workers=4)
+            start = key_shards[0][0]
+            end = key_shards[-1][1]
+            self.assertTrue(all(start <= block_id and
+                                (end is None or block_id < end)
+                                for block_id in scanned))
+
+        # the listings start at the shards, not at the start of the vault
+        self.assertEqual(
+            [start for worker in range(4)
+             for start, end in shards.key_space_shards(2, worker=worker,
+                                                       workers=4)],
+            sorted(marker for marker in self.listings
+                   if marker is not None and marker.endswith('0' * 30)))
+
+    @httpretty.activate
+    def test_scan_failures(self):
+        self.register_blocks()
+        failing = set(self.block_ids[::8])
+
+        def work(client, block_id, request):
+            if block_id in failing:
+                raise RuntimeError('mock failure')
+
+        summary = self.client.ScanVault(self.vault, work, shard_count=2)
+
+        self.assertEqual({'scanned': 64, 'failed': 8}, summary)
+
+    @httpretty.activate
+    def test_scan_resume(self):
+        self.register_blocks()
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'scan'))
+        key_shards = shards.key_space_shards(2, worker=1, workers=2)
+        second_start = key_shards[1][0]
+
+        # the first shard of the worker already completed
+        checkpoint.save({
+            'shard_count': 2,
+            'worker': 1,
+            'workers': 2,
+            'shards': [
+                {'marker': None, 'done': True,
+                 'results': {'scanned': 3, 'failed': 0, 'even': 1}},
+                {'marker': second_start, 'done': False,
+                 'results': {'scanned': 0, 'failed': 0, 'even': 0}},
+            ]
+        })
+
+        summary, scanned = self.scan(shard_count=2, worker=1, workers=2,
+                                     checkpoint=checkpoint)
+
+        second_shard = [block_id for block_id in self.block_ids
+                        if block_id >= second_start]
+        self.assertEqual(second_shard, sorted(scanned))
+        self.assertEqual(len(second_shard) + 3, summary['scanned'])
+        self.assertEqual(self.even_blocks(second_shard) + 1, summary['even'])
+        self.assertIsNone(checkpoint.load())
+
+    def test_scan_checkpoint_other_worker(self):
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'scan'))
+        checkpoint.save({'shard_count': 2, 'worker': 0, 'workers': 2,
+                         'shards': []})
+
+        with self.assertRaises(ValueError):
+            self.scan(shard_count=2, worker=1, workers=2,
+                      checkpoint=checkpoint)
+
+    def test_scan_invalid_worker(self):
+        with self.assertRaises(ValueError):
+            self.scan(worker=2, workers=2)
+
+    @httpretty.activate
+    def test_scan_listing_failure(self):
+        httpretty.register_uri(httpretty.GET,
+                               get_blocks_url(self.apihost,
+                                              self.vault.vault_id),
+                               status=404)
+
+        with self.assertRaises(RuntimeError):
+            self.scan(shard_count=2)
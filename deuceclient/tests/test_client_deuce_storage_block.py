@@ -262,3 +262,55 @@ class ClientDeuceStorageBlockTests(ClientTestBase):
                           block_type='storage')
         with self.assertRaises(RuntimeError):
             self.client.DeleteBlockStorage(self.vault, block)
+
+    @httpretty.activate
+    def test_delete_storage_blocks(self):
+        storage_blockids = [create_storage_block() for _ in range(10)]
+        failed_blockid = storage_blockids[0]
+
+        for storage_blockid in storage_blockids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_storage_block_url(self.apihost,
+                                                         self.vault.vault_id,
+                                                         storage_blockid),
+                                   status=204)
+        httpretty.register_uri(httpretty.DELETE,
+                               get_storage_block_url(self.apihost,
+                                                     self.vault.vault_id,
+                                                     failed_blockid),
+                               body='mock failure',
+                               status=404)
+
+        # Use a known block for one of the entries
+        self.vault.storageblocks[storage_blockids[1]] = api.Block(
+            project_id=self.vault.project_id,
+            vault_id=self.vault.vault_id,
+            storage_id=storage_blockids[1],
+            block_type='storage')
+
+        results = self.client.DeleteStorageBlocks(self.vault,
+                                                  (storage_blockid
+                                                   for storage_blockid
+                                                   in storage_blockids),
+                                                  max_workers=3)
+        self.assertEqual([(storage_blockid, storage_blockid != failed_blockid)
+                          for storage_blockid in storage_blockids], results)
+
+    @httpretty.activate
+    def test_stream_delete_storage_blocks(self):
+        storage_blockids = [create_storage_block() for _ in range(10)]
+
+        for storage_blockid in storage_blockids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_storage_block_url(self.apihost,
+                                                         self.vault.vault_id,
+                                                         storage_blockid),
+                                   status=204)
+
+        results = self.client.StreamDeleteStorageBlocks(
+            self.vault, (storage_blockid
+                         for storage_blockid in storage_blockids))
+        self.assertEqual(sorted(storage_blockids),
+                         sorted(storage_blockid
+                                for storage_blockid, r, error in results
+                                if r))
@@ -0,0 +1,260 @@
+"""
+Tests - Deuce Client - Client - Deuce - Storage Block - Garbage Collection
+"""
+import json
+import os
+import tempfile
+import time
+import urllib.parse
+
+import httpretty
+
+import deuceclient.client.deuce
+from deuceclient.common.checkpoint import Checkpoint
+import deuceclient.common.shards as shards
+from deuceclient.tests import *
+
+
+class ClientDeuceStorageBlockGCTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceStorageBlockGCTests, self).setUp()
+
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+        self.grace_period = 3600
+        now = int(time.time())
+
+        # storage id -> (orphaned, ref_modified, block_size)
+        self.storage_blocks = {}
+        for index in range(40):
+            block_id = hashlib.sha1(str(index).encode()).hexdigest()
+            kind = index % 4
+            if kind == 0:
+                details = ('False', str(now), 10)
+            elif kind == 1:
+                details = ('True', str(now - 2 * self.grace_period), 100)
+            elif kind == 2:
+                details = ('True', str(now), 1000)
+            else:
+                details = ('True', '', 10000)
+            self.storage_blocks[create_storage_block(block_id)] = details
+        self.storage_ids = sorted(self.storage_blocks)
+        self.expired = [storage_id
+                        for storage_id, (orphaned, modified, size)
+                        in self.storage_blocks.items()
+                        if orphaned == 'True' and modified and
+                        int(modified) < now - self.grace_period]
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(ClientDeuceStorageBlockGCTests, self).tearDown()
+
+    def list_storage_blocks(self, request, uri, response_headers):
+        # marker and limit are honored like the service does
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(uri).query)
+        limit = int(params.get('limit', ['5'])[0])
+        entries = self.storage_ids
+        if 'marker' in params:
+            entries = [storage_id for storage_id in entries
+                       if storage_id >= params['marker'][0]]
+
+        if len(entries) > limit:
+            response_headers['x-next-batch'] = '{0}?{1}'.format(
+                uri.split('?')[0],
+                urllib.parse.urlencode({'marker': entries[limit]}))
+        response_headers['content-type'] = 'application/json'
+        return (200, response_headers, json.dumps(entries[:limit]))
+
+    def register_storage(self):
+        httpretty.register_uri(httpretty.GET,
+                               get_storage_blocks_url(self.apihost,
+                                                      self.vault.vault_id),
+                               body=self.list_storage_blocks)
+
+        for storage_id, (orphaned, modified, size) in \
+                self.storage_blocks.items():
+            url = get_storage_block_url(self.apihost,
+                                        self.vault.vault_id,
+                                        storage_id)
+            httpretty.register_uri(httpretty.HEAD,
+                                   url,
+                                   adding_headers={
+                                       'x-block-reference-count': '0',
+                                       'x-ref-modified': modified,
+                                       'x-block-id': storage_id[:40],
+                                       'x-block-size': str(size),
+                                       'x-block-orphaned': orphaned
+                                   },
+                                   status=204)
+            httpretty.register_uri(httpretty.DELETE, url, status=204)
+
+    def requests(self, method):
+        return [request.path.split('/')[-1].split('?')[0]
+                for request in httpretty.latest_requests()
+                if request.method == method]
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks(self):
+        self.register_storage()
+        progress = []
+
+        summary = self.client.CollectOrphanedStorageBlocks(
+            self.vault,
+            grace_period=self.grace_period,
+            shard_count=4,
+            max_workers=4,
+            progress=progress.append)
+
+        self.assertEqual({
+            'scanned': 40,
+            'orphaned': 30,
+            'deferred': 20,
+            'deleted': 10,
+            'failed': 0,
+            'reclaimed_bytes': 1000
+        }, summary)
+
+        # every storage block is checked exactly once across the shards
+        self.assertEqual(sorted(self.storage_ids),
+                         sorted(self.requests('HEAD')))
+        self.assertEqual(sorted(self.expired),
+                         sorted(self.requests('DELETE')))
+
+        self.assertEqual(4, progress[-1]['shards_done'])
+        self.assertEqual(40, progress[-1]['scanned'])
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks_workers(self):
+        self.register_storage()
+        summaries = []
+
+        for worker in range(3):
+            summaries.append(self.client.CollectOrphanedStorageBlocks(
+                self.vault,
+                grace_period=self.grace_period,
+                shard_count=2,
+                worker=worker,
+                workers=3,
+                max_workers=2))
+
+        # the workers checked every storage block exactly once between them
+        self.assertEqual(40, sum(summary['scanned']
+                                 for summary in summaries))
+        self.assertTrue(all(summary['scanned'] for summary in summaries))
+        self.assertEqual(10, sum(summary['deleted']
+                                 for summary in summaries))
+        self.assertEqual(sorted(self.storage_ids),
+                         sorted(self.requests('HEAD')))
+        self.assertEqual(sorted(self.expired),
+                         sorted(self.requests('DELETE')))
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks_dry_run(self):
+        self.register_storage()
+
+        summary = self.client.CollectOrphanedStorageBlocks(
+            self.vault,
+            grace_period=self.grace_period,
+            dry_run=True)
+
+        self.assertEqual(10, summary['deleted'])
+        self.assertEqual(1000, summary['reclaimed_bytes'])
+        self.assertEqual([], self.requests('DELETE'))
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks_no_grace_period(self):
+        self.register_storage()
+
+        summary = self.client.CollectOrphanedStorageBlocks(self.vault,
+                                                           grace_period=0,
+                                                           dry_run=True)
+
+        self.assertEqual(30, summary['deleted'])
+        self.assertEqual(0, summary['deferred'])
+        self.assertEqual(10 * (100 + 1000 + 10000),
+                         summary['reclaimed_bytes'])
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks_failures(self):
+        self.register_storage()
+        failed_id = self.expired[0]
+        httpretty.register_uri(httpretty.DELETE,
+                               get_storage_block_url(self.apihost,
+                                                     self.vault.vault_id,
+                                                     failed_id),
+                               status=404)
+        missing_id = [storage_id for storage_id in self.storage_ids
+                      if self.storage_blocks[storage_id][0] == 'False'][0]
+        httpretty.register_uri(httpretty.HEAD,
+                               get_storage_block_url(self.apihost,
+                                                     self.vault.vault_id,
+                                                     missing_id),
+                               status=404)
+
+        summary = self.client.CollectOrphanedStorageBlocks(
+            self.vault,
+            grace_period=self.grace_period,
+            shard_count=2)
+
+        self.assertEqual(40, summary['scanned'])
+        self.assertEqual(9, summary['deleted'])
+        self.assertEqual(2, summary['failed'])
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks_listing_failure(self):
+        httpretty.register_uri(httpretty.GET,
+                               get_storage_blocks_url(self.apihost,
+                                                      self.vault.vault_id),
+                               status=404)
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'gc'))
+
+        with self.assertRaises(RuntimeError):
+            self.client.CollectOrphanedStorageBlocks(self.vault,
+                                                     checkpoint=checkpoint)
+
+    @httpretty.activate
+    def test_collect_orphaned_storage_blocks_resume(self):
+        self.register_storage()
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'gc'))
+        key_shards = shards.key_space_shards(2)
+        second_start = shards.storage_block_marker(key_shards[1][0])
+
+        # the first shard already completed
+        checkpoint.save({
+            'shard_count': 2,
+            'shards': [
+                {'marker': None, 'done': True,
+                 'results': {'scanned': 1, 'orphaned': 0, 'deferred': 0,
+                             'deleted': 0, 'failed': 0,
+                             'reclaimed_bytes': 0}},
+                {'marker': second_start, 'done': False,
+                 'results': {'scanned': 0, 'orphaned': 0, 'deferred': 0,
+                             'deleted': 0, 'failed': 0,
+                             'reclaimed_bytes': 0}},
+            ]
+        })
+
+        summary = self.client.CollectOrphanedStorageBlocks(
+            self.vault,
+            grace_period=self.grace_period,
+            shard_count=2,
+            checkpoint=checkpoint)
+
+        second_shard = [storage_id for storage_id in self.storage_ids
+                        if storage_id >= second_start]
+        self.assertEqual(sorted(second_shard), sorted(self.requests('HEAD')))
+        self.assertEqual(len(second_shard) + 1, summary['scanned'])
+        self.assertIsNone(checkpoint.load())
+
+    def test_collect_orphaned_storage_blocks_checkpoint_mismatch(self):
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'gc'))
+        checkpoint.save({'shard_count': 4, 'shards': []})
+
+        with self.assertRaises(ValueError):
+            self.client.CollectOrphanedStorageBlocks(self.vault,
+                                                     shard_count=2,
+                                                     checkpoint=checkpoint)
@@ -0,0 +1,237 @@
+"""
+Tests - Deuce Client - Client - Deuce - Vault - Purge
+"""
+import json
+import os
+import tempfile
+import urllib.parse
+
+import httpretty
+import mock
+
+import deuceclient.client.deuce
+from deuceclient.common.checkpoint import Checkpoint
+from deuceclient.tests import *
+
+
+class ClientDeuceVaultPurgeTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceVaultPurgeTests, self).setUp()
+
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+        self.file_ids = [create_file() for _ in range(6)]
+        self.block_ids = [block[0] for block in create_blocks(block_count=6)]
+        self.storage_ids = [create_storage_block() for _ in range(2)]
+        self.statistics = {
+            'metadata': {
+                'files': {'count': len(self.file_ids)},
+                'blocks': {'count': len(self.block_ids)}
+            },
+            'storage': {'block-count': len(self.storage_ids)}
+        }
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(ClientDeuceVaultPurgeTests, self).tearDown()
+
+    def register_listing(self, url, entries, page_size=4):
+        responses = []
+        for start in range(0, len(entries), page_size):
+            headers = {}
+            next_start = start + page_size
+            if next_start < len(entries):
+                headers['x-next-batch'] = '{0}?{1}'.format(
+                    url, urllib.parse.urlencode({
+                        'marker': entries[next_start]}))
+            responses.append(
+                httpretty.Response(body=json.dumps(entries[start:next_start]),
+                                   content_type='application/json',
+                                   adding_headers=headers,
+                                   status=200))
+        if not responses:
+            responses.append(httpretty.Response(body=json.dumps([]),
+                                                status=200))
+        httpretty.register_uri(httpretty.GET, url, responses=responses)
+
+    def register_vault(self, failed_block_id=None):
+        httpretty.register_uri(httpretty.GET,
+                               get_vault_url(self.apihost,
+                                             self.vault.vault_id),
+                               content_type='application/json',
+                               body=json.dumps(self.statistics),
+                               status=200)
+        httpretty.register_uri(httpretty.DELETE,
+                               get_vault_url(self.apihost,
+                                             self.vault.vault_id),
+                               status=204)
+
+        self.register_listing(get_files_url(self.apihost,
+                                            self.vault.vault_id),
+                              self.file_ids)
+        self.register_listing(get_blocks_url(self.apihost,
+                                             self.vault.vault_id),
+                              self.block_ids)
+        self.register_listing(get_storage_blocks_url(self.apihost,
+                                                     self.vault.vault_id),
+                              self.storage_ids)
+
+        for file_id in self.file_ids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_file_url(self.apihost,
+                                                self.vault.vault_id,
+                                                file_id),
+                                   status=204)
+        for block_id in self.block_ids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 block_id),
+                                   status=204)
+        for storage_id in self.storage_ids:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_storage_block_url(self.apihost,
+                                                         self.vault.vault_id,
+                                                         storage_id),
+                                   status=204)
+
+        if failed_block_id is not None:
+            httpretty.register_uri(httpretty.DELETE,
+                                   get_block_url(self.apihost,
+                                                 self.vault.vault_id,
+                                                 failed_block_id),
+                                   body='mock failure',
+                                   status=409)
+
+    def deletions(self):
+        return [request.path for request in httpretty.latest_requests()
+                if request.method == 'DELETE']
+
+    @httpretty.activate
+    def test_purge_vault(self):
+        self.register_vault()
+        progress = []
+
+        summary = self.client.PurgeVault(self.vault,
+                                         max_workers=3,
+                                         progress=progress.append)
+
+        self.assertTrue(summary['vault_deleted'])
+        self.assertEqual('deleted', self.vault.status)
+        self.assertEqual({'deleted': 6, 'failed': 0}, summary['files'])
+        self.assertEqual({'deleted': 6, 'failed': 0}, summary['blocks'])
+        self.assertEqual({'deleted': 2, 'failed': 0}, summary['storage'])
+
+        # two pages each of files and blocks, one of storage blocks
+        self.assertEqual(['files', 'files', 'blocks', 'blocks', 'storage'],
+                         [status['stage'] for status in progress])
+        self.assertEqual([2, 0, 2, 0, 0],
+                         [status['remaining'] for status in progress])
+        for status in progress:
+            self.assertEqual(0, status['failed'])
+            self.assertGreaterEqual(status['rate'], 0)
+
+        # files are deleted before blocks, and the vault last of all
+        deletions = self.deletions()
+        self.assertEqual(6 + 6 + 2 + 1, len(deletions))
+        self.assertTrue(all('/files/' in path for path in deletions[:6]))
+        self.assertTrue(deletions[-1].endswith(self.vault.vault_id))
+
+        # nothing is kept around once the vault is purged
+        self.assertEqual(0, len(self.vault.files))
+        self.assertEqual(0, len(self.vault.blocks))
+        self.assertEqual(0, len(self.vault.storageblocks))
+
+    @httpretty.activate
+    def test_purge_vault_listing_pages(self):
+        self.register_vault()
+
+        self.client.PurgeVault(self.vault, max_workers=1, limit=4)
+
+        blocks_path = get_blocks_path(self.vault.vault_id)
+        listings = [request for request in httpretty.latest_requests()
+                    if request.method == 'GET' and
+                    request.path.split('?')[0] == blocks_path]
+
+        # the second page starts at the marker of the first one
+        self.assertEqual([
+            '{0}?limit=4'.format(blocks_path),
+            '{0}?marker={1}&limit=4'.format(blocks_path, self.block_ids[4])
+        ], [request.path for request in listings])
+        self.assertEqual({'marker': [self.block_ids[4]], 'limit': ['4']},
+                         listings[1].querystring)
+
+    @httpretty.activate
+    def test_purge_vault_with_failures(self):
+        self.register_vault(failed_block_id=self.block_ids[1])
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'purge'))
+
+        summary = self.client.PurgeVault(self.vault, checkpoint=checkpoint)
+
+        self.assertFalse(summary['vault_deleted'])
+        self.assertEqual({'deleted': 5, 'failed': 1}, summary['blocks'])
+        self.assertNotEqual('deleted', self.vault.status)
+        self.assertIsNone(checkpoint.load())
+
+    @httpretty.activate
+    def test_purge_vault_no_statistics(self):
+        self.register_vault()
+        httpretty.register_uri(httpretty.GET,
+                               get_vault_url(self.apihost,
+                                             self.vault.vault_id),
+                               body='mock failure',
+                               status=500)
+        progress = []
+
+        summary = self.client.PurgeVault(self.vault,
+                                         progress=progress.append)
+
+        self.assertTrue(summary['vault_deleted'])
+        for status in progress:
+            self.assertIsNone(status['remaining'])
+
+    @httpretty.activate
+    def test_purge_vault_resume(self):
+        self.register_vault()
+        checkpoint = Checkpoint(os.path.join(self.temp_dir.name, 'purge'))
+
+        # Stop after the first page of blocks
+        original_save = Checkpoint.save
+
+        def save_then_interrupt(self, state):
+            original_save(self, state)
+            if state['stage'] == 'blocks':
+                raise KeyboardInterrupt()
+
+        with mock.patch.object(Checkpoint, 'save', save_then_interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.client.PurgeVault(self.vault, checkpoint=checkpoint)
+
+        state = checkpoint.load()
+        self.assertEqual('blocks', state['stage'])
+        self.assertEqual(self.block_ids[4], state['marker'])
+        self.assertEqual({'deleted': 6, 'failed': 0},
+                         state['results']['files'])
+        self.assertEqual({'deleted': 4, 'failed': 0},
+                         state['results']['blocks'])
+
+        # the resumed purge continues from the last page of blocks
+        httpretty.reset()
+        httpretty.enable()
+        self.register_vault()
+        self.register_listing(get_blocks_url(self.apihost,
+                                             self.vault.vault_id),
+                              self.block_ids[4:])
+
+        summary = self.client.PurgeVault(self.vault, checkpoint=checkpoint)
+        self.assertTrue(summary['vault_deleted'])
+        self.assertEqual({'deleted': 6, 'failed': 0}, summary['files'])
+        self.assertEqual({'deleted': 6, 'failed': 0}, summary['blocks'])
+
+        deletions = self.deletions()
+        self.assertFalse(any('/files/' in path for path in deletions))
+        self.assertEqual(2 + 2 + 1, len(deletions))
+        self.assertIsNone(checkpoint.load())
@@ -0,0 +1,141 @@
+"""
+Tests - Deuce Client - Client - File ID Pool
+"""
+import threading
+from unittest import TestCase
+
+import deuceclient.api.vault as api_vault
+from deuceclient.client.fileidpool import FileIdPool
+from deuceclient.tests import create_file, create_project_name, \
+    create_vault_name
+
+
+class FakeClient(object):
+    """Creates files in memory, optionally slowly or not at all
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.created = []
+        self.deleted = []
+        self.threads = set()
+        self.fail = False
+
+    def _thread_client(self):
+        return self
+
+    def CreateFile(self, vault):
+        threading.Event().wait(self.latency)
+        with self.lock:
+            self.threads.add(threading.current_thread().name)
+            if self.fail:
+                raise RuntimeError('mock failure')
+            file_id = create_file()
+            self.created.append(file_id)
+        vault.add_file(file_id, 'https://deuce/files/{0}'.format(file_id))
+        return file_id
+
+    def DeleteFile(self, vault, file_id):
+        with self.lock:
+            self.deleted.append(file_id)
+        return True
+
+
+class FileIdPoolTest(TestCase):
+
+    def setUp(self):
+        super(FileIdPoolTest, self).setUp()
+        self.vault = api_vault.Vault(create_project_name(),
+                                     create_vault_name())
+
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            threading.Event().wait(0.01)
+        self.fail('condition not met')
+
+    def test_prefill(self):
+        client = FakeClient()
+        with FileIdPool(client, self.vault, min_size=3) as pool:
+            self.wait_for(lambda: len(pool) == 3)
+
+            file_id, url = pool.get()
+            self.assertIn(file_id, client.created)
+            self.assertEqual('https://deuce/files/{0}'.format(file_id), url)
+            self.assertNotIn(file_id, self.vault.files)
+
+            # Taken files are replaced
+            self.wait_for(lambda: len(pool) == 3)
+            self.assertIn('deuce-file-id-pool', client.threads)
+
+        # Unused files are deleted once closed
+        self.assertEqual(sorted(client.created),
+                         sorted(client.deleted + [file_id]))
+        self.assertEqual(0, len(pool))
+
+        with self.assertRaises(RuntimeError):
+            pool.get()
+
+    def test_empty(self):
+        client = FakeClient()
+        with FileIdPool(client, self.vault, min_size=0, workers=0) as pool:
+            file_id, url = pool.get()
+            self.assertEqual([file_id], client.created)
+            self.assertEqual(0, len(pool))
+
+        self.assertEqual([], client.deleted)
+
+    def test_adapts_to_consumption(self):
+        client = FakeClient(latency=0.05)
+        with FileIdPool(client, self.vault, min_size=1, max_size=16,
+                        workers=4) as pool:
+            self.assertEqual(1, pool.target)
+
+            # Files are taken far faster than one can be created
+            for _ in range(20):
+                pool.get()
+                threading.Event().wait(0.005)
+
+            self.assertGreater(pool.target, 4)
+            self.assertLessEqual(pool.target, 16)
+            self.wait_for(lambda: len(pool) >= 4)
+
+    def test_unique(self):
+        client = FakeClient()
+        taken = []
+        lock = threading.Lock()
+
+        with FileIdPool(client, self.vault, min_size=4) as pool:
+            def take():
+                for _ in range(25):
+                    entry = pool.get()
+                    with lock:
+                        taken.append(entry[0])
+
+            threads = [threading.Thread(target=take) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(100, len(set(taken)))
+        self.assertEqual(sorted(client.created),
+                         sorted(taken + client.deleted))
+
+    def test_failure(self):
+        client = FakeClient()
+        client.fail = True
+        with FileIdPool(client, self.vault, retry_delay=0.01) as pool:
+            with self.assertRaises(RuntimeError):
+                pool.get()
+
+            # The pool recovers once files can be created again
+            client.fail = False
+            self.wait_for(lambda: len(pool) == 2)
+            pool.get()
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            FileIdPool(FakeClient(), self.vault, min_size=3, max_size=2)
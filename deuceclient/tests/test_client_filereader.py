@@ -0,0 +1,200 @@
+"""
+Tests - Deuce Client - Client - File Reader
+"""
+import io
+import os
+import threading
+from unittest import TestCase
+
+import deuceclient.api.vault as api_vault
+from deuceclient.client.filereader import DeuceFileReader
+import deuceclient.common.errors as errors
+from deuceclient.tests import create_blocks, create_file, \
+    create_project_name, create_vault_name
+
+
+class FakeClient(object):
+    """Serves the blocks of a single file from memory
+    """
+
+    def __init__(self, blocks):
+        self.lock = threading.Lock()
+        self.blocks = {}
+        self.manifest = []
+        self.content = b''
+        self.downloads = []
+        self.fail = set()
+        for block_id, block_data, block_size in blocks:
+            self.blocks[block_id] = block_data
+            self.manifest.append((block_id, len(self.content)))
+            self.content += block_data
+
+    def _thread_client(self):
+        return self
+
+    def GetFileManifest(self, vault, file_id):
+        return list(self.manifest)
+
+    def DownloadBlock(self, vault, block):
+        with self.lock:
+            self.downloads.append(block.block_id)
+        if block.block_id in self.fail:
+            raise RuntimeError('mock failure')
+        block.data = self.blocks[block.block_id]
+        return True
+
+
+class DeuceFileReaderTest(TestCase):
+
+    def setUp(self):
+        super(DeuceFileReaderTest, self).setUp()
+        self.vault = api_vault.Vault(create_project_name(),
+                                     create_vault_name())
+        self.file_id = create_file()
+        self.client = FakeClient(create_blocks(block_count=10,
+                                               block_size=100,
+                                               uniform_sizes=True))
+
+    def open(self, **kwargs):
+        return DeuceFileReader(self.client, self.vault, self.file_id,
+                               **kwargs)
+
+    def test_read_all(self):
+        with self.open() as reader:
+            self.assertEqual(len(self.client.content), len(reader))
+            self.assertEqual(self.client.content, reader.read())
+            self.assertEqual(b'', reader.read())
+            self.assertEqual(len(self.client.content), reader.tell())
+
+    def test_length_from_last_block(self):
+        with self.open(read_ahead=0) as reader:
+            self.assertEqual(1000, len(reader))
+            self.assertEqual([self.client.manifest[-1][0]],
+                             self.client.downloads)
+
+    def test_given_length(self):
+        with self.open(length=1000, read_ahead=0) as reader:
+            self.assertEqual([], self.client.downloads)
+            self.assertEqual(1000, len(reader))
+
+    def test_empty_file(self):
+        self.client = FakeClient([])
+        with self.open() as reader:
+            self.assertEqual(0, len(reader))
+            self.assertEqual(b'', reader.read())
+
+        with self.open(length=0) as reader:
+            self.assertEqual(0, len(reader))
+            self.assertEqual(b'', reader.read())
+
+        with self.assertRaises(errors.InvalidContentError):
+            self.open(length=1000)
+
+    def test_length_past_last_block(self):
+        with self.open(length=2000, read_ahead=0) as reader:
+            self.assertEqual(self.client.content, reader.read())
+            self.assertEqual(b'', reader.read())
+
+    def test_seek_and_read_range(self):
+        with self.open(length=1000, read_ahead=0) as reader:
+            self.assertEqual(450, reader.seek(450))
+            self.assertEqual(self.client.content[450:700],
+                             reader.read(250))
+
+            # Only the blocks the read touched were downloaded
+            self.assertEqual([block_id for block_id, offset
+                              in self.client.manifest[4:7]],
+                             self.client.downloads)
+
+            self.assertEqual(990, reader.seek(-10, os.SEEK_END))
+            self.assertEqual(self.client.content[-10:], reader.read(100))
+
+            reader.seek(100)
+            self.assertEqual(150, reader.seek(50, os.SEEK_CUR))
+            self.assertEqual(self.client.content[150:160], reader.read(10))
+
+    def test_seek_invalid(self):
+        with self.open(length=1000) as reader:
+            with self.assertRaises(ValueError):
+                reader.seek(-1)
+            with self.assertRaises(ValueError):
+                reader.seek(0, 3)
+
+    def test_seek_past_end(self):
+        with self.open(length=1000) as reader:
+            reader.seek(5000)
+            self.assertEqual(b'', reader.read(10))
+
+    def test_readinto(self):
+        with self.open(length=1000, read_ahead=0) as reader:
+            buffer = bytearray(300)
+            reader.seek(50)
+            self.assertEqual(300, reader.readinto(buffer))
+            self.assertEqual(self.client.content[50:350], bytes(buffer))
+
+    def test_cache(self):
+        with self.open(length=1000, read_ahead=0, cache_blocks=2) as reader:
+            for _ in range(3):
+                reader.seek(10)
+                reader.read(10)
+            self.assertEqual(1, len(self.client.downloads))
+
+            for offset in (110, 210, 10):
+                reader.seek(offset)
+                reader.read(10)
+
+            # The first block was evicted by the later two
+            self.assertEqual(4, len(self.client.downloads))
+
+    def test_read_ahead(self):
+        with self.open(length=1000, read_ahead=3) as reader:
+            reader.read(10)
+            for _ in range(500):
+                if len(self.client.downloads) >= 4:
+                    break
+                threading.Event().wait(0.01)
+
+            self.assertEqual(
+                sorted(block_id for block_id, offset
+                       in self.client.manifest[:4]),
+                sorted(self.client.downloads))
+
+            self.assertEqual(self.client.content[10:],
+                             reader.read())
+            self.assertEqual(10, len(self.client.downloads))
+
+    def test_buffered(self):
+        with io.BufferedReader(self.open(), buffer_size=64) as reader:
+            reader.seek(333)
+            self.assertEqual(self.client.content[333:340], reader.read(7))
+            self.assertEqual(self.client.content[340:341], reader.peek(1)[:1])
+
+    def test_download_failure(self):
+        self.client.fail.add(self.client.manifest[2][0])
+        with self.open(length=1000, read_ahead=0, retries=0) as reader:
+            reader.seek(250)
+            with self.assertRaises(RuntimeError):
+                reader.read(10)
+
+    def test_wrong_content(self):
+        block_id = self.client.manifest[1][0]
+        self.client.blocks[block_id] = b'corrupted'
+        with self.open(length=1000, read_ahead=0) as reader:
+            reader.seek(150)
+            with self.assertRaises(errors.InvalidContentError):
+                reader.read(10)
+
+    def test_closed(self):
+        reader = self.open()
+        reader.close()
+        self.assertTrue(reader.closed)
+        with self.assertRaises(ValueError):
+            reader.read(10)
+        with self.assertRaises(ValueError):
+            reader.seek(0)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            self.open(cache_blocks=0)
+        with self.assertRaises(ValueError):
+            self.open(read_ahead=-1)
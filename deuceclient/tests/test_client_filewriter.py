@@ -0,0 +1,282 @@
+"""
+Tests - Deuce Client - Client - File Writer
+"""
+import os
+import threading
+from unittest import TestCase
+
+import httpretty
+import mock
+import requests
+
+import deuceclient.api as api
+import deuceclient.client.deuce
+from deuceclient.client.filewriter import DeuceFileWriter
+import deuceclient.common.sparse as sparse
+from deuceclient.tests import *
+import deuceclient.tests.test_client_deuce_file_upload as upload_tests
+
+
+class ClientDeuceFileWriterTests(ClientTestBase):
+
+    def setUp(self):
+        super(ClientDeuceFileWriterTests, self).setUp()
+        self.client = deuceclient.client.deuce.DeuceClient(self.authenticator,
+                                                           self.apihost,
+                                                           sslenabled=True)
+        self.server = upload_tests.FakeFileServer(self.apihost,
+                                                  self.vault.vault_id)
+
+    def open(self, **kwargs):
+        # httpretty does not cope with requests from several threads at once
+        kwargs.setdefault('workers', 1)
+        return DeuceFileWriter(self.client, self.vault, **kwargs)
+
+    @httpretty.activate
+    def test_write(self):
+        self.server.register()
+        data = os.urandom(10000)
+        existing_block_id = api.Block.make_id(data[1000:2000])
+        self.server.blocks[existing_block_id] = data[1000:2000]
+
+        with self.open(chunk_size=1000, count=3) as writer:
+            for start in range(0, len(data), 777):
+                self.assertEqual(len(data[start:start + 777]),
+                                 writer.write(data[start:start + 777]))
+            self.assertEqual(len(data), writer.tell())
+
+        self.assertTrue(writer.closed)
+        file_id = writer.file_id
+        self.assertEqual({file_id: len(data)}, self.server.finalized)
+        self.assertEqual(data, self.server.content(file_id))
+        self.assertEqual(4, self.server.assignments)
+        self.assertEqual({
+            'file_id': file_id,
+            'url': get_file_url(self.apihost, self.vault.vault_id, file_id),
+            'bytes': len(data),
+            'blocks': 10,
+            'uploaded_bytes': 9000,
+            'uploaded_blocks': 9
+        }, writer.summary)
+
+    @httpretty.activate
+    def test_write_partial_block(self):
+        self.server.register()
+        data = os.urandom(2500)
+
+        with self.open(chunk_size=1000) as writer:
+            writer.write(bytearray(data))
+
+        self.assertEqual(data, self.server.content(writer.file_id))
+        self.assertEqual(3, writer.summary['blocks'])
+
+    @httpretty.activate
+    def test_write_zero_blocks(self):
+        self.server.register()
+        data = bytes(3000) + os.urandom(1000) + bytes(500)
+        # The ids of the zero blocks are worked out once
+        sparse.zero_block_id(1000)
+        sparse.zero_block_id(500)
+
+        with mock.patch.object(api.Block, 'make_id',
+                               side_effect=api.Block.make_id) as make_id:
+            with self.open(chunk_size=1000, count=2) as writer:
+                writer.write(data)
+
+        # Zero blocks are not hashed but get the id of the zero block of
+        # their size, as when uploading a file
+        self.assertEqual(1, make_id.call_count)
+        self.assertEqual({0: sparse.zero_block_id(1000),
+                          1000: sparse.zero_block_id(1000),
+                          2000: sparse.zero_block_id(1000),
+                          3000: api.Block.make_id(data[3000:4000]),
+                          4000: sparse.zero_block_id(500)},
+                         self.server.files[writer.file_id])
+        self.assertEqual(data, self.server.content(writer.file_id))
+        self.assertEqual(5, writer.summary['blocks'])
+
+    @httpretty.activate
+    def test_write_empty_file(self):
+        self.server.register()
+
+        with self.open() as writer:
+            pass
+
+        self.assertEqual({writer.file_id: 0}, self.server.finalized)
+        self.assertEqual(0, self.server.assignments)
+
+    @httpretty.activate
+    def test_write_existing_file(self):
+        self.server.register()
+        file_id = create_file()
+        self.server.files[file_id] = {}
+        data = os.urandom(1500)
+
+        with self.open(file_id=file_id, chunk_size=1000) as writer:
+            writer.write(data)
+
+        self.assertEqual(file_id, writer.file_id)
+        self.assertEqual(data, self.server.content(file_id))
+
+    @httpretty.activate
+    def test_write_aborted(self):
+        self.server.register()
+
+        with self.assertRaises(KeyError):
+            with self.open(chunk_size=1000, count=1) as writer:
+                writer.write(os.urandom(3000))
+                raise KeyError('producer failed')
+
+        self.assertTrue(writer.closed)
+        self.assertEqual({}, self.server.files)
+        self.assertEqual({}, self.server.finalized)
+
+    @httpretty.activate
+    def test_write_upload_failure(self):
+        self.server.register()
+        httpretty.register_uri(httpretty.POST,
+                               get_blocks_url(self.apihost,
+                                              self.vault.vault_id),
+                               body='mock failure',
+                               status=500)
+
+        writer = self.open(chunk_size=1000, count=1)
+        with self.assertRaises(RuntimeError):
+            writer.write(os.urandom(3000))
+            writer.close()
+
+        # The incomplete file was deleted by close
+        self.assertTrue(writer.closed)
+        self.assertEqual({}, self.server.files)
+        self.assertEqual({}, self.server.finalized)
+
+        writer.abort()
+        self.assertTrue(writer.closed)
+
+    @httpretty.activate
+    def test_write_upload_failure_context(self):
+        self.server.register()
+        httpretty.register_uri(httpretty.POST,
+                               get_blocks_url(self.apihost,
+                                              self.vault.vault_id),
+                               body='mock failure',
+                               status=500)
+
+        with self.assertRaises(RuntimeError):
+            with self.open(chunk_size=1000, count=1) as writer:
+                writer.write(os.urandom(500))
+
+        self.assertTrue(writer.closed)
+        self.assertEqual({}, self.server.files)
+        self.assertEqual({}, self.server.finalized)
+
+    def test_write_transient_failure(self):
+        client = FlakyClient(failures=1)
+        writer = DeuceFileWriter(client, self.vault, chunk_size=10, count=1)
+        writer.write(b'0123456789')
+        writer.close()
+
+        self.assertEqual(2, client.started)
+        self.assertEqual(10, client.finalized)
+        self.assertEqual(1, writer.summary['blocks'])
+
+        client = FlakyClient(failures=1)
+        writer = DeuceFileWriter(client, self.vault, chunk_size=10, count=1,
+                                 retries=0)
+        writer.write(b'0123456789')
+        with self.assertRaises(requests.ConnectionError):
+            writer.close()
+
+    def test_write_closed(self):
+        writer = DeuceFileWriter(GatedClient(), self.vault)
+        writer.close()
+        with self.assertRaises(ValueError):
+            writer.write(b'data')
+
+    def test_invalid_parameters(self):
+        for kwargs in ({'chunk_size': 0}, {'count': 0}, {'workers': 0}):
+            with self.assertRaises(ValueError):
+                DeuceFileWriter(GatedClient(), self.vault, **kwargs)
+
+
+class GatedClient(object):
+    """Accepts uploads only while the gate is open
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.finalized = None
+
+    _assign_block_list = \
+        deuceclient.client.deuce.DeuceClient._assign_block_list
+
+    def _thread_client(self):
+        return self
+
+    def CreateFile(self, vault):
+        file_id = create_file()
+        vault.add_file(file_id)
+        return file_id
+
+    def AssignBlocksToFile(self, vault, file_id, block_ids):
+        with self.lock:
+            self.started += 1
+        self.gate.wait()
+        return []
+
+    def FinalizeFile(self, vault, file_id, file_length=None):
+        self.finalized = file_length
+        return True
+
+
+class DeuceFileWriterMemoryTests(TestCase):
+
+    def test_bounded_pending(self):
+        client = GatedClient()
+        client.gate.clear()
+        self.addCleanup(client.gate.set)
+        vault = api.Vault(create_project_name(), create_vault_name())
+        writer = DeuceFileWriter(client, vault, chunk_size=10, count=1,
+                                 workers=1, max_pending=2)
+
+        def produce():
+            for _ in range(10):
+                writer.write(b'0123456789')
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        producer.join(0.5)
+
+        # One batch is being uploaded, one waits and the producer waits for
+        # room for the third
+        self.assertTrue(producer.is_alive())
+        self.assertEqual(1, client.started)
+        self.assertEqual(30, writer.tell())
+
+        client.gate.set()
+        producer.join()
+        writer.close()
+        self.assertEqual(10, client.started)
+        self.assertEqual(100, client.finalized)
+        self.assertEqual(10, writer.summary['blocks'])
+
+
+class FlakyClient(GatedClient):
+    """Fails the first assignments with a connection error
+    """
+
+    def __init__(self, failures):
+        super(FlakyClient, self).__init__()
+        self.failures = failures
+
+    def AssignBlocksToFile(self, vault, file_id, block_ids):
+        super(FlakyClient, self).AssignBlocksToFile(vault, file_id,
+                                                    block_ids)
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise requests.ConnectionError('mock failure')
+        return []
@@ -0,0 +1,81 @@
+"""
+Tests - Deuce Client - Common - Bitmap
+"""
+from unittest import TestCase
+
+from deuceclient.common.bitmap import Bitmap
+
+
+class BitmapTest(TestCase):
+
+    def test_empty(self):
+        bitmap = Bitmap(0)
+        self.assertEqual(0, len(bitmap))
+        self.assertEqual(0, bitmap.count())
+        self.assertTrue(bitmap.all())
+        self.assertEqual([], list(bitmap.missing()))
+
+    def test_negative_size(self):
+        with self.assertRaises(ValueError):
+            Bitmap(-1)
+
+    def test_set_and_clear(self):
+        bitmap = Bitmap(20)
+        self.assertNotIn(9, bitmap)
+
+        bitmap.set(9)
+        bitmap.set(19)
+        self.assertIn(9, bitmap)
+        self.assertIn(19, bitmap)
+        self.assertEqual(2, bitmap.count())
+        self.assertFalse(bitmap.all())
+
+        bitmap.clear(9)
+        self.assertNotIn(9, bitmap)
+        self.assertEqual(1, bitmap.count())
+
+    def test_out_of_range(self):
+        bitmap = Bitmap(10)
+        for index in (-1, 10, 16):
+            with self.assertRaises(IndexError):
+                bitmap.set(index)
+            with self.assertRaises(IndexError):
+                index in bitmap
+
+    def test_missing(self):
+        bitmap = Bitmap(19)
+        for index in range(19):
+            if index not in (3, 17):
+                bitmap.set(index)
+
+        self.assertEqual([3, 17], list(bitmap.missing()))
+
+        bitmap.set(3)
+        bitmap.set(17)
+        self.assertTrue(bitmap.all())
+        self.assertEqual([], list(bitmap.missing()))
+
+    def test_encode_decode(self):
+        bitmap = Bitmap(1000)
+        for index in range(0, 1000, 7):
+            bitmap.set(index)
+
+        decoded = Bitmap.decode(1000, bitmap.encode())
+        self.assertEqual(bitmap.count(), decoded.count())
+        self.assertEqual(list(bitmap.missing()), list(decoded.missing()))
+
+    def test_encode_large(self):
+        bitmap = Bitmap(1000000)
+        for index in range(600000):
+            bitmap.set(index)
+
+        encoded = bitmap.encode()
+        self.assertLess(len(encoded), 2000)
+        self.assertEqual(600000, Bitmap.decode(1000000, encoded).count())
+
+    def test_decode_invalid(self):
+        with self.assertRaises(ValueError):
+            Bitmap.decode(10, 'not a bitmap')
+
+        with self.assertRaises(ValueError):
+            Bitmap.decode(100, Bitmap(10).encode())
@@ -0,0 +1,71 @@
+"""
+Tests - Deuce Client - Common - Checkpoint
+"""
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from deuceclient.common.checkpoint import Checkpoint
+
+
+class CheckpointTest(TestCase):
+
+    def setUp(self):
+        super(CheckpointTest, self).setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'checkpoint')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(CheckpointTest, self).tearDown()
+
+    def test_path(self):
+        self.assertEqual(self.path, Checkpoint(self.path).path)
+
+    def test_load_missing(self):
+        self.assertIsNone(Checkpoint(self.path).load())
+
+    def test_save_and_load(self):
+        checkpoint = Checkpoint(self.path)
+        state = {'stage': 'blocks', 'marker': None, 'counts': [1, 2]}
+
+        checkpoint.save(state)
+        self.assertEqual(state, Checkpoint(self.path).load())
+
+        state['marker'] = 'next'
+        checkpoint.save(state)
+        self.assertEqual(state, checkpoint.load())
+        self.assertEqual(['checkpoint'], os.listdir(self.temp_dir.name))
+
+    def test_concurrent_saves(self):
+        # Writers sharing a checkpoint do not replace each other's files
+        errors = []
+
+        def save(writer):
+            try:
+                for count in range(50):
+                    Checkpoint(self.path).save({'writer': writer,
+                                                'count': count})
+            except Exception as ex:
+                errors.append(ex)
+
+        writers = [threading.Thread(target=save, args=(writer,))
+                   for writer in range(4)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(49, Checkpoint(self.path).load()['count'])
+        self.assertEqual(['checkpoint'], os.listdir(self.temp_dir.name))
+
+    def test_clear(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.save({})
+        checkpoint.clear()
+        self.assertIsNone(checkpoint.load())
+
+        # clearing again is harmless
+        checkpoint.clear()
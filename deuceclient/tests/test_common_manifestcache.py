@@ -0,0 +1,111 @@
+"""
+Tests - Deuce Client - Common - Manifest Cache
+"""
+import os
+import tempfile
+import types
+from unittest import TestCase
+
+import deuceclient.api.vault as api_vault
+from deuceclient.common.manifestcache import ManifestCache
+from deuceclient.tests import create_blocks, create_project_name, \
+    create_vault_name
+
+
+class ManifestCacheTest(TestCase):
+
+    def setUp(self):
+        super(ManifestCacheTest, self).setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'manifests.db')
+        self.vault = api_vault.Vault(create_project_name(),
+                                     create_vault_name())
+
+        self.local_path = os.path.join(self.temp_dir.name, 'local')
+        with open(self.local_path, 'wb') as local_file:
+            local_file.write(b'local content')
+
+        self.manifest = []
+        offset = 0
+        for block_id, block_data, block_size in create_blocks(3):
+            self.manifest.append((block_id, offset))
+            offset += block_size
+        self.length = offset
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(ManifestCacheTest, self).tearDown()
+
+    def test_store_and_lookup(self):
+        stat_result = os.stat(self.local_path)
+        with ManifestCache(self.path) as cache:
+            self.assertEqual(self.path, cache.path)
+            self.assertIsNone(cache.lookup(self.vault, self.local_path,
+                                           stat_result))
+
+            cache.store(self.vault, self.local_path, stat_result,
+                        self.manifest, self.length)
+            self.assertEqual((self.manifest, self.length),
+                             cache.lookup(self.vault, self.local_path,
+                                          stat_result))
+
+        # The cache persists
+        with ManifestCache(self.path) as cache:
+            self.assertEqual((self.manifest, self.length),
+                             cache.lookup(self.vault, self.local_path,
+                                          stat_result))
+
+    def test_relative_path(self):
+        stat_result = os.stat(self.local_path)
+        old_dir = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            with ManifestCache(self.path) as cache:
+                cache.store(self.vault, 'local', stat_result,
+                            self.manifest, self.length)
+                self.assertIsNotNone(cache.lookup(self.vault,
+                                                  self.local_path,
+                                                  stat_result))
+        finally:
+            os.chdir(old_dir)
+
+    def test_changed_file(self):
+        stat_result = os.stat(self.local_path)
+        with ManifestCache(self.path) as cache:
+            cache.store(self.vault, self.local_path, stat_result,
+                        self.manifest, self.length)
+
+            for field in ('st_size', 'st_mtime_ns', 'st_ino'):
+                fingerprint = {
+                    'st_size': stat_result.st_size,
+                    'st_mtime_ns': stat_result.st_mtime_ns,
+                    'st_ino': stat_result.st_ino
+                }
+                fingerprint[field] += 1
+                self.assertIsNone(cache.lookup(
+                    self.vault, self.local_path,
+                    types.SimpleNamespace(**fingerprint)))
+
+            # Rewriting the file changes its fingerprint
+            os.utime(self.local_path, ns=(0, 0))
+            self.assertIsNone(cache.lookup(self.vault, self.local_path,
+                                           os.stat(self.local_path)))
+
+    def test_other_vault(self):
+        stat_result = os.stat(self.local_path)
+        other_vault = api_vault.Vault(self.vault.project_id,
+                                      create_vault_name())
+        with ManifestCache(self.path) as cache:
+            cache.store(self.vault, self.local_path, stat_result,
+                        self.manifest, self.length)
+            self.assertIsNone(cache.lookup(other_vault, self.local_path,
+                                           stat_result))
+
+    def test_remove(self):
+        stat_result = os.stat(self.local_path)
+        with ManifestCache(self.path) as cache:
+            cache.store(self.vault, self.local_path, stat_result,
+                        self.manifest, self.length)
+            cache.remove(self.vault, self.local_path)
+            self.assertIsNone(cache.lookup(self.vault, self.local_path,
+                                           stat_result))
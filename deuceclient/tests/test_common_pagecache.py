@@ -0,0 +1,147 @@
+"""
+Tests - Deuce Client - Common - Page Cache
+"""
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+import mock
+
+import deuceclient.common.pagecache as pagecache
+from deuceclient.utils import UniformSplitter
+from deuceclient.tests import create_project_name, create_vault_name
+
+MiB = 1024 * 1024
+
+
+class PageCacheTestBase(TestCase):
+
+    def setUp(self):
+        super(PageCacheTestBase, self).setUp()
+        if not hasattr(os, 'posix_fadvise'):
+            self.skipTest('posix_fadvise is not available')
+
+        self.local_file = tempfile.TemporaryFile()
+        self.addCleanup(self.local_file.close)
+
+        self.advice = []
+        patcher = mock.patch('os.posix_fadvise',
+                             side_effect=lambda fd, offset, length, advice:
+                             self.advice.append((offset, length, advice)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def advised(self, advice):
+        return [(offset, length) for offset, length, kind in self.advice
+                if kind == advice]
+
+
+class PageCacheAdvisorTest(PageCacheTestBase):
+
+    def test_sequential(self):
+        advisor = pagecache.PageCacheAdvisor(self.local_file)
+        self.assertTrue(advisor.enabled)
+        self.assertEqual([(0, 0, os.POSIX_FADV_SEQUENTIAL)], self.advice)
+
+    def test_readahead(self):
+        advisor = pagecache.PageCacheAdvisor(self.local_file,
+                                             readahead=8 * MiB, drop=False)
+        for offset in range(0, 12 * MiB, MiB):
+            advisor.read(offset, MiB)
+
+        # The window is extended once half of it is read
+        self.assertEqual([(MiB, 8 * MiB), (9 * MiB, 5 * MiB),
+                          (14 * MiB, 5 * MiB)],
+                         self.advised(os.POSIX_FADV_WILLNEED))
+        self.assertEqual([], self.advised(os.POSIX_FADV_DONTNEED))
+
+    def test_readahead_disabled(self):
+        advisor = pagecache.PageCacheAdvisor(self.local_file, readahead=0)
+        for offset in range(0, 4 * MiB, MiB):
+            advisor.read(offset, MiB)
+
+        self.assertEqual([], self.advised(os.POSIX_FADV_WILLNEED))
+
+    def test_drop(self):
+        advisor = pagecache.PageCacheAdvisor(self.local_file, readahead=0)
+        for offset in range(0, 10 * MiB, MiB):
+            advisor.read(offset, MiB)
+        advisor.flush()
+        advisor.flush()
+
+        self.assertEqual([(0, 4 * MiB), (4 * MiB, 4 * MiB),
+                          (8 * MiB, 2 * MiB)],
+                         self.advised(os.POSIX_FADV_DONTNEED))
+
+    def test_repositioned(self):
+        advisor = pagecache.PageCacheAdvisor(self.local_file, readahead=0)
+        advisor.read(0, MiB)
+        advisor.read(10 * MiB, MiB)
+        advisor.flush()
+
+        # The ranges read are dropped, not the range skipped
+        self.assertEqual([(0, MiB), (10 * MiB, MiB)],
+                         self.advised(os.POSIX_FADV_DONTNEED))
+
+    def test_not_a_local_file(self):
+        self.assertFalse(pagecache.PageCacheAdvisor(io.BytesIO()).enabled)
+        self.assertFalse(pagecache.PageCacheAdvisor(mock.MagicMock()).enabled)
+
+        read_fd, write_fd = os.pipe()
+        with open(read_fd, 'rb') as read_pipe, open(write_fd, 'wb'):
+            advisor = pagecache.PageCacheAdvisor(read_pipe)
+            self.assertFalse(advisor.enabled)
+            advisor.read(0, MiB)
+            advisor.flush()
+
+        self.assertEqual([], self.advice)
+
+    def test_fadvise_failure(self):
+        advisor = pagecache.PageCacheAdvisor(self.local_file)
+        with mock.patch('os.posix_fadvise', side_effect=OSError):
+            advisor.read(0, MiB)
+        self.assertFalse(advisor.enabled)
+
+    def test_invalid_readahead(self):
+        with self.assertRaises(ValueError):
+            pagecache.PageCacheAdvisor(self.local_file, readahead=-1)
+
+
+class SplitterPageCacheTest(PageCacheTestBase):
+
+    def split(self, **kwargs):
+        splitter = UniformSplitter(create_project_name(),
+                                   create_vault_name(),
+                                   self.local_file,
+                                   chunk_size=MiB,
+                                   **kwargs)
+        return splitter.get_blocks(20)
+
+    def test_split_drops_content(self):
+        self.local_file.write(os.urandom(MiB) * 9 + b'tail')
+        self.local_file.seek(0)
+
+        blocks = self.split(readahead=2 * MiB)
+
+        self.assertEqual(10, len(blocks))
+        self.assertEqual((0, 0, os.POSIX_FADV_SEQUENTIAL), self.advice[0])
+        self.assertEqual((MiB, 2 * MiB),
+                         self.advised(os.POSIX_FADV_WILLNEED)[0])
+
+        # All of the file was dropped, in order
+        dropped = self.advised(os.POSIX_FADV_DONTNEED)
+        self.assertEqual(0, dropped[0][0])
+        for (offset, length), (next_offset, next_length) in zip(dropped,
+                                                                dropped[1:]):
+            self.assertEqual(offset + length, next_offset)
+        self.assertEqual(9 * MiB + 4, sum(length
+                                          for offset, length in dropped))
+
+    def test_split_keep_cache(self):
+        self.local_file.write(os.urandom(3 * MiB))
+        self.local_file.seek(0)
+
+        self.split(drop_cache=False)
+
+        self.assertEqual([], self.advised(os.POSIX_FADV_DONTNEED))
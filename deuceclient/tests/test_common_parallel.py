@@ -0,0 +1,165 @@
+"""
+Tests - Deuce Client - Common - Parallel
+"""
+import threading
+import time
+from unittest import TestCase
+
+import mock
+
+import deuceclient.common.parallel as parallel
+
+
+class ParallelTest(TestCase):
+
+    def test_map_unordered(self):
+        items = list(range(100))
+
+        results = list(parallel.map_unordered(lambda x: x * 2, items,
+                                              max_workers=4))
+
+        self.assertEqual(len(items), len(results))
+        for item, result, error in results:
+            self.assertEqual(item * 2, result)
+            self.assertIsNone(error)
+
+    def test_map_unordered_errors(self):
+        def fail_odd(x):
+            if x % 2:
+                raise ValueError('mock failure {0}'.format(x))
+            return x
+
+        results = {item: (result, error)
+                   for item, result, error in
+                   parallel.map_unordered(fail_odd, range(10))}
+
+        self.assertEqual(10, len(results))
+        for item, (result, error) in results.items():
+            if item % 2:
+                self.assertIsNone(result)
+                self.assertIsInstance(error, ValueError)
+            else:
+                self.assertEqual(item, result)
+                self.assertIsNone(error)
+
+    def test_map_unordered_bounded(self):
+        lock = threading.Lock()
+        state = {'consumed': 0, 'active': 0, 'peak': 0}
+
+        def generate():
+            for item in range(50):
+                state['consumed'] = state['consumed'] + 1
+                yield item
+
+        def work(item):
+            with lock:
+                state['active'] = state['active'] + 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.001)
+            with lock:
+                state['active'] = state['active'] - 1
+            return item
+
+        results = parallel.map_unordered(work, generate(), max_workers=3)
+        next(results)
+        # only the initial window has been pulled from the generator
+        self.assertLessEqual(state['consumed'], 3 * 2 + 1)
+
+        remaining = list(results)
+        self.assertEqual(49, len(remaining))
+        self.assertLessEqual(state['peak'], 3)
+
+    def test_map_unordered_empty(self):
+        self.assertEqual([], list(parallel.map_unordered(str, [])))
+
+    def test_map_unordered_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            list(parallel.map_unordered(str, [1], max_workers=0))
+
+    def test_map_unordered_retries(self):
+        attempts = {}
+
+        def flaky(x):
+            attempts[x] = attempts.get(x, 0) + 1
+            if attempts[x] < 3:
+                raise ValueError('mock failure')
+            return x
+
+        with mock.patch('deuceclient.common.parallel.time.sleep'):
+            results = list(parallel.map_unordered(flaky, range(5),
+                                                  retries=2,
+                                                  retry_delay=0))
+
+        for item, result, error in results:
+            self.assertEqual(item, result)
+            self.assertIsNone(error)
+            self.assertEqual(3, attempts[item])
+
+
+class RetryTest(TestCase):
+
+    def setUp(self):
+        super(RetryTest, self).setUp()
+        self.attempts = 0
+
+    def fail_until(self, success_attempt, error=ValueError):
+        def func():
+            self.attempts = self.attempts + 1
+            if self.attempts < success_attempt:
+                raise error('mock failure')
+            return self.attempts
+        return func
+
+    def test_call_with_retry_success(self):
+        self.assertEqual(1, parallel.call_with_retry(self.fail_until(1)))
+
+    def test_call_with_retry_backoff(self):
+        with mock.patch('deuceclient.common.parallel.time.sleep') as sleep:
+            self.assertEqual(3, parallel.call_with_retry(self.fail_until(3),
+                                                         retries=3,
+                                                         retry_delay=1))
+            self.assertEqual([mock.call(1), mock.call(2)],
+                             sleep.call_args_list)
+
+    def test_call_with_retry_exhausted(self):
+        with mock.patch('deuceclient.common.parallel.time.sleep'):
+            with self.assertRaises(ValueError):
+                parallel.call_with_retry(self.fail_until(5), retries=2)
+        self.assertEqual(3, self.attempts)
+
+    def test_call_with_retry_not_retryable(self):
+        with mock.patch('deuceclient.common.parallel.time.sleep'):
+            with self.assertRaises(KeyError):
+                parallel.call_with_retry(
+                    self.fail_until(5, error=KeyError),
+                    retries=2,
+                    retry_if=lambda ex: isinstance(ex, ValueError))
+        self.assertEqual(1, self.attempts)
+
+    def test_call_with_retry_rate_limited(self):
+        limiter = mock.MagicMock()
+        with mock.patch('deuceclient.common.parallel.time.sleep'):
+            parallel.call_with_retry(self.fail_until(2), retries=1,
+                                     rate_limiter=limiter)
+        self.assertEqual(2, limiter.acquire.call_count)
+
+
+class RateLimiterTest(TestCase):
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            parallel.RateLimiter(0)
+
+    def test_rate(self):
+        self.assertEqual(4, parallel.RateLimiter(4).rate)
+
+    def test_acquire(self):
+        limiter = parallel.RateLimiter(10)
+        with mock.patch('deuceclient.common.parallel.time.sleep') as sleep:
+            for _ in range(5):
+                limiter.acquire()
+
+        # the first acquire does not wait, the rest are spaced out
+        self.assertEqual(4, sleep.call_count)
+        for call_args in sleep.call_args_list:
+            self.assertLessEqual(call_args[0][0], 0.5)
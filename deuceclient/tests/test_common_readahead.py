@@ -0,0 +1,125 @@
+"""
+Tests - Deuce Client - Common - Read-Ahead
+"""
+import io
+import os
+import threading
+from unittest import TestCase
+
+from deuceclient.common.readahead import ReadAheadReader
+
+
+class StreamSource(object):
+    """Fills buffers from a stream, recording the buffers filled
+    """
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.buffers = set()
+        self.reads = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def read_into(self, view):
+        self.gate.wait()
+        self.buffers.add(id(view.obj))
+        self.reads += 1
+        offset = self.stream.tell()
+        return (offset, self.stream.readinto(view), None)
+
+
+class ReadAheadReaderTest(TestCase):
+
+    def read_all(self, reader):
+        chunks = []
+        while True:
+            offset, data = reader.get()
+            if not len(data):
+                return chunks
+            chunks.append((offset, bytes(data)))
+
+    def test_read(self):
+        data = os.urandom(1000)
+        source = StreamSource(data)
+        reader = ReadAheadReader(source.read_into, 300, 900)
+
+        chunks = self.read_all(reader)
+        self.assertEqual([0, 300, 600, 900],
+                         [offset for offset, chunk in chunks])
+        self.assertEqual(data, b''.join(chunk for offset, chunk in chunks))
+        self.assertEqual((1000, b''), reader.get())
+        reader.close()
+
+        # The three buffers of the budget were reused
+        self.assertEqual(3, len(source.buffers))
+
+    def test_exact_chunks(self):
+        data = os.urandom(600)
+        reader = ReadAheadReader(StreamSource(data).read_into, 300, 0)
+
+        chunks = self.read_all(reader)
+        self.assertEqual([0, 300], [offset for offset, chunk in chunks])
+        reader.close()
+
+    def test_budget(self):
+        source = StreamSource(os.urandom(10000))
+        reader = ReadAheadReader(source.read_into, 100, 400)
+        self.addCleanup(reader.close)
+
+        for _ in range(500):
+            if source.reads >= 4:
+                break
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.05)
+
+        # Only as many chunks as there are buffers are read ahead
+        self.assertEqual(4, source.reads)
+
+        # The buffer of a chunk is read into again once the next chunk is
+        # taken
+        self.assertEqual(0, reader.get()[0])
+        self.assertEqual(100, reader.get()[0])
+        for _ in range(500):
+            if source.reads >= 5:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(5, source.reads)
+
+    def test_data_instead_of_buffer(self):
+        zeros = bytes(100)
+
+        def read_into(view):
+            return (0, 100, zeros)
+
+        reader = ReadAheadReader(read_into, 100, 200)
+        self.assertIs(zeros, reader.get()[1])
+        reader.close()
+
+    def test_error(self):
+        def read_into(view):
+            raise OSError('mock failure')
+
+        reader = ReadAheadReader(read_into, 100, 200)
+        with self.assertRaises(OSError):
+            reader.get()
+        with self.assertRaises(OSError):
+            reader.get()
+        reader.close()
+
+    def test_close_early(self):
+        source = StreamSource(os.urandom(10000))
+        source.gate.clear()
+        reader = ReadAheadReader(source.read_into, 100, 200)
+
+        source.gate.set()
+        reader.get()
+        reader.close()
+        reads = source.reads
+        threading.Event().wait(0.05)
+        self.assertEqual(reads, source.reads)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            ReadAheadReader(StreamSource(b'').read_into, 0, 100)
+        with self.assertRaises(ValueError):
+            ReadAheadReader(StreamSource(b'').read_into, 100, -1)
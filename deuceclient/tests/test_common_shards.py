@@ -0,0 +1,70 @@
+"""
+Tests - Deuce Client - Common - Shards
+"""
+from unittest import TestCase
+import uuid
+
+import deuceclient.common.shards as shards
+import deuceclient.common.validation as v
+
+
+class ShardsTest(TestCase):
+
+    def test_single_shard(self):
+        self.assertEqual([('0' * 40, None)], shards.key_space_shards(1))
+
+    def test_shards(self):
+        key_shards = shards.key_space_shards(4)
+
+        self.assertEqual(['0', '4', '8', 'c'],
+                         [start[0] for start, end in key_shards])
+        for start, end in key_shards:
+            self.assertEqual(40, len(start))
+            v.val_metadata_block_id(start)
+
+        # each shard ends where the next one starts
+        for (start, end), (next_start, next_end) in zip(key_shards,
+                                                        key_shards[1:]):
+            self.assertEqual(end, next_start)
+        self.assertIsNone(key_shards[-1][1])
+
+    def test_uneven_shards(self):
+        key_shards = shards.key_space_shards(3)
+        starts = [int(start, 16) for start, end in key_shards]
+
+        self.assertEqual(0, starts[0])
+        self.assertEqual(starts[1] - starts[0], starts[2] - starts[1])
+
+    def test_invalid_shards(self):
+        with self.assertRaises(ValueError):
+            shards.key_space_shards(0)
+
+    def test_worker_shards(self):
+        all_shards = shards.key_space_shards(8)
+        worker_shards = [shards.key_space_shards(2, worker=worker, workers=4)
+                         for worker in range(4)]
+
+        # the workers share out the key space without overlapping
+        self.assertEqual(all_shards, sum(worker_shards, []))
+        self.assertEqual(('0' * 40, '2' + '0' * 39), worker_shards[0][0])
+        self.assertEqual(('e' + '0' * 39, None), worker_shards[3][1])
+        for shard_list in worker_shards[:3]:
+            self.assertIsNotNone(shard_list[-1][1])
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            shards.key_space_shards(1, workers=0)
+        with self.assertRaises(ValueError):
+            shards.key_space_shards(1, worker=2, workers=2)
+        with self.assertRaises(ValueError):
+            shards.key_space_shards(1, worker=-1, workers=2)
+
+    def test_storage_block_marker(self):
+        block_id = shards.key_space_shards(2)[1][0]
+        marker = shards.storage_block_marker(block_id)
+
+        v.val_storage_block_id(marker)
+        self.assertTrue(marker.startswith(block_id))
+        self.assertLessEqual(marker, '{0}_{1}'.format(block_id,
+                                                      str(uuid.uuid4())))
+        self.assertIsNone(shards.storage_block_marker(None))
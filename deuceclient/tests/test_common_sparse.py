@@ -0,0 +1,110 @@
+"""
+Tests - Deuce Client - Common - Sparse
+"""
+import os
+import tempfile
+from unittest import TestCase
+
+import mock
+
+import deuceclient.api as api
+import deuceclient.common.sparse as sparse
+
+
+class SparseTest(TestCase):
+
+    def setUp(self):
+        super(SparseTest, self).setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'sparse')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(SparseTest, self).tearDown()
+
+    def make_sparse_file(self, data_offset, data, length):
+        with open(self.path, 'wb') as sparse_file:
+            sparse_file.truncate(length)
+            sparse_file.seek(data_offset)
+            sparse_file.write(data)
+
+    def test_zeros(self):
+        self.assertEqual(b'\0' * 10, sparse.zeros(10))
+        self.assertIs(sparse.zeros(10), sparse.zeros(10))
+
+    def test_zero_block_id(self):
+        self.assertEqual(api.Block.make_id(bytes(100)),
+                         sparse.zero_block_id(100))
+        self.assertTrue(sparse.is_zero_block(sparse.zero_block_id(100), 100))
+        self.assertFalse(sparse.is_zero_block(sparse.zero_block_id(100), 99))
+        self.assertFalse(sparse.is_zero_block(sparse.zero_block_id(100),
+                                              None))
+        self.assertFalse(sparse.is_zero_block(
+            api.Block.make_id(b'data'), 4))
+
+    def test_hole_map(self):
+        block_size = 1024 * 1024
+        self.make_sparse_file(4 * block_size, os.urandom(block_size),
+                              8 * block_size)
+
+        with open(self.path, 'rb') as sparse_file:
+            holes = sparse.HoleMap(sparse_file)
+            if not holes.enabled or \
+                    not holes.hole_size(0, block_size):
+                self.skipTest('The file system does not report holes')
+
+            sparse_file.seek(123)
+            self.assertEqual(block_size,
+                             holes.hole_size(block_size, block_size))
+            self.assertEqual(0, holes.hole_size(3 * block_size,
+                                                2 * block_size))
+            self.assertEqual(0, holes.hole_size(4 * block_size, 10))
+            self.assertEqual(block_size,
+                             holes.hole_size(6 * block_size, block_size))
+            self.assertEqual(0, holes.hole_size(7 * block_size,
+                                                2 * block_size))
+            self.assertEqual(0, holes.hole_size(8 * block_size, 10))
+            self.assertEqual(123, sparse_file.tell())
+
+    def test_hole_map_not_a_file(self):
+        self.assertFalse(sparse.HoleMap(mock.MagicMock()).enabled)
+
+        read_fd, write_fd = os.pipe()
+        with open(read_fd, 'rb') as read_pipe, open(write_fd, 'wb'):
+            self.assertFalse(sparse.HoleMap(read_pipe).enabled)
+
+    def test_punch_hole(self):
+        data = os.urandom(10000)
+        with open(self.path, 'wb') as output:
+            output.write(data)
+
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            sparse.punch_hole(fd, 1000, 5000)
+            sparse.punch_hole(fd, 0, 0)
+        finally:
+            os.close(fd)
+
+        with open(self.path, 'rb') as output:
+            self.assertEqual(data[:1000] + bytes(5000) + data[6000:],
+                             output.read())
+
+    def test_punch_hole_unsupported(self):
+        data = os.urandom(3000)
+        with open(self.path, 'wb') as output:
+            output.write(data)
+
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            with mock.patch('deuceclient.common.sparse.ZERO_FILL_SIZE',
+                            700), \
+                    mock.patch('deuceclient.common.sparse.'
+                               '_fallocate_punch_hole',
+                               return_value=False):
+                sparse.punch_hole(fd, 100, 2000)
+        finally:
+            os.close(fd)
+
+        with open(self.path, 'rb') as output:
+            self.assertEqual(data[:100] + bytes(2000) + data[2100:],
+                             output.read())
@@ -1,13 +1,14 @@
 """
 Tests - Deuce Client - Common - Validation
 """
+import types
+
 import mock
 from unittest import TestCase
 
-from stoplight import validate
-
 import deuceclient.api as api
 import deuceclient.common.validation as v
+from deuceclient.common.validation import validate
 import deuceclient.common.errors as errors
 from deuceclient.tests import *
 
@@ -53,7 +54,7 @@ class TestVaultRules(TestRulesBase):
         '-_-_-_-_-_-_-_-',
         'snake_case_is_ok',
         'So-are-hyphonated-names',
-        'a' * v.VAULT_ID_MAX_LEN
+        'a' * v.VAULT_ID_MAX_LEN,
     ]
 
     negative_cases = [
@@ -62,6 +63,9 @@ class TestVaultRules(TestRulesBase):
         '^', '&', '*', '[', ']', '/',
         '@#$@#$@#^@%$@#@#@#$@!!!@$@$@',
         '\\', 'a' * (v.VAULT_ID_MAX_LEN + 1),
+        'vault\n',
+        'vault\n\n',
+        '\n',
         None
     ]
 
@@ -164,6 +168,12 @@ class TestMetadataBlockRules(TestRulesBase):
         'AaaAaaAaaaaAaAaaaAaaaaaaaAAAAaaaaAaaaaaa' * 2,
         'AaaAaaAaaaaAaAaaaAaaaaaaaAAAAaaaaAaaaaaa' * 3,
         'AaaAaaAaaaaAaAaaaAaaaaaaaAAAAaaaaAaaaaaa' * 4,
+        'a' * 40 + '-',
+        'a' * 40 + ' a',
+        'a' * 40 + '\n',
+        'a' * 40 + '_',
+        'a' * 40 + 'g',
+        'a' * 40 + '\u00e9',
         None
     ]
 
@@ -292,6 +302,12 @@ class TestStorageBlockRules(TestRulesBase):
         'e7bf692b-ec7b-40ad-b0d1-45ce6798fb6z',  # note trailing z
         str(uuid.uuid4()).upper(),  # Force case sensitivity
         123456,
+        create_storage_block().replace('_', '-'),
+        create_storage_block()[:-1] + 'z',
+        'z' + create_storage_block()[1:],
+        create_storage_block()[:49] + 'a' + create_storage_block()[50:],
+        create_storage_block() + '0',
+        create_storage_block() + '-',
         None
     ]
 
@@ -386,6 +402,9 @@ class TestFileRules(TestRulesBase):
         '',
         'e7bf692b-ec7b-40ad-b0d1-45ce6798fb6z',  # note trailing z
         str(uuid.uuid4()).upper(),  # Force case sensitivity
+        str(uuid.uuid4()).replace('-', 'a'),
+        str(uuid.uuid4()) + '0',
+        str(uuid.uuid4()) + '-',
         None
     ]
 
@@ -646,3 +665,282 @@ class TestIntRules(TestRulesBase):
         for i in self.__class__.negative_cases:
             with self.assertRaises(errors.ParameterConstraintError):
                 self.utilize_int(i)
+
+
+class NonStrictValidationMixin(object):
+    """Re-run a set of rule tests with strict validation disabled
+    """
+
+    def setUp(self):
+        super(NonStrictValidationMixin, self).setUp()
+        v.set_strict(False)
+
+    def tearDown(self):
+        v.set_strict(True)
+        super(NonStrictValidationMixin, self).tearDown()
+
+
+class TestVaultRulesNonStrict(NonStrictValidationMixin, TestVaultRules):
+    pass
+
+
+class TestMetadataBlockRulesNonStrict(NonStrictValidationMixin,
+                                      TestMetadataBlockRules):
+    pass
+
+
+class TestBlockTypesNonStrict(NonStrictValidationMixin, TestBlockTypes):
+    pass
+
+
+class TestStorageBlockRulesNonStrict(NonStrictValidationMixin,
+                                     TestStorageBlockRules):
+    pass
+
+
+class TestFileRulesNonStrict(NonStrictValidationMixin, TestFileRules):
+
+    def test_file_id_bytes_type(self):
+        # Non-string values fall back to the strict check so the
+        # error raised for them is unchanged
+        with self.assertRaises(TypeError):
+            v.val_file_id()(str(uuid.uuid4()).encode())
+
+
+class TestOffsetRulesNonStrict(NonStrictValidationMixin, TestOffsetRules):
+    pass
+
+
+class TestOffsetNumericRulesNonStrict(NonStrictValidationMixin,
+                                      TestOffsetNumericRules):
+    pass
+
+
+class TestLimitRulesNonStrict(NonStrictValidationMixin, TestLimitRules):
+    pass
+
+
+class TestBoolRulesNonStrict(NonStrictValidationMixin, TestBoolRules):
+    pass
+
+
+class TestIntRulesNonStrict(NonStrictValidationMixin, TestIntRules):
+    pass
+
+
+class TestRuleGetters(TestCase):
+
+    settings = {}
+
+    @validate(vault_id=v.Rule(v.val_vault_id(), lambda: v._abort(200),
+                              getter=settings.get))
+    def vault_from_settings(self):
+        return True
+
+    block_id_rule = v.Rule(v.val_metadata_block_id(), lambda: v._abort(400),
+                           getter=lambda block: block.block_id)
+
+    @validate(block=v.Rule(v.val_block_type_metadata(),
+                           lambda: v._abort(403),
+                           nested_rules=[block_id_rule]))
+    def block_with_id(self, block):
+        return True
+
+    def tearDown(self):
+        TestRuleGetters.settings.clear()
+        super(TestRuleGetters, self).tearDown()
+
+    def test_getter(self):
+        TestRuleGetters.settings['vault_id'] = create_vault_name()
+        self.assertTrue(self.vault_from_settings())
+
+        TestRuleGetters.settings['vault_id'] = 'not a vault!'
+        with self.assertRaises(errors.InvalidVault):
+            self.vault_from_settings()
+
+    def test_nested_rules(self):
+        block = types.SimpleNamespace(block_type='metadata',
+                                      block_id=create_block()[0])
+        self.assertTrue(self.block_with_id(block))
+
+        block.block_id = 'not a block id'
+        with self.assertRaises(errors.InvalidBlocks):
+            self.block_with_id(block)
+
+        block.block_type = 'storage'
+        with self.assertRaises(errors.InvalidMetadataBlockType):
+            self.block_with_id(block)
+
+
+class TestRuleGettersNonStrict(NonStrictValidationMixin, TestRuleGetters):
+    pass
+
+
+class TestValidateValue(TestCase):
+
+    def tearDown(self):
+        v.set_strict(True)
+        super(TestValidateValue, self).tearDown()
+
+    def test_validate_value(self):
+        for strict in (True, False):
+            v.set_strict(strict)
+            v.validate_value(v.MetadataBlockIdIterableRule,
+                             [create_block()[0]])
+
+            with self.assertRaises(errors.InvalidBlocks):
+                v.validate_value(v.MetadataBlockIdIterableRule,
+                                 [create_block()[0] + '_'])
+
+
+class TestModesAgree(TestCase):
+    """The fast checks accept exactly the ids the regular expressions match
+    """
+
+    suffixes = ['', '0', 'a', 'g', 'A', '_', '-', ' ', '.', '\n', '\n\n',
+                '\u00e9', '\u0661', '-a', '\nx']
+
+    def tearDown(self):
+        v.set_strict(True)
+        super(TestModesAgree, self).tearDown()
+
+    def assertModesAgree(self, match, prefixes):
+        for prefix in prefixes:
+            for cut in (0, 1):
+                for suffix in self.suffixes:
+                    value = prefix[:len(prefix) - cut] + suffix
+                    v.set_strict(True)
+                    strict = bool(match(value))
+                    v.set_strict(False)
+                    self.assertEqual(strict, bool(match(value)), repr(value))
+
+    def test_openstring(self):
+        self.assertModesAgree(
+            lambda value: v._match_openstring(v.VAULT_ID_REGEX, value),
+            ['', 'a', 'vault', 'Vault_-9', 'vau lt'])
+
+    def test_metadata_block_id(self):
+        block_id = create_block()[0]
+        self.assertModesAgree(v._match_metadata_block_id,
+                              ['', block_id, block_id.upper(),
+                               block_id[:20] + '-' + block_id[21:]])
+
+    def test_file_id(self):
+        file_id = str(uuid.uuid4())
+        self.assertModesAgree(v._match_file_id,
+                              ['', file_id, file_id.upper(),
+                               file_id.replace('-', 'a')])
+
+    def test_storage_block_id(self):
+        storage_id = create_storage_block()
+        self.assertModesAgree(v._match_storage_block_id,
+                              ['', storage_id, storage_id.replace('_', '-'),
+                               storage_id[:40]])
+
+
+class TestStrictSwitch(TestCase):
+
+    def setUp(self):
+        super(TestStrictSwitch, self).setUp()
+        self.inner_calls = 0
+
+    def tearDown(self):
+        v.set_strict(True)
+        super(TestStrictSwitch, self).tearDown()
+
+    @v.validate(vault_id=v.VaultIdRule, block_id=v.MetadataBlockIdRule)
+    def outer(self, vault_id, block_id):
+        return self.inner(vault_id, block_id)
+
+    @v.validate(vault_id=v.VaultIdRule, block_id=v.MetadataBlockIdRule)
+    def inner(self, vault_id, block_id):
+        self.inner_calls = self.inner_calls + 1
+        return True
+
+    @v.validate(vault_id=v.VaultIdRule)
+    def internal(self, vault_id):
+        return self.inner(vault_id, 'internal value')
+
+    def test_default_is_strict(self):
+        self.assertTrue(v.is_strict())
+
+    def test_set_strict(self):
+        v.set_strict(False)
+        self.assertFalse(v.is_strict())
+        v.set_strict(True)
+        self.assertTrue(v.is_strict())
+
+    def test_strict_validates_nested_calls(self):
+        block_id = create_block()[0]
+        with mock.patch.object(v, 'METADATA_BLOCK_ID_REGEX',
+                               wraps=v.METADATA_BLOCK_ID_REGEX) as regex:
+            self.assertTrue(self.outer(create_vault_name(), block_id))
+            self.assertEqual(2, regex.match.call_count)
+
+        with self.assertRaises(errors.InvalidBlocks):
+            self.outer(create_vault_name(), 'not a block id')
+
+    def test_non_strict_validates_boundary_once(self):
+        v.set_strict(False)
+        vault_id = create_vault_name()
+        block_id = create_block()[0]
+
+        with mock.patch.object(v, '_match_metadata_block_id',
+                               wraps=v._match_metadata_block_id) as match:
+            self.assertTrue(self.outer(vault_id, block_id))
+            self.assertTrue(self.outer(vault_id, block_id=block_id))
+            self.assertEqual(2, match.call_count)
+
+        self.assertEqual(2, self.inner_calls)
+
+        with self.assertRaises(errors.InvalidBlocks):
+            self.outer(vault_id, 'not a block id')
+
+        with self.assertRaises(errors.InvalidVault):
+            self.outer('not a vault!', block_id)
+
+        # a failure must not leave the values marked as validated
+        with self.assertRaises(errors.InvalidBlocks):
+            self.inner(vault_id, 'not a block id')
+
+    def test_non_strict_new_values_validated(self):
+        v.set_strict(False)
+
+        # a value that did not go through a rule of the outer call, e.g.
+        # one read from a response, is validated by the nested call
+        with self.assertRaises(errors.InvalidBlocks):
+            self.internal(create_vault_name())
+
+        @v.validate(vault_id=v.VaultIdRule)
+        def boundary(vault_id):
+            return self.inner(vault_id, create_block()[0])
+
+        self.assertTrue(boundary(create_vault_name()))
+        self.assertEqual(1, self.inner_calls)
+
+    def test_non_strict_other_rules_validated(self):
+        v.set_strict(False)
+
+        @v.validate(vault_id=v.VaultIdRule)
+        def boundary(vault_id):
+            # the same value checked with another rule
+            return self.inner(vault_id, vault_id)
+
+        with self.assertRaises(errors.InvalidBlocks):
+            boundary(create_vault_name())
+
+    def test_non_strict_mutable_values_validated(self):
+        v.set_strict(False)
+        block_ids = [create_block()[0]]
+
+        @v.validate(block_ids=v.MetadataBlockIdIterableRule)
+        def inner(block_ids):
+            return True
+
+        @v.validate(block_ids=v.MetadataBlockIdIterableRule)
+        def boundary(block_ids):
+            block_ids.append('not a block id')
+            return inner(block_ids)
+
+        with self.assertRaises(errors.InvalidBlocks):
+            boundary(block_ids)
@@ -0,0 +1,327 @@
+"""
+Tests - Deuce Client - Daemon
+"""
+import io
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+import mock
+
+import deuceclient.auth.tokenmanager as tokenmanager
+import deuceclient.client.deuce
+import deuceclient.daemon as daemon
+import deuceclient.shell as shell
+from deuceclient.tests import FakeAuthenticator
+
+
+def fake_access():
+    authenticator = FakeAuthenticator(userid='cheshirecat',
+                                      usertype='username',
+                                      credentials='alice',
+                                      auth_method='password',
+                                      datacenter='ord',
+                                      auth_url='127.0.0.1')
+    return (authenticator,
+            deuceclient.client.deuce.DeuceClient(authenticator, 'deuce'))
+
+
+class RefreshingAuthenticator(FakeAuthenticator):
+    """Refreshes its token in the background like the OpenStack plugins
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RefreshingAuthenticator, self).__init__(*args, **kwargs)
+        self.access = None
+        self.tokens = tokenmanager.TokenManager(current=lambda: self.access,
+                                                fetch=self.fetch,
+                                                lifetime=self.lifetime_of)
+        # The first token starts the refresh thread
+        self.tokens.get()
+
+    def fetch(self):
+        self.access = ('token', time.monotonic() + 3600)
+
+    @staticmethod
+    def lifetime_of(access):
+        if access is None:
+            return 0
+        return access[1] - time.monotonic()
+
+    def StopTokenRefresh(self):
+        self.tokens.stop()
+
+
+def refreshing_access():
+    authenticator = RefreshingAuthenticator(userid='cheshirecat',
+                                            usertype='username',
+                                            credentials='alice',
+                                            auth_method='password',
+                                            datacenter='ord',
+                                            auth_url='127.0.0.1')
+    return (authenticator,
+            deuceclient.client.deuce.DeuceClient(authenticator, 'deuce'))
+
+
+def refresh_threads():
+    return {thread for thread in threading.enumerate()
+            if thread.name == 'deuce-token-refresh'}
+
+
+class DaemonSocketPathTest(TestCase):
+
+    def test_explicit(self):
+        self.assertEqual('/tmp/mock.sock',
+                         daemon.daemon_socket_path('/tmp/mock.sock'))
+
+    def test_environment(self):
+        with mock.patch.dict(os.environ,
+                             {'DEUCE_DAEMON_SOCKET': '/tmp/env.sock'}):
+            self.assertEqual('/tmp/env.sock', daemon.daemon_socket_path())
+
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': '/run/user/1'}):
+            os.environ.pop('DEUCE_DAEMON_SOCKET', None)
+            self.assertEqual('/run/user/1/deuce-client.sock',
+                             daemon.daemon_socket_path())
+
+
+class ClientPoolTest(TestCase):
+
+    def test_reuse(self):
+        pool = daemon.ClientPool()
+        factory = mock.Mock(side_effect=fake_access)
+
+        lease = pool.lease()
+        authenticator, client = lease.get('key', factory)
+        lease.release()
+        self.assertEqual(1, len(pool))
+
+        lease = pool.lease()
+        self.assertEqual((authenticator, client), lease.get('key', factory))
+        self.assertEqual(1, factory.call_count)
+        self.assertEqual(0, len(pool))
+
+    def test_concurrent_commands(self):
+        pool = daemon.ClientPool()
+
+        first = pool.lease().get('key', fake_access)
+        second = pool.lease().get('key', fake_access)
+
+        # Each command has its own client sharing the authenticator
+        self.assertIsNot(first[1], second[1])
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[0], second[1].authenticator)
+
+    def test_keys(self):
+        pool = daemon.ClientPool()
+
+        first = pool.lease().get('key', fake_access)
+        second = pool.lease().get('other', fake_access)
+        self.assertIsNot(first[0], second[0])
+
+    def test_close(self):
+        threads = refresh_threads()
+        pool = daemon.ClientPool()
+
+        lease = pool.lease()
+        lease.get('key', refreshing_access)
+        lease.get('other', refreshing_access)
+        lease.release()
+        self.assertEqual(2, len(refresh_threads() - threads))
+
+        pool.close()
+        self.assertEqual(0, len(pool))
+        self.assertEqual(set(), refresh_threads() - threads)
+
+    def test_shared_authenticator_refresh_stopped(self):
+        threads = refresh_threads()
+        pool = daemon.ClientPool()
+
+        first = pool.lease().get('key', refreshing_access)
+        second = pool.lease().get('key', refreshing_access)
+        self.assertIs(first[0], second[0])
+
+        # Only the token of the shared authenticator is refreshed
+        self.assertEqual(1, len(refresh_threads() - threads))
+
+        pool.close()
+        self.assertEqual(set(), refresh_threads() - threads)
+
+
+class ThreadOutputTest(TestCase):
+
+    def test_redirect(self):
+        default = io.StringIO()
+        redirected = []
+        output = daemon.ThreadOutput(default)
+
+        def other_thread():
+            output.write('other')
+
+        with output.redirect(redirected.append):
+            output.write('redirected')
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            thread.join()
+        output.write('default')
+
+        self.assertEqual(['redirected'], redirected)
+        self.assertEqual('otherdefault', default.getvalue())
+
+    def test_buffer(self):
+        default = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        redirected = []
+        output = daemon.ThreadOutput(default)
+
+        with output.redirect(redirected.append):
+            # A character split between writes is sent once complete
+            data = 'caf\u00e9\n'.encode('utf-8')
+            self.assertEqual(4, output.buffer.write(data[:4]))
+            output.buffer.write(data[4:])
+
+            with self.assertRaises(UnicodeDecodeError):
+                output.buffer.write(b'\xff')
+
+        output.buffer.write(b'default')
+        output.flush()
+
+        self.assertEqual('caf\u00e9\n', ''.join(redirected))
+        self.assertEqual(b'default', default.buffer.getvalue())
+
+
+class DaemonTest(TestCase):
+
+    def setUp(self):
+        super(DaemonTest, self).setUp()
+        # Unix socket paths are limited in length
+        self.temp_dir = tempfile.mkdtemp(prefix='deuce')
+        self.socket_path = os.path.join(self.temp_dir, 'run', 'daemon.sock')
+
+        user_config = os.path.join(self.temp_dir, 'user.json')
+        with open(user_config, 'w') as config:
+            json.dump({'user': 'cheshirecat', 'password': 'alice'}, config)
+
+        self.common_args = ['--user-config', 'user.json',
+                            '-dc', 'ord',
+                            '--auth-service', 'none']
+
+        self.server = threading.Thread(target=daemon.serve,
+                                       args=(self.socket_path,))
+        self.server.start()
+        for _ in range(500):
+            if daemon.forward(['--ping'], socket_path=self.socket_path,
+                              stderr=io.StringIO()) is not None:
+                break
+            time.sleep(0.01)
+
+    def tearDown(self):
+        daemon.main(['--socket', self.socket_path, 'stop'])
+        self.server.join()
+        shutil.rmtree(self.temp_dir)
+        super(DaemonTest, self).tearDown()
+
+    def forward(self, argv):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        exit_code = daemon.forward(argv, socket_path=self.socket_path,
+                                   stdout=stdout, stderr=stderr)
+        return (exit_code, stdout.getvalue(), stderr.getvalue())
+
+    def test_socket_permissions(self):
+        self.assertEqual(0o600,
+                         stat.S_IMODE(os.stat(self.socket_path).st_mode))
+        self.assertEqual(0o700, stat.S_IMODE(
+            os.stat(os.path.dirname(self.socket_path)).st_mode))
+
+    def test_not_running(self):
+        self.assertIsNone(daemon.forward(
+            ['vault', 'list'],
+            socket_path=os.path.join(self.temp_dir, 'missing.sock')))
+
+    def test_stdin_not_forwarded(self):
+        self.assertIsNone(daemon.forward(['files', 'upload', '--content', '-'],
+                                         socket_path=self.socket_path))
+        self.assertIsNone(daemon.forward(['files', 'upload', '--content=-'],
+                                         socket_path=self.socket_path))
+
+    def test_stdout_not_forwarded(self):
+        for argv in (['files', 'download', '--file-name', '-'],
+                     ['files', 'download', '--file-name=-']):
+            self.assertIsNone(daemon.forward(argv,
+                                             socket_path=self.socket_path))
+
+    def test_invalid_arguments(self):
+        exit_code, stdout, stderr = self.forward(['--bogus'])
+        self.assertEqual(2, exit_code)
+        self.assertIn('usage', stderr)
+
+    def test_command(self):
+        clients = []
+
+        def fake_vault_exists(log, arguments):
+            auth_engine, client, api_url = \
+                getattr(shell, '__api_operation_prep')(log, arguments)
+            clients.append(client)
+            print('Vault {0}'.format(arguments.vault_name))
+
+        old_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            with mock.patch.object(shell, 'vault_exists', fake_vault_exists):
+                argv = self.common_args + ['vault', '--vault-name', 'mock',
+                                           'exists']
+                for _ in range(2):
+                    self.assertEqual((0, 'Vault mock\n', ''),
+                                     self.forward(argv))
+        finally:
+            os.chdir(old_dir)
+
+        # The client of the first command was kept for the second
+        self.assertEqual(2, len(clients))
+        self.assertIs(clients[0], clients[1])
+
+    def test_binary_output(self):
+        def fake_vault_exists(log, arguments):
+            sys.stdout.buffer.write('Vault {0}\n'.format(
+                arguments.vault_name).encode())
+            sys.stdout.flush()
+
+        with mock.patch.object(shell, 'vault_exists', fake_vault_exists):
+            self.assertEqual((0, 'Vault mock\n', ''), self.forward(
+                ['--user-config', os.path.join(self.temp_dir, 'user.json'),
+                 '-dc', 'ord', 'vault', '--vault-name', 'mock', 'exists']))
+
+    def test_command_failure(self):
+        def fake_vault_exists(log, arguments):
+            raise RuntimeError('mock failure')
+
+        with mock.patch.object(shell, 'vault_exists', fake_vault_exists):
+            exit_code, stdout, stderr = self.forward(
+                ['--user-config', os.path.join(self.temp_dir, 'user.json'),
+                 '-dc', 'ord', 'vault', '--vault-name', 'mock', 'exists'])
+
+        self.assertEqual(1, exit_code)
+        self.assertIn('mock failure', stderr)
+
+    def test_status(self):
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertEqual(0, daemon.main(['--socket', self.socket_path,
+                                             'status']))
+        self.assertIn('Running', stdout.getvalue())
+
+    def test_stop_closes_pool(self):
+        with mock.patch.object(daemon.ClientPool, 'close',
+                               autospec=True) as close:
+            daemon.main(['--socket', self.socket_path, 'stop'])
+            self.server.join()
+        close.assert_called_once_with(mock.ANY)
+
+    def test_already_running(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            self.assertEqual(1, daemon.serve(self.socket_path))
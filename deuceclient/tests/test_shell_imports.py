@@ -0,0 +1,42 @@
+"""
+Tests - Deuce Client - Shell - Imports
+"""
+import json
+import subprocess
+import sys
+from unittest import TestCase
+
+# Dependencies that take far longer to import than short commands take to
+# run; they may only be loaded once an operation needs them
+HEAVY_MODULES = ('keystoneclient', 'msgpack', 'requests', 'stoplight')
+
+
+class ShellImportTest(TestCase):
+
+    def imported(self, *modules):
+        """Return the top level packages loaded by importing the modules
+        """
+        code = ('import sys, json\n'
+                'import {0}\n'
+                'print(json.dumps(sorted(set(name.split(".")[0] '
+                'for name in sys.modules))))').format(', '.join(modules))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         universal_newlines=True)
+        return json.loads(output)
+
+    def assertNotImported(self, modules, *imports):
+        imported = self.imported(*imports)
+        for module in modules:
+            self.assertNotIn(module, imported)
+
+    def test_shell(self):
+        self.assertNotImported(HEAVY_MODULES, 'deuceclient.shell')
+
+    def test_auth_backends(self):
+        for backend in ('nonauth', 'openstackauth', 'rackspaceauth'):
+            self.assertNotImported(('keystoneclient', 'requests'),
+                                   'deuceclient.auth.{0}'.format(backend))
+
+    def test_client(self):
+        self.assertNotImported(('keystoneclient', 'msgpack'),
+                               'deuceclient.client.deuce')
@@ -1,7 +1,9 @@
 """
 Tests - Deuce Client - Utils - File Splitter - Uniform File Splitter
 """
+import io
 import os
+import tempfile
 from unittest import TestCase
 
 import mock
@@ -122,8 +124,8 @@ class TestUniformSplitter(TestCase):
                                    self.vault_id,
                                    reader)
 
-        with self.assertRaises(AttributeError):
-            splitter.input_stream = Y()
+        splitter.input_stream = Y()
+        self.assertIsInstance(splitter.input_stream, Y)
 
     def test_get_block(self):
         reader = make_reader(10 * 1024 * 1024)
@@ -337,3 +339,149 @@ class TestUniformSplitter(TestCase):
                 else:
                     self.assertEqual(splitter.chunk_size,
                                      len(block))
+
+    def test_get_block_non_seekable(self):
+        data = os.urandom(100)
+
+        class Pipe(io.RawIOBase):
+            """Returns at most 7 bytes at a time and cannot tell"""
+
+            def __init__(self):
+                self.source = io.BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, buffer):
+                chunk = self.source.read(min(7, len(buffer)))
+                buffer[:len(chunk)] = chunk
+                return len(chunk)
+
+        pipe = Pipe()
+        self.assertFalse(pipe.seekable())
+
+        splitter = UniformSplitter(self.project_id,
+                                   self.vault_id,
+                                   pipe,
+                                   chunk_size=30)
+
+        blocks = splitter.get_blocks(10)
+        self.assertEqual([0, 30, 60, 90],
+                         [offset for offset, block in blocks])
+        self.assertEqual([30, 30, 30, 10],
+                         [len(block) for offset, block in blocks])
+        self.assertEqual(data, b''.join(block.data
+                                        for offset, block in blocks))
+
+    def test_get_block_sparse_file(self):
+        chunk_size = 1024 * 1024
+        data = os.urandom(chunk_size)
+
+        class LocalFile(io.FileIO):
+            """Records the offsets read from"""
+
+            def __init__(self, *args, **kwargs):
+                super(LocalFile, self).__init__(*args, **kwargs)
+                self.reads = []
+
+            def read(self, size=-1):
+                self.reads.append(self.tell())
+                return super(LocalFile, self).read(size)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'sparse')
+            with open(path, 'wb') as sparse_file:
+                sparse_file.truncate(4 * chunk_size)
+                sparse_file.seek(2 * chunk_size)
+                sparse_file.write(data)
+
+            with LocalFile(path, 'rb') as local_file:
+                splitter = UniformSplitter(self.project_id,
+                                           self.vault_id,
+                                           local_file,
+                                           chunk_size=chunk_size)
+                blocks = splitter.get_blocks(5)
+
+        zero_block_id = api.Block.make_id(bytes(chunk_size))
+        self.assertEqual([zero_block_id, zero_block_id,
+                          api.Block.make_id(data), zero_block_id],
+                         [block.block_id for offset, block in blocks])
+        self.assertEqual(bytes(2 * chunk_size) + data + bytes(chunk_size),
+                         b''.join(block.data for offset, block in blocks))
+        self.assertEqual([0, chunk_size, 2 * chunk_size, 3 * chunk_size],
+                         [offset for offset, block in blocks])
+
+        if 0 not in local_file.reads:
+            # The holes were found and not read
+            self.assertEqual([2 * chunk_size, 4 * chunk_size],
+                             local_file.reads)
+
+    def test_get_blocks_prefetch(self):
+        data = os.urandom(1000)
+        reader = io.BytesIO(data)
+        reader.seek(100)
+
+        splitter = UniformSplitter(self.project_id,
+                                   self.vault_id,
+                                   reader,
+                                   chunk_size=300,
+                                   prefetch_bytes=600)
+
+        blocks = splitter.get_blocks(10)
+        self.assertEqual([100, 400, 700],
+                         [offset for offset, block in blocks])
+        self.assertEqual(data[100:], b''.join(block.data
+                                              for offset, block in blocks))
+        for offset, block in blocks:
+            self.assertIsInstance(block.data, bytes)
+            self.assertEqual(api.Block.make_id(block.data), block.block_id)
+        self.assertEqual([], splitter.get_blocks(1))
+        splitter.close()
+
+    def test_get_blocks_prefetch_non_seekable(self):
+        data = os.urandom(90) + bytes(70)
+
+        class Pipe(object):
+            """Provides read only, at most 7 bytes at a time"""
+
+            def __init__(self):
+                self.source = io.BytesIO(data)
+
+            def read(self, size):
+                return self.source.read(min(7, size))
+
+        splitter = UniformSplitter(self.project_id,
+                                   self.vault_id,
+                                   Pipe(),
+                                   chunk_size=30,
+                                   prefetch_bytes=1)
+
+        blocks = splitter.get_blocks(10)
+        self.assertEqual([0, 30, 60, 90, 120, 150],
+                         [offset for offset, block in blocks])
+        self.assertEqual(data, b''.join(block.data
+                                        for offset, block in blocks))
+
+        # All-zero blocks share their data
+        self.assertIs(blocks[-2][1].data, blocks[-3][1].data)
+        self.assertEqual(api.Block.make_id(bytes(10)), blocks[-1][1].block_id)
+
+    def test_prefetch_abandoned(self):
+        reader = io.BytesIO(os.urandom(10000))
+        splitter = UniformSplitter(self.project_id,
+                                   self.vault_id,
+                                   reader,
+                                   chunk_size=100,
+                                   prefetch_bytes=300)
+
+        offset, block = splitter.get_block()
+        splitter.close()
+
+        # The stream is left after what was read ahead
+        self.assertEqual(0, offset)
+        self.assertLessEqual(100, reader.tell())
+        self.assertGreaterEqual(400, reader.tell())
+
+        with self.assertRaises(ValueError):
+            UniformSplitter(self.project_id, self.vault_id, reader,
+                            prefetch_bytes=-1)
@@ -3,11 +3,11 @@ Deuce Client - Utils - File Splitter - Uniform File Splitter
 """
 import logging
 
-from stoplight import validate
-
 from deuceclient.api import Block, Blocks
 from deuceclient.api.splitter import FileSplitterBase
+import deuceclient.common.pagecache as pagecache
 from deuceclient.common.validation import *
+from deuceclient.common.validation import validate
 
 
 class UniformSplitter(FileSplitterBase):
@@ -16,13 +16,24 @@ class UniformSplitter(FileSplitterBase):
     """
 
     def __init__(self, project_id, vault_id, input_io,
-                 chunk_size=(1024 * 1024)):
+                 chunk_size=(1024 * 1024),
+                 readahead=pagecache.DEFAULT_READAHEAD, drop_cache=True,
+                 prefetch_bytes=0):
         """
         :param input_io: file-like object providing read function
         :param chunk_size: uniform size in bytes to return at a time,
                            default 1KB
+        :param readahead: for local files, number of bytes the kernel is
+                          asked to read ahead, 0 to leave it to the kernel
+        :param drop_cache: for local files, whether or not to drop the
+                           content split from the page cache
+        :param prefetch_bytes: number of bytes of buffers to read ahead into
+                               in a background thread, 0 not to
         """
-        super(UniformSplitter, self).__init__(project_id, vault_id, input_io)
+        super(UniformSplitter, self).__init__(project_id, vault_id, input_io,
+                                              readahead=readahead,
+                                              drop_cache=drop_cache,
+                                              prefetch_bytes=prefetch_bytes)
         self._chunk_size = chunk_size
 
     def configure(self, config):
@@ -45,8 +56,7 @@ class UniformSplitter(FileSplitterBase):
 
     def get_block(self):
         self._set_state('processing')
-        data_offset = self.input_stream.tell()
-        data = self.input_stream.read(self.chunk_size)
+        data_offset, data = self._read(self.chunk_size)
 
         # If len(data) is 0, then we've reached the end of the data source;
         # so don't create a block and return None instead.
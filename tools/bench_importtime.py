@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Deuce Client - Import Time Benchmark
+
+Measures the import time of the command-line interface and of the modules
+each kind of command loads using ``python -X importtime`` in a fresh
+interpreter, and fails if any of them goes over its budget.
+
+    python tools/bench_importtime.py [--repeat N] [--top N] [--no-budget]
+"""
+import argparse
+import subprocess
+import sys
+
+# (name, modules imported, budget in milliseconds)
+ENTRY_POINTS = [
+    ('shell', ['deuceclient.shell'], 60),
+    ('shell + noauth', ['deuceclient.shell', 'deuceclient.auth.nonauth'],
+     60),
+    ('shell + openstack', ['deuceclient.shell',
+                           'deuceclient.auth.openstackauth'], 60),
+]
+
+
+def measure(modules):
+    """Import the modules in a fresh interpreter
+
+    :returns: list of (cumulative microseconds, module name) for each module
+              imported, in import order
+    """
+    code = 'import {0}'.format(', '.join(modules))
+    # -X importtime reports on stderr; the import itself prints nothing
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stderr=subprocess.STDOUT, universal_newlines=True)
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            timings.append((int(fields[1]), fields[2].strip()))
+        except (IndexError, ValueError):
+            # the header line
+            continue
+    return timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Deuce Client Import Time Benchmark')
+    arg_parser.add_argument('--repeat', default=5, type=int,
+                            help='Runs per entry point, the best is kept')
+    arg_parser.add_argument('--top', default=5, type=int,
+                            help='Number of slowest modules to show')
+    arg_parser.add_argument('--no-budget', default=False,
+                            action='store_true',
+                            help='Only report, do not enforce the budgets')
+    arguments = arg_parser.parse_args()
+
+    over_budget = []
+    for name, modules, budget in ENTRY_POINTS:
+        runs = [measure(modules) for _ in range(arguments.repeat)]
+        totals = [sum(cumulative for cumulative, module in run
+                      if module in modules) for run in runs]
+        best = min(range(len(runs)), key=lambda index: totals[index])
+        total_ms = totals[best] / 1000.0
+
+        print('{0:20} {1:8.1f} ms (budget {2} ms)'.format(name, total_ms,
+                                                          budget))
+        for cumulative, module in sorted(runs[best],
+                                         reverse=True)[:arguments.top]:
+            print('    {0:40} {1:8.1f} ms'.format(module,
+                                                  cumulative / 1000.0))
+
+        if total_ms > budget:
+            over_budget.append(name)
+
+    if over_budget and not arguments.no_budget:
+        print('Over budget: {0}'.format(', '.join(over_budget)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Deuce Client - Page Cache Benchmark
+
+Splits a local file with UniformSplitter, as an upload does, with and
+without dropping the content from the page cache, and reports the
+throughput and how much of the file is left in the page cache afterwards.
+The file is evicted from the page cache before each run, so the reads come
+from the disk.
+
+    python tools/bench_pagecache.py [--size MiB] [--path FILE]
+
+Linux only: the page cache footprint is measured with mincore(2).
+"""
+import argparse
+import ctypes
+import ctypes.util
+import mmap
+import os
+import tempfile
+import time
+import uuid
+
+import deuceclient.common.pagecache as pagecache
+from deuceclient.utils import UniformSplitter
+
+MiB = 1024 * 1024
+
+# (name, readahead, drop_cache)
+MODES = [
+    ('keep cache', 0, False),
+    ('drop cache', 0, True),
+    ('drop cache + readahead', pagecache.DEFAULT_READAHEAD, True),
+]
+
+
+def cached_bytes(path):
+    """Return how many bytes of a file are in the page cache
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.mmap.restype = ctypes.c_void_p
+    libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                          ctypes.c_int, ctypes.c_int, ctypes.c_long]
+    libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t,
+                             ctypes.c_void_p]
+
+    size = os.path.getsize(path)
+    if not size:
+        return 0
+
+    pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    vector = (ctypes.c_ubyte * pages)()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        address = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED,
+                            fd, 0)
+        if address == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), 'mmap failed')
+        try:
+            if libc.mincore(address, size, vector) != 0:
+                raise OSError(ctypes.get_errno(), 'mincore failed')
+        finally:
+            libc.munmap(address, size)
+    finally:
+        os.close(fd)
+
+    return sum(page & 1 for page in vector) * mmap.PAGESIZE
+
+
+def evict(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def split(path, readahead, drop_cache):
+    """Split a file into blocks
+
+    :returns: seconds taken
+    """
+    project_id = 'project_{0}'.format(uuid.uuid4())
+    vault_id = 'vault_{0}'.format(uuid.uuid4())
+    start = time.monotonic()
+    with open(path, 'rb') as content:
+        splitter = UniformSplitter(project_id, vault_id, content,
+                                   readahead=readahead,
+                                   drop_cache=drop_cache)
+        while splitter.get_blocks(16):
+            pass
+    return time.monotonic() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Deuce Client Page Cache Benchmark')
+    arg_parser.add_argument('--size',
+                            default=512,
+                            type=int,
+                            help='Size in MiB of the file to create')
+    arg_parser.add_argument('--path',
+                            default=None,
+                            help='Existing file to split instead of a new '
+                            'temporary file')
+    arg_parser.add_argument('--repeat',
+                            default=3,
+                            type=int,
+                            help='Number of runs to take the best of')
+    arguments = arg_parser.parse_args()
+
+    path = arguments.path
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix='bench_pagecache_')
+        with os.fdopen(fd, 'wb') as local_file:
+            for _ in range(arguments.size):
+                local_file.write(os.urandom(MiB))
+
+    try:
+        size = os.path.getsize(path)
+        print('{0:<26}{1:>12}{2:>14}'.format('mode', 'MiB/s',
+                                             'cached (MiB)'))
+        for name, readahead, drop_cache in MODES:
+            best = None
+            for _ in range(arguments.repeat):
+                evict(path)
+                seconds = split(path, readahead, drop_cache)
+                best = seconds if best is None else min(best, seconds)
+            print('{0:<26}{1:>12.1f}{2:>14.1f}'.format(
+                name, size / MiB / best, cached_bytes(path) / MiB))
+
+    finally:
+        if arguments.path is None:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Deuce Client - Validation Micro-benchmark
+
+Measures the per-call cost of the validated block operations with strict
+validation enabled (the default) and with the non-strict fast path.
+
+    python tools/bench_validation.py [--count N]
+"""
+import argparse
+import hashlib
+import os
+import timeit
+import uuid
+
+import deuceclient.api as api
+import deuceclient.api.v1 as api_v1
+import deuceclient.common.validation as validation
+
+
+def make_operations(count):
+    project_id = 'project_{0}'.format(uuid.uuid4())
+    vault_id = 'vault_{0}'.format(uuid.uuid4())
+    block_ids = [hashlib.sha1(os.urandom(16)).hexdigest()
+                 for _ in range(count)]
+    storage_ids = ['{0}_{1}'.format(block_id, uuid.uuid4())
+                   for block_id in block_ids]
+    blocks = [api.Block(project_id, vault_id, block_id)
+              for block_id in block_ids]
+    collection = api.Blocks(project_id, vault_id)
+    a_file = api.File(project_id, vault_id, str(uuid.uuid4()))
+
+    def block_create():
+        for block_id in block_ids:
+            api.Block(project_id, vault_id, block_id)
+
+    def blocks_set():
+        for block in blocks:
+            collection[block.block_id] = block
+
+    def blocks_get():
+        for block_id in block_ids:
+            collection[block_id]
+
+    def file_assign_block():
+        for offset, block_id in enumerate(block_ids):
+            a_file.assign_block(block_id, offset)
+
+    def block_path():
+        for block_id in block_ids:
+            api_v1.get_block_path(vault_id, block_id)
+
+    def storage_block_path():
+        for storage_id in storage_ids:
+            api_v1.get_storage_block_path(vault_id, storage_id)
+
+    blocks_set()
+    return [
+        ('Block()', block_create),
+        ('Blocks.__setitem__', blocks_set),
+        ('Blocks.__getitem__', blocks_get),
+        ('File.assign_block', file_assign_block),
+        ('v1.get_block_path', block_path),
+        ('v1.get_storage_block_path', storage_block_path),
+    ]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Deuce Client Validation Micro-benchmark')
+    arg_parser.add_argument('--count',
+                            default=10000,
+                            type=int,
+                            help='Number of block operations per timing')
+    arg_parser.add_argument('--repeat',
+                            default=5,
+                            type=int,
+                            help='Number of timings to take the best of')
+    arguments = arg_parser.parse_args()
+
+    operations = make_operations(arguments.count)
+
+    print('{0:<28}{1:>14}{2:>14}{3:>10}'.format('operation',
+                                                'strict (us)',
+                                                'fast (us)',
+                                                'speedup'))
+    for name, operation in operations:
+        results = {}
+        for strict in (True, False):
+            validation.set_strict(strict)
+            best = min(timeit.repeat(operation,
+                                     number=1,
+                                     repeat=arguments.repeat))
+            results[strict] = best / arguments.count * 1000000
+        validation.set_strict(True)
+
+        print('{0:<28}{1:>14.2f}{2:>14.2f}{3:>9.1f}x'.format(
+            name, results[True], results[False],
+            results[True] / results[False]))
+
+
+if __name__ == '__main__':
+    main()